@@ -7,7 +7,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from utils.database import init_db
+from utils.database import DB_ASYNC, init_db, pool_stats
+from services.executor import start_executor, shutdown_executor
+from services.history_writer import start_history_writer, shutdown_history_writer
+from services.history_archive import start_history_archiver, shutdown_history_archiver
+from services.history_purge import start_purge_worker, shutdown_purge_worker
+from services.user_stats import start_stats_reconciler, shutdown_stats_reconciler
+from services.usage_analytics import start_usage_rollups, shutdown_usage_rollups
+from utils.replicas import (
+    replica_router,
+    start_replica_health_checks,
+    shutdown_replica_health_checks,
+)
 
 # 加载环境变量
 load_dotenv()
@@ -36,8 +47,31 @@ async def startup_event():
     """应用启动时初始化数据库"""
     print("🚀 正在启动应用...")
     init_db()
+    start_replica_health_checks()
+    start_executor()
+    start_history_writer()
+    start_stats_reconciler()
+    start_history_archiver()
+    start_purge_worker()
+    start_usage_rollups()
     print("✅ 应用启动完成")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时停止计算进程池和后台任务, 并提交写后缓冲中剩余的历史记录"""
+    shutdown_executor()
+    shutdown_history_writer()
+    shutdown_stats_reconciler()
+    shutdown_history_archiver()
+    shutdown_purge_worker()
+    shutdown_usage_rollups()
+    shutdown_replica_health_checks()
+    if DB_ASYNC:
+        from utils.async_database import shutdown_async_db
+
+        await shutdown_async_db()
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -52,11 +86,46 @@ async def health_check():
     """健康检查"""
     return {"status": "healthy"}
 
+@app.get("/health/db")
+def database_health():
+    """
+    数据库连接池状态
+
+    - `size` / `max_overflow`: 常驻连接数和高峰时可额外创建的连接数
+    - `checked_out` / `idle` / `overflow`: 当前使用中、空闲和超出常驻数的连接数
+    - `waiting`: 正在等待连接的请求数
+    - `checkouts` / `avg_wait_ms` / `max_wait_ms`: 累计取出次数和取出耗时 (包括新建连接)
+    - `timeouts`: 等待超过 DB_POOL_TIMEOUT 的次数
+    - `journal_mode`: SQLite 实际生效的日志模式
+    - `async_pool`: 启用 DB_ASYNC 时异步引擎的连接池状态 (字段同上)
+    - `replicas`: 配置了只读副本时每个副本的健康状态、复制延迟、读取次数和连接池状态,
+      以及因读己之写 (`sticky_reads`) 和没有可用副本 (`fallbacks`) 而读主库的次数
+    """
+    stats = pool_stats()
+    if DB_ASYNC:
+        from utils.async_database import async_pool_stats
+
+        stats["async_pool"] = async_pool_stats()
+    if replica_router.enabled:
+        stats["replicas"] = replica_router.stats()
+    return stats
+
 # 引入路由模块
-from routers import auth_router, calculate_router, history_router, ai_router
+from routers import (
+    auth_router,
+    calculate_router,
+    calculus_router,
+    convert_router,
+    prepared_router,
+    history_router,
+    ai_router,
+)
 
 app.include_router(auth_router, prefix="/api/v1", tags=["认证"])
 app.include_router(calculate_router, prefix="/api/v1", tags=["计算"])
+app.include_router(calculus_router, prefix="/api/v1", tags=["数值微积分"])
+app.include_router(convert_router, prefix="/api/v1", tags=["单位换算"])
+app.include_router(prepared_router, prefix="/api/v1", tags=["预编译表达式"])
 app.include_router(ai_router, prefix="/api/v1", tags=["AI计算"])
 app.include_router(history_router, prefix="/api/v1", tags=["历史记录"])
 
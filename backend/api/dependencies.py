@@ -1,34 +1,39 @@
 """
 FastAPI 依赖注入
 """
+import os
 from typing import Optional
+from uuid import UUID
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
-from .utils.database import get_db
+from .utils.database import get_db, use_primary
+from .utils.replicas import route_session
 from .utils.security import decode_access_token
 from .models import User
 
 # HTTP Bearer 认证
 security = HTTPBearer()
 
+# 管理员用户名列表 (逗号分隔)
+ADMIN_USERNAMES = {
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+}
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)
-) -> User:
+
+def token_user_id(credentials: HTTPAuthorizationCredentials) -> UUID:
     """
-    获取当前认证用户的依赖注入函数
+    解析 Bearer 令牌中的用户ID
 
     Args:
         credentials: HTTP Bearer 凭证
-        db: 数据库会话
 
     Returns:
-        User: 当前用户对象
+        UUID: 用户ID
 
     Raises:
-        HTTPException: 令牌无效或用户不存在
+        HTTPException: 令牌无效
     """
     # 解码令牌
     token = credentials.credentials
@@ -43,15 +48,29 @@ def get_current_user(
 
     # 获取用户ID
     user_id: Optional[str] = payload.get("sub")
-    if user_id is None:
+    try:
+        return UUID(user_id)
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的令牌payload",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # 查询用户
-    user = db.query(User).filter(User.id == user_id).first()
+
+def check_user(user: Optional[User]) -> User:
+    """
+    检查令牌对应的用户是否存在且已激活
+
+    Args:
+        user: 查询到的用户
+
+    Returns:
+        User: 用户对象
+
+    Raises:
+        HTTPException: 用户不存在或已被禁用
+    """
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户不存在")
 
@@ -59,3 +78,53 @@ def get_current_user(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账户已被禁用")
 
     return user
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)
+) -> User:
+    """
+    获取当前认证用户的依赖注入函数
+
+    Args:
+        credentials: HTTP Bearer 凭证
+        db: 数据库会话
+
+    Returns:
+        User: 当前用户对象
+
+    Raises:
+        HTTPException: 令牌无效或用户不存在
+    """
+    user_id = token_user_id(credentials)
+
+    # 只读请求改用只读副本 (用户最近写入过时仍使用主库)
+    route_session(db, user_id)
+
+    # 查询用户 (刚注册的用户可能尚未复制到副本, 在主库上再查一次)
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None and db.info.get("bind") is not None:
+        use_primary(db)
+        user = db.query(User).filter(User.id == user_id).first()
+    return check_user(user)
+
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """
+    获取当前管理员用户的依赖注入函数
+
+    管理员由环境变量 ADMIN_USERNAMES 配置
+
+    Args:
+        current_user: 当前用户
+
+    Returns:
+        User: 当前用户对象
+
+    Raises:
+        HTTPException: 当前用户不是管理员
+    """
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限")
+
+    return current_user
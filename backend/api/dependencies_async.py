@@ -0,0 +1,44 @@
+"""
+FastAPI 依赖注入 (异步数据库访问, DB_ASYNC=true 时使用)
+"""
+from fastapi import Depends, Request
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .dependencies import check_user, security, token_user_id
+from .models import User
+from .utils.async_database import get_async_db
+from .utils.database import READ_METHODS
+from .utils.replicas import replica_router
+
+
+async def get_current_user_async(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    """
+    获取当前认证用户的依赖注入函数 (异步版本, 与 get_current_user 行为相同)
+
+    异步引擎只连接主库; 写请求同样记录用户的写入, 使同步的只读路由读己之写
+
+    Args:
+        request: 当前请求
+        credentials: HTTP Bearer 凭证
+        db: 异步数据库会话
+
+    Returns:
+        User: 当前用户对象
+
+    Raises:
+        HTTPException: 令牌无效或用户不存在
+    """
+    user_id = token_user_id(credentials)
+    if replica_router.enabled and request.method not in READ_METHODS:
+        replica_router.record_write(user_id)
+
+    # 查询用户
+    user = await db.scalar(select(User).where(User.id == user_id))
+    return check_user(user)
+
@@ -5,10 +5,10 @@
 import sys
 import os
 
-# 添加项目根目录到Python路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# 添加 backend 目录到Python路径 (utils/database.py 中的模型按 api 包相对导入)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.database import init_db, drop_db
+from api.utils.database import init_db, drop_db
 
 
 def main():
@@ -18,8 +18,8 @@ def main():
     parser = argparse.ArgumentParser(description="数据库管理工具")
     parser.add_argument(
         "action",
-        choices=["init", "drop", "reset"],
-        help="操作类型: init(初始化), drop(删除), reset(重置)",
+        choices=["init", "migrate", "drop", "reset"],
+        help="操作类型: init(初始化), migrate(迁移), drop(删除), reset(重置)",
     )
 
     args = parser.parse_args()
@@ -28,6 +28,11 @@ def main():
         print("🚀 正在初始化数据库...")
         init_db()
 
+    elif args.action == "migrate":
+        # init_db 创建缺少的表, 并为已有的表添加新增的列和索引、回填数据
+        print("🚀 正在迁移数据库...")
+        init_db()
+
     elif args.action == "drop":
         confirm = input("⚠️  确定要删除所有表吗? (yes/no): ")
         if confirm.lower() == "yes":
@@ -1,7 +1,27 @@
 """
 数据库模型模块
 """
-from .user import User
-from .history import History, AIUsage
+from .user import User, UserStats
+from .history import (
+    History,
+    HistoryText,
+    HistoryTombstone,
+    HistoryArchiveSegment,
+    HistoryPurgeJob,
+    AIUsage,
+)
+from .usage import UsageRollup, AIUsageRollup, ExpressionRollup
 
-__all__ = ["User", "History", "AIUsage"]
+__all__ = [
+    "User",
+    "UserStats",
+    "History",
+    "HistoryText",
+    "HistoryTombstone",
+    "HistoryArchiveSegment",
+    "HistoryPurgeJob",
+    "AIUsage",
+    "UsageRollup",
+    "AIUsageRollup",
+    "ExpressionRollup",
+]
@@ -2,37 +2,222 @@
 历史记录和AI使用记录模型
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+    select,
+    text,
+)
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, deferred, relationship
 import uuid
 
 from ..utils.database import Base
 
 
+class HistoryText(Base):
+    """
+    历史记录文本 (较长的表达式和结果按内容去重保存)
+
+    digest 为内容 SHA-256 的前 16 字节, 写入时按摘要查找或插入; 历史记录只保存整数ID引用。
+    同一文本可能被多条记录引用, 删除历史记录后只清理不再被引用的文本
+    (见 services/history_storage.release_texts)
+    """
+
+    __tablename__ = "history_texts"
+
+    # SQLite 中 INTEGER PRIMARY KEY 即 rowid, 引用按变长整数存储
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    digest = Column(LargeBinary(16), nullable=False, unique=True)
+    content = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<HistoryText(id={self.id}, content={self.content[:20]})>"
+
+
 class History(Base):
-    """计算历史记录模型"""
+    """
+    计算历史记录模型
+
+    表达式和文本结果较短时直接保存在本表中, 较长时按内容去重保存在 history_texts 中
+    (expression_id/result_id); 可由浮点数精确还原的数值结果保存在 result_value 中。
+    expression 和 result 在读取时还原, 与原来的字段一致 (写入格式见 services/history_storage)
+    """
 
     __tablename__ = "history"
+    __table_args__ = (
+        # 游标分页: WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("idx_history_user_created_id", "user_id", "created_at", "id"),
+        # 增量同步: WHERE user_id = ? AND change_seq > ? ORDER BY change_seq
+        Index("idx_history_user_change_seq", "user_id", "change_seq"),
+        # 离线记录上传按客户端ID去重
+        UniqueConstraint("user_id", "client_id", name="uq_history_user_client_id"),
+        # 删除记录后检查长文本是否仍被引用 (部分索引, 只包含引用了 history_texts 的记录)
+        Index(
+            "idx_history_expression_id",
+            "expression_id",
+            sqlite_where=text("expression_id IS NOT NULL"),
+            postgresql_where=text("expression_id IS NOT NULL"),
+        ),
+        Index(
+            "idx_history_result_id",
+            "result_id",
+            sqlite_where=text("result_id IS NOT NULL"),
+            postgresql_where=text("result_id IS NOT NULL"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    expression = Column(Text, nullable=False)
-    result = Column(String(255), nullable=True)
+    expression_inline = Column("expression", Text, nullable=True)
+    expression_id = Column(BigInteger, ForeignKey("history_texts.id"), nullable=True)
+    result_inline = Column("result", String(255), nullable=True)
+    result_id = Column(BigInteger, ForeignKey("history_texts.id"), nullable=True)
+    result_value = Column(Float, nullable=True)
+    # 矩阵等非标量结果的二进制编码 (result 中只保存文本摘要或引用), 延迟加载
+    result_data = deferred(Column(LargeBinary, nullable=True))
     calculation_type = Column(String(20), default="basic", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # 创建时分配的用户级变更序号
+    change_seq = Column(BigInteger, nullable=True)
+    # 客户端离线创建记录时生成的ID
+    client_id = Column(String(64), nullable=True)
+
+    # 表达式和文本结果 (只读; 内联值为空时才按主键查询 history_texts)
+    expression = column_property(
+        func.coalesce(
+            expression_inline,
+            select(HistoryText.content)
+            .where(HistoryText.id == expression_id)
+            .correlate_except(HistoryText)
+            .scalar_subquery(),
+        )
+    )
+    result_text = column_property(
+        func.coalesce(
+            result_inline,
+            select(HistoryText.content)
+            .where(HistoryText.id == result_id)
+            .correlate_except(HistoryText)
+            .scalar_subquery(),
+        )
+    )
 
     # 关系
     user = relationship("User", back_populates="history_records")
 
+    @property
+    def result(self):
+        """计算结果 (文本结果或数值结果还原的文本)"""
+        if self.result_text is not None:
+            return self.result_text
+        return repr(self.result_value) if self.result_value is not None else None
+
+    @result.setter
+    def result(self, value):
+        # 只用于尚未写入数据库的临时对象 (写后缓冲模式), 写入时由 history_storage 转换
+        self.result_text = value
+        self.result_value = None
+
     def __repr__(self):
         return f"<History(id={self.id}, user_id={self.user_id}, expression={self.expression[:20]}...)>"
 
 
+class HistoryTombstone(Base):
+    """
+    历史记录删除标记 (增量同步)
+
+    history_id 为空表示清空了该序号之前的全部历史记录
+    """
+
+    __tablename__ = "history_tombstones"
+    __table_args__ = (Index("idx_history_tombstones_user_change_seq", "user_id", "change_seq"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    history_id = Column(UUID(as_uuid=True), nullable=True)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<HistoryTombstone(user_id={self.user_id}, history_id={self.history_id}, seq={self.change_seq})>"
+
+
+class HistoryArchiveSegment(Base):
+    """
+    历史记录归档段 (冷数据)
+
+    超过保留期的历史记录按用户成批移出 history 表, 每批压缩为一个只追加的段;
+    start_at/end_at 为段内记录创建时间的范围, 读取时按时间范围定位需要解压的段;
+    max_seq 为段内记录的最大变更序号, 增量同步只解压包含新变更的段
+    """
+
+    __tablename__ = "history_archive_segments"
+    __table_args__ = (
+        Index("idx_history_archive_user_end", "user_id", "end_at"),
+        Index("idx_history_archive_user_start", "user_id", "start_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    start_at = Column(DateTime, nullable=False)
+    end_at = Column(DateTime, nullable=False)
+    record_count = Column(Integer, nullable=False)
+    # 添加该列之前创建的段为空 (增量同步时总是解压)
+    max_seq = Column(Integer, nullable=True)
+    # zlib 压缩的 JSON 记录列表, 延迟加载
+    data = deferred(Column(LargeBinary, nullable=False))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<HistoryArchiveSegment(user_id={self.user_id}, records={self.record_count}, {self.start_at} - {self.end_at})>"
+
+
+class HistoryPurgeJob(Base):
+    """
+    历史记录后台清理任务
+
+    kind 为 clear (清空历史记录) 或 account (删除账户及其全部数据);
+    status 依次为 pending、running、done (失败时为 failed, 可重新执行)
+    """
+
+    __tablename__ = "history_purge_jobs"
+    __table_args__ = (Index("idx_history_purge_jobs_status", "status"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # 删除账户后任务记录仍保留, 不设外键
+    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)
+    # 清空时的水位 (变更序号和时间)
+    cleared_seq = Column(BigInteger, nullable=False)
+    cleared_at = Column(DateTime, nullable=False)
+    total = Column(BigInteger, default=0, nullable=False)
+    deleted = Column(BigInteger, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<HistoryPurgeJob(id={self.id}, kind={self.kind}, status={self.status}, deleted={self.deleted}/{self.total})>"
+
+
 class AIUsage(Base):
     """AI使用记录模型"""
 
     __tablename__ = "ai_usage"
+    __table_args__ = (Index("idx_ai_usage_user_change_seq", "user_id", "change_seq"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -40,6 +225,8 @@ class AIUsage(Base):
     tokens_used = Column(Integer, nullable=False)
     model_version = Column(String(50), default="glm-4.6", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # 用户级序号 (users.ai_usage_seq), 用于增量汇总
+    change_seq = Column(BigInteger, nullable=True)
 
     # 关系
     user = relationship("User", back_populates="ai_usage_records")
@@ -0,0 +1,71 @@
+"""
+使用统计汇总模型
+按小时和按天汇总的计算次数、AI 使用量以及表达式累计使用次数, 由 services/usage_analytics
+从新增的历史记录和 AI 使用记录增量更新; 时间分桶按 UTC
+"""
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, LargeBinary, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+
+from ..utils.database import Base
+
+
+class UsageRollup(Base):
+    """计算次数汇总 (period 为 hour 或 day, 按计算类型分行)"""
+
+    __tablename__ = "usage_rollups"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    period = Column(String(4), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    calculation_type = Column(String(20), primary_key=True)
+    calculations = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<UsageRollup(user_id={self.user_id}, {self.period} {self.bucket_start}, "
+            f"{self.calculation_type}={self.calculations})>"
+        )
+
+
+class AIUsageRollup(Base):
+    """AI 使用量汇总 (period 为 hour 或 day)"""
+
+    __tablename__ = "ai_usage_rollups"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    period = Column(String(4), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    queries = Column(BigInteger, default=0, server_default="0", nullable=False)
+    tokens = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<AIUsageRollup(user_id={self.user_id}, {self.period} {self.bucket_start}, "
+            f"queries={self.queries}, tokens={self.tokens})>"
+        )
+
+
+class ExpressionRollup(Base):
+    """
+    表达式累计使用次数 (用于常用表达式排行)
+
+    digest 为表达式 SHA-256 的前 16 字节; 按 (user_id, uses) 索引倒序读取前几名,
+    耗时与表达式数量无关。清空历史记录时删除该用户的全部行
+    """
+
+    __tablename__ = "expression_rollups"
+    __table_args__ = (Index("idx_expression_rollups_user_uses", "user_id", "uses"),)
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    digest = Column(LargeBinary(16), primary_key=True)
+    expression = Column(Text, nullable=False)
+    uses = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    def __repr__(self):
+        return f"<ExpressionRollup(user_id={self.user_id}, uses={self.uses})>"
@@ -2,7 +2,7 @@
 用户模型
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import BigInteger, Column, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -23,6 +23,14 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_premium = Column(Boolean, default=False, nullable=False)
+    # 历史记录变更序号 (每次新增或删除历史记录时递增, 用于增量同步)
+    history_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
+    # 清空水位: 变更序号不大于 history_cleared_seq 的历史记录、以及 history_cleared_at
+    # 之前创建的归档段已被逻辑删除 (读取时隐藏), 由后台清理任务分批物理删除
+    history_cleared_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
+    history_cleared_at = Column(DateTime, nullable=True)
+    # AI 使用记录序号 (每次新增 AI 使用记录时递增, 用于增量汇总)
+    ai_usage_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
 
     # 关系
     history_records = relationship("History", back_populates="user", cascade="all, delete-orphan")
@@ -30,3 +38,32 @@ class User(Base):
 
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
+
+
+class UserStats(Base):
+    """
+    用户统计汇总 (物化计数)
+
+    与历史记录和 AI 使用记录的插入/删除在同一事务中增量更新,
+    统计接口直接按主键读取; 由对账任务修正可能的偏差
+    """
+
+    __tablename__ = "user_stats"
+
+    user_id = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    history_count = Column(BigInteger, default=0, server_default="0", nullable=False)
+    # 已归档到冷数据段的历史记录数 (不计入 history_count)
+    archived_count = Column(BigInteger, default=0, server_default="0", nullable=False)
+    ai_queries = Column(BigInteger, default=0, server_default="0", nullable=False)
+    ai_tokens = Column(BigInteger, default=0, server_default="0", nullable=False)
+    last_activity_at = Column(DateTime, nullable=True)
+    reconciled_at = Column(DateTime, nullable=True)
+    # 使用统计的汇总水位: 已汇总到的历史记录变更序号和 AI 使用记录序号
+    rollup_history_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
+    rollup_ai_usage_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
+    rolled_up_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UserStats(user_id={self.user_id}, history={self.history_count}, tokens={self.ai_tokens})>"
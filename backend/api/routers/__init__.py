@@ -1,9 +1,60 @@
 """
 API 路由模块
 """
+from fastapi import APIRouter
+
+from ..utils.database import DB_ASYNC
 from .auth import router as auth_router
 from .calculate import router as calculate_router
+from .calculus import router as calculus_router
+from .convert import router as convert_router
+from .prepared import router as prepared_router
 from .history import router as history_router
 from .ai import router as ai_router
 
-__all__ = ["auth_router", "calculate_router", "history_router", "ai_router"]
+
+def use_async_routes(router: APIRouter, async_router: APIRouter) -> None:
+    """
+    用异步路由替换路径和方法相同的同步路由
+
+    保持原来的路由顺序 (避免 /history/{history_id} 之类的路径参数抢先匹配) 和接口文档
+
+    Args:
+        router: 同步路由
+        async_router: 异步路由
+
+    Raises:
+        RuntimeError: 异步路由在同步路由中没有对应的路由
+    """
+    replacements = {
+        (route.path, frozenset(route.methods)): route for route in async_router.routes
+    }
+    for index, route in enumerate(router.routes):
+        replacement = replacements.pop((route.path, frozenset(route.methods)), None)
+        if replacement is not None:
+            replacement.summary, replacement.description = route.summary, route.description
+            router.routes[index] = replacement
+    if replacements:
+        raise RuntimeError(f"异步路由没有对应的同步路由: {sorted(path for path, _ in replacements)}")
+
+
+if DB_ASYNC:
+    from .auth_async import router as auth_async_router
+    from .calculate_async import router as calculate_async_router
+    from .history_async import router as history_async_router
+    from .ai_async import router as ai_async_router
+
+    use_async_routes(auth_router, auth_async_router)
+    use_async_routes(calculate_router, calculate_async_router)
+    use_async_routes(history_router, history_async_router)
+    use_async_routes(ai_router, ai_async_router)
+
+__all__ = [
+    "auth_router",
+    "calculate_router",
+    "calculus_router",
+    "convert_router",
+    "prepared_router",
+    "history_router",
+    "ai_router",
+]
@@ -0,0 +1,88 @@
+"""
+AI 计算路由 (异步数据库访问, DB_ASYNC=true 时替换 routers/ai.py 中的同名路由)
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from ..schemas.calculate import AICalculateRequest, AICalculateResponse
+from ..services.calculator import CalculatorService
+from ..services.history_async import AsyncHistoryService
+from ..utils.async_database import get_async_db
+from ..dependencies_async import get_current_user_async
+from ..models import User
+from .ai import GLMClient
+
+router = APIRouter()
+
+
+@router.post("/calculate/ai", response_model=AICalculateResponse)
+async def ai_calculate(
+    request: AICalculateRequest,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """AI 智能计算 (接口说明见 routers/ai.py)"""
+    # 检查 GLM 客户端是否可用
+    if GLMClient is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI服务暂不可用, 请联系管理员配置GLM_API_KEY",
+        )
+
+    try:
+        # 初始化 GLM 客户端
+        glm_client = GLMClient()
+
+        # 使用 AI 理解请求 (GLM 客户端是同步 HTTP 调用, 在线程池中执行)
+        expression, ai_result, tokens_used = await run_in_threadpool(
+            glm_client.calculate, request.query
+        )
+
+        # 使用计算器服务验证和计算
+        try:
+            result = await CalculatorService.evaluate_async(expression)
+        except Exception:
+            # 如果表达式无效, 使用 AI 的结果
+            try:
+                result = float(ai_result)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"AI无法理解计算请求: {request.query}",
+                )
+
+        # 保存历史记录
+        history = await AsyncHistoryService.create_history(
+            db=db,
+            user_id=current_user.id,
+            expression=expression,
+            result=str(result),
+            calculation_type="ai",
+        )
+
+        # 保存 AI 使用记录
+        await AsyncHistoryService.create_ai_usage(
+            db=db, user_id=current_user.id, query=request.query, tokens_used=tokens_used
+        )
+
+        return AICalculateResponse(
+            query=request.query,
+            understood=expression,
+            result=result,
+            calculation_id=history.id,
+            tokens_used=tokens_used,
+        )
+
+    except ValueError as e:
+        if "GLM_API_KEY" in str(e):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AI服务未配置, 请联系管理员",
+            )
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"AI计算失败: {str(e)}"
+        )
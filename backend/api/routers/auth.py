@@ -1,12 +1,13 @@
 """
 认证路由
-处理用户注册和登录
+处理用户注册、登录和账户删除
 """
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 
 from ..schemas.auth import UserCreate, UserLogin, Token, UserResponse
 from ..services.auth import AuthService
+from ..services.history_purge import HistoryPurgeService
 from ..utils.database import get_db
 from ..dependencies import get_current_user
 from ..models import User
@@ -50,3 +51,17 @@ def get_me(current_user: User = Depends(get_current_user)):
     ```
     """
     return UserResponse.from_orm(current_user)
+
+
+@router.delete("/auth/me", status_code=status.HTTP_202_ACCEPTED)
+def delete_me(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    删除当前账户
+
+    账户立即禁用 (之后的请求返回 403), 历史记录和AI使用记录由后台任务分批删除后
+    再删除用户; 管理员可通过 GET /history/jobs/{job_id} 查询进度
+
+    需要认证: 是
+    """
+    job = HistoryPurgeService.remove_account(db, current_user)
+    return {"message": "账户已禁用, 正在后台删除数据", "job_id": job.id}
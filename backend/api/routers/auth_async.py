@@ -0,0 +1,42 @@
+"""
+认证路由 (异步数据库访问, DB_ASYNC=true 时替换 routers/auth.py 中的同名路由)
+"""
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas.auth import UserCreate, UserLogin, Token, UserResponse
+from ..services.auth_async import AsyncAuthService
+from ..services.history_async import AsyncHistoryService
+from ..utils.async_database import get_async_db
+from ..dependencies_async import get_current_user_async
+from ..models import User
+
+router = APIRouter()
+
+
+@router.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """用户注册 (接口说明见 routers/auth.py)"""
+    return await AsyncAuthService.register_user(db, user_data)
+
+
+@router.post("/auth/login", response_model=Token)
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    """用户登录 (接口说明见 routers/auth.py)"""
+    return await AsyncAuthService.login_user(db, login_data)
+
+
+@router.get("/auth/me", response_model=UserResponse)
+async def get_me(current_user: User = Depends(get_current_user_async)):
+    """获取当前用户信息 (接口说明见 routers/auth.py)"""
+    return UserResponse.from_orm(current_user)
+
+
+@router.delete("/auth/me", status_code=status.HTTP_202_ACCEPTED)
+async def delete_me(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """删除当前账户 (接口说明见 routers/auth.py)"""
+    job = await AsyncHistoryService.remove_account(db, current_user)
+    return {"message": "账户已禁用, 正在后台删除数据", "job_id": job.id}
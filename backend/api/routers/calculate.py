@@ -2,18 +2,55 @@
 计算路由
 处理基础计算请求
 """
+import json
+import math
+
+from uuid import UUID
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..schemas.calculate import CalculateRequest, CalculateResponse
-from ..services.calculator import CalculatorService
+from ..schemas.calculate import (
+    CalculateRequest,
+    CalculateResponse,
+    ExactCalculateResponse,
+    MatrixCalculateResponse,
+    BatchCalculateRequest,
+    BatchCalculateItem,
+    BatchCalculateResponse,
+    SweepRequest,
+    PlotRequest,
+    PlotResponse,
+)
+from ..services.calculator import CalculatorService, np
+from ..services.exact import (
+    EXACT_STREAM_THRESHOLD,
+    digit_count,
+    exact_reference,
+    iter_digits,
+    parse_exact_reference,
+    result_digest,
+    result_type,
+)
 from ..services.history import HistoryService
+from ..services.matrix import (
+    encode_array,
+    from_binary,
+    inline_values,
+    matrix_reference,
+    to_binary,
+)
+from ..services.plot import PlotService
 from ..utils.database import get_db
-from ..dependencies import get_current_user
+from ..dependencies import get_current_user, get_admin_user
 from ..models import User
 
 router = APIRouter()
 
+# 流式返回时每个分块包含的采样点数
+SWEEP_CHUNK_POINTS = 65536
+
 
 @router.post("/calculate", response_model=CalculateResponse)
 def calculate(
@@ -41,6 +78,9 @@ def calculate(
         # 计算结果
         result = CalculatorService.evaluate(request.expression)
 
+        # 超出浮点数范围的整数需要使用精确模式 (在保存历史记录之前检查)
+        value = CalculatorService.float_result(result)
+
         # 保存历史记录
         history = HistoryService.create_history(
             db=db,
@@ -51,7 +91,7 @@ def calculate(
         )
 
         return CalculateResponse(
-            expression=request.expression, result=result, calculation_id=history.id
+            expression=request.expression, result=value, calculation_id=history.id
         )
 
     except ValueError as e:
@@ -64,17 +104,421 @@ def calculate(
         )
 
 
+@router.post("/calculate/exact", response_model=ExactCalculateResponse)
+def calculate_exact(
+    request: CalculateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    精确计算
+
+    整数结果保持任意精度, 非整数结果以高精度小数 (Decimal) 返回。
+
+    - 结果不超过 CALC_EXACT_STREAM_THRESHOLD 位时返回 JSON
+    - 超过时以 `text/plain` 分块流式返回数字, 计算记录ID、位数和摘要在响应头中
+      (`X-Calculation-Id`, `X-Result-Digits`, `X-Result-Digest`, `X-Result-Type`)
+    - 结果位数上限由 CALC_EXACT_MAX_DIGITS 配置
+    - 超过 255 个字符的结果在历史记录中只保存位数和摘要,
+      可通过 `GET /calculate/exact/{calculation_id}` 重新获取完整结果
+
+    示例:
+    - `2**1000` → 302 位整数
+    - `1/3` → `0.3333…` (50 位有效数字)
+
+    需要认证: 是
+    """
+    try:
+        result = CalculatorService.evaluate_exact(request.expression)
+    except (ValueError, ZeroDivisionError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    digits = digit_count(result)
+    digest = result_digest(result)
+    text = "".join(iter_digits(result)) if digits <= EXACT_STREAM_THRESHOLD else None
+
+    # 大结果只保存位数和摘要, 避免写入超长字符串
+    stored = text if text is not None and len(text) <= 255 else exact_reference(digits, digest)
+    history = HistoryService.create_history(
+        db=db,
+        user_id=current_user.id,
+        expression=request.expression,
+        result=stored,
+        calculation_type="exact",
+    )
+
+    if text is not None:
+        return ExactCalculateResponse(
+            expression=request.expression,
+            result=text,
+            result_type=result_type(result),
+            digits=digits,
+            digest=digest,
+            calculation_id=history.id,
+        )
+
+    return StreamingResponse(
+        iter_digits(result),
+        media_type="text/plain",
+        headers={
+            "X-Calculation-Id": str(history.id),
+            "X-Result-Digits": str(digits),
+            "X-Result-Digest": digest,
+            "X-Result-Type": result_type(result),
+        },
+    )
+
+
+@router.get("/calculate/exact/{calculation_id}")
+def get_exact_result(
+    calculation_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    获取精确计算的完整结果
+
+    根据历史记录中的表达式重新计算, 并用保存的摘要校验结果, 以 `text/plain` 分块流式返回
+
+    需要认证: 是
+    """
+    history = HistoryService.get_history(db, current_user.id, calculation_id)
+    if history is None or history.calculation_type != "exact":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="计算记录不存在")
+
+    try:
+        result = CalculatorService.evaluate_exact(history.expression)
+    except (ValueError, ZeroDivisionError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    digest = result_digest(result)
+    reference = parse_exact_reference(history.result)
+    if reference is not None and reference[1] != digest:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="重新计算的结果与记录的摘要不一致"
+        )
+
+    return StreamingResponse(
+        iter_digits(result),
+        media_type="text/plain",
+        headers={
+            "X-Calculation-Id": str(history.id),
+            "X-Result-Digits": str(digit_count(result)),
+            "X-Result-Digest": digest,
+            "X-Result-Type": result_type(result),
+        },
+    )
+
+
+@router.post("/calculate/matrix", response_model=MatrixCalculateResponse)
+def calculate_matrix(
+    request: CalculateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    矩阵计算
+
+    支持矩阵字面量、矩阵乘法 `@`、逐元素运算 (`+ - * / **` 和 sin/sqrt 等函数)
+    以及 `det`、`inv`、`solve`、`transpose`、`eig` (返回特征值)。
+
+    - 结果以紧凑编码返回: `shape` + `dtype` + `data` (行优先小端字节的 base64)
+    - 不超过 CALC_MATRIX_INLINE_ELEMENTS 个元素的实数结果同时在 `values` 中以嵌套列表返回
+    - 元素数上限由 CALC_MATRIX_MAX_ELEMENTS 配置, 维度不匹配在计算前报错
+    - 历史记录中以二进制保存完整结果, 可通过 `GET /calculate/matrix/{calculation_id}` 获取
+
+    示例:
+    - `[[1, 2], [3, 4]] @ [[5], [6]]`
+    - `solve([[3, 1], [1, 2]], [9, 8])` → `[2, 3]`
+    - `det([[1, 2], [3, 4]])`
+
+    需要认证: 是
+    """
+    try:
+        result = CalculatorService.evaluate_matrix(request.expression)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except (ValueError, ZeroDivisionError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    values = inline_values(result)
+
+    # 完整结果以二进制保存, result 字段只保存小结果的文本或形状引用
+    text = json.dumps(values) if values is not None else None
+    stored = text if text is not None and len(text) <= 255 else matrix_reference(result)
+    history = HistoryService.create_history(
+        db=db,
+        user_id=current_user.id,
+        expression=request.expression,
+        result=stored,
+        calculation_type="matrix",
+        result_data=to_binary(result),
+    )
+
+    return MatrixCalculateResponse(
+        expression=request.expression,
+        values=values,
+        calculation_id=history.id,
+        **encode_array(result),
+    )
+
+
+@router.get("/calculate/matrix/{calculation_id}", response_model=MatrixCalculateResponse)
+def get_matrix_result(
+    calculation_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    获取矩阵计算的完整结果 (从历史记录中的二进制数据解码, 不重新计算)
+
+    需要认证: 是
+    """
+    history = HistoryService.get_history(db, current_user.id, calculation_id)
+    if history is None or history.calculation_type != "matrix" or history.result_data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="计算记录不存在")
+
+    result = from_binary(history.result_data)
+    return MatrixCalculateResponse(
+        expression=history.expression,
+        values=inline_values(result),
+        calculation_id=history.id,
+        **encode_array(result),
+    )
+
+
+@router.post("/calculate/batch", response_model=BatchCalculateResponse)
+def calculate_batch(
+    request: BatchCalculateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    批量计算
+
+    一次请求提交多个表达式 (最多 CALC_BATCH_MAX_SIZE 个), 只认证一次,
+    按请求顺序返回每个表达式的结果或错误信息。
+    成功的计算以一次批量插入写入历史记录。
+
+    示例:
+    - `["2 + 3", "sqrt(16)", "1 / 0"]` → `5`, `4`, `除数不能为零`
+
+    需要认证: 是
+    """
+    try:
+        outcomes = CalculatorService.evaluate_batch(request.expressions)
+
+        # 批量保存成功的计算记录
+        succeeded = [
+            (expression, result)
+            for expression, (result, error) in zip(request.expressions, outcomes)
+            if error is None
+        ]
+        history_ids = iter(
+            HistoryService.create_history_bulk(
+                db=db,
+                user_id=current_user.id,
+                records=[(expression, str(result)) for expression, result in succeeded],
+                calculation_type="basic",
+            )
+        )
+
+        items = []
+        for expression, (result, error) in zip(request.expressions, outcomes):
+            if error is None:
+                items.append(
+                    BatchCalculateItem(
+                        expression=expression, result=result, calculation_id=next(history_ids)
+                    )
+                )
+            else:
+                items.append(BatchCalculateItem(expression=expression, error=error))
+
+        return BatchCalculateResponse(
+            items=items, succeeded=len(succeeded), failed=len(items) - len(succeeded)
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"批量计算失败: {str(e)}"
+        )
+
+
+@router.post("/calculate/sweep")
+def calculate_sweep(request: SweepRequest, current_user: User = Depends(get_current_user)):
+    """
+    参数扫描 (向量化计算)
+
+    在 [start, stop] 上均匀取 count 个点 (等价于 numpy.linspace), 一次性计算表达式的值,
+    函数使用对应的 NumPy ufunc。定义域之外的点结果为 NaN (JSON 中为 null)。
+
+    返回格式:
+    - `json`: JSON 数组, 例如 `[0.0, 0.84, ...]`
+    - `binary`: 连续的小端 float64 字节流 (`application/octet-stream`)
+
+    示例:
+    - `sin(x)*exp(-x/10)`, start=0, stop=100, count=1000
+
+    需要认证: 是
+    """
+    try:
+        values = CalculatorService.sweep(
+            request.expression, request.variable, request.start, request.stop, request.count
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {"X-Sweep-Count": str(len(values))}
+
+    if request.format == "binary":
+        data = values.astype("<f8", copy=False)
+        return StreamingResponse(
+            _iter_binary_chunks(data),
+            media_type="application/octet-stream",
+            headers={**headers, "X-Sweep-Dtype": "float64-le"},
+        )
+
+    return StreamingResponse(
+        _iter_json_chunks(values), media_type="application/json", headers=headers
+    )
+
+
+@router.post("/calculate/plot", response_model=PlotResponse)
+def calculate_plot(request: PlotRequest, current_user: User = Depends(get_current_user)):
+    """
+    函数绘图采样
+
+    在均匀网格的基础上自适应细分: 曲率大的区域、定义域边界和跳变处加密采样,
+    再用 LTTB (Largest-Triangle-Three-Buckets) 降采样到约 `points` 个点。
+    定义域之外的区间和渐近线处返回 `y = null`, 图表应在此处断开。
+
+    结果按 (规范化表达式, 区间, 点数) 缓存。
+
+    示例:
+    - `tan(x)`, start=-5, stop=5, points=1000
+    - `sqrt(x)`, start=-2, stop=2 (x < 0 的部分为空)
+
+    需要认证: 是
+    """
+    try:
+        result = PlotService.plot(
+            request.expression, request.variable, request.start, request.stop, request.points
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return PlotResponse(expression=request.expression, **result)
+
+
+def _iter_binary_chunks(values):
+    """按分块输出 float64 字节流"""
+    for offset in range(0, len(values), SWEEP_CHUNK_POINTS):
+        yield values[offset : offset + SWEEP_CHUNK_POINTS].tobytes()
+
+
+def _iter_json_chunks(values):
+    """按分块输出 JSON 数组, 非有限值输出为 null"""
+    yield "["
+    for offset in range(0, len(values), SWEEP_CHUNK_POINTS):
+        chunk = values[offset : offset + SWEEP_CHUNK_POINTS]
+        if np.isfinite(chunk).all():
+            text = ",".join(map(repr, chunk.tolist()))
+        else:
+            text = ",".join(repr(v) if math.isfinite(v) else "null" for v in chunk.tolist())
+        yield ("," + text) if offset else text
+    yield "]"
+
+
 @router.post("/calculate/validate")
 def validate_expression(request: CalculateRequest, current_user: User = Depends(get_current_user)):
     """
     验证表达式是否有效
 
+    只做语法、白名单和计算量检查, 不执行计算
+
     返回:
     - `valid`: 是否有效
     - `message`: 错误信息 (如果无效)
+    - `cost`: 计算量估算 (如果有效)
 
     需要认证: 是
     """
     is_valid, error_message = CalculatorService.validate_expression(request.expression)
 
-    return {"valid": is_valid, "message": error_message if not is_valid else "表达式有效"}
+    if not is_valid:
+        return {"valid": False, "message": error_message}
+
+    return {
+        "valid": True,
+        "message": "表达式有效",
+        "cost": CalculatorService.analyze(request.expression),
+    }
+
+
+@router.get("/calculate/engine/stats")
+def get_engine_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取表达式引擎的编译缓存统计
+
+    返回:
+    - `size`: 当前缓存的表达式数量
+    - `capacity`: 缓存容量 (环境变量 CALC_ENGINE_CACHE_SIZE)
+    - `hits`: 命中次数
+    - `misses`: 未命中次数
+
+    需要认证: 是
+    """
+    return CalculatorService.engine_stats()
+
+
+@router.get("/calculate/executor/stats")
+def get_executor_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取计算执行器统计
+
+    返回:
+    - `executor`: inline (请求线程内计算) 或 process (进程池)
+    - `queue_depth`: 等待空闲工作进程的请求数
+    - `avg_latency_ms` / `avg_wait_ms` / `max_latency_ms`: 计算延迟和排队等待时间
+    - `timeouts` / `restarts`: 超时次数和工作进程重启次数
+    - `spawn_failures`: 替换进程启动失败次数 (失败后进程池暂时少于配置的进程数, 下次计算时重试)
+
+    需要认证: 是
+    """
+    return CalculatorService.executor_stats()
+
+
+@router.get("/calculate/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取计算结果缓存统计
+
+    返回:
+    - `backend`: 外部缓存后端 (none/memory/redis)
+    - `size` / `capacity`: 进程内缓存条目数和容量
+    - `local_hits` / `backend_hits` / `misses`: 各级命中和未命中次数
+    - `hit_rate`: 命中率
+
+    需要认证: 是
+    """
+    return CalculatorService.cache_stats()
+
+
+@router.delete("/calculate/cache")
+def clear_cache(current_user: User = Depends(get_admin_user)):
+    """
+    清空计算结果缓存和绘图缓存 (进程内和外部后端)
+
+    返回各级缓存删除的条目数: `deleted` 为计算结果 (calc:), `plot_deleted` 为绘图 (plot:)
+
+    需要认证: 是 (管理员)
+    """
+    return {
+        "message": "计算结果和绘图缓存已清空",
+        "deleted": CalculatorService.clear_cache(),
+        "plot_deleted": PlotService.clear_cache(),
+    }
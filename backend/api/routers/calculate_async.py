@@ -0,0 +1,51 @@
+"""
+计算路由 (异步数据库访问, DB_ASYNC=true 时替换 routers/calculate.py 中的同名路由)
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas.calculate import CalculateRequest, CalculateResponse
+from ..services.calculator import CalculatorService
+from ..services.history_async import AsyncHistoryService
+from ..utils.async_database import get_async_db
+from ..dependencies_async import get_current_user_async
+from ..models import User
+
+router = APIRouter()
+
+
+@router.post("/calculate", response_model=CalculateResponse)
+async def calculate(
+    request: CalculateRequest,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """基础计算 (接口说明见 routers/calculate.py)"""
+    try:
+        # 计算结果
+        result = await CalculatorService.evaluate_async(request.expression)
+
+        # 超出浮点数范围的整数需要使用精确模式 (在保存历史记录之前检查)
+        value = CalculatorService.float_result(result)
+
+        # 保存历史记录
+        history = await AsyncHistoryService.create_history(
+            db=db,
+            user_id=current_user.id,
+            expression=request.expression,
+            result=str(result),
+            calculation_type="basic",
+        )
+
+        return CalculateResponse(
+            expression=request.expression, result=value, calculation_id=history.id
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ZeroDivisionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"计算失败: {str(e)}"
+        )
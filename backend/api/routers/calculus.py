@@ -0,0 +1,117 @@
+"""
+数值微积分路由
+处理定积分、数值求导和区间求根请求
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from ..schemas.calculate import (
+    IntegrateRequest,
+    IntegrateResponse,
+    DerivativeRequest,
+    DerivativeResponse,
+    RootsRequest,
+    RootsResponse,
+)
+from ..services.calculus import CalculusService
+from ..dependencies import get_current_user
+from ..models import User
+
+router = APIRouter()
+
+
+@router.post("/calculate/integrate", response_model=IntegrateResponse)
+def integrate(request: IntegrateRequest, current_user: User = Depends(get_current_user)):
+    """
+    定积分 (自适应 Gauss-Kronrod 积分)
+
+    每轮对所有未收敛的子区间一次性向量化求值, 误差超出容差的子区间二分后继续。
+    积分限必须是有限值; 被积函数在区间内出现无定义的点 (例如 1/x 在 0 附近) 时返回错误。
+
+    示例:
+    - `exp(-x**2)`, lower=-5, upper=5
+    - `sin(x)`, lower=0, upper=pi 的数值
+
+    需要认证: 是
+    """
+    try:
+        result = CalculusService.integrate(
+            request.expression,
+            request.variable,
+            request.lower,
+            request.upper,
+            abs_tol=request.abs_tol,
+            rel_tol=request.rel_tol,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return IntegrateResponse(expression=request.expression, **result)
+
+
+@router.post("/calculate/derivative", response_model=DerivativeResponse)
+def derivative(request: DerivativeRequest, current_user: User = Depends(get_current_user)):
+    """
+    数值求导 (五点中心差分, 一阶或二阶)
+
+    指定 `points` 在给定点求导, 或指定 `start`/`stop`/`count` 在均匀网格上求导。
+    无定义的点导数为 null。
+
+    示例:
+    - `sin(x)`, points=[0, 1.5]
+    - `x**3`, order=2, start=0, stop=2, count=5
+
+    需要认证: 是
+    """
+    grid = None
+    if request.start is not None and request.stop is not None and request.count is not None:
+        grid = (request.start, request.stop, request.count)
+
+    try:
+        points, values = CalculusService.derivative(
+            request.expression,
+            request.variable,
+            points=request.points,
+            grid=grid,
+            order=request.order,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return DerivativeResponse(
+        expression=request.expression, order=request.order, points=points, values=values
+    )
+
+
+@router.post("/calculate/roots", response_model=RootsResponse)
+def find_roots(request: RootsRequest, current_user: User = Depends(get_current_user)):
+    """
+    区间求根
+
+    先在 `samples` 个网格点上寻找变号区间, 再对所有区间同时二分到容差 `tol`。
+    间断点处的变号 (例如 tan 的极点) 会被排除; 不变号的重根 (例如 x**2) 无法找到。
+
+    示例:
+    - `cos(x) - x`, lower=-10, upper=10
+    - `x**3 - 2*x - 5`, lower=0, upper=3
+
+    需要认证: 是
+    """
+    try:
+        result = CalculusService.roots(
+            request.expression,
+            request.variable,
+            request.lower,
+            request.upper,
+            samples=request.samples,
+            tol=request.tol,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return RootsResponse(expression=request.expression, **result)
@@ -0,0 +1,144 @@
+"""
+单位换算路由
+处理带单位的表达式计算和单位换算请求
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from ..schemas.convert import (
+    ConvertRequest,
+    ConvertResponse,
+    BatchConvertRequest,
+    BatchConvertItem,
+    BatchConvertResponse,
+)
+from ..services.calculator import CalculatorService
+from ..services.history import HistoryService
+from ..services.units import UNITS_BY_DIMENSION, dimension_name, format_dimension
+from ..utils.database import get_db
+from ..dependencies import get_current_user
+from ..models import User
+
+router = APIRouter()
+
+
+def _history_expression(request: ConvertRequest) -> str:
+    """历史记录中保存的表达式 (包含目标单位)"""
+    if request.to:
+        return f"{request.expression} in {request.to}"
+    return request.expression
+
+
+@router.post("/convert", response_model=ConvertResponse)
+def convert(
+    request: ConvertRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    单位换算
+
+    表达式中的数字后可以直接跟单位 (`3 mi`, `5 m^2`, `100 km/h`), 不同单位按量纲自动换算,
+    量纲不匹配时返回错误。目标单位可以通过 `to` 指定, 或写在表达式中 (`3 mi in km`);
+    未指定时使用表达式中第一个量纲相同的单位。
+    两个摄氏/华氏温度不能相加, 相减得到温差 (`30 degC - 10 degC` → `20 degC`)。
+
+    示例:
+    - `3 miles in km` → `4.828032 km`
+    - `3 mi + 200 m` → `3.1243 mi`
+    - `20 degC to degF` → `68 degF`
+    - `60 W * 2 h`, to=`kWh` → `0.12 kWh`
+
+    需要认证: 是
+    """
+    try:
+        result = CalculatorService.convert(request.expression, request.to)
+    except (ValueError, ZeroDivisionError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    history = HistoryService.create_history(
+        db=db,
+        user_id=current_user.id,
+        expression=_history_expression(request),
+        result=str(result),
+        calculation_type="unit",
+    )
+
+    return ConvertResponse(
+        expression=request.expression, calculation_id=history.id, **result.to_dict()
+    )
+
+
+@router.post("/convert/batch", response_model=BatchConvertResponse)
+def convert_batch(
+    request: BatchConvertRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    批量单位换算
+
+    一次请求提交多个换算 (最多 CALC_BATCH_MAX_SIZE 个), 按请求顺序返回每个换算的结果或错误信息。
+    成功的换算以一次批量插入写入历史记录。
+
+    需要认证: 是
+    """
+    outcomes = []
+    for item in request.items:
+        try:
+            outcomes.append((CalculatorService.convert(item.expression, item.to), None))
+        except (ValueError, ZeroDivisionError) as e:
+            outcomes.append((None, str(e)))
+
+    try:
+        history_ids = iter(
+            HistoryService.create_history_bulk(
+                db=db,
+                user_id=current_user.id,
+                records=[
+                    (_history_expression(item), str(result))
+                    for item, (result, error) in zip(request.items, outcomes)
+                    if error is None
+                ],
+                calculation_type="unit",
+            )
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"批量换算失败: {str(e)}"
+        )
+
+    items = []
+    for item, (result, error) in zip(request.items, outcomes):
+        if error is None:
+            items.append(
+                BatchConvertItem(
+                    expression=item.expression,
+                    calculation_id=next(history_ids),
+                    **result.to_dict(),
+                )
+            )
+        else:
+            items.append(BatchConvertItem(expression=item.expression, error=error))
+
+    succeeded = sum(1 for _, error in outcomes if error is None)
+    return BatchConvertResponse(items=items, succeeded=succeeded, failed=len(items) - succeeded)
+
+
+@router.get("/convert/units")
+def list_units(current_user: User = Depends(get_current_user)):
+    """
+    获取支持的单位 (按量纲分组)
+
+    SI 单位可加词头 (T/G/M/k/h/d/c/m/u/n), 例如 km、mg、kWh
+
+    需要认证: 是
+    """
+    return [
+        {
+            "dimension": dimension_name(dimension),
+            "base_unit": format_dimension(dimension),
+            "units": units,
+        }
+        for dimension, units in UNITS_BY_DIMENSION.items()
+    ]
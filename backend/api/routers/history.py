@@ -2,14 +2,35 @@
 历史记录路由
 处理历史记录查询和管理
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
 
-from ..schemas.history import HistoryListResponse
+from ..schemas.history import (
+    HistoryListResponse,
+    HistorySearchResponse,
+    HistoryChangesResponse,
+    SyncUploadRequest,
+    SyncUploadResult,
+    SyncUploadResponse,
+    HistoryPurgeJobResponse,
+    UsageSummaryResponse,
+)
 from ..services.history import HistoryService
+from ..services.history_archive import HISTORY_ARCHIVE_AFTER_DAYS, HistoryArchiveService
+from ..services.history_export import EXPORT_FORMATS, export_history
+from ..services.history_purge import HistoryPurgeService
+from ..services.history_search import HistorySearchService
+from ..services.history_sync import SYNC_MAX_CHANGES, HistorySyncService
+from ..services.history_writer import history_writer_stats
+from ..services.usage_analytics import UsageAnalyticsService
+from ..services.user_stats import UserStatsService
 from ..utils.database import get_db
-from ..dependencies import get_current_user
+from ..dependencies import ADMIN_USERNAMES, get_current_user, get_admin_user
 from ..models import User
 
 router = APIRouter()
@@ -19,26 +40,195 @@ router = APIRouter()
 def get_history(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页大小"),
+    cursor: Optional[str] = Query(None, description="分页游标 (上一页的 next_cursor)"),
+    include_total: Optional[bool] = Query(None, description="是否统计总记录数"),
+    include_archived: bool = Query(False, description="是否包含已归档的记录"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
-    获取当前用户的计算历史记录
+    获取当前用户的计算历史记录 (按创建时间倒序)
+
+    支持两种分页方式:
+    - **页码分页**: `page` + `page_size`, 页码越大越慢
+    - **游标分页**: 把上一页返回的 `next_cursor` 作为 `cursor` 传入, 耗时与翻页深度无关,
+      且翻页期间新增的记录不会导致重复或遗漏
 
-    支持分页查询:
-    - **page**: 页码 (从1开始)
+    参数:
+    - **page**: 页码 (从1开始, 指定 cursor 时忽略)
     - **page_size**: 每页大小 (1-100)
+    - **cursor**: 分页游标
+    - **include_total**: 是否统计总记录数 (默认页码分页统计, 游标分页不统计)
+    - **include_archived**: 是否包含超过保留期被归档的记录 (按创建时间与近期记录合并,
+      较深的页建议使用游标分页)
 
     返回:
     - **items**: 历史记录列表
-    - **total**: 总记录数
-    - **page**: 当前页码
+    - **total**: 总记录数 (未统计时为空)
+    - **page**: 当前页码 (游标分页时为空)
     - **page_size**: 每页大小
-    - **total_pages**: 总页数
+    - **total_pages**: 总页数 (未统计时为空)
+    - **next_cursor**: 下一页的游标 (没有下一页时为空)
+    - **has_more**: 是否还有下一页
+
+    需要认证: 是
+    """
+    try:
+        return HistoryService.get_user_history(
+            db,
+            current_user.id,
+            page,
+            page_size,
+            cursor=cursor,
+            include_total=include_total,
+            include_archived=include_archived,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/history/search", response_model=HistorySearchResponse)
+def search_history(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索词"),
+    calculation_type: Optional[str] = Query(None, max_length=20, description="计算类型"),
+    start: Optional[datetime] = Query(None, description="起始时间 (包含)"),
+    end: Optional[datetime] = Query(None, description="结束时间 (不包含)"),
+    limit: int = Query(20, ge=1, le=100, description="最多返回的记录数"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    搜索当前用户的计算历史记录 (按创建时间倒序)
+
+    搜索词按空格和运算符拆分, 每个词按前缀匹配表达式中的函数名、数字等
+    (例如 `sqr` 匹配 `sqrt(16)`, 单个字符按完整词匹配), 多个词需同时匹配。
+    查询走全文索引 (SQLite FTS5 / PostgreSQL pg_trgm), 不扫描全部历史记录。
+
+    参数:
+    - **q**: 搜索词 (最多 8 个)
+    - **calculation_type**: 只返回该计算类型的记录
+    - **start** / **end**: 创建时间范围
+    - **limit**: 最多返回的记录数 (1-100)
+
+    需要认证: 是
+    """
+    try:
+        items, has_more = HistorySearchService.search(
+            db, current_user.id, q, calculation_type, start=start, end=end, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return HistorySearchResponse(items=items, has_more=has_more)
+
+
+@router.get("/history/export")
+def export_user_history(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导出格式"),
+    gzip: bool = Query(False, description="是否 gzip 压缩"),
+    since: Optional[str] = Query(None, description="从该游标之后继续导出"),
+    include_archived: bool = Query(False, description="是否包含已归档的记录"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    导出当前用户的全部计算历史记录 (按创建时间升序, 流式输出)
+
+    数据库结果通过服务端游标逐批读取并立即输出, 内存占用与记录数无关。
+
+    参数:
+    - **format**: `ndjson` (每行一个 JSON 对象) 或 `csv` (首行为表头)
+    - **gzip**: 为 true 时输出 gzip 压缩文件
+    - **since**: 导出中断后, 把已收到的最后一行的 `cursor` 字段传入即可从下一行继续
+    - **include_archived**: 为 true 时同时导出超过保留期被归档的记录
+
+    每行包含 id、expression、result、calculation_type、created_at 和 cursor
+
+    需要认证: 是
+    """
+    try:
+        chunks = export_history(
+            current_user.id, format, since=since, compress=gzip, include_archived=include_archived
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"history.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", f"{filename}.gz"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/history/changes", response_model=HistoryChangesResponse)
+def get_history_changes(
+    response: Response,
+    since: int = Query(0, ge=0, description="已同步到的变更序号 (首次同步为 0)"),
+    limit: int = Query(SYNC_MAX_CHANGES, ge=1, le=SYNC_MAX_CHANGES, description="最多返回的变更数"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    增量同步: 获取变更序号大于 since 的历史记录变更
+
+    每个用户的新增和删除都分配单调递增的变更序号, 客户端保存响应中的 `since`,
+    下次只拉取之后的变更; `has_more` 为 true 时立即用新的 since 继续拉取。
+
+    变更类型:
+    - `upsert`: 新增记录 (包含完整字段)
+    - `delete`: 删除单条记录
+    - `clear`: 清空了该序号之前的全部记录
+
+    超过保留期被归档的记录保留原来的序号, 同样会返回 (首次同步 since=0 时包含全部记录)。
+
+    响应带有 `ETag` (当前变更序号); 请求带 `If-None-Match` 且没有新变更时返回 304,
+    判断只读取用户行, 不扫描历史记录。
 
     需要认证: 是
     """
-    return HistoryService.get_user_history(db, current_user.id, page, page_size)
+    current = HistorySyncService.current_seq(db, current_user.id)
+    etag = f'"{current}"'
+    if if_none_match == etag and since >= current:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    changes, next_since, has_more = HistorySyncService.get_changes(
+        db, current_user.id, since, limit
+    )
+    response.headers["ETag"] = etag
+    return HistoryChangesResponse(changes=changes, since=next_since, has_more=has_more)
+
+
+@router.post("/history/sync/upload", response_model=SyncUploadResponse)
+def upload_history(
+    request: SyncUploadRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    上传离线创建的历史记录
+
+    每条记录带客户端生成的 `client_id`, 重复上传 (例如网络重试) 不会产生重复记录,
+    返回已有记录的服务端ID。新记录以一次批量插入写入, 并出现在后续的增量同步中。
+
+    需要认证: 是
+    """
+    results = HistorySyncService.upload(
+        db, current_user.id, [item.model_dump() for item in request.items]
+    )
+    return SyncUploadResponse(
+        items=[
+            SyncUploadResult(client_id=item.client_id, id=history_id, created=created)
+            for item, (history_id, created) in zip(request.items, results)
+        ],
+        created=sum(1 for _, created in results if created),
+        since=HistorySyncService.current_seq(db, current_user.id),
+    )
 
 
 @router.delete("/history/{history_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -63,17 +253,48 @@ def delete_history(
 
 
 @router.delete("/history", status_code=status.HTTP_200_OK)
-def clear_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def clear_history(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     """
     清空当前用户的所有历史记录
 
+    记录立即从查询结果中消失; 记录较多时由后台任务分批删除,
+    返回 202 和 job_id, 可通过 GET /history/jobs/{job_id} 查询进度
+
     返回删除的记录数
 
     需要认证: 是
     """
-    count = HistoryService.clear_user_history(db, current_user.id)
+    count, job = HistoryService.clear_user_history(db, current_user.id)
 
-    return {"message": "历史记录已清空", "deleted_count": count}
+    if job is None:
+        return {"message": "历史记录已清空", "deleted_count": count}
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"message": "历史记录已清空, 正在后台删除", "deleted_count": count, "job_id": job.id}
+
+
+@router.get("/history/jobs/{job_id}", response_model=HistoryPurgeJobResponse)
+def get_purge_job(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    查询后台清理任务的进度
+
+    只能查询自己的任务 (管理员可以查询全部任务)
+
+    需要认证: 是
+    """
+    job = HistoryPurgeService.get_job(db, job_id)
+    is_admin = current_user.username in ADMIN_USERNAMES
+    if job is None or (job.user_id != current_user.id and not is_admin):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    return job
 
 
 @router.get("/history/stats/ai-usage")
@@ -91,3 +312,106 @@ def get_ai_usage_stats(
     """
     stats = HistoryService.get_user_ai_usage_stats(db, current_user.id)
     return stats
+
+
+@router.get("/history/stats/summary", response_model=UsageSummaryResponse)
+def get_usage_summary(
+    days: int = Query(30, ge=1, le=366, description="统计最近的天数 (包括今天)"),
+    granularity: Literal["hour", "day"] = Query("day", description="时间线粒度"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    获取当前用户的使用统计汇总
+
+    返回最近 `days` 天 (UTC) 的计算次数、按计算类型统计、AI 查询次数和 token 数、
+    按小时或按天的时间线以及累计最常用的表达式。只读取后台任务增量维护的汇总表,
+    耗时与历史记录数量无关; 最近 USAGE_ROLLUP_INTERVAL 秒内的记录可能尚未计入 (见 `rolled_up_at`)。
+    按小时统计的范围不超过 USAGE_HOURLY_RETENTION_DAYS 天
+
+    需要认证: 是
+    """
+    try:
+        return UsageAnalyticsService.get_summary(db, current_user.id, days, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/history/writer/stats")
+def get_writer_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取历史记录写入器统计
+
+    HISTORY_WRITE_MODE=sync 时只返回 `{"mode": "sync"}`; buffered 模式返回:
+    - `queued` / `pending` / `capacity`: 队列中和尚未提交的记录数、队列容量
+    - `enqueued` / `written`: 入队和已提交的记录数
+    - `failed` / `failed_batches`: 重试后仍写入失败而被丢弃的记录数和批次数
+      (不为 0 说明有历史记录丢失, 应告警), `last_error` / `last_failure_at` 为最近一次失败
+    - `retries`: 批量写入失败后的重试次数
+    - `flushes` / `avg_batch_size`: 批量提交次数和平均批量大小
+    - `backpressure` / `sync_fallbacks`: 队列写满时等待和退回同步写入的次数
+    - `last_flush_lag_ms` / `max_flush_lag_ms`: 记录从入队到提交的延迟
+
+    需要认证: 是
+    """
+    return history_writer_stats()
+
+
+@router.post("/history/stats/reconcile")
+def reconcile_stats(
+    current_user: User = Depends(get_admin_user), db: Session = Depends(get_db)
+):
+    """
+    用户统计对账
+
+    按用户重新统计历史记录数、AI 查询次数和 token 总数, 修正物化计数的偏差
+    (也可以通过 USER_STATS_RECONCILE_INTERVAL 启用后台定期对账)
+
+    返回检查的用户数和修正的用户数
+
+    需要认证: 是 (管理员)
+    """
+    return UserStatsService.reconcile_all(db)
+
+
+@router.post("/history/stats/rollup")
+def run_usage_rollup(
+    current_user: User = Depends(get_admin_user), db: Session = Depends(get_db)
+):
+    """
+    立即汇总使用统计
+
+    把所有用户汇总水位之后的历史记录和 AI 使用记录累加到按小时/按天的汇总表
+    (后台任务每 USAGE_ROLLUP_INTERVAL 秒执行一次)
+
+    返回汇总的用户数、历史记录数和 AI 使用记录数
+
+    需要认证: 是 (管理员)
+    """
+    return UsageAnalyticsService.run_rollups(db)
+
+
+@router.post("/history/archive/run")
+def run_history_archive(
+    older_than_days: Optional[int] = Query(
+        None, ge=1, description="归档早于该天数的记录 (默认 HISTORY_ARCHIVE_AFTER_DAYS)"
+    ),
+    current_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db),
+):
+    """
+    立即执行一次历史记录归档
+
+    把创建时间早于保留期的记录按用户成批移入压缩的归档段, 每批一个短事务
+    (也可以通过 HISTORY_ARCHIVE_AFTER_DAYS 启用后台定期归档)
+
+    返回截止时间、检查的用户数、归档的记录数和新建的段数
+
+    需要认证: 是 (管理员)
+    """
+    days = older_than_days or HISTORY_ARCHIVE_AFTER_DAYS
+    if days <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="未配置归档保留期 (older_than_days)"
+        )
+    return HistoryArchiveService.archive_all(db, datetime.utcnow() - timedelta(days=days))
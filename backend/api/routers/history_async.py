@@ -0,0 +1,65 @@
+"""
+历史记录路由 (异步数据库访问, DB_ASYNC=true 时替换 routers/history.py 中的同名路由)
+"""
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas.history import HistoryListResponse
+from ..services.history_async import AsyncHistoryService
+from ..utils.async_database import get_async_db
+from ..dependencies_async import get_current_user_async
+from ..models import User
+
+router = APIRouter()
+
+
+@router.get("/history", response_model=HistoryListResponse)
+async def get_history(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页大小"),
+    cursor: Optional[str] = Query(None, description="分页游标 (上一页的 next_cursor)"),
+    include_total: Optional[bool] = Query(None, description="是否统计总记录数"),
+    include_archived: bool = Query(False, description="是否包含已归档的记录"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """获取当前用户的计算历史记录 (接口说明见 routers/history.py)"""
+    try:
+        return await AsyncHistoryService.get_user_history(
+            db,
+            current_user.id,
+            page,
+            page_size,
+            cursor=cursor,
+            include_total=include_total,
+            include_archived=include_archived,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete("/history/{history_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_history(
+    history_id: UUID,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """删除指定的历史记录 (接口说明见 routers/history.py)"""
+    success = await AsyncHistoryService.delete_history(db, current_user.id, history_id)
+
+    if not success:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="历史记录不存在")
+
+    return None
+
+
+@router.get("/history/stats/ai-usage")
+async def get_ai_usage_stats(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """获取当前用户的AI使用统计 (接口说明见 routers/history.py)"""
+    return await AsyncHistoryService.get_user_ai_usage_stats(db, current_user.id)
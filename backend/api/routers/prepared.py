@@ -0,0 +1,161 @@
+"""
+预编译表达式路由
+表达式注册一次, 之后按句柄绑定变量多次计算
+"""
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from ..schemas.prepared import (
+    PrepareRequest,
+    PreparedResponse,
+    PreparedEvaluateRequest,
+    PreparedEvaluateResponse,
+    PreparedBatchRequest,
+    PreparedBatchItem,
+    PreparedBatchResponse,
+)
+from ..services.prepared import PreparedExpression, PreparedExpressionService
+from ..dependencies import get_current_user
+from ..models import User
+
+router = APIRouter()
+
+
+def _get_prepared(current_user: User, handle: str) -> PreparedExpression:
+    """读取当前用户的预编译表达式, 不存在时返回 404"""
+    prepared = PreparedExpressionService.get(current_user.id, handle)
+    if prepared is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="预编译表达式不存在或已被淘汰"
+        )
+    return prepared
+
+
+@router.post("/prepared", response_model=PreparedResponse, status_code=status.HTTP_201_CREATED)
+def prepare_expression(request: PrepareRequest, current_user: User = Depends(get_current_user)):
+    """
+    注册预编译表达式
+
+    表达式在注册时完成解析、白名单校验和计算量分析, 返回句柄。
+    同一表达式 (规范形式相同) 和变量列表重复注册返回相同的句柄。
+
+    每个用户最多保存 CALC_PREPARED_MAX_PER_USER 个预编译表达式,
+    超出时淘汰最久未使用的; 被淘汰的句柄需要重新注册。
+
+    示例:
+    - `principal * (1 + rate) ** years`, variables=`["principal", "rate", "years"]`
+
+    需要认证: 是
+    """
+    try:
+        prepared = PreparedExpressionService.prepare(
+            current_user.id, request.expression, request.variables
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return PreparedResponse(**prepared.to_dict())
+
+
+@router.get("/prepared", response_model=List[PreparedResponse])
+def list_prepared(current_user: User = Depends(get_current_user)):
+    """
+    获取当前用户的预编译表达式 (最近使用的在前)
+
+    需要认证: 是
+    """
+    return [
+        PreparedResponse(**prepared.to_dict())
+        for prepared in PreparedExpressionService.list(current_user.id)
+    ]
+
+
+@router.get("/prepared/stats")
+def get_prepared_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取预编译表达式存储统计
+
+    返回:
+    - `users`: 保存预编译表达式的用户数
+    - `size`: 预编译表达式总数
+    - `max_users` / `max_per_user`: 容量
+    - `evictions`: 累计淘汰数量
+
+    需要认证: 是
+    """
+    return PreparedExpressionService.stats()
+
+
+@router.get("/prepared/{handle}", response_model=PreparedResponse)
+def get_prepared(handle: str, current_user: User = Depends(get_current_user)):
+    """
+    获取预编译表达式信息
+
+    需要认证: 是
+    """
+    return PreparedResponse(**_get_prepared(current_user, handle).to_dict())
+
+
+@router.delete("/prepared/{handle}")
+def delete_prepared(handle: str, current_user: User = Depends(get_current_user)):
+    """
+    删除预编译表达式
+
+    需要认证: 是
+    """
+    if not PreparedExpressionService.delete(current_user.id, handle):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="预编译表达式不存在或已被淘汰"
+        )
+    return {"message": "预编译表达式已删除"}
+
+
+@router.post("/prepared/{handle}/evaluate", response_model=PreparedEvaluateResponse)
+def evaluate_prepared(
+    handle: str,
+    request: PreparedEvaluateRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    绑定变量计算预编译表达式
+
+    必须为注册时的每个变量提供取值, 不能包含未注册的变量。
+    预编译表达式的计算不写入历史记录。
+
+    需要认证: 是
+    """
+    prepared = _get_prepared(current_user, handle)
+    try:
+        result = PreparedExpressionService.evaluate(prepared, request.bindings)
+    except (ValueError, ZeroDivisionError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return PreparedEvaluateResponse(handle=handle, result=result)
+
+
+@router.post("/prepared/{handle}/evaluate/batch", response_model=PreparedBatchResponse)
+def evaluate_prepared_batch(
+    handle: str,
+    request: PreparedBatchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    批量绑定变量计算预编译表达式
+
+    一次请求提交多组变量取值 (最多 CALC_PREPARED_BATCH_MAX_SIZE 组), 安装了 NumPy 时
+    按列一次性向量化计算, 按请求顺序返回每组的结果或错误信息。
+
+    需要认证: 是
+    """
+    prepared = _get_prepared(current_user, handle)
+    try:
+        outcomes = PreparedExpressionService.evaluate_batch(prepared, request.bindings)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    items = [PreparedBatchItem(result=result, error=error) for result, error in outcomes]
+    succeeded = sum(1 for _, error in outcomes if error is None)
+    return PreparedBatchResponse(
+        handle=handle, items=items, succeeded=succeeded, failed=len(items) - succeeded
+    )
@@ -3,8 +3,57 @@ Pydantic模式模块
 用于请求验证和响应序列化
 """
 from .auth import UserCreate, UserLogin, UserResponse, Token
-from .calculate import CalculateRequest, CalculateResponse, AICalculateRequest, AICalculateResponse
-from .history import HistoryResponse, HistoryListResponse
+from .calculate import (
+    CalculateRequest,
+    CalculateResponse,
+    ExactCalculateResponse,
+    MatrixCalculateResponse,
+    BatchCalculateRequest,
+    BatchCalculateItem,
+    BatchCalculateResponse,
+    SweepRequest,
+    PlotRequest,
+    PlotResponse,
+    IntegrateRequest,
+    IntegrateResponse,
+    DerivativeRequest,
+    DerivativeResponse,
+    RootsRequest,
+    RootsResponse,
+    AICalculateRequest,
+    AICalculateResponse,
+)
+from .convert import (
+    ConvertRequest,
+    ConvertResponse,
+    BatchConvertRequest,
+    BatchConvertItem,
+    BatchConvertResponse,
+)
+from .prepared import (
+    PrepareRequest,
+    PreparedResponse,
+    PreparedEvaluateRequest,
+    PreparedEvaluateResponse,
+    PreparedBatchRequest,
+    PreparedBatchItem,
+    PreparedBatchResponse,
+)
+from .history import (
+    HistoryResponse,
+    HistoryListResponse,
+    HistorySearchResponse,
+    HistoryChange,
+    HistoryChangesResponse,
+    SyncUploadItem,
+    SyncUploadRequest,
+    SyncUploadResult,
+    SyncUploadResponse,
+    HistoryPurgeJobResponse,
+    UsageBucket,
+    TopExpression,
+    UsageSummaryResponse,
+)
 
 __all__ = [
     "UserCreate",
@@ -13,8 +62,45 @@ __all__ = [
     "Token",
     "CalculateRequest",
     "CalculateResponse",
+    "ExactCalculateResponse",
+    "MatrixCalculateResponse",
+    "BatchCalculateRequest",
+    "BatchCalculateItem",
+    "BatchCalculateResponse",
+    "SweepRequest",
+    "PlotRequest",
+    "PlotResponse",
+    "IntegrateRequest",
+    "IntegrateResponse",
+    "DerivativeRequest",
+    "DerivativeResponse",
+    "RootsRequest",
+    "RootsResponse",
     "AICalculateRequest",
     "AICalculateResponse",
+    "ConvertRequest",
+    "ConvertResponse",
+    "BatchConvertRequest",
+    "BatchConvertItem",
+    "BatchConvertResponse",
+    "PrepareRequest",
+    "PreparedResponse",
+    "PreparedEvaluateRequest",
+    "PreparedEvaluateResponse",
+    "PreparedBatchRequest",
+    "PreparedBatchItem",
+    "PreparedBatchResponse",
     "HistoryResponse",
     "HistoryListResponse",
+    "HistorySearchResponse",
+    "HistoryChange",
+    "HistoryChangesResponse",
+    "SyncUploadItem",
+    "SyncUploadRequest",
+    "SyncUploadResult",
+    "SyncUploadResponse",
+    "HistoryPurgeJobResponse",
+    "UsageBucket",
+    "TopExpression",
+    "UsageSummaryResponse",
 ]
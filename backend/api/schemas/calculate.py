@@ -1,10 +1,14 @@
 """
 计算相关的Pydantic模式
 """
-from typing import Optional
+import os
+from typing import Any, List, Literal, Optional
 from pydantic import BaseModel, Field
 from uuid import UUID
 
+# 批量计算单次请求允许的最大表达式数量
+BATCH_MAX_SIZE = int(os.getenv("CALC_BATCH_MAX_SIZE", "10000"))
+
 
 class CalculateRequest(BaseModel):
     """基础计算请求"""
@@ -20,6 +24,156 @@ class CalculateResponse(BaseModel):
     calculation_id: UUID = Field(..., description="计算记录ID")
 
 
+class ExactCalculateResponse(BaseModel):
+    """精确计算响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    result: str = Field(..., description="完整精度的计算结果")
+    result_type: Literal["integer", "decimal"] = Field(..., description="结果类型")
+    digits: int = Field(..., description="结果的十进制位数")
+    digest: str = Field(..., description="结果十进制表示的 SHA-256 摘要")
+    calculation_id: UUID = Field(..., description="计算记录ID")
+
+
+class MatrixCalculateResponse(BaseModel):
+    """矩阵计算响应 (紧凑数组编码)"""
+
+    expression: str = Field(..., description="原始表达式")
+    shape: List[int] = Field(..., description="结果形状 (标量为空列表)", example=[2, 2])
+    dtype: Literal["float64", "complex128"] = Field(..., description="元素类型")
+    data: str = Field(..., description="按行优先排列的小端元素字节的 base64 编码")
+    values: Optional[Any] = Field(
+        None, description="小型实数结果的嵌套列表 (结果过大或为复数时为空)"
+    )
+    calculation_id: UUID = Field(..., description="计算记录ID")
+
+
+class BatchCalculateRequest(BaseModel):
+    """批量计算请求"""
+
+    expressions: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_MAX_SIZE,
+        description="数学表达式列表",
+        example=["2 + 3", "sqrt(16)"],
+    )
+
+
+class BatchCalculateItem(BaseModel):
+    """批量计算中单个表达式的结果"""
+
+    expression: str = Field(..., description="原始表达式")
+    result: Optional[float] = Field(None, description="计算结果 (失败时为空)")
+    error: Optional[str] = Field(None, description="错误信息 (成功时为空)")
+    calculation_id: Optional[UUID] = Field(None, description="计算记录ID (失败时为空)")
+
+
+class BatchCalculateResponse(BaseModel):
+    """批量计算响应"""
+
+    items: List[BatchCalculateItem] = Field(..., description="按请求顺序排列的结果")
+    succeeded: int = Field(..., description="成功数量")
+    failed: int = Field(..., description="失败数量")
+
+
+class SweepRequest(BaseModel):
+    """参数扫描请求"""
+
+    expression: str = Field(..., description="含自由变量的数学表达式", example="sin(x)*exp(-x/10)")
+    variable: str = Field("x", description="自由变量名")
+    start: float = Field(..., description="起始值", example=0)
+    stop: float = Field(..., description="结束值 (包含)", example=100)
+    count: int = Field(..., ge=1, description="采样点数", example=1000)
+    format: Literal["json", "binary"] = Field(
+        "json", description="返回格式: json (JSON数组) 或 binary (小端 float64)"
+    )
+
+
+class PlotRequest(BaseModel):
+    """绘图采样请求"""
+
+    expression: str = Field(..., description="含自由变量的数学表达式", example="tan(x)")
+    variable: str = Field("x", description="自由变量名")
+    start: float = Field(..., description="区间起点", example=-5)
+    stop: float = Field(..., description="区间终点", example=5)
+    points: int = Field(1000, ge=2, description="目标点数 (图表分辨率)")
+
+
+class PlotResponse(BaseModel):
+    """绘图采样响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    x: List[float] = Field(..., description="横坐标 (升序)")
+    y: List[Optional[float]] = Field(..., description="纵坐标 (为空表示断开, 不应连线)")
+    points: int = Field(..., description="返回的点数")
+    evaluations: int = Field(..., description="自适应采样的函数求值次数")
+    gaps: int = Field(..., description="断开处的数量 (定义域之外或渐近线)")
+    cached: bool = Field(..., description="是否命中绘图缓存")
+
+
+class IntegrateRequest(BaseModel):
+    """定积分请求"""
+
+    expression: str = Field(..., description="被积函数表达式", example="exp(-x**2)")
+    variable: str = Field("x", description="积分变量名")
+    lower: float = Field(..., description="积分下限", example=-5)
+    upper: float = Field(..., description="积分上限", example=5)
+    abs_tol: float = Field(1e-10, gt=0, description="绝对误差容差")
+    rel_tol: float = Field(1e-10, gt=0, description="相对误差容差")
+
+
+class IntegrateResponse(BaseModel):
+    """定积分响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    value: float = Field(..., description="积分值")
+    error_estimate: float = Field(..., description="误差估计")
+    evaluations: int = Field(..., description="函数求值次数")
+    intervals: int = Field(..., description="子区间数")
+    converged: bool = Field(..., description="是否在求值预算内达到容差")
+
+
+class DerivativeRequest(BaseModel):
+    """数值求导请求 (指定 points 或均匀网格 start/stop/count 之一)"""
+
+    expression: str = Field(..., description="函数表达式", example="sin(x)")
+    variable: str = Field("x", description="自变量名")
+    order: Literal[1, 2] = Field(1, description="导数阶数")
+    points: Optional[List[float]] = Field(None, description="求导点", example=[0, 1.5])
+    start: Optional[float] = Field(None, description="网格起始值")
+    stop: Optional[float] = Field(None, description="网格结束值 (包含)")
+    count: Optional[int] = Field(None, ge=1, description="网格点数")
+
+
+class DerivativeResponse(BaseModel):
+    """数值求导响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    order: int = Field(..., description="导数阶数")
+    points: List[float] = Field(..., description="求导点")
+    values: List[Optional[float]] = Field(..., description="导数值 (无定义的点为空)")
+
+
+class RootsRequest(BaseModel):
+    """区间求根请求"""
+
+    expression: str = Field(..., description="函数表达式", example="cos(x) - x")
+    variable: str = Field("x", description="自变量名")
+    lower: float = Field(..., description="搜索区间下限", example=-10)
+    upper: float = Field(..., description="搜索区间上限", example=10)
+    samples: int = Field(1000, ge=2, description="变号扫描的网格点数")
+    tol: float = Field(1e-12, gt=0, description="根的绝对容差")
+
+
+class RootsResponse(BaseModel):
+    """区间求根响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    roots: List[float] = Field(..., description="升序排列的根")
+    evaluations: int = Field(..., description="函数求值次数")
+
+
 class AICalculateRequest(BaseModel):
     """AI计算请求"""
 
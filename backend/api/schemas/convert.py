@@ -0,0 +1,56 @@
+"""
+单位换算相关的Pydantic模式
+"""
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from uuid import UUID
+
+from .calculate import BATCH_MAX_SIZE
+
+
+class ConvertRequest(BaseModel):
+    """单位换算请求"""
+
+    expression: str = Field(..., description="带单位的表达式", example="3 mi + 200 m")
+    to: Optional[str] = Field(
+        None, description="目标单位 (也可以在表达式中用 in/to 指定)", example="km"
+    )
+
+
+class ConvertResponse(BaseModel):
+    """单位换算响应"""
+
+    expression: str = Field(..., description="原始表达式")
+    value: float = Field(..., description="换算后的数值")
+    unit: str = Field(..., description="结果单位")
+    dimension: str = Field(..., description="量纲名称")
+    base_unit: str = Field(..., description="量纲的 SI 基本单位表示")
+    calculation_id: UUID = Field(..., description="计算记录ID")
+
+
+class BatchConvertRequest(BaseModel):
+    """批量单位换算请求"""
+
+    items: List[ConvertRequest] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_SIZE, description="换算请求列表"
+    )
+
+
+class BatchConvertItem(BaseModel):
+    """批量换算中单个请求的结果"""
+
+    expression: str = Field(..., description="原始表达式")
+    value: Optional[float] = Field(None, description="换算后的数值 (失败时为空)")
+    unit: Optional[str] = Field(None, description="结果单位 (失败时为空)")
+    dimension: Optional[str] = Field(None, description="量纲名称 (失败时为空)")
+    base_unit: Optional[str] = Field(None, description="量纲的 SI 基本单位表示 (失败时为空)")
+    error: Optional[str] = Field(None, description="错误信息 (成功时为空)")
+    calculation_id: Optional[UUID] = Field(None, description="计算记录ID (失败时为空)")
+
+
+class BatchConvertResponse(BaseModel):
+    """批量单位换算响应"""
+
+    items: List[BatchConvertItem] = Field(..., description="按请求顺序排列的结果")
+    succeeded: int = Field(..., description="成功数量")
+    failed: int = Field(..., description="失败数量")
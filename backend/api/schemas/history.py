@@ -2,10 +2,12 @@
 历史记录相关的Pydantic模式
 """
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from uuid import UUID
 
+from .calculate import BATCH_MAX_SIZE
+
 
 class HistoryResponse(BaseModel):
     """历史记录响应"""
@@ -24,7 +26,125 @@ class HistoryListResponse(BaseModel):
     """历史记录列表响应"""
 
     items: List[HistoryResponse]
-    total: int = Field(..., description="总记录数")
-    page: int = Field(..., description="当前页码")
+    total: Optional[int] = Field(None, description="总记录数 (未统计时为空)")
+    page: Optional[int] = Field(None, description="当前页码 (游标分页时为空)")
     page_size: int = Field(..., description="每页大小")
-    total_pages: int = Field(..., description="总页数")
+    total_pages: Optional[int] = Field(None, description="总页数 (未统计时为空)")
+    next_cursor: Optional[str] = Field(None, description="下一页的游标 (没有下一页时为空)")
+    has_more: bool = Field(False, description="是否还有下一页")
+
+
+class HistorySearchResponse(BaseModel):
+    """历史记录搜索响应"""
+
+    items: List[HistoryResponse] = Field(..., description="匹配的记录 (按创建时间倒序)")
+    has_more: bool = Field(False, description="是否还有更多匹配 (可缩小时间范围继续查询)")
+
+
+class HistoryChange(BaseModel):
+    """单条历史记录变更"""
+
+    op: Literal["upsert", "delete", "clear"] = Field(
+        ..., description="变更类型: upsert (新增) / delete (删除单条) / clear (清空此前全部)"
+    )
+    seq: int = Field(..., description="变更序号")
+    id: Optional[UUID] = Field(None, description="历史记录ID (clear 时为空)")
+    client_id: Optional[str] = Field(None, description="客户端ID")
+    expression: Optional[str] = None
+    result: Optional[str] = None
+    calculation_type: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class HistoryChangesResponse(BaseModel):
+    """增量同步响应"""
+
+    changes: List[HistoryChange] = Field(..., description="按序号升序排列的变更")
+    since: int = Field(..., description="下次请求使用的 since")
+    has_more: bool = Field(..., description="是否还有更多变更 (有则立即用 since 继续拉取)")
+
+
+class SyncUploadItem(BaseModel):
+    """离线创建的历史记录"""
+
+    client_id: str = Field(..., min_length=1, max_length=64, description="客户端生成的唯一ID")
+    expression: str = Field(..., min_length=1, description="表达式")
+    result: Optional[str] = Field(None, max_length=255, description="计算结果")
+    calculation_type: str = Field("basic", max_length=20, description="计算类型")
+    created_at: Optional[datetime] = Field(None, description="客户端创建时间 (UTC)")
+
+
+class SyncUploadRequest(BaseModel):
+    """离线记录上传请求"""
+
+    items: List[SyncUploadItem] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class SyncUploadResult(BaseModel):
+    """单条上传结果"""
+
+    client_id: str = Field(..., description="客户端ID")
+    id: UUID = Field(..., description="服务端历史记录ID")
+    created: bool = Field(..., description="是否新建 (false 表示此前已上传过)")
+
+
+class SyncUploadResponse(BaseModel):
+    """离线记录上传响应"""
+
+    items: List[SyncUploadResult] = Field(..., description="按请求顺序排列的结果")
+    created: int = Field(..., description="新建数量")
+    since: int = Field(..., description="上传后的最新变更序号")
+
+
+class HistoryPurgeJobResponse(BaseModel):
+    """后台清理任务状态"""
+
+    id: UUID
+    kind: Literal["clear", "account"] = Field(
+        ..., description="任务类型: clear (清空历史记录) / account (删除账户)"
+    )
+    status: Literal["pending", "running", "done", "failed"] = Field(..., description="任务状态")
+    total: int = Field(..., description="需要删除的记录数 (创建任务时的统计)")
+    deleted: int = Field(..., description="已删除的记录数")
+    error: Optional[str] = Field(None, description="失败原因")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class UsageBucket(BaseModel):
+    """使用统计时间线中的一个时间段"""
+
+    bucket_start: datetime = Field(..., description="时间段起始时间 (UTC)")
+    calculations: int = Field(0, description="计算次数")
+    ai_queries: int = Field(0, description="AI 查询次数")
+    ai_tokens: int = Field(0, description="AI 使用的 token 数")
+
+
+class TopExpression(BaseModel):
+    """常用表达式"""
+
+    expression: str
+    count: int = Field(..., description="使用次数")
+
+
+class UsageSummaryResponse(BaseModel):
+    """使用统计汇总响应"""
+
+    granularity: Literal["hour", "day"] = Field(..., description="时间线粒度")
+    start: datetime = Field(..., description="统计范围起始时间 (UTC, 包含)")
+    end: datetime = Field(..., description="统计范围结束时间 (UTC, 不包含)")
+    calculations: int = Field(..., description="计算次数")
+    ai_queries: int = Field(..., description="AI 查询次数")
+    ai_tokens: int = Field(..., description="AI 使用的 token 数")
+    by_type: Dict[str, int] = Field(..., description="按计算类型统计的计算次数")
+    timeline: List[UsageBucket] = Field(..., description="按时间段统计 (没有记录的时间段为 0)")
+    top_expressions: List[TopExpression] = Field(
+        ..., description="最常用的表达式 (累计次数, 不限于统计范围; 清空历史记录后重新累计)"
+    )
+    rolled_up_at: Optional[datetime] = Field(
+        None, description="最近一次汇总的时间 (之后的记录尚未计入)"
+    )
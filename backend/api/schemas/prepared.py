@@ -0,0 +1,74 @@
+"""
+预编译表达式相关的Pydantic模式
+"""
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class PrepareRequest(BaseModel):
+    """注册预编译表达式请求"""
+
+    expression: str = Field(
+        ..., description="含自由变量的数学表达式", example="principal * (1 + rate) ** years"
+    )
+    variables: List[str] = Field(
+        default_factory=list,
+        description="变量名列表",
+        example=["principal", "rate", "years"],
+    )
+
+
+class PreparedResponse(BaseModel):
+    """预编译表达式信息"""
+
+    handle: str = Field(..., description="句柄")
+    expression: str = Field(..., description="注册的表达式")
+    canonical: str = Field(..., description="规范形式")
+    variables: List[str] = Field(..., description="变量名列表")
+    evaluations: int = Field(..., description="累计计算次数")
+    created_at: float = Field(..., description="注册时间 (Unix 时间戳)")
+    last_used_at: float = Field(..., description="最近使用时间 (Unix 时间戳)")
+
+
+class PreparedEvaluateRequest(BaseModel):
+    """预编译表达式计算请求"""
+
+    bindings: Dict[str, float] = Field(
+        default_factory=dict,
+        description="变量取值",
+        example={"principal": 1000, "rate": 0.05, "years": 10},
+    )
+
+
+class PreparedEvaluateResponse(BaseModel):
+    """预编译表达式计算响应"""
+
+    handle: str = Field(..., description="句柄")
+    result: float = Field(..., description="计算结果")
+
+
+class PreparedBatchRequest(BaseModel):
+    """预编译表达式批量计算请求"""
+
+    bindings: List[Dict[str, float]] = Field(
+        ...,
+        min_length=1,
+        description="每组变量取值",
+        example=[{"principal": 1000, "rate": 0.05, "years": 10}],
+    )
+
+
+class PreparedBatchItem(BaseModel):
+    """批量计算中单组绑定的结果"""
+
+    result: Optional[float] = Field(None, description="计算结果 (失败时为空)")
+    error: Optional[str] = Field(None, description="错误信息 (成功时为空)")
+
+
+class PreparedBatchResponse(BaseModel):
+    """预编译表达式批量计算响应"""
+
+    handle: str = Field(..., description="句柄")
+    items: List[PreparedBatchItem] = Field(..., description="按请求顺序排列的结果")
+    succeeded: int = Field(..., description="成功数量")
+    failed: int = Field(..., description="失败数量")
@@ -2,9 +2,27 @@
 计算服务
 提供基础计算和科学计算功能
 """
-import re
+import ast
 import math
-from typing import Union
+import os
+from typing import Callable, List, Optional, Tuple, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from .exact import ExactExpressionEngine, ExactResult, evaluate_exact
+from .executor import get_executor, executor_stats
+from .expression import ExpressionEngine
+from .matrix import MatrixExpressionEngine, evaluate_matrix
+from .result_cache import ResultCache, create_backend
+from .units import ConversionResult, UnitExpressionEngine, convert
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 参数扫描单次请求允许的最大采样点数
+SWEEP_MAX_POINTS = int(os.getenv("CALC_SWEEP_MAX_POINTS", "1000000"))
 
 
 class CalculatorService:
@@ -30,6 +48,40 @@ class CalculatorService:
         "pow": pow,
     }
 
+    # 函数对应的 NumPy ufunc (用于向量化计算; pow 按 float64 计算, 整数参数不会按 int64 溢出)
+    NUMPY_FUNCTIONS = (
+        {
+            "sin": np.sin,
+            "cos": np.cos,
+            "tan": np.tan,
+            "sqrt": np.sqrt,
+            "log": np.log,
+            "log10": np.log10,
+            "exp": np.exp,
+            "abs": np.abs,
+            "pow": np.float_power,
+        }
+        if np is not None
+        else {}
+    )
+
+    # 表达式引擎 (白名单 AST 编译 + LRU 编译缓存)
+    engine = ExpressionEngine(CONSTANTS, FUNCTIONS)
+
+    # 精确模式表达式引擎 (整数任意精度, 小数使用 Decimal)
+    exact_engine = ExactExpressionEngine()
+
+    # 矩阵表达式引擎 (矩阵字面量、@ 运算符和线性代数函数, 需要 NumPy)
+    matrix_engine = (
+        MatrixExpressionEngine(CONSTANTS, NUMPY_FUNCTIONS) if np is not None else None
+    )
+
+    # 带单位的表达式引擎 (单位表 + 量纲检查)
+    unit_engine = UnitExpressionEngine(CONSTANTS, FUNCTIONS)
+
+    # 计算结果缓存 (calc:{expression_hash}, 进程内 LRU + 可选外部后端)
+    result_cache = ResultCache(backend=create_backend())
+
     @classmethod
     def evaluate(cls, expression: str) -> Union[float, int]:
         """
@@ -42,81 +94,339 @@ class CalculatorService:
             Union[float, int]: 计算结果
 
         Raises:
-            ValueError: 表达式无效或包含不安全的内容
+            ValueError: 表达式无效、包含不安全的内容或计算量超出预算
             ZeroDivisionError: 除零错误
         """
-        # 清理表达式
-        expression = expression.strip()
+        # 编译表达式 (白名单校验和计算量分析在编译阶段完成, 结果按规范化表达式缓存)
+        compiled = cls.engine.compile(expression)
 
-        # 安全检查 - 防止代码注入
-        if not cls._is_safe_expression(expression):
-            raise ValueError("表达式包含不安全的内容")
+        # 相同规范形式的表达式 (如 `2+3` 与 `2 + 3`) 共享结果缓存
+        hit, cached = cls.result_cache.get(compiled.canonical)
+        if hit:
+            return cached
 
-        try:
-            # 替换常量
-            for name, value in cls.CONSTANTS.items():
-                expression = re.sub(rf"\b{name}\b", str(value), expression, flags=re.IGNORECASE)
+        # 启用进程池时在工作进程中计算 (带超时), 否则在当前线程计算
+        executor = get_executor()
+        if executor is not None:
+            result = executor.evaluate(compiled.source)
+        else:
+            result = cls._run(compiled)
 
-            # 创建安全的命名空间
-            safe_dict = {
-                "__builtins__": {},
-                **cls.FUNCTIONS,
-            }
+        cls.result_cache.set(compiled.canonical, result)
+        return result
+
+    @classmethod
+    async def evaluate_async(cls, expression: str) -> Union[float, int]:
+        """
+        计算数学表达式 (异步路由使用, 结果与 evaluate 相同)
+
+        在当前线程计算时直接在事件循环中执行 (计算量受编译阶段的预算限制);
+        启用进程池或外部结果缓存时需要阻塞等待, 放到线程池中执行
+
+        Args:
+            expression: 数学表达式字符串
+
+        Returns:
+            Union[float, int]: 计算结果
+
+        Raises:
+            ValueError: 表达式无效、包含不安全的内容或计算量超出预算
+            ZeroDivisionError: 除零错误
+        """
+        if get_executor() is None and cls.result_cache.backend is None:
+            return cls.evaluate(expression)
+        return await run_in_threadpool(cls.evaluate, expression)
+
+    @classmethod
+    def evaluate_local(cls, expression: str) -> Union[float, int]:
+        """
+        在当前进程中计算数学表达式 (不经过结果缓存和进程池)
+
+        Args:
+            expression: 数学表达式字符串
+
+        Returns:
+            Union[float, int]: 计算结果
+
+        Raises:
+            ValueError: 表达式无效、包含不安全的内容或计算量超出预算
+            ZeroDivisionError: 除零错误
+        """
+        return cls._run(cls.engine.compile(expression))
+
+    @staticmethod
+    def _run(compiled, variables: Optional[dict] = None) -> Union[float, int]:
+        """
+        执行编译后的表达式并校验结果类型
 
+        Args:
+            compiled: 编译后的表达式
+            variables: 自由变量的取值
+
+        Returns:
+            Union[float, int]: 计算结果
+        """
+        try:
             # 计算结果
-            result = eval(expression, safe_dict)
+            result = compiled.evaluate(variables=variables)
 
             # 验证结果类型
-            if not isinstance(result, (int, float)):
+            if isinstance(result, bool) or not isinstance(result, (int, float)):
                 raise ValueError("表达式必须返回数值结果")
 
+            # 浮点运算溢出得到 inf (响应中会变成 null)
+            if isinstance(result, float) and not math.isfinite(result):
+                raise ValueError("结果超出浮点数范围")
+
             return result
 
         except ZeroDivisionError:
             raise ZeroDivisionError("除数不能为零")
-        except SyntaxError as e:
-            raise ValueError(f"表达式语法错误: {str(e)}")
         except Exception as e:
             raise ValueError(f"计算错误: {str(e)}")
 
     @staticmethod
-    def _is_safe_expression(expression: str) -> bool:
+    def float_result(result: Union[float, int]) -> float:
         """
-        检查表达式是否安全
+        把计算结果转换为浮点数 (响应中的 result 字段)
 
         Args:
-            expression: 表达式字符串
+            result: 计算结果
+
+        Returns:
+            float: 浮点数结果
+
+        Raises:
+            ValueError: 整数结果超出浮点数范围
+        """
+        try:
+            return float(result)
+        except (OverflowError, ValueError):
+            raise ValueError("结果超出浮点数范围, 请使用 /calculate/exact 获取精确结果")
+
+    @classmethod
+    def evaluate_exact(cls, expression: str) -> ExactResult:
+        """
+        精确计算数学表达式
+
+        整数结果保持任意精度, 非整数结果以 Decimal 返回 (精度由 CALC_EXACT_PRECISION 配置),
+        结果位数上限由 CALC_EXACT_MAX_DIGITS 配置
+
+        Args:
+            expression: 数学表达式字符串
+
+        Returns:
+            ExactResult: 整数或 Decimal 结果
+
+        Raises:
+            ValueError: 表达式无效、结果过大或计算量超出预算
+            ZeroDivisionError: 除零错误
+        """
+        return evaluate_exact(cls.exact_engine, expression)
+
+    @classmethod
+    def evaluate_matrix(cls, expression: str) -> "np.ndarray":
+        """
+        计算矩阵表达式
+
+        支持矩阵字面量 `[[1, 2], [3, 4]]`、矩阵乘法 `@`、逐元素运算和
+        det/inv/solve/transpose/eig, 维度在编译阶段校验
+
+        Args:
+            expression: 数学表达式字符串
+
+        Returns:
+            np.ndarray: float64 或 complex128 数组 (标量结果为零维数组)
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效、维度不匹配、矩阵奇异或超出大小限制
+            ZeroDivisionError: 除零错误
+        """
+        if cls.matrix_engine is None:
+            raise RuntimeError("矩阵计算需要安装 NumPy")
+        return evaluate_matrix(cls.matrix_engine, expression)
+
+    @classmethod
+    def convert(cls, expression: str, target: Optional[str] = None) -> ConversionResult:
+        """
+        计算带单位的表达式并换算单位
+
+        Args:
+            expression: 表达式, 例如 `3 mi + 200 m` 或 `3 miles in km`
+            target: 目标单位, 例如 `km` (也可以写在表达式中)
 
         Returns:
-            bool: 是否安全
+            ConversionResult: 换算后的数值、单位和量纲
+
+        Raises:
+            ValueError: 表达式无效、单位未知、量纲不匹配或结果超出浮点数范围
+            ZeroDivisionError: 除零错误
         """
-        # 禁止的关键字和字符
-        dangerous_patterns = [
-            r"__",  # 双下划线 (防止访问私有属性)
-            r"import",  # 导入语句
-            r"exec",  # 执行代码
-            r"eval",  # 嵌套eval
-            r"compile",  # 编译代码
-            r"open",  # 文件操作
-            r"input",  # 输入
-            r"__builtins__",  # 内置函数
-            r"globals",  # 全局变量
-            r"locals",  # 本地变量
-            r"vars",  # 变量
-            r"dir",  # 目录
-        ]
+        return convert(cls.unit_engine, expression, target)
 
-        for pattern in dangerous_patterns:
-            if re.search(pattern, expression, re.IGNORECASE):
-                return False
+    @classmethod
+    def evaluate_batch(
+        cls, expressions: List[str]
+    ) -> List[Tuple[Optional[Union[float, int]], Optional[str]]]:
+        """
+        批量计算数学表达式
 
-        return True
+        单个表达式失败 (包括超出浮点数范围的整数结果) 不会影响其他表达式
+
+        Args:
+            expressions: 数学表达式列表
+
+        Returns:
+            List[Tuple[Optional[Union[float, int]], Optional[str]]]: 按输入顺序排列的 (计算结果, 错误信息)
+        """
+        results = []
+        for expression in expressions:
+            try:
+                result = cls.evaluate(expression)
+                cls.float_result(result)
+                results.append((result, None))
+            except (ValueError, ZeroDivisionError) as e:
+                results.append((None, str(e)))
+        return results
+
+    @classmethod
+    def sweep(
+        cls, expression: str, variable: str, start: float, stop: float, count: int
+    ) -> "np.ndarray":
+        """
+        参数扫描: 在 [start, stop] 上均匀取 count 个点, 一次性向量化计算表达式
+
+        采样点为 numpy.linspace(start, stop, count), 定义域之外的点结果为 NaN
+
+        Args:
+            expression: 含自由变量的数学表达式, 例如 sin(x)*exp(-x/10)
+            variable: 自由变量名
+            start: 起始值
+            stop: 结束值 (包含)
+            count: 采样点数
+
+        Returns:
+            np.ndarray: float64 结果数组, 长度为 count
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效或采样点数超出限制
+        """
+        if count < 1 or count > SWEEP_MAX_POINTS:
+            raise ValueError(f"采样点数必须在 1 到 {SWEEP_MAX_POINTS} 之间")
+
+        function = cls.vectorize(expression, variable)
+        return function(np.linspace(start, stop, count, dtype=np.float64))
+
+    @classmethod
+    def vectorize(cls, expression: str, variable: str) -> Callable[["np.ndarray"], "np.ndarray"]:
+        """
+        将含一个自由变量的表达式编译为向量化函数
+
+        函数使用对应的 NumPy ufunc, 输入 float64 数组, 返回同形状的 float64 数组,
+        定义域之外的点结果为 NaN
+
+        Args:
+            expression: 含自由变量的数学表达式
+            variable: 自由变量名
+
+        Returns:
+            Callable[[np.ndarray], np.ndarray]: 向量化函数
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效或计算量超出预算
+        """
+        if np is None:
+            raise RuntimeError("向量化计算需要安装 NumPy")
+
+        compiled = cls.engine.compile(expression, variables=(variable,))
+        functions = cls.NUMPY_FUNCTIONS
+
+        # NumPy 的幂函数没有模幂参数 (第三个位置参数是输出数组)
+        for node in ast.walk(ast.parse(compiled.canonical, mode="eval")):
+            if isinstance(node, ast.Call) and node.func.id == "pow" and len(node.args) != 2:
+                raise ValueError("参数扫描中 pow() 只支持两个参数 (不支持模幂)")
+
+        def function(points: "np.ndarray") -> "np.ndarray":
+            try:
+                with np.errstate(all="ignore"):
+                    values = compiled.evaluate(variables={variable: points}, functions=functions)
+                    values = np.asarray(values, dtype=np.float64)
+            except Exception as e:
+                raise ValueError(f"计算错误: {str(e)}")
+
+            # 与自由变量无关的表达式返回标量, 扩展为完整数组
+            if values.shape != points.shape:
+                values = np.broadcast_to(values, points.shape).copy()
+            return values
+
+        return function
+
+    @classmethod
+    def engine_stats(cls) -> dict:
+        """
+        获取表达式引擎的编译缓存统计
+
+        Returns:
+            dict: 缓存大小、容量和命中/未命中次数
+        """
+        return cls.engine.stats()
+
+    @staticmethod
+    def executor_stats() -> dict:
+        """
+        获取计算执行器统计
+
+        Returns:
+            dict: 执行器类型, 进程池启用时包括排队深度、延迟、超时和重启次数
+        """
+        return executor_stats()
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """
+        获取计算结果缓存统计
+
+        Returns:
+            dict: 命中/未命中次数、大小和后端信息
+        """
+        return cls.result_cache.stats()
+
+    @classmethod
+    def clear_cache(cls) -> dict:
+        """
+        清空计算结果缓存
+
+        Returns:
+            dict: 各级缓存删除的条目数
+        """
+        return cls.result_cache.clear()
+
+    @classmethod
+    def analyze(cls, expression: str) -> dict:
+        """
+        静态分析表达式的计算量 (不执行计算)
+
+        Args:
+            expression: 表达式字符串
+
+        Returns:
+            dict: 节点数、最大指数位数、整数结果位数和运算量估算
+
+        Raises:
+            ValueError: 表达式无效或计算量超出预算
+        """
+        return cls.engine.compile(expression).cost.to_dict()
 
     @classmethod
     def validate_expression(cls, expression: str) -> tuple[bool, str]:
         """
         验证表达式是否有效
 
+        只做语法、白名单和计算量检查, 不执行计算 (因此不会发现除零等运行时错误)
+
         Args:
             expression: 表达式字符串
 
@@ -129,11 +439,8 @@ class CalculatorService:
         if len(expression) > 1000:
             return False, "表达式过长 (最多1000字符)"
 
-        if not cls._is_safe_expression(expression):
-            return False, "表达式包含不安全的内容"
-
         try:
-            cls.evaluate(expression)
+            cls.engine.compile(expression)
             return True, ""
-        except Exception as e:
+        except ValueError as e:
             return False, str(e)
@@ -0,0 +1,289 @@
+"""
+数值微积分服务
+基于表达式引擎的向量化函数: 自适应积分、有限差分求导和区间求根
+"""
+import os
+from typing import List, Optional, Tuple
+
+from .calculator import CalculatorService, np
+
+# 单次积分/求根允许的最大函数求值次数
+CALCULUS_MAX_EVALUATIONS = int(os.getenv("CALC_CALCULUS_MAX_EVALUATIONS", "1000000"))
+
+# 求导/求根允许的最大点数
+CALCULUS_MAX_POINTS = int(os.getenv("CALC_CALCULUS_MAX_POINTS", "100000"))
+
+# Gauss-Kronrod 15 点节点 (正半轴, 最后一个为中点) 及权重
+_GK15_NODES = [
+    0.991455371120812639206854697526329,
+    0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926,
+    0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013,
+    0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+    0.000000000000000000000000000000000,
+]
+_GK15_WEIGHTS = [
+    0.022935322010529224963732008058970,
+    0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518,
+    0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550,
+    0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+    0.209482141084727828012999174891714,
+]
+# 嵌入的 Gauss 7 点权重 (对应 Kronrod 节点 1, 3, 5, 7)
+_G7_WEIGHTS = [
+    0.129484966168869693270611432679082,
+    0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975,
+    0.417959183673469387755102040816327,
+]
+
+
+def _gauss_kronrod_rule():
+    """构造完整的 15 点节点、Kronrod 权重和 Gauss 权重数组"""
+    half = np.array(_GK15_NODES[:7])
+    nodes = np.concatenate([-half, [0.0], half[::-1]])
+    kronrod = np.concatenate([_GK15_WEIGHTS[:7], [_GK15_WEIGHTS[7]], _GK15_WEIGHTS[6::-1]])
+    gauss = np.zeros(15)
+    for index, weight in zip([1, 3, 5], _G7_WEIGHTS[:3]):
+        gauss[index] = weight
+        gauss[14 - index] = weight
+    gauss[7] = _G7_WEIGHTS[3]
+    return nodes, kronrod, gauss
+
+
+class CalculusService:
+    """数值微积分服务类"""
+
+    @staticmethod
+    def integrate(
+        expression: str,
+        variable: str,
+        lower: float,
+        upper: float,
+        abs_tol: float = 1e-10,
+        rel_tol: float = 1e-10,
+    ) -> dict:
+        """
+        自适应 Gauss-Kronrod (G7/K15) 定积分
+
+        每轮把所有未收敛子区间的积分节点合并为一个数组, 一次向量化求值;
+        误差超出容差的子区间二分后进入下一轮
+
+        Args:
+            expression: 被积函数表达式
+            variable: 积分变量名
+            lower: 积分下限
+            upper: 积分上限
+            abs_tol: 绝对误差容差
+            rel_tol: 相对误差容差
+
+        Returns:
+            dict: 积分值、误差估计、函数求值次数、子区间数和是否收敛
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效、积分限非有限值或被积函数在区间内无定义
+        """
+        function = CalculatorService.vectorize(expression, variable)
+
+        if not (np.isfinite(lower) and np.isfinite(upper)):
+            raise ValueError("积分上下限必须是有限数值")
+        if lower == upper:
+            return {
+                "value": 0.0,
+                "error_estimate": 0.0,
+                "evaluations": 0,
+                "intervals": 0,
+                "converged": True,
+            }
+
+        nodes, kronrod, gauss = _gauss_kronrod_rule()
+        length = abs(upper - lower)
+
+        left = np.array([min(lower, upper)])
+        right = np.array([max(lower, upper)])
+        accepted_value = 0.0
+        accepted_error = 0.0
+        evaluations = 0
+        intervals = 0
+        converged = True
+
+        while left.size:
+            center = (left + right) / 2
+            half = (right - left) / 2
+            points = center[:, None] + half[:, None] * nodes[None, :]
+
+            values = function(points.ravel()).reshape(points.shape)
+            evaluations += points.size
+            if not np.all(np.isfinite(values)):
+                raise ValueError("被积函数在积分区间内无定义或不是有限值")
+
+            k15 = (values @ kronrod) * half
+            g7 = (values @ gauss) * half
+            error = np.abs(k15 - g7)
+
+            total = accepted_value + k15.sum()
+            tolerance = max(abs_tol, rel_tol * abs(total))
+            # 容差按子区间长度分配
+            done = error <= tolerance * (2 * half / length)
+
+            # 子区间已无法再细分时也视为完成
+            done |= center + half == center
+
+            out_of_budget = evaluations + 2 * (~done).sum() * nodes.size > CALCULUS_MAX_EVALUATIONS
+            if out_of_budget:
+                converged = False
+                done[:] = True
+
+            accepted_value += k15[done].sum()
+            accepted_error += error[done].sum()
+            intervals += int(done.sum())
+
+            left, right, center = left[~done], right[~done], center[~done]
+            left, right = np.concatenate([left, center]), np.concatenate([center, right])
+
+        sign = 1.0 if upper > lower else -1.0
+        return {
+            "value": sign * float(accepted_value),
+            "error_estimate": float(accepted_error),
+            "evaluations": evaluations,
+            "intervals": intervals,
+            "converged": converged,
+        }
+
+    @staticmethod
+    def derivative(
+        expression: str,
+        variable: str,
+        points: Optional[List[float]] = None,
+        grid: Optional[Tuple[float, float, int]] = None,
+        order: int = 1,
+    ) -> Tuple[List[float], List[Optional[float]]]:
+        """
+        五点中心差分求导 (一阶或二阶), 所有点的差分节点一次向量化求值
+
+        Args:
+            expression: 函数表达式
+            variable: 自变量名
+            points: 求导点 (与 grid 二选一)
+            grid: 均匀网格 (start, stop, count), 等价于 numpy.linspace
+            order: 导数阶数 (1 或 2)
+
+        Returns:
+            Tuple[List[float], List[Optional[float]]]: (求导点, 导数值), 无定义的点导数为None
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效、阶数不支持或点数超出限制
+        """
+        if order not in (1, 2):
+            raise ValueError("只支持一阶和二阶导数")
+        if (points is None) == (grid is None):
+            raise ValueError("必须且只能指定求导点 points 或网格 start/stop/count 之一")
+
+        count = len(points) if points is not None else grid[2]
+        if not 1 <= count <= CALCULUS_MAX_POINTS:
+            raise ValueError(f"求导点数必须在 1 到 {CALCULUS_MAX_POINTS} 之间")
+
+        function = CalculatorService.vectorize(expression, variable)
+        if points is not None:
+            x = np.asarray(points, dtype=np.float64)
+        else:
+            x = np.linspace(grid[0], grid[1], count, dtype=np.float64)
+
+        # 步长按机器精度和点的量级选取
+        epsilon = np.finfo(np.float64).eps
+        scale = np.maximum(np.abs(x), 1.0)
+        h = (epsilon ** (1 / 5) if order == 1 else epsilon ** (1 / 6)) * scale
+        # 保证 x ± h 可以精确表示
+        h = (x + h) - x
+
+        offsets = np.array([-2.0, -1.0, 0.0, 1.0, 2.0])
+        stencil = x[:, None] + h[:, None] * offsets[None, :]
+        values = function(stencil.ravel()).reshape(stencil.shape)
+
+        if order == 1:
+            weights = np.array([1.0, -8.0, 0.0, 8.0, -1.0]) / 12.0
+            result = (values @ weights) / h
+        else:
+            weights = np.array([-1.0, 16.0, -30.0, 16.0, -1.0]) / 12.0
+            result = (values @ weights) / (h * h)
+
+        derivatives = [float(value) if np.isfinite(value) else None for value in result]
+        return x.tolist(), derivatives
+
+    @staticmethod
+    def roots(
+        expression: str,
+        variable: str,
+        lower: float,
+        upper: float,
+        samples: int = 1000,
+        tol: float = 1e-12,
+    ) -> dict:
+        """
+        区间求根: 先在网格上寻找变号区间, 再对所有区间同时做向量化二分
+
+        收敛后函数值明显大于区间端点函数值的点视为间断点 (如 tan 的极点) 并被排除
+
+        Args:
+            expression: 函数表达式
+            variable: 自变量名
+            lower: 搜索区间下限
+            upper: 搜索区间上限
+            samples: 网格采样点数
+            tol: 根的绝对容差
+
+        Returns:
+            dict: 升序排列的根和函数求值次数
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效或采样点数超出限制
+        """
+        if not 2 <= samples <= CALCULUS_MAX_POINTS:
+            raise ValueError(f"采样点数必须在 2 到 {CALCULUS_MAX_POINTS} 之间")
+        if not (np.isfinite(lower) and np.isfinite(upper)) or lower >= upper:
+            raise ValueError("搜索区间必须是有限的且下限小于上限")
+
+        function = CalculatorService.vectorize(expression, variable)
+
+        grid = np.linspace(lower, upper, samples)
+        values = function(grid)
+        evaluations = samples
+
+        # 网格点恰好为零
+        exact = grid[values == 0]
+
+        finite = np.isfinite(values[:-1]) & np.isfinite(values[1:])
+        brackets = finite & (np.sign(values[:-1]) * np.sign(values[1:]) < 0)
+        a, b = grid[:-1][brackets], grid[1:][brackets]
+        fa, fb = values[:-1][brackets], values[1:][brackets]
+        endpoint_magnitude = np.minimum(np.abs(fa), np.abs(fb))
+
+        while a.size and np.max(b - a) > tol and evaluations < CALCULUS_MAX_EVALUATIONS:
+            middle = (a + b) / 2
+            # 区间已无法再二分
+            if np.all((middle == a) | (middle == b)):
+                break
+            fm = function(middle)
+            evaluations += middle.size
+            left_half = np.sign(fa) * np.sign(fm) <= 0
+            b = np.where(left_half, middle, b)
+            fb = np.where(left_half, fm, fb)
+            a = np.where(left_half, a, middle)
+            fa = np.where(left_half, fa, fm)
+
+        found = (a + b) / 2
+        if found.size:
+            residual = np.abs(function(found))
+            evaluations += found.size
+            found = found[np.isfinite(residual) & (residual <= endpoint_magnitude)]
+
+        roots = np.unique(np.concatenate([exact, found]))
+        return {"roots": [float(root) for root in roots], "evaluations": int(evaluations)}
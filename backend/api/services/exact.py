@@ -0,0 +1,320 @@
+"""
+精确计算
+整数保持任意精度, 小数使用 Decimal, 大结果按块输出十进制数字
+"""
+import ast
+import decimal
+import hashlib
+import math
+import os
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, Union
+
+from .expression import CostAnalyzer, ExpressionEngine, MAX_NODES
+
+# 精确模式下 Decimal 的有效数字位数
+EXACT_PRECISION = int(os.getenv("CALC_EXACT_PRECISION", "50"))
+
+# 精确模式下结果允许的最大十进制位数
+EXACT_MAX_DIGITS = int(os.getenv("CALC_EXACT_MAX_DIGITS", "100000"))
+
+# 精确模式的运算预算 (按 64 位机器字操作估算)
+EXACT_MAX_OPERATIONS = int(os.getenv("CALC_EXACT_MAX_OPERATIONS", "100000000"))
+
+# 超过该位数的结果以分块数字流返回
+EXACT_STREAM_THRESHOLD = int(os.getenv("CALC_EXACT_STREAM_THRESHOLD", "10000"))
+
+# 分块输出时每块的十进制位数 (需小于 sys.get_int_max_str_digits())
+DIGIT_CHUNK_SIZE = 4000
+
+ExactResult = Union[int, Decimal]
+
+
+def _context() -> decimal.Context:
+    """精确模式使用的 Decimal 上下文"""
+    return decimal.Context(prec=EXACT_PRECISION)
+
+
+def _compute_pi() -> Decimal:
+    """按当前精度计算圆周率 (decimal 文档中的级数算法)"""
+    with decimal.localcontext(_context()) as ctx:
+        ctx.prec += 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+        ctx.prec -= 2
+        return +s
+
+
+def _exact_div(a: ExactResult, b: ExactResult) -> ExactResult:
+    """除法: 整数能整除时保持整数, 否则返回 Decimal"""
+    if isinstance(a, int) and isinstance(b, int) and b and a % b == 0:
+        return a // b
+    return Decimal(a) / Decimal(b)
+
+
+def _exact_pow(a: ExactResult, b: ExactResult) -> ExactResult:
+    """幂运算: 整数的非负整数次幂保持整数, 否则返回 Decimal"""
+    if isinstance(a, int) and isinstance(b, int) and b >= 0:
+        return a**b
+    return Decimal(a) ** Decimal(b)
+
+
+def _exact_sqrt(x: ExactResult) -> ExactResult:
+    """平方根: 完全平方数返回整数"""
+    if isinstance(x, int) and x >= 0:
+        root = math.isqrt(x)
+        if root * root == x:
+            return root
+    return Decimal(x).sqrt()
+
+
+def _exact_log(x: ExactResult, base: ExactResult = None) -> Decimal:
+    """自然对数或指定底数的对数"""
+    if base is None:
+        return Decimal(x).ln()
+    return Decimal(x).ln() / Decimal(base).ln()
+
+
+def _exact_power_function(a: ExactResult, b: ExactResult, modulus: int = None) -> ExactResult:
+    """pow(a, b) 或整数模幂 pow(a, b, m)"""
+    if modulus is None:
+        return _exact_pow(a, b)
+    return pow(a, b, modulus)
+
+
+# 精确模式支持的函数 (三角函数没有精确实现, 不在此列)
+EXACT_FUNCTIONS = {
+    "sqrt": _exact_sqrt,
+    "log": _exact_log,
+    "log10": lambda x: Decimal(x).log10(),
+    "exp": lambda x: Decimal(x).exp(),
+    "abs": abs,
+    "pow": _exact_power_function,
+}
+
+# 精确模式的数学常量
+EXACT_CONSTANTS = {
+    "pi": _compute_pi(),
+    "e": Decimal(1).exp(_context()),
+}
+EXACT_CONSTANTS["tau"] = _context().multiply(EXACT_CONSTANTS["pi"], 2)
+
+
+class _ExactRewriter(ast.NodeTransformer):
+    """将浮点字面量、除法和幂运算改写为精确实现"""
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if isinstance(node.value, float):
+            return ast.Call(
+                func=ast.Name(id="_decimal", ctx=ast.Load()),
+                args=[ast.Constant(value=repr(node.value))],
+                keywords=[],
+            )
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        helper = {ast.Div: "_div", ast.Pow: "_pow"}.get(type(node.op))
+        if helper is None:
+            return node
+        return ast.Call(
+            func=ast.Name(id=helper, ctx=ast.Load()), args=[node.left, node.right], keywords=[]
+        )
+
+
+class ExactExpressionEngine(ExpressionEngine):
+    """
+    精确模式表达式引擎
+
+    与普通引擎共用白名单和计算量分析, 生成代码前将浮点字面量改写为 Decimal,
+    除法和幂运算改写为保持精度的实现
+    """
+
+    def __init__(self):
+        max_result_bits = int(math.ceil(EXACT_MAX_DIGITS * math.log2(10)))
+        super().__init__(
+            EXACT_CONSTANTS,
+            EXACT_FUNCTIONS,
+            analyzer=CostAnalyzer(
+                max_nodes=MAX_NODES,
+                max_result_bits=max_result_bits,
+                max_operations=EXACT_MAX_OPERATIONS,
+            ),
+        )
+
+    def _constant_node(
+        self, name: str, value: Any, used_functions: Dict[str, Callable]
+    ) -> ast.AST:
+        # Decimal 常量不能作为字面量编译, 通过命名空间引用
+        used_functions[f"_{name}"] = value
+        return ast.Name(id=f"_{name}", ctx=ast.Load())
+
+    def _finalize(self, tree: ast.Expression, used_functions: Dict[str, Callable]) -> ast.AST:
+        used_functions.update({"_decimal": Decimal, "_div": _exact_div, "_pow": _exact_pow})
+        return _ExactRewriter().visit(tree)
+
+
+def evaluate_exact(engine: ExactExpressionEngine, expression: str) -> ExactResult:
+    """
+    精确计算表达式
+
+    Args:
+        engine: 精确模式表达式引擎
+        expression: 数学表达式字符串
+
+    Returns:
+        ExactResult: 整数或 Decimal 结果
+
+    Raises:
+        ValueError: 表达式无效、结果超出位数上限或计算量超出预算
+        ZeroDivisionError: 除零错误
+    """
+    compiled = engine.compile(expression)
+
+    try:
+        with decimal.localcontext(_context()):
+            result = compiled.evaluate()
+    except ZeroDivisionError:
+        raise ZeroDivisionError("除数不能为零")
+    except decimal.Overflow:
+        raise ValueError("计算错误: 结果溢出")
+    except decimal.InvalidOperation:
+        raise ValueError("计算错误: 无效的运算 (例如负数开方或非整数的模幂)")
+    except Exception as e:
+        raise ValueError(f"计算错误: {str(e)}")
+
+    if isinstance(result, bool) or not isinstance(result, (int, Decimal)):
+        raise ValueError("计算错误: 表达式必须返回数值结果")
+
+    if isinstance(result, Decimal) and not result.is_finite():
+        raise ValueError("计算错误: 结果不是有限数值")
+
+    if digit_count(result) > EXACT_MAX_DIGITS:
+        raise ValueError(f"表达式结果过大 (最多{EXACT_MAX_DIGITS}位十进制数字)")
+
+    return result
+
+
+def digit_count(value: ExactResult) -> int:
+    """
+    结果的十进制有效位数 (不生成完整字符串)
+
+    Args:
+        value: 整数或 Decimal
+
+    Returns:
+        int: 十进制位数
+    """
+    if isinstance(value, Decimal):
+        return len(value.as_tuple().digits)
+
+    value = abs(value)
+    if value == 0:
+        return 1
+    digits = int(value.bit_length() * math.log10(2))
+    if digits <= 0 or value >= 10**digits:
+        digits += 1
+    return max(digits, 1)
+
+
+def iter_digits(value: ExactResult, chunk_size: int = DIGIT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    按块生成结果的十进制表示, 整数采用分治转换, 不构造完整字符串
+
+    Args:
+        value: 整数或 Decimal
+        chunk_size: 每块的十进制位数
+
+    Yields:
+        str: 十进制数字块
+    """
+    if isinstance(value, Decimal):
+        text = str(value)
+        for offset in range(0, len(text), chunk_size):
+            yield text[offset : offset + chunk_size]
+        return
+
+    if value < 0:
+        yield "-"
+        value = -value
+
+    # powers[i] = 10 ** (chunk_size * 2**i)
+    powers = [10**chunk_size]
+    while powers[-1] <= value:
+        powers.append(powers[-1] * powers[-1])
+
+    yield from _iter_int_digits(value, powers, len(powers) - 1, chunk_size, leading=True)
+
+
+def _iter_int_digits(
+    value: int, powers: list, level: int, chunk_size: int, leading: bool
+) -> Iterator[str]:
+    """按 10 的幂逐层拆分整数并输出数字块"""
+    if level == 0:
+        text = str(value)
+        yield text if leading else text.zfill(chunk_size)
+        return
+
+    high, low = divmod(value, powers[level - 1])
+    if leading and high == 0:
+        yield from _iter_int_digits(low, powers, level - 1, chunk_size, leading=True)
+    else:
+        yield from _iter_int_digits(high, powers, level - 1, chunk_size, leading)
+        yield from _iter_int_digits(low, powers, level - 1, chunk_size, leading=False)
+
+
+def result_digest(value: ExactResult) -> str:
+    """
+    结果十进制表示的 SHA-256 摘要 (按块计算)
+
+    Args:
+        value: 整数或 Decimal
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for chunk in iter_digits(value):
+        digest.update(chunk.encode("ascii"))
+    return digest.hexdigest()
+
+
+def result_type(value: ExactResult) -> str:
+    """结果类型: integer 或 decimal"""
+    return "integer" if isinstance(value, int) else "decimal"
+
+
+def exact_reference(digits: int, digest: str) -> str:
+    """
+    大结果在历史记录中的引用 (位数 + 摘要), 完整结果可由表达式重新计算得到
+
+    Args:
+        digits: 十进制位数
+        digest: SHA-256 摘要
+
+    Returns:
+        str: 引用字符串, 例如 exact:30103:sha256:ab12...
+    """
+    return f"exact:{digits}:sha256:{digest}"
+
+
+def parse_exact_reference(value: str):
+    """
+    解析历史记录中的大结果引用
+
+    Args:
+        value: 历史记录的 result 字段
+
+    Returns:
+        Optional[Tuple[int, str]]: (位数, 摘要), 不是引用时返回None
+    """
+    parts = (value or "").split(":")
+    if len(parts) == 4 and parts[0] == "exact" and parts[2] == "sha256" and parts[1].isdigit():
+        return int(parts[1]), parts[3]
+    return None
@@ -0,0 +1,342 @@
+"""
+计算执行器
+可选地将表达式计算发送到常驻的进程池, 每次调用有超时限制,
+超时的工作进程会被终止并替换, 避免重计算阻塞 API 进程
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Optional, Union
+
+# 执行器类型: inline (在请求线程中计算) / process (进程池)
+CALC_EXECUTOR = os.getenv("CALC_EXECUTOR", "inline")
+
+# 进程池大小
+CALC_POOL_SIZE = int(os.getenv("CALC_POOL_SIZE", str(os.cpu_count() or 2)))
+
+# 单次计算超时 (秒)
+CALC_EVAL_TIMEOUT = float(os.getenv("CALC_EVAL_TIMEOUT", "2.0"))
+
+# 工作进程启动方式 (spawn 不会继承父进程中其他线程持有的锁)
+CALC_POOL_START_METHOD = os.getenv("CALC_POOL_START_METHOD", "spawn")
+
+# 等待工作进程完成启动的最长时间 (秒)
+WORKER_STARTUP_TIMEOUT = 30.0
+
+
+class EvaluationTimeout(ValueError):
+    """计算超时或执行器繁忙"""
+
+
+def _worker_main(conn) -> None:
+    """
+    工作进程主循环
+
+    Args:
+        conn: 与主进程通信的管道
+    """
+    from .calculator import CalculatorService
+
+    # 模块导入完成后通知主进程
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            expression = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if expression is None:
+            break
+
+        try:
+            conn.send(("ok", CalculatorService.evaluate_local(expression)))
+        except ZeroDivisionError as e:
+            conn.send(("zero_division", str(e)))
+        except ValueError as e:
+            conn.send(("value", str(e)))
+        except Exception as e:
+            conn.send(("value", f"计算错误: {str(e)}"))
+
+
+class _Worker:
+    """工作进程及其通信管道"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float = WORKER_STARTUP_TIMEOUT) -> None:
+        """
+        等待工作进程完成启动
+
+        Raises:
+            OSError: 工作进程未能在超时前启动
+        """
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise OSError("计算进程启动超时")
+        self.conn.recv()
+        self.ready = True
+
+    def stop(self, kill: bool = False) -> None:
+        """停止工作进程"""
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ProcessPoolEvaluator:
+    """
+    进程池计算执行器
+
+    - 工作进程常驻 (预热), 数量有上限
+    - 每次计算有超时, 超时的进程被终止并立即替换
+    - 统计排队深度、延迟、超时和重启次数
+    """
+
+    def __init__(
+        self,
+        size: int = CALC_POOL_SIZE,
+        timeout: float = CALC_EVAL_TIMEOUT,
+        start_method: str = CALC_POOL_START_METHOD,
+    ):
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._started = False
+
+        # 统计
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.spawn_failures = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_wait = 0.0
+
+    def start(self) -> None:
+        """启动并预热全部工作进程"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            workers = [_Worker(self._context) for _ in range(self.size)]
+            for worker in workers:
+                worker.wait_ready()
+                self._workers.add(worker)
+                self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        """停止全部工作进程"""
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._started = False
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for worker in workers:
+            worker.stop()
+
+    def evaluate(self, expression: str) -> Union[float, int]:
+        """
+        在工作进程中计算表达式
+
+        Args:
+            expression: 数学表达式字符串
+
+        Returns:
+            Union[float, int]: 计算结果
+
+        Raises:
+            ValueError: 表达式无效
+            ZeroDivisionError: 除零错误
+            EvaluationTimeout: 计算超时或等待空闲进程超时
+        """
+        self.start()
+        self._refill()
+        started_at = time.perf_counter()
+
+        with self._lock:
+            self.waiting += 1
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.waiting -= 1
+                self.rejected += 1
+            raise EvaluationTimeout("计算服务繁忙, 请稍后重试")
+
+        dispatched_at = time.perf_counter()
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.total_wait += dispatched_at - started_at
+
+        try:
+            # 替换进程在首次使用前完成启动, 启动时间不计入计算超时
+            worker.wait_ready()
+            worker.conn.send(expression)
+            if not worker.conn.poll(self.timeout):
+                # 先清空 worker, 替换失败时不会在下面的异常处理中再次替换
+                failed, worker = worker, None
+                with self._lock:
+                    self.timeouts += 1
+                self._replace(failed)
+                raise EvaluationTimeout(f"计算超时 (超过{self.timeout:g}秒)")
+            status, payload = worker.conn.recv()
+        except (EOFError, BrokenPipeError, OSError):
+            if worker is not None:
+                failed, worker = worker, None
+                self._replace(failed)
+            raise ValueError("计算错误: 计算进程异常退出")
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+            latency = time.perf_counter() - started_at
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+        if status == "ok":
+            return payload
+        if status == "zero_division":
+            raise ZeroDivisionError(payload)
+        raise ValueError(payload)
+
+    def _replace(self, worker: _Worker) -> None:
+        """终止工作进程并启动替换进程 (替换进程启动完成后才加入空闲队列)"""
+        worker.stop(kill=True)
+        with self._lock:
+            self._workers.discard(worker)
+            self.restarts += 1
+        self._refill()
+
+    def _refill(self) -> None:
+        """
+        补足工作进程
+
+        启动失败 (例如文件描述符或进程数耗尽) 时不抛出异常, 只记录次数,
+        由下一次计算请求重试, 进程池在此期间以较少的进程继续服务
+        """
+        with self._refill_lock:
+            while True:
+                with self._lock:
+                    if not self._started or len(self._workers) >= self.size:
+                        return
+                try:
+                    replacement = _Worker(self._context)
+                except OSError as e:
+                    with self._lock:
+                        self.spawn_failures += 1
+                    print(f"⚠️  计算进程启动失败: {e}")
+                    return
+                with self._lock:
+                    self._workers.add(replacement)
+                threading.Thread(target=self._warm_up, args=(replacement,), daemon=True).start()
+
+    def _warm_up(self, worker: _Worker) -> None:
+        """等待替换进程启动完成后加入空闲队列"""
+        try:
+            worker.wait_ready()
+        except (EOFError, OSError):
+            pass
+        self._idle.put(worker)
+
+    def stats(self) -> dict:
+        """
+        获取执行器统计
+
+        Returns:
+            dict: 进程数、排队深度、延迟和超时统计
+        """
+        with self._lock:
+            return {
+                "executor": "process",
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "queue_depth": self.waiting,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "spawn_failures": self.spawn_failures,
+                "timeout_seconds": self.timeout,
+                "avg_latency_ms": (
+                    self.total_latency / self.completed * 1000 if self.completed else 0.0
+                ),
+                "avg_wait_ms": self.total_wait / self.completed * 1000 if self.completed else 0.0,
+                "max_latency_ms": self.max_latency * 1000,
+            }
+
+
+# 全局执行器 (CALC_EXECUTOR=process 时启用)
+_executor: Optional[ProcessPoolEvaluator] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Optional[ProcessPoolEvaluator]:
+    """
+    获取全局进程池执行器
+
+    Returns:
+        Optional[ProcessPoolEvaluator]: 未启用进程池时返回None
+    """
+    global _executor
+    if CALC_EXECUTOR != "process":
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolEvaluator()
+    return _executor
+
+
+def start_executor() -> None:
+    """启动并预热进程池 (应用启动时调用)"""
+    executor = get_executor()
+    if executor is not None:
+        executor.start()
+
+
+def shutdown_executor() -> None:
+    """停止进程池 (应用关闭时调用)"""
+    if _executor is not None:
+        _executor.shutdown()
+
+
+def executor_stats() -> dict:
+    """
+    获取执行器统计
+
+    Returns:
+        dict: 执行器统计信息
+    """
+    executor = get_executor()
+    if executor is None:
+        return {"executor": "inline"}
+    return executor.stats()
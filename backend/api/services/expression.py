@@ -0,0 +1,576 @@
+"""
+表达式引擎
+将表达式解析为白名单 AST 并编译, 编译结果缓存在有界 LRU 中
+"""
+import ast
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 编译缓存容量 (可通过环境变量配置)
+ENGINE_CACHE_SIZE = int(os.getenv("CALC_ENGINE_CACHE_SIZE", "4096"))
+
+# 表达式允许的最大 AST 节点数
+MAX_NODES = int(os.getenv("CALC_MAX_NODES", "500"))
+
+# 整数中间结果允许的最大位数 (约 4900 位十进制数字)
+MAX_RESULT_BITS = int(os.getenv("CALC_MAX_RESULT_BITS", "16384"))
+
+# 单次计算的运算预算 (按 64 位机器字操作估算)
+MAX_OPERATIONS = int(os.getenv("CALC_MAX_OPERATIONS", "10000000"))
+
+# 允许的二元运算符
+ALLOWED_BINARY_OPERATORS = (
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.Mod,
+    ast.FloorDiv,
+)
+
+# 允许的一元运算符
+ALLOWED_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+def normalize_expression(expression: str) -> str:
+    """
+    规范化表达式文本 (去除首尾空白并合并连续空白)
+
+    Args:
+        expression: 表达式字符串
+
+    Returns:
+        str: 规范化后的表达式
+    """
+    return " ".join(expression.split())
+
+
+class ExpressionCostError(ValueError):
+    """表达式计算量超出预算"""
+
+
+class CostEstimate:
+    """表达式的静态计算量估算"""
+
+    __slots__ = ("nodes", "max_exponent_bits", "result_bits", "operations")
+
+    def __init__(self):
+        self.nodes = 0
+        self.max_exponent_bits = 0
+        self.result_bits = 0
+        self.operations = 0.0
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "nodes": self.nodes,
+            "max_exponent_bits": self.max_exponent_bits,
+            "result_bits": self.result_bits,
+            "operations": int(self.operations),
+        }
+
+
+class _Bound:
+    """
+    节点取值的静态上界
+
+    - is_int: 结果是否为整数 (只有整数运算可能产生超大结果)
+    - bits: |值| 的二进制位数上界 (浮点数统一视为 1024 位)
+    - value: 取值较小时的精确值, 用于估算幂运算的指数
+    """
+
+    __slots__ = ("is_int", "bits", "value")
+
+    def __init__(self, is_int: bool, bits: float, value: Optional[int] = None):
+        self.is_int = is_int
+        self.bits = bits
+        self.value = value
+
+
+# 浮点数的位数上界
+_FLOAT = _Bound(False, 1024.0)
+
+# 精确跟踪的整数位数上限
+_EXACT_BITS = 64
+
+
+def _limbs(bits: float) -> float:
+    """位数对应的机器字数"""
+    return max(bits / 64.0, 1.0)
+
+
+def _mul_cost(bits: float) -> float:
+    """大整数乘法的代价估算 (Karatsuba, 约 n^1.585)"""
+    return _limbs(bits) ** 1.585
+
+
+class CostAnalyzer:
+    """
+    静态计算量分析
+
+    在不执行表达式的前提下估算节点数、指数大小、整数结果位数和运算量,
+    超出预算时抛出 ExpressionCostError
+    """
+
+    def __init__(
+        self,
+        max_nodes: int = MAX_NODES,
+        max_result_bits: int = MAX_RESULT_BITS,
+        max_operations: int = MAX_OPERATIONS,
+    ):
+        self.max_nodes = max_nodes
+        self.max_result_bits = max_result_bits
+        self.max_operations = max_operations
+
+    def analyze(self, tree: ast.Expression) -> CostEstimate:
+        """
+        分析已通过白名单校验的表达式
+
+        Args:
+            tree: 表达式 AST
+
+        Returns:
+            CostEstimate: 计算量估算
+
+        Raises:
+            ExpressionCostError: 超出节点数、结果位数或运算预算
+        """
+        estimate = CostEstimate()
+        estimate.nodes = sum(1 for _ in ast.walk(tree.body))
+        if estimate.nodes > self.max_nodes:
+            raise ExpressionCostError(f"表达式过于复杂 (最多{self.max_nodes}个节点)")
+
+        bound = self._visit(tree.body, estimate)
+        if bound.is_int:
+            estimate.result_bits = int(bound.bits)
+        return estimate
+
+    def _charge(self, estimate: CostEstimate, operations: float) -> None:
+        """累计运算量并检查预算"""
+        estimate.operations += operations
+        if estimate.operations > self.max_operations:
+            raise ExpressionCostError("表达式计算量超出限制")
+
+    def _integer(self, estimate: CostEstimate, bits: float, value: Optional[int] = None) -> _Bound:
+        """构造整数上界并检查结果位数"""
+        if bits > self.max_result_bits:
+            raise ExpressionCostError(
+                f"表达式结果过大 (整数结果最多{self.max_result_bits}位二进制)"
+            )
+        if value is not None and abs(value).bit_length() > _EXACT_BITS:
+            value = None
+        return _Bound(True, bits, value)
+
+    def _visit(self, node: ast.AST, estimate: CostEstimate) -> _Bound:
+        """递归估算节点取值上界"""
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, int):
+                return self._integer(estimate, node.value.bit_length(), node.value)
+            return _FLOAT
+
+        if isinstance(node, ast.Name):
+            # 自由变量按浮点数处理
+            return _FLOAT
+
+        if isinstance(node, ast.UnaryOp):
+            return self._unary(estimate, node.op, self._visit(node.operand, estimate))
+
+        if isinstance(node, ast.BinOp):
+            left = self._visit(node.left, estimate)
+            right = self._visit(node.right, estimate)
+            return self._binary(estimate, node.op, left, right)
+
+        if isinstance(node, ast.Call):
+            args = [self._visit(arg, estimate) for arg in node.args]
+            return self._call(estimate, node.func.id, args)
+
+        raise ExpressionCostError("无法估算表达式的计算量")
+
+    def _unary(self, estimate: CostEstimate, op: ast.unaryop, operand: _Bound) -> _Bound:
+        """一元运算的上界"""
+        if not operand.is_int:
+            return _FLOAT
+        value = None
+        if operand.value is not None:
+            value = -operand.value if isinstance(op, ast.USub) else operand.value
+        return _Bound(True, operand.bits, value)
+
+    def _binary(
+        self, estimate: CostEstimate, op: ast.operator, left: _Bound, right: _Bound
+    ) -> _Bound:
+        """二元运算的上界"""
+        if isinstance(op, ast.Pow):
+            return self._power(estimate, left, right)
+        if not (left.is_int and right.is_int) or isinstance(op, ast.Div):
+            self._charge(estimate, 1)
+            return _FLOAT
+        return self._arithmetic(estimate, op, left, right)
+
+    def _call(self, estimate: CostEstimate, name: str, args: List[_Bound]) -> _Bound:
+        """函数调用的上界"""
+        if name == "pow" and len(args) == 2:
+            return self._power(estimate, args[0], args[1])
+        if name == "pow" and len(args) == 3 and all(arg.is_int for arg in args):
+            # 模幂: 结果不超过模数, 代价与指数位数成正比
+            base, exponent, modulus = args
+            estimate.max_exponent_bits = max(estimate.max_exponent_bits, int(exponent.bits))
+            self._charge(estimate, exponent.bits * _mul_cost(modulus.bits))
+            return self._integer(estimate, modulus.bits)
+        if name == "abs" and len(args) == 1 and args[0].is_int:
+            value = abs(args[0].value) if args[0].value is not None else None
+            return _Bound(True, args[0].bits, value)
+        self._charge(estimate, sum(_limbs(arg.bits) for arg in args) or 1)
+        return _FLOAT
+
+    def _arithmetic(self, estimate: CostEstimate, op: ast.operator, left: _Bound, right: _Bound):
+        """整数四则运算的上界"""
+        value = None
+        known = left.value is not None and right.value is not None
+
+        if isinstance(op, (ast.Add, ast.Sub)):
+            bits = max(left.bits, right.bits) + 1
+            self._charge(estimate, _limbs(bits))
+            if known and isinstance(op, ast.Add):
+                value = left.value + right.value
+            elif known:
+                value = left.value - right.value
+        elif isinstance(op, ast.Mult):
+            bits = left.bits + right.bits
+            self._charge(estimate, _mul_cost(bits))
+            if known:
+                value = left.value * right.value
+        elif isinstance(op, ast.Mod):
+            bits = right.bits
+            self._charge(estimate, _mul_cost(left.bits))
+            if known and right.value:
+                value = left.value % right.value
+        else:
+            bits = left.bits
+            self._charge(estimate, _mul_cost(left.bits))
+            if known and right.value:
+                value = left.value // right.value
+
+        return self._integer(estimate, bits, value)
+
+    def _power(self, estimate: CostEstimate, base: _Bound, exponent: _Bound) -> _Bound:
+        """幂运算的上界"""
+        if exponent.is_int:
+            estimate.max_exponent_bits = max(estimate.max_exponent_bits, int(exponent.bits))
+
+        if not (base.is_int and exponent.is_int):
+            # 浮点幂运算溢出时立即报错, 代价为常数
+            self._charge(estimate, 1)
+            return _FLOAT
+
+        if exponent.value is not None and exponent.value < 0:
+            # 负指数得到浮点结果
+            self._charge(estimate, exponent.bits)
+            return _FLOAT
+
+        if base.value is not None and abs(base.value) <= 1:
+            # 0, 1, -1 的任意次幂
+            self._charge(estimate, exponent.bits)
+            value = base.value ** exponent.value if exponent.value is not None else None
+            return _Bound(True, 1, value)
+
+        if exponent.value is not None:
+            exponent_value = exponent.value
+        elif exponent.bits > 64:
+            raise ExpressionCostError("表达式结果过大 (指数过大)")
+        else:
+            exponent_value = 2 ** int(math.ceil(exponent.bits))
+
+        if base.value is not None:
+            bits = exponent_value * math.log2(abs(base.value)) + 1
+        else:
+            bits = exponent_value * base.bits
+
+        bound = self._integer(estimate, bits)
+        self._charge(estimate, _mul_cost(bits) * max(exponent.bits, 1))
+
+        if base.value is not None and exponent.value is not None and bits <= _EXACT_BITS:
+            bound.value = base.value ** exponent.value
+        return bound
+
+
+class CompiledExpression:
+    """编译后的表达式"""
+
+    __slots__ = ("source", "canonical", "code", "namespace", "variables", "cost")
+
+    def __init__(
+        self,
+        source: str,
+        code,
+        namespace: Dict[str, Any],
+        variables: Tuple[str, ...] = (),
+        cost: Optional[CostEstimate] = None,
+        canonical: Optional[str] = None,
+    ):
+        self.source = source
+        self.canonical = canonical or source
+        self.code = code
+        self.namespace = namespace
+        self.variables = variables
+        self.cost = cost
+
+    def evaluate(
+        self,
+        variables: Optional[Dict[str, Any]] = None,
+        functions: Optional[Dict[str, Callable]] = None,
+    ) -> Any:
+        """
+        执行编译后的表达式
+
+        Args:
+            variables: 自由变量的取值 (标量或 NumPy 数组)
+            functions: 替换函数表 (例如使用 NumPy ufunc 进行向量化计算)
+
+        Returns:
+            Any: 计算结果
+        """
+        if not variables and not functions:
+            return eval(self.code, self.namespace)
+
+        namespace = dict(self.namespace)
+        if functions:
+            for name in self.namespace:
+                if name in functions:
+                    namespace[name] = functions[name]
+        if variables:
+            namespace.update(variables)
+        return eval(self.code, namespace)
+
+
+class ExpressionEngine:
+    """
+    表达式引擎
+
+    编译时完成白名单校验, 常量替换为字面量, 函数名解析到函数表, 并做静态计算量分析,
+    之后对同一表达式的计算只需执行缓存中的代码对象
+    """
+
+    def __init__(
+        self,
+        constants: Dict[str, float],
+        functions: Dict[str, Callable],
+        cache_size: int = ENGINE_CACHE_SIZE,
+        analyzer: Optional[CostAnalyzer] = None,
+    ):
+        self.constants = {name.lower(): value for name, value in constants.items()}
+        self.functions = dict(functions)
+        self.analyzer = analyzer or CostAnalyzer()
+        self.cache_size = max(cache_size, 0)
+        self._cache: "OrderedDict[tuple, CompiledExpression]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, expression: str, variables: Tuple[str, ...] = ()) -> CompiledExpression:
+        """
+        编译表达式 (优先从缓存读取)
+
+        Args:
+            expression: 表达式字符串
+            variables: 允许出现的自由变量名
+
+        Returns:
+            CompiledExpression: 编译后的表达式
+
+        Raises:
+            ValueError: 表达式语法错误或包含不支持的内容
+            ExpressionCostError: 表达式计算量超出预算
+        """
+        variables = tuple(variables)
+        key = (normalize_expression(expression), variables)
+
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        compiled = self._compile(key[0], variables)
+
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = compiled
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return compiled
+
+    def _compile(self, expression: str, variables: Tuple[str, ...] = ()) -> CompiledExpression:
+        """
+        解析并编译表达式 (不经过缓存)
+
+        Args:
+            expression: 规范化后的表达式
+            variables: 允许出现的自由变量名
+
+        Returns:
+            CompiledExpression: 编译后的表达式
+        """
+        if not expression:
+            raise ValueError("表达式不能为空")
+
+        for name in variables:
+            self._check_variable_name(name)
+
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"表达式语法错误: {e.msg}")
+
+        used_functions: Dict[str, Callable] = {}
+        body = self._transform(tree.body, used_functions, variables)
+        tree = ast.fix_missing_locations(ast.Expression(body=body))
+        cost = self.analyzer.analyze(tree)
+
+        # 规范形式: 常量已替换, 空白和冗余括号由 ast.unparse 统一
+        canonical = ast.unparse(tree)
+        tree = ast.fix_missing_locations(self._finalize(tree, used_functions))
+
+        code = compile(tree, "<expression>", "eval")
+        namespace = {"__builtins__": {}, **used_functions}
+        return CompiledExpression(expression, code, namespace, variables, cost, canonical)
+
+    def _constant_node(
+        self, name: str, value: Any, used_functions: Dict[str, Callable]
+    ) -> ast.AST:
+        """
+        常量在编译结果中的表示 (默认替换为字面量)
+
+        Args:
+            name: 常量名 (小写)
+            value: 常量值
+            used_functions: 编译结果的命名空间
+
+        Returns:
+            ast.AST: 替换后的节点
+        """
+        return ast.Constant(value=value)
+
+    def _finalize(self, tree: ast.Expression, used_functions: Dict[str, Callable]) -> ast.AST:
+        """
+        计算量分析之后、生成代码之前的改写钩子 (默认不改写)
+
+        Args:
+            tree: 已校验的表达式 AST
+            used_functions: 编译结果的命名空间
+
+        Returns:
+            ast.AST: 改写后的 AST
+        """
+        return tree
+
+    def _check_variable_name(self, name: str) -> None:
+        """
+        校验自由变量名
+
+        Args:
+            name: 变量名
+
+        Raises:
+            ValueError: 变量名不合法或与常量/函数重名
+        """
+        if not name.isidentifier() or name.startswith("_"):
+            raise ValueError(f"变量名不合法: {name}")
+        if name.lower() in self.constants or name in self.functions:
+            raise ValueError(f"变量名与常量或函数重名: {name}")
+
+    def _transform(
+        self,
+        node: ast.AST,
+        used_functions: Dict[str, Callable],
+        variables: Tuple[str, ...] = (),
+    ) -> ast.AST:
+        """
+        校验 AST 节点并替换常量
+
+        Args:
+            node: AST 节点
+            used_functions: 收集表达式中引用的函数
+            variables: 允许出现的自由变量名
+
+        Returns:
+            ast.AST: 转换后的节点
+
+        Raises:
+            ValueError: 节点不在白名单内
+        """
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError("表达式只能包含数字")
+            return node
+
+        if isinstance(node, ast.BinOp):
+            if not isinstance(node.op, ALLOWED_BINARY_OPERATORS):
+                raise ValueError(f"不支持的运算符: {type(node.op).__name__}")
+            return ast.BinOp(
+                left=self._transform(node.left, used_functions, variables),
+                op=node.op,
+                right=self._transform(node.right, used_functions, variables),
+            )
+
+        if isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, ALLOWED_UNARY_OPERATORS):
+                raise ValueError(f"不支持的运算符: {type(node.op).__name__}")
+            return ast.UnaryOp(
+                op=node.op, operand=self._transform(node.operand, used_functions, variables)
+            )
+
+        if isinstance(node, ast.Name):
+            if "__" in node.id:
+                raise ValueError("表达式包含不安全的内容")
+            if node.id in variables:
+                return ast.Name(id=node.id, ctx=ast.Load())
+            value = self.constants.get(node.id.lower())
+            if value is None:
+                raise ValueError(f"未知的名称: {node.id}")
+            return self._constant_node(node.id.lower(), value, used_functions)
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                raise ValueError("表达式包含不安全的内容")
+            name = node.func.id
+            function = self.functions.get(name)
+            if function is None:
+                if "__" in name:
+                    raise ValueError("表达式包含不安全的内容")
+                raise ValueError(f"不支持的函数: {name}")
+            used_functions[name] = function
+            return ast.Call(
+                func=ast.Name(id=name, ctx=ast.Load()),
+                args=[self._transform(arg, used_functions, variables) for arg in node.args],
+                keywords=[],
+            )
+
+        raise ValueError("表达式包含不安全的内容")
+
+    def clear(self) -> None:
+        """清空编译缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """
+        获取编译缓存统计
+
+        Returns:
+            dict: 缓存大小、容量和命中/未命中次数
+        """
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "capacity": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -2,13 +2,67 @@
 历史记录服务
 处理计算历史和AI使用记录
 """
+import base64
+import binascii
+import heapq
+import itertools
 import math
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import tuple_
 
-from ..models import History, AIUsage, User
+from ..models import History, AIUsage, HistoryPurgeJob, User
 from ..schemas.history import HistoryResponse, HistoryListResponse
+from .history_archive import HistoryArchiveService, iter_archived, record_key
+from .history_purge import HistoryPurgeService
+from .history_storage import release_texts, to_storage
+from .history_sync import (
+    allocate_change_seq,
+    assign_change_seq,
+    cleared_watermark,
+    record_tombstones,
+    visible_history,
+)
+from .history_writer import get_history_writer
+from .user_stats import UserStatsService, bump_stats
+
+
+def encode_cursor(record: History) -> str:
+    """
+    生成指向某条历史记录之后的分页游标
+
+    Args:
+        record: 当前页的最后一条历史记录
+
+    Returns:
+        str: URL 安全的游标字符串
+    """
+    raw = f"{record.created_at.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    解析分页游标
+
+    Args:
+        cursor: 游标字符串
+
+    Returns:
+        Tuple[datetime, UUID]: (created_at, id)
+
+    Raises:
+        ValueError: 游标无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, record_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(record_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("分页游标无效")
 
 
 class HistoryService:
@@ -16,7 +70,12 @@ class HistoryService:
 
     @staticmethod
     def create_history(
-        db: Session, user_id: UUID, expression: str, result: str, calculation_type: str = "basic"
+        db: Session,
+        user_id: UUID,
+        expression: str,
+        result: str,
+        calculation_type: str = "basic",
+        result_data: Optional[bytes] = None,
     ) -> History:
         """
         创建历史记录
@@ -27,59 +86,193 @@ class HistoryService:
             expression: 表达式
             result: 计算结果
             calculation_type: 计算类型 (basic/scientific/ai)
+            result_data: 非标量结果的二进制编码 (例如矩阵)
 
         Returns:
-            History: 历史记录对象
+            History: 历史记录对象 (写后缓冲模式下为尚未提交的临时对象)
         """
-        history = History(
-            user_id=user_id, expression=expression, result=result, calculation_type=calculation_type
-        )
-
+        values = {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "expression": expression,
+            "result": result,
+            "calculation_type": calculation_type,
+            "result_data": result_data,
+            "created_at": datetime.utcnow(),
+        }
+
+        # 写后缓冲模式: 入队后立即返回, 由后台线程批量提交
+        writer = get_history_writer()
+        if writer is not None and writer.submit(History, values):
+            return History(**values)
+
+        values["change_seq"] = allocate_change_seq(db, user_id)
+        bump_stats(db, user_id, history=1, activity_at=values["created_at"])
+        history = History(**to_storage(db, [values])[0])
         db.add(history)
         db.commit()
         db.refresh(history)
 
         return history
 
+    @staticmethod
+    def create_history_bulk(
+        db: Session,
+        user_id: UUID,
+        records: List[Tuple[str, str]],
+        calculation_type: str = "basic",
+    ) -> List[UUID]:
+        """
+        批量创建历史记录 (一次批量插入, 一次提交)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            records: (表达式, 计算结果) 列表
+            calculation_type: 计算类型 (basic/scientific/ai)
+
+        Returns:
+            List[UUID]: 与 records 顺序一致的历史记录ID
+        """
+        if not records:
+            return []
+
+        created_at = datetime.utcnow()
+        mappings = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "expression": expression,
+                "result": result,
+                "calculation_type": calculation_type,
+                "created_at": created_at,
+            }
+            for expression, result in records
+        ]
+
+        assign_change_seq(db, mappings)
+        bump_stats(db, user_id, history=len(mappings), activity_at=created_at)
+        db.bulk_insert_mappings(History, to_storage(db, mappings), render_nulls=True)
+        db.commit()
+
+        return [mapping["id"] for mapping in mappings]
+
     @staticmethod
     def get_user_history(
-        db: Session, user_id: UUID, page: int = 1, page_size: int = 20
+        db: Session,
+        user_id: UUID,
+        page: int = 1,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        include_archived: bool = False,
     ) -> HistoryListResponse:
         """
         获取用户历史记录
 
+        两种分页方式:
+        - 页码分页: OFFSET (page-1)*page_size, 深分页时需要扫描并跳过前面所有记录
+        - 游标分页: 从 cursor 指向的记录之后继续 (按 (created_at, id) 定位),
+          通过 (user_id, created_at, id) 复合索引直接定位, 耗时与页深度无关
+
         Args:
             db: 数据库会话
             user_id: 用户ID
-            page: 页码 (从1开始)
+            page: 页码 (从1开始, 指定 cursor 时忽略)
             page_size: 每页大小
+            cursor: 上一页响应中的 next_cursor
+            include_total: 是否统计总数 (默认页码分页统计, 游标分页不统计)
+            include_archived: 是否合并已归档的记录
 
         Returns:
             HistoryListResponse: 历史记录列表
-        """
-        # 查询总数
-        total = db.query(func.count(History.id)).filter(History.user_id == user_id).scalar()
 
-        # 查询分页数据
-        records = (
-            db.query(History)
-            .filter(History.user_id == user_id)
-            .order_by(History.created_at.desc())
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-            .all()
-        )
+        Raises:
+            ValueError: 游标无效
+        """
+        if include_total is None:
+            include_total = cursor is None
+
+        position = decode_cursor(cursor) if cursor is not None else None
+        offset = (page - 1) * page_size if cursor is None else 0
+
+        # 已清空但尚未被后台任务删除的记录按水位隐藏
+        cleared_seq, cleared_at = cleared_watermark(db, user_id)
+        query = db.query(History).filter(History.user_id == user_id, *visible_history(cleared_seq))
+        if position is not None:
+            query = query.filter(tuple_(History.created_at, History.id) < position)
+        query = query.order_by(History.created_at.desc(), History.id.desc())
+
+        # 多取一条判断是否还有下一页
+        if include_archived:
+            # 热数据和归档数据各自按相同顺序取前 offset+page_size+1 条, 归并后再跳过 offset 条
+            hot = query.limit(offset + page_size + 1).all()
+            cold = iter_archived(db, user_id, position, descending=True, cleared_at=cleared_at)
+            merged = heapq.merge(hot, cold, key=record_key, reverse=True)
+            records = list(itertools.islice(merged, offset, offset + page_size + 1))
+        else:
+            records = query.offset(offset).limit(page_size + 1).all()
+        has_more = len(records) > page_size
+        records = records[:page_size]
 
         # 转换为响应模型
         items = [HistoryResponse.from_orm(record) for record in records]
+        next_cursor = encode_cursor(records[-1]) if has_more else None
 
-        # 计算总页数
-        total_pages = math.ceil(total / page_size) if total > 0 else 0
+        # 总数读取物化计数 (按主键读取, 不扫描历史记录) 并计算总页数
+        total = total_pages = None
+        if include_total:
+            stats = UserStatsService.get_stats(db, user_id)
+            total = stats.history_count + (stats.archived_count if include_archived else 0)
+            total_pages = math.ceil(total / page_size) if total > 0 else 0
 
         return HistoryListResponse(
-            items=items, total=total, page=page, page_size=page_size, total_pages=total_pages
+            items=items,
+            total=total,
+            page=None if cursor is not None else page,
+            page_size=page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor,
+            has_more=has_more,
         )
 
+    @staticmethod
+    def get_history(db: Session, user_id: UUID, history_id: UUID) -> Optional[History]:
+        """
+        获取单条历史记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            history_id: 历史记录ID
+
+        Returns:
+            Optional[History]: 历史记录对象, 不存在时返回None
+        """
+        cleared_seq, cleared_at = cleared_watermark(db, user_id)
+        record = (
+            db.query(History)
+            .filter(
+                History.id == history_id,
+                History.user_id == user_id,
+                *visible_history(cleared_seq),
+            )
+            .first()
+        )
+        if record is not None:
+            return record
+
+        # 写后缓冲模式下刚创建的记录可能尚未提交
+        writer = get_history_writer()
+        values = writer.pending(History, history_id) if writer is not None else None
+        if values is not None and values["user_id"] == user_id:
+            return History(**values)
+
+        # 已归档的记录
+        if UserStatsService.get_stats(db, user_id).archived_count:
+            return HistoryArchiveService.get(db, user_id, history_id, cleared_at)
+        return None
+
     @staticmethod
     def delete_history(db: Session, user_id: UUID, history_id: UUID) -> bool:
         """
@@ -93,32 +286,60 @@ class HistoryService:
         Returns:
             bool: 是否删除成功
         """
+        HistoryService._flush_pending()
+
+        cleared_seq, cleared_at = cleared_watermark(db, user_id)
         record = (
-            db.query(History).filter(History.id == history_id, History.user_id == user_id).first()
+            db.query(History)
+            .filter(
+                History.id == history_id,
+                History.user_id == user_id,
+                *visible_history(cleared_seq),
+            )
+            .first()
         )
 
         if record:
             db.delete(record)
+            release_texts(db, [record.expression_id, record.result_id])
+            record_tombstones(db, user_id, [record.id])
+            bump_stats(db, user_id, history=-1)
             db.commit()
             return True
 
+        # 已归档的记录 (重写所在的归档段)
+        if UserStatsService.get_stats(db, user_id).archived_count:
+            if HistoryArchiveService.delete(db, user_id, history_id, cleared_at):
+                db.commit()
+                return True
+
         return False
 
     @staticmethod
-    def clear_user_history(db: Session, user_id: UUID) -> int:
+    def clear_user_history(
+        db: Session, user_id: UUID
+    ) -> Tuple[int, Optional[HistoryPurgeJob]]:
         """
         清空用户历史记录
 
+        记录立即对读取隐藏; 记录较多时由后台任务分批删除
+
         Args:
             db: 数据库会话
             user_id: 用户ID
 
         Returns:
-            int: 删除的记录数
+            Tuple[int, Optional[HistoryPurgeJob]]: (清空的记录数 (包括已归档的记录),
+            后台清理任务; 直接删除时为 None)
         """
-        count = db.query(History).filter(History.user_id == user_id).delete()
-        db.commit()
-        return count
+        return HistoryPurgeService.clear_history(db, user_id)
+
+    @staticmethod
+    def _flush_pending() -> None:
+        """写后缓冲模式下等待已入队的记录提交, 保证删除操作能看到刚创建的记录"""
+        writer = get_history_writer()
+        if writer is not None:
+            writer.flush()
 
     @staticmethod
     def create_ai_usage(db: Session, user_id: UUID, query: str, tokens_used: int) -> AIUsage:
@@ -132,10 +353,25 @@ class HistoryService:
             tokens_used: 使用的token数
 
         Returns:
-            AIUsage: AI使用记录对象
+            AIUsage: AI使用记录对象 (写后缓冲模式下为尚未提交的临时对象)
         """
-        ai_usage = AIUsage(user_id=user_id, query=query, tokens_used=tokens_used)
-
+        values = {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "query": query,
+            "tokens_used": tokens_used,
+            "created_at": datetime.utcnow(),
+        }
+
+        writer = get_history_writer()
+        if writer is not None and writer.submit(AIUsage, values):
+            return AIUsage(**values)
+
+        values["change_seq"] = allocate_change_seq(db, user_id, counter=User.ai_usage_seq)
+        bump_stats(
+            db, user_id, ai_queries=1, ai_tokens=tokens_used, activity_at=values["created_at"]
+        )
+        ai_usage = AIUsage(**values)
         db.add(ai_usage)
         db.commit()
         db.refresh(ai_usage)
@@ -154,10 +390,7 @@ class HistoryService:
         Returns:
             dict: 统计信息
         """
-        total_queries = db.query(func.count(AIUsage.id)).filter(AIUsage.user_id == user_id).scalar()
-
-        total_tokens = (
-            db.query(func.sum(AIUsage.tokens_used)).filter(AIUsage.user_id == user_id).scalar() or 0
-        )
+        stats = UserStatsService.get_stats(db, user_id)
+        total_queries, total_tokens = stats.ai_queries, stats.ai_tokens
 
         return {"total_queries": total_queries, "total_tokens": total_tokens}
@@ -0,0 +1,502 @@
+"""
+历史记录归档
+超过保留期的历史记录按用户成批移出 history 表, 压缩为只追加的归档段 (history_archive_segments),
+热表只保留近期数据; 读取时可按 (created_at, id) 顺序把热数据和归档数据合并返回
+"""
+import base64
+import heapq
+import itertools
+import json
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session, undefer
+
+from ..models import History, HistoryArchiveSegment, User
+from .history_storage import format_result, release_texts
+from .history_sync import (
+    cleared_watermark,
+    record_tombstones,
+    visible_history,
+    visible_segments,
+)
+from .user_stats import bump_stats
+
+# 保留期 (天), 创建时间早于该期限的记录会被归档; 0 表示不归档
+HISTORY_ARCHIVE_AFTER_DAYS = int(os.getenv("HISTORY_ARCHIVE_AFTER_DAYS", "0"))
+
+# 后台归档间隔 (秒)
+HISTORY_ARCHIVE_INTERVAL = float(os.getenv("HISTORY_ARCHIVE_INTERVAL", "3600"))
+
+# 每个归档段 (一个事务) 的最大记录数
+HISTORY_ARCHIVE_CHUNK = int(os.getenv("HISTORY_ARCHIVE_CHUNK", "1000"))
+
+# 归档时每批处理的用户数
+HISTORY_ARCHIVE_USER_BATCH = 100
+
+
+class ArchivedHistory(NamedTuple):
+    """归档的历史记录 (字段与 History 一致, 可直接用于响应模型和游标)"""
+
+    id: UUID
+    user_id: UUID
+    expression: str
+    result: Optional[str]
+    calculation_type: str
+    created_at: datetime
+    change_seq: Optional[int]
+    client_id: Optional[str]
+    result_data: Optional[bytes]
+
+
+def record_key(record) -> Tuple[datetime, UUID]:
+    """历史记录的排序键 (与游标分页的 (created_at, id) 顺序一致)"""
+    return record.created_at, record.id
+
+
+# 归档段中每条记录的字段顺序
+_ID, _EXPRESSION, _RESULT, _TYPE, _CREATED_AT, _CHANGE_SEQ, _CLIENT_ID, _RESULT_DATA = range(8)
+
+
+def _raw_key(created_at: datetime, record_id: UUID) -> Tuple[str, str]:
+    """
+    归档段中的排序键
+
+    时间固定为微秒精度的 ISO 格式、ID 为十六进制, 字符串顺序与 (created_at, id) 顺序一致,
+    比较时不需要先把每条记录解析为 datetime 和 UUID
+    """
+    return created_at.isoformat(timespec="microseconds"), record_id.hex
+
+
+def encode_segment(records: List) -> bytes:
+    """
+    把一批历史记录编码为压缩的归档段
+
+    Args:
+        records: 按 (created_at, id) 升序排列的历史记录
+
+    Returns:
+        bytes: zlib 压缩的 JSON
+    """
+    payload = [
+        [
+            record.id.hex,
+            record.expression,
+            record.result,
+            record.calculation_type,
+            record.created_at.isoformat(timespec="microseconds"),
+            record.change_seq,
+            record.client_id,
+            base64.b64encode(record.result_data).decode("ascii")
+            if record.result_data is not None
+            else None,
+        ]
+        for record in records
+    ]
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def _load_segment(segment: HistoryArchiveSegment) -> List[list]:
+    """解压归档段, 返回未解析的记录字段列表"""
+    return json.loads(zlib.decompress(segment.data).decode("utf-8"))
+
+
+def _to_record(raw: list, user_id: UUID) -> ArchivedHistory:
+    """把归档段中的记录字段转换为 ArchivedHistory"""
+    return ArchivedHistory(
+        id=UUID(raw[_ID]),
+        user_id=user_id,
+        expression=raw[_EXPRESSION],
+        result=raw[_RESULT],
+        calculation_type=raw[_TYPE],
+        created_at=datetime.fromisoformat(raw[_CREATED_AT]),
+        change_seq=raw[_CHANGE_SEQ],
+        client_id=raw[_CLIENT_ID],
+        result_data=base64.b64decode(raw[_RESULT_DATA])
+        if raw[_RESULT_DATA] is not None
+        else None,
+    )
+
+
+def iter_archived(
+    db: Session,
+    user_id: UUID,
+    position: Optional[Tuple[datetime, UUID]] = None,
+    descending: bool = True,
+    cleared_at: Optional[datetime] = None,
+) -> Iterator[ArchivedHistory]:
+    """
+    按 (created_at, id) 顺序逐条读取用户的归档记录
+
+    归档段按时间边界依次解压: 倒序时按 end_at 从新到旧读取, 缓冲区中比下一段 end_at
+    更新的记录不会再被超越, 可以立即返回; 只读取前几页时只解压最近的几个段,
+    且只有实际返回的记录才会被解析
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        position: 只返回排在该 (created_at, id) 之后的记录 (不包含)
+        descending: 是否倒序 (从新到旧)
+        cleared_at: 清空时间, 跳过此前创建的段
+
+    Returns:
+        Iterator[ArchivedHistory]: 归档记录
+    """
+    statement = (
+        select(HistoryArchiveSegment)
+        .options(undefer(HistoryArchiveSegment.data))
+        .where(HistoryArchiveSegment.user_id == user_id, *visible_segments(cleared_at))
+    )
+    if descending:
+        if position is not None:
+            statement = statement.where(HistoryArchiveSegment.start_at <= position[0])
+        statement = statement.order_by(HistoryArchiveSegment.end_at.desc())
+    else:
+        if position is not None:
+            statement = statement.where(HistoryArchiveSegment.end_at >= position[0])
+        statement = statement.order_by(HistoryArchiveSegment.start_at)
+    bound = _raw_key(*position) if position is not None else None
+
+    def key(raw: list) -> Tuple[str, str]:
+        return raw[_CREATED_AT], raw[_ID]
+
+    # 缓冲区按输出顺序的逆序排列, 下一条输出的记录在末尾
+    buffer: List[list] = []
+    for segment in db.execute(statement, execution_options={"yield_per": 1}).scalars():
+        if descending:
+            edge = segment.end_at.isoformat(timespec="microseconds")
+            while buffer and buffer[-1][_CREATED_AT] > edge:
+                yield _to_record(buffer.pop(), user_id)
+        else:
+            edge = segment.start_at.isoformat(timespec="microseconds")
+            while buffer and buffer[-1][_CREATED_AT] < edge:
+                yield _to_record(buffer.pop(), user_id)
+
+        records = _load_segment(segment)
+        if bound is not None:
+            if descending:
+                records = [raw for raw in records if key(raw) < bound]
+            else:
+                records = [raw for raw in records if key(raw) > bound]
+        buffer.extend(records)
+        buffer.sort(key=key, reverse=not descending)
+
+    while buffer:
+        yield _to_record(buffer.pop(), user_id)
+
+
+def archived_changes(
+    db: Session,
+    user_id: UUID,
+    after_seq: int,
+    limit: int,
+    cleared_at: Optional[datetime] = None,
+) -> List[ArchivedHistory]:
+    """
+    读取变更序号大于 after_seq 的归档记录 (按序号升序)
+
+    归档不产生新的变更, 记录保留原来的变更序号, 增量同步按序号与热数据合并;
+    只解压 max_seq 大于 after_seq 的段 (没有 max_seq 的旧段总是解压)
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        after_seq: 只返回序号大于该值的记录
+        limit: 最多返回的记录数
+        cleared_at: 清空时间, 跳过此前创建的段
+
+    Returns:
+        List[ArchivedHistory]: 归档记录
+    """
+    segments = db.execute(
+        select(HistoryArchiveSegment)
+        .options(undefer(HistoryArchiveSegment.data))
+        .where(
+            HistoryArchiveSegment.user_id == user_id,
+            or_(
+                HistoryArchiveSegment.max_seq.is_(None),
+                HistoryArchiveSegment.max_seq > after_seq,
+            ),
+            *visible_segments(cleared_at),
+        ),
+        execution_options={"yield_per": 1},
+    ).scalars()
+    records = (
+        raw
+        for segment in segments
+        for raw in _load_segment(segment)
+        if raw[_CHANGE_SEQ] is not None and raw[_CHANGE_SEQ] > after_seq
+    )
+    return [
+        _to_record(raw, user_id)
+        for raw in heapq.nsmallest(limit, records, key=lambda raw: raw[_CHANGE_SEQ])
+    ]
+
+
+class HistoryArchiveService:
+    """历史记录归档服务类"""
+
+    @staticmethod
+    def archive_user(db: Session, user_id: UUID, cutoff: datetime) -> Tuple[int, int]:
+        """
+        归档单个用户早于 cutoff 的历史记录
+
+        每 HISTORY_ARCHIVE_CHUNK 条记录写入一个归档段并在独立的事务中提交,
+        单个事务持有锁的时间与热表大小无关
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            cutoff: 归档创建时间早于该时间的记录
+
+        Returns:
+            Tuple[int, int]: (归档的记录数, 新建的段数)
+        """
+        archived = segments = 0
+        while True:
+            cleared_seq, _ = cleared_watermark(db, user_id)
+            # 只读取列 (不构造 ORM 对象), 包括延迟加载的 result_data
+            records = db.execute(
+                select(
+                    History.id,
+                    History.expression,
+                    History.result_text,
+                    History.result_value,
+                    History.calculation_type,
+                    History.created_at,
+                    History.change_seq,
+                    History.client_id,
+                    History.result_data,
+                )
+                .where(
+                    History.user_id == user_id,
+                    History.created_at < cutoff,
+                    *visible_history(cleared_seq),
+                )
+                .order_by(History.created_at, History.id)
+                .limit(HISTORY_ARCHIVE_CHUNK)
+            ).all()
+            if not records:
+                break
+            records = [
+                ArchivedHistory(
+                    id=record.id,
+                    user_id=user_id,
+                    expression=record.expression,
+                    result=format_result(record.result_text, record.result_value),
+                    calculation_type=record.calculation_type,
+                    created_at=record.created_at,
+                    change_seq=record.change_seq,
+                    client_id=record.client_id,
+                    result_data=record.result_data,
+                )
+                for record in records
+            ]
+
+            ids = [record.id for record in records]
+            released = db.execute(
+                delete(History)
+                .where(History.id.in_(ids))
+                .returning(History.expression_id, History.result_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            current_seq = db.execute(
+                select(User.history_cleared_seq).where(User.id == user_id).with_for_update()
+            ).scalar()
+            if len(released) != len(records) or current_seq != cleared_seq:
+                # 读取之后有记录被用户删除或历史记录被清空, 放弃这一批并重新读取
+                db.rollback()
+                continue
+            # 归档段保存完整的文本, 不再被引用的长文本可以删除
+            release_texts(db, itertools.chain.from_iterable(released))
+
+            db.add(
+                HistoryArchiveSegment(
+                    id=uuid.uuid4(),
+                    user_id=user_id,
+                    start_at=records[0].created_at,
+                    end_at=records[-1].created_at,
+                    record_count=len(records),
+                    max_seq=max(
+                        (record.change_seq for record in records if record.change_seq is not None),
+                        default=None,
+                    ),
+                    data=encode_segment(records),
+                )
+            )
+            bump_stats(db, user_id, history=-len(records), archived=len(records))
+            db.commit()
+
+            archived += len(records)
+            segments += 1
+            if len(records) < HISTORY_ARCHIVE_CHUNK:
+                break
+
+        return archived, segments
+
+    @staticmethod
+    def archive_all(db: Session, cutoff: Optional[datetime] = None) -> dict:
+        """
+        归档所有用户超过保留期的历史记录
+
+        Args:
+            db: 数据库会话
+            cutoff: 归档创建时间早于该时间的记录 (默认为当前时间减去保留期)
+
+        Returns:
+            dict: 截止时间、检查的用户数、归档的记录数和新建的段数
+        """
+        if cutoff is None:
+            cutoff = datetime.utcnow() - timedelta(days=HISTORY_ARCHIVE_AFTER_DAYS)
+
+        users = archived = segments = 0
+        last_id = None
+        while True:
+            query = select(User.id).order_by(User.id).limit(HISTORY_ARCHIVE_USER_BATCH)
+            if last_id is not None:
+                query = query.where(User.id > last_id)
+            user_ids = db.execute(query).scalars().all()
+            if not user_ids:
+                break
+
+            for user_id in user_ids:
+                count, created = HistoryArchiveService.archive_user(db, user_id, cutoff)
+                archived += count
+                segments += created
+
+            users += len(user_ids)
+            last_id = user_ids[-1]
+
+        return {
+            "cutoff": cutoff,
+            "users": users,
+            "archived": archived,
+            "segments": segments,
+        }
+
+    @staticmethod
+    def _find(
+        db: Session, user_id: UUID, history_id: UUID, cleared_at: Optional[datetime] = None
+    ) -> Tuple[Optional[HistoryArchiveSegment], List[list]]:
+        """
+        在用户的归档段中查找记录 (归档记录没有按ID的索引, 需要逐段解压)
+
+        Returns:
+            Tuple: (包含该记录的段, 该段的全部记录字段), 未找到时为 (None, [])
+        """
+        segments = db.execute(
+            select(HistoryArchiveSegment)
+            .options(undefer(HistoryArchiveSegment.data))
+            .where(HistoryArchiveSegment.user_id == user_id, *visible_segments(cleared_at))
+            .order_by(HistoryArchiveSegment.end_at.desc()),
+            execution_options={"yield_per": 1},
+        ).scalars()
+        for segment in segments:
+            records = _load_segment(segment)
+            if any(raw[_ID] == history_id.hex for raw in records):
+                return segment, records
+        return None, []
+
+    @staticmethod
+    def get(
+        db: Session, user_id: UUID, history_id: UUID, cleared_at: Optional[datetime] = None
+    ) -> Optional[ArchivedHistory]:
+        """
+        读取单条归档记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            history_id: 历史记录ID
+            cleared_at: 清空时间, 跳过此前创建的段
+
+        Returns:
+            Optional[ArchivedHistory]: 归档记录, 不存在时返回None
+        """
+        _, records = HistoryArchiveService._find(db, user_id, history_id, cleared_at)
+        for raw in records:
+            if raw[_ID] == history_id.hex:
+                return _to_record(raw, user_id)
+        return None
+
+    @staticmethod
+    def delete(
+        db: Session, user_id: UUID, history_id: UUID, cleared_at: Optional[datetime] = None
+    ) -> bool:
+        """
+        删除单条归档记录 (重写所在的段, 在调用方的事务中执行, 不提交)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            history_id: 历史记录ID
+            cleared_at: 清空时间, 跳过此前创建的段
+
+        Returns:
+            bool: 是否找到并删除
+        """
+        segment, records = HistoryArchiveService._find(db, user_id, history_id, cleared_at)
+        if segment is None:
+            return False
+
+        remaining = [
+            _to_record(raw, user_id) for raw in records if raw[_ID] != history_id.hex
+        ]
+        if remaining:
+            segment.start_at = remaining[0].created_at
+            segment.end_at = remaining[-1].created_at
+            segment.record_count = len(remaining)
+            segment.data = encode_segment(remaining)
+        else:
+            db.delete(segment)
+
+        record_tombstones(db, user_id, [history_id])
+        bump_stats(db, user_id, archived=-1)
+        return True
+
+
+# 后台归档线程 (HISTORY_ARCHIVE_AFTER_DAYS > 0 时启用)
+_archiver: Optional[threading.Thread] = None
+_archiver_stop = threading.Event()
+
+
+def _archive_loop() -> None:
+    """后台归档主循环"""
+    from ..utils.database import SessionLocal
+
+    while not _archiver_stop.wait(HISTORY_ARCHIVE_INTERVAL):
+        db = SessionLocal()
+        try:
+            result = HistoryArchiveService.archive_all(db)
+            if result["archived"]:
+                print(f"📦 已归档 {result['archived']} 条历史记录 ({result['segments']} 个段)")
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  历史记录归档失败: {e}")
+        finally:
+            db.close()
+
+
+def start_history_archiver() -> None:
+    """启动后台归档线程 (应用启动时调用)"""
+    global _archiver
+    if HISTORY_ARCHIVE_AFTER_DAYS <= 0 or _archiver is not None:
+        return
+    _archiver_stop.clear()
+    _archiver = threading.Thread(target=_archive_loop, name="history-archiver", daemon=True)
+    _archiver.start()
+
+
+def shutdown_history_archiver() -> None:
+    """停止后台归档线程 (应用关闭时调用)"""
+    global _archiver
+    if _archiver is not None:
+        _archiver_stop.set()
+        _archiver.join(timeout=5)
+        _archiver = None
@@ -0,0 +1,155 @@
+"""
+历史记录服务 (异步数据库访问, DB_ASYNC=true 时使用)
+
+通过 AsyncSession.run_sync 复用 HistoryService 的同步实现 (序号分配、物化计数、
+长文本去重、归档和清空水位): 同步代码中的查询经异步驱动执行, 等待数据库时让出事件循环,
+不占用线程池。写后缓冲的 flush 等线程同步等待放到线程池中执行, 避免阻塞事件循环
+"""
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from ..models import AIUsage, History, HistoryPurgeJob, User
+from ..schemas.history import HistoryListResponse
+from .history import HistoryService
+from .history_purge import HistoryPurgeService
+
+
+class AsyncHistoryService:
+    """历史记录服务类 (异步版本, 方法与 HistoryService 一一对应)"""
+
+    @staticmethod
+    async def create_history(
+        db: AsyncSession,
+        user_id: UUID,
+        expression: str,
+        result: str,
+        calculation_type: str = "basic",
+        result_data: Optional[bytes] = None,
+    ) -> History:
+        """
+        创建历史记录
+
+        Args:
+            db: 异步数据库会话
+            user_id: 用户ID
+            expression: 表达式
+            result: 计算结果
+            calculation_type: 计算类型 (basic/scientific/ai)
+            result_data: 非标量结果的二进制编码 (例如矩阵)
+
+        Returns:
+            History: 历史记录对象 (写后缓冲模式下为尚未提交的临时对象)
+        """
+        return await db.run_sync(
+            HistoryService.create_history,
+            user_id,
+            expression,
+            result,
+            calculation_type,
+            result_data,
+        )
+
+    @staticmethod
+    async def get_user_history(
+        db: AsyncSession,
+        user_id: UUID,
+        page: int = 1,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        include_archived: bool = False,
+    ) -> HistoryListResponse:
+        """
+        获取用户历史记录 (分页方式见 HistoryService.get_user_history)
+
+        Args:
+            db: 异步数据库会话
+            user_id: 用户ID
+            page: 页码 (从1开始, 指定 cursor 时忽略)
+            page_size: 每页大小
+            cursor: 上一页响应中的 next_cursor
+            include_total: 是否统计总数 (默认页码分页统计, 游标分页不统计)
+            include_archived: 是否合并已归档的记录
+
+        Returns:
+            HistoryListResponse: 历史记录列表
+
+        Raises:
+            ValueError: 游标无效
+        """
+        return await db.run_sync(
+            HistoryService.get_user_history,
+            user_id,
+            page,
+            page_size,
+            cursor=cursor,
+            include_total=include_total,
+            include_archived=include_archived,
+        )
+
+    @staticmethod
+    async def delete_history(db: AsyncSession, user_id: UUID, history_id: UUID) -> bool:
+        """
+        删除历史记录
+
+        Args:
+            db: 异步数据库会话
+            user_id: 用户ID
+            history_id: 历史记录ID
+
+        Returns:
+            bool: 是否删除成功
+        """
+        # 先在线程池中等待已入队的记录提交, 同步实现中的 flush 随后立即返回
+        await run_in_threadpool(HistoryService._flush_pending)
+        return await db.run_sync(HistoryService.delete_history, user_id, history_id)
+
+    @staticmethod
+    async def create_ai_usage(
+        db: AsyncSession, user_id: UUID, query: str, tokens_used: int
+    ) -> AIUsage:
+        """
+        创建AI使用记录
+
+        Args:
+            db: 异步数据库会话
+            user_id: 用户ID
+            query: 查询内容
+            tokens_used: 使用的token数
+
+        Returns:
+            AIUsage: AI使用记录对象 (写后缓冲模式下为尚未提交的临时对象)
+        """
+        return await db.run_sync(HistoryService.create_ai_usage, user_id, query, tokens_used)
+
+    @staticmethod
+    async def get_user_ai_usage_stats(db: AsyncSession, user_id: UUID) -> dict:
+        """
+        获取用户AI使用统计
+
+        Args:
+            db: 异步数据库会话
+            user_id: 用户ID
+
+        Returns:
+            dict: 统计信息
+        """
+        return await db.run_sync(HistoryService.get_user_ai_usage_stats, user_id)
+
+    @staticmethod
+    async def remove_account(db: AsyncSession, user: User) -> HistoryPurgeJob:
+        """
+        禁用账户并创建后台删除任务 (见 HistoryPurgeService.remove_account)
+
+        Args:
+            db: 异步数据库会话
+            user: 要删除的用户
+
+        Returns:
+            HistoryPurgeJob: 后台任务
+        """
+        await run_in_threadpool(HistoryService._flush_pending)
+        return await db.run_sync(HistoryPurgeService.remove_account, user)
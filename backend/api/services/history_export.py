@@ -0,0 +1,158 @@
+"""
+历史记录导出
+通过服务端游标 (yield_per) 逐批读取并流式输出 NDJSON 或 CSV, 内存占用与记录总数无关;
+可选 gzip 压缩, 支持从上次导出的游标处继续
+"""
+import csv
+import heapq
+import io
+import itertools
+import json
+import os
+import zlib
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import select, tuple_
+
+from ..models import History
+from ..utils.replicas import read_session
+from .history import HistoryService, decode_cursor, encode_cursor
+from .history_archive import iter_archived, record_key
+from .history_storage import HISTORY_ROW_COLUMNS, to_row
+from .history_sync import cleared_watermark, visible_history
+
+# 每批从数据库读取并输出的记录数
+HISTORY_EXPORT_BATCH_SIZE = int(os.getenv("HISTORY_EXPORT_BATCH_SIZE", "1000"))
+
+# 导出字段 (cursor 为该记录之后继续导出的游标)
+EXPORT_FIELDS = ("id", "expression", "result", "calculation_type", "created_at", "cursor")
+
+# 导出格式对应的 Content-Type 和文件扩展名
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def _ndjson_chunk(rows: List[tuple]) -> str:
+    """把一批记录序列化为 NDJSON 文本"""
+    return "".join(
+        json.dumps(
+            {
+                "id": str(row.id),
+                "expression": row.expression,
+                "result": row.result,
+                "calculation_type": row.calculation_type,
+                "created_at": row.created_at.isoformat(),
+                "cursor": encode_cursor(row),
+            },
+            ensure_ascii=False,
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def _csv_writer() -> Callable[[List[tuple]], str]:
+    """创建 CSV 序列化函数 (复用同一个缓冲区)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def serialize(rows: List[tuple]) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (
+                str(row.id),
+                row.expression,
+                row.result,
+                row.calculation_type,
+                row.created_at.isoformat(),
+                encode_cursor(row),
+            )
+            for row in rows
+        )
+        return buffer.getvalue()
+
+    return serialize
+
+
+def export_history(
+    user_id,
+    export_format: str = "ndjson",
+    since: Optional[str] = None,
+    compress: bool = False,
+    include_archived: bool = False,
+) -> Iterator[bytes]:
+    """
+    导出用户的全部历史记录 (按创建时间升序)
+
+    游标在调用时立即校验, 数据库查询在开始迭代后才执行;
+    迭代期间使用独立的数据库会话, 结束或中断时关闭
+
+    Args:
+        user_id: 用户ID
+        export_format: 导出格式 (ndjson/csv)
+        since: 从该游标指向的记录之后继续导出 (上次导出最后一行的 cursor)
+        compress: 是否 gzip 压缩
+        include_archived: 是否合并已归档的记录 (按创建时间归并到同一个有序输出中)
+
+    Returns:
+        Iterator[bytes]: 导出内容的分块
+
+    Raises:
+        ValueError: 导出格式或游标无效
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    position = decode_cursor(since) if since else None
+
+    serialize = _ndjson_chunk if export_format == "ndjson" else _csv_writer()
+    header = ",".join(EXPORT_FIELDS) + "\n" if export_format == "csv" else ""
+
+    def generate() -> Iterator[bytes]:
+        # 写后缓冲模式下先等待已入队的记录提交
+        HistoryService._flush_pending()
+
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        db = read_session(user_id)
+        try:
+            cleared_seq, cleared_at = cleared_watermark(db, user_id)
+            # 只查询导出字段 (不构造 ORM 对象, 不加载 result_data)
+            statement = select(*HISTORY_ROW_COLUMNS).where(
+                History.user_id == user_id, *visible_history(cleared_seq)
+            )
+            if position is not None:
+                statement = statement.where(tuple_(History.created_at, History.id) > position)
+            statement = statement.order_by(History.created_at, History.id)
+
+            # yield_per: 服务端游标 (PostgreSQL 使用命名游标), 每次只取一批
+            result = db.execute(
+                statement, execution_options={"yield_per": HISTORY_EXPORT_BATCH_SIZE}
+            )
+
+            batches = ([to_row(row) for row in rows] for rows in result.partitions())
+            if include_archived:
+                # 热数据与归档数据按 (created_at, id) 归并后重新分批
+                cold = iter_archived(
+                    db, user_id, position, descending=False, cleared_at=cleared_at
+                )
+                merged = heapq.merge(itertools.chain.from_iterable(batches), cold, key=record_key)
+                batches = iter(
+                    lambda: list(itertools.islice(merged, HISTORY_EXPORT_BATCH_SIZE)), []
+                )
+
+            pending = header
+            for rows in batches:
+                data = (pending + serialize(rows)).encode("utf-8")
+                pending = ""
+                yield compressor.compress(data) if compressor is not None else data
+            if pending:
+                data = pending.encode("utf-8")
+                yield compressor.compress(data) if compressor is not None else data
+            if compressor is not None:
+                yield compressor.flush()
+        finally:
+            db.close()
+
+    return generate()
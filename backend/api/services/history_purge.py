@@ -0,0 +1,357 @@
+"""
+历史记录后台清理
+清空历史记录或删除账户时先写入清空水位 (users.history_cleared_seq/history_cleared_at),
+读取立即隐藏水位之前的数据; 物理删除由后台任务分批执行, 批次之间暂停, 不长时间持有写锁
+"""
+import itertools
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..models import (
+    AIUsage,
+    History,
+    HistoryArchiveSegment,
+    HistoryPurgeJob,
+    HistoryTombstone,
+    User,
+    UserStats,
+)
+from .history_sync import (
+    cleared_watermark,
+    record_tombstones,
+    visible_history,
+    visible_segments,
+)
+from .history_storage import release_texts
+from .history_writer import get_history_writer
+from .usage_analytics import clear_expression_rollups, delete_user_rollups
+from .user_stats import UserStatsService
+
+# 每批删除的记录数 (清空的记录数不超过该值时直接在请求中删除)
+HISTORY_PURGE_BATCH = int(os.getenv("HISTORY_PURGE_BATCH", "1000"))
+
+# 批次之间的暂停时间 (秒), 让其他写操作有机会获得锁
+HISTORY_PURGE_PAUSE = float(os.getenv("HISTORY_PURGE_PAUSE", "0.05"))
+
+# 每批删除的归档段数
+HISTORY_PURGE_SEGMENT_BATCH = 10
+
+
+def _set_watermark(db: Session, user_id: UUID, **values) -> Tuple[int, datetime]:
+    """
+    把清空水位设为用户当前的变更序号 (在调用方的事务中执行)
+
+    Returns:
+        Tuple[int, datetime]: (清空序号, 清空时间)
+    """
+    cleared_at = datetime.utcnow()
+    cleared_seq = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            history_cleared_seq=User.history_seq,
+            history_cleared_at=cleared_at,
+            updated_at=User.updated_at,
+            **values,
+        )
+        .returning(User.history_cleared_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(history_count=0, archived_count=0)
+    )
+    # 常用表达式汇总包含历史记录的内容, 随清空一起删除
+    clear_expression_rollups(db, user_id)
+    return cleared_seq, cleared_at
+
+
+class HistoryPurgeService:
+    """历史记录清理服务类"""
+
+    @staticmethod
+    def clear_history(db: Session, user_id: UUID) -> Tuple[int, Optional[HistoryPurgeJob]]:
+        """
+        清空用户的历史记录
+
+        记录数不超过 HISTORY_PURGE_BATCH 时直接删除; 否则只写入清空水位并创建后台任务,
+        读取立即看不到被清空的记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            Tuple[int, Optional[HistoryPurgeJob]]: (清空的记录数, 后台任务; 直接删除时为 None)
+        """
+        # 写后缓冲模式下先等待已入队的记录提交
+        writer = get_history_writer()
+        if writer is not None:
+            writer.flush()
+
+        stats = UserStatsService.get_stats(db, user_id)
+        count = stats.history_count + stats.archived_count
+        if count == 0:
+            return 0, None
+
+        record_tombstones(db, user_id, [None])
+
+        if count <= HISTORY_PURGE_BATCH:
+            # 只删除此前可见的数据, 上一次清空的数据仍由其后台任务分批删除
+            previous_seq, previous_at = cleared_watermark(db, user_id)
+            _set_watermark(db, user_id)
+            released = db.execute(
+                delete(History)
+                .where(History.user_id == user_id, *visible_history(previous_seq))
+                .returning(History.expression_id, History.result_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            release_texts(db, itertools.chain.from_iterable(released))
+            db.execute(
+                delete(HistoryArchiveSegment)
+                .where(
+                    HistoryArchiveSegment.user_id == user_id, *visible_segments(previous_at)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return count, None
+
+        cleared_seq, cleared_at = _set_watermark(db, user_id)
+        job = HistoryPurgeJob(
+            user_id=user_id,
+            kind="clear",
+            cleared_seq=cleared_seq,
+            cleared_at=cleared_at,
+            total=count,
+        )
+        db.add(job)
+        db.commit()
+        submit_purge_job(job.id)
+        return count, job
+
+    @staticmethod
+    def remove_account(db: Session, user: User) -> HistoryPurgeJob:
+        """
+        删除账户: 立即禁用账户并隐藏全部数据, 由后台任务分批删除后再删除用户行
+
+        Args:
+            db: 数据库会话
+            user: 要删除的用户
+
+        Returns:
+            HistoryPurgeJob: 后台任务
+        """
+        writer = get_history_writer()
+        if writer is not None:
+            writer.flush()
+
+        stats = UserStatsService.get_stats(db, user.id)
+        total = stats.history_count + stats.archived_count + stats.ai_queries
+
+        cleared_seq, cleared_at = _set_watermark(db, user.id, is_active=False)
+        job = HistoryPurgeJob(
+            user_id=user.id,
+            kind="account",
+            cleared_seq=cleared_seq,
+            cleared_at=cleared_at,
+            total=total,
+        )
+        db.add(job)
+        db.commit()
+        submit_purge_job(job.id)
+        return job
+
+    @staticmethod
+    def get_job(db: Session, job_id: UUID) -> Optional[HistoryPurgeJob]:
+        """
+        获取清理任务
+
+        Args:
+            db: 数据库会话
+            job_id: 任务ID
+
+        Returns:
+            Optional[HistoryPurgeJob]: 任务, 不存在时返回None
+        """
+        return db.get(HistoryPurgeJob, job_id)
+
+    @staticmethod
+    def run_job(db: Session, job_id: UUID) -> bool:
+        """
+        执行清理任务 (每批一个事务, 可中断; 重新执行时从剩余的数据继续)
+
+        Args:
+            db: 数据库会话
+            job_id: 任务ID
+
+        Returns:
+            bool: 是否执行完成 (停止信号导致中断时为 False)
+        """
+        job = db.get(HistoryPurgeJob, job_id)
+        if job is None or job.status == "done":
+            return True
+
+        job.status = "running"
+        job.started_at = job.started_at or datetime.utcnow()
+        job.error = None
+        db.commit()
+
+        account = job.kind == "account"
+        history_filter = [History.user_id == job.user_id]
+        segment_filter = [HistoryArchiveSegment.user_id == job.user_id]
+        if not account:
+            # 只删除水位之前的数据, 清空之后新增的记录保留
+            history_filter.append(
+                or_(History.change_seq <= job.cleared_seq, History.change_seq.is_(None))
+            )
+            segment_filter.append(HistoryArchiveSegment.created_at <= job.cleared_at)
+
+        # (模型, 条件, 每批行数, 每行计入的已删除记录数)
+        steps = [
+            (History, history_filter, HISTORY_PURGE_BATCH, literal(1)),
+            (
+                HistoryArchiveSegment,
+                segment_filter,
+                HISTORY_PURGE_SEGMENT_BATCH,
+                HistoryArchiveSegment.record_count,
+            ),
+        ]
+        if account:
+            steps += [
+                (AIUsage, [AIUsage.user_id == job.user_id], HISTORY_PURGE_BATCH, literal(1)),
+                (
+                    HistoryTombstone,
+                    [HistoryTombstone.user_id == job.user_id],
+                    HISTORY_PURGE_BATCH,
+                    literal(0),
+                ),
+            ]
+
+        for model, conditions, batch_size, weight in steps:
+            while True:
+                rows = db.execute(
+                    select(model.id, weight).where(*conditions).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+
+                statement = (
+                    delete(model)
+                    .where(model.id.in_([row[0] for row in rows]))
+                    .execution_options(synchronize_session=False)
+                )
+                if model is History:
+                    # 清理这批记录引用的、不再被其他记录引用的长文本
+                    released = db.execute(
+                        statement.returning(History.expression_id, History.result_id)
+                    ).all()
+                    release_texts(db, itertools.chain.from_iterable(released))
+                else:
+                    db.execute(statement)
+                job.deleted += sum(row[1] for row in rows)
+                db.commit()
+
+                if _purge_stop.wait(HISTORY_PURGE_PAUSE):
+                    return False
+
+        if account:
+            delete_user_rollups(db, job.user_id)
+            db.execute(delete(UserStats).where(UserStats.user_id == job.user_id))
+            db.execute(delete(User).where(User.id == job.user_id))
+
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return True
+
+
+# 后台清理线程 (首次提交任务时启动)
+_purge_queue: "queue.Queue[UUID]" = queue.Queue()
+_purge_stop = threading.Event()
+_purge_worker: Optional[threading.Thread] = None
+_purge_lock = threading.Lock()
+
+
+def _purge_loop() -> None:
+    """后台清理主循环"""
+    from ..utils.database import SessionLocal
+
+    while not _purge_stop.is_set():
+        try:
+            job_id = _purge_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+        db = SessionLocal()
+        try:
+            HistoryPurgeService.run_job(db, job_id)
+        except Exception as e:
+            db.rollback()
+            job = db.get(HistoryPurgeJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e)
+                db.commit()
+            print(f"⚠️  历史记录清理任务 {job_id} 失败: {e}")
+        finally:
+            db.close()
+
+
+def _ensure_purge_worker() -> None:
+    """确保后台清理线程已启动"""
+    global _purge_worker
+    with _purge_lock:
+        if _purge_worker is None or not _purge_worker.is_alive():
+            _purge_stop.clear()
+            _purge_worker = threading.Thread(
+                target=_purge_loop, name="history-purge", daemon=True
+            )
+            _purge_worker.start()
+
+
+def submit_purge_job(job_id: UUID) -> None:
+    """
+    提交清理任务到后台线程
+
+    Args:
+        job_id: 任务ID
+    """
+    _ensure_purge_worker()
+    _purge_queue.put(job_id)
+
+
+def start_purge_worker() -> None:
+    """启动后台清理线程并恢复上次未完成的任务 (应用启动时调用)"""
+    from ..utils.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job_ids = db.execute(
+            select(HistoryPurgeJob.id)
+            .where(HistoryPurgeJob.status.in_(["pending", "running"]))
+            .order_by(HistoryPurgeJob.created_at)
+        ).scalars().all()
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        submit_purge_job(job_id)
+
+
+def shutdown_purge_worker() -> None:
+    """停止后台清理线程 (应用关闭时调用; 进行中的任务在下次启动时继续)"""
+    global _purge_worker
+    with _purge_lock:
+        if _purge_worker is not None:
+            _purge_stop.set()
+            _purge_worker.join(timeout=5)
+            _purge_worker = None
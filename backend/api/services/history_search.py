@@ -0,0 +1,369 @@
+"""
+历史记录搜索
+按表达式中的词 (函数名、数字等) 做前缀搜索, 可按计算类型和时间范围过滤:
+- SQLite: FTS5 全文索引 (无内容表, 由触发器与 history 表同步)
+- PostgreSQL: pg_trgm 三元组 GIN 索引
+"""
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from ..models import History, HistoryText
+from .history_storage import HISTORY_ROW_COLUMNS, HistoryRow, to_row
+from .history_sync import cleared_watermark, visible_history
+
+# 搜索词的最大数量和单个词的最大长度
+SEARCH_MAX_TERMS = 8
+SEARCH_MAX_TERM_LENGTH = 64
+
+# 搜索词: 连续的字母、数字、下划线和小数点 (其余字符视为分隔符)
+_TERM_PATTERN = re.compile(r"[\w.]+")
+
+# 时间范围拆分为年/月/日分桶词时允许的最大词数 (超出时只按 created_at 过滤)
+SEARCH_MAX_PERIOD_TOKENS = 128
+
+
+def _fts_columns(row: str) -> str:
+    """
+    FTS5 索引各列的取值表达式
+
+    去重保存的长表达式从 history_texts 读取 (删除记录时触发器先于文本清理执行, 仍可读取原值);
+    owner 为 'u' + 用户ID, ctype 为 't' + 计算类型, period 为创建时间所在的年/月/日分桶词
+    (例如 "y2026 m202610 d20261018"), 用于在索引内按用户、类型和时间范围求交集
+    """
+    return (
+        f"coalesce({row}.expression, "
+        f"(SELECT content FROM history_texts WHERE id = {row}.expression_id)), "
+        f"'u' || {row}.user_id, 't' || {row}.calculation_type, "
+        f"'y' || strftime('%Y', {row}.created_at) || ' m' || strftime('%Y%m', {row}.created_at)"
+        f" || ' d' || strftime('%Y%m%d', {row}.created_at)"
+    )
+
+
+_SQLITE_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+        expression, owner, ctype, period, content='', prefix='2 3 4 5 6', tokenize='unicode61'
+    )
+"""
+
+# 同步触发器 (名称 → 创建语句); 旧版本创建的定义不同的触发器在 setup_search_index 中替换
+_SQLITE_TRIGGERS = {
+    "history_fts_insert": f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, expression, owner, ctype, period)
+        VALUES (new.rowid, {_fts_columns("new")});
+    END
+    """,
+    "history_fts_delete": f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, expression, owner, ctype, period)
+        VALUES ('delete', old.rowid, {_fts_columns("old")});
+    END
+    """,
+    "history_fts_update": f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_update
+    AFTER UPDATE OF expression, expression_id, user_id, calculation_type, created_at
+    ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, expression, owner, ctype, period)
+        VALUES ('delete', old.rowid, {_fts_columns("old")});
+        INSERT INTO history_fts(rowid, expression, owner, ctype, period)
+        VALUES (new.rowid, {_fts_columns("new")});
+    END
+    """,
+}
+
+# 为已有记录建立 SQLite 索引
+_SQLITE_BACKFILL = f"""
+    INSERT INTO history_fts(rowid, expression, owner, ctype, period)
+    SELECT history.rowid, {_fts_columns("history")} FROM history
+"""
+
+# PostgreSQL 三元组索引 (btree_gin 使 user_id 与表达式在同一个 GIN 索引中);
+# 去重保存的长表达式先按 history_texts 的三元组索引匹配, 再按 (user_id, expression_id) 索引关联
+_POSTGRESQL_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    """
+    CREATE INDEX IF NOT EXISTS idx_history_user_expression_trgm
+    ON history USING gin (user_id, expression gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_history_texts_content_trgm
+    ON history_texts USING gin (content gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_history_user_expression_id
+    ON history (user_id, expression_id)
+    """,
+]
+
+
+def _normalize_sql(statement: str) -> str:
+    """
+    规范化创建语句以便比较 (sqlite_master 中保存的语句不含 IF NOT EXISTS)
+
+    Args:
+        statement: CREATE TRIGGER 语句
+
+    Returns:
+        str: 去掉 IF NOT EXISTS 并合并空白后的语句
+    """
+    return " ".join(statement.replace("IF NOT EXISTS ", "").split())
+
+
+def setup_search_index(engine) -> None:
+    """
+    创建搜索索引 (幂等, 在建表之后调用; 定义已变化的 SQLite 触发器会被替换并重建索引)
+
+    Args:
+        engine: 数据库引擎
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+            ).first()
+            conn.execute(text(_SQLITE_TABLE))
+
+            # 旧版本的触发器 (例如不读取 history_texts 中的长表达式) 不会被 IF NOT EXISTS 替换
+            stored = dict(
+                conn.execute(
+                    text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+                ).all()
+            )
+            replaced = False
+            for name, statement in _SQLITE_TRIGGERS.items():
+                if name in stored and _normalize_sql(stored[name]) != _normalize_sql(statement):
+                    conn.execute(text(f"DROP TRIGGER {name}"))
+                    replaced = True
+                conn.execute(text(statement))
+
+            # 旧触发器写入的索引内容可能不完整, 替换后重建
+            if replaced and exists:
+                conn.execute(text("INSERT INTO history_fts(history_fts) VALUES ('delete-all')"))
+            if replaced or not exists:
+                conn.execute(text(_SQLITE_BACKFILL))
+        elif dialect == "postgresql":
+            for statement in _POSTGRESQL_SETUP:
+                conn.execute(text(statement))
+
+
+def rebuild_search_index(engine) -> None:
+    """
+    重建 SQLite 搜索索引
+
+    FTS5 索引按 history 的 rowid 关联, VACUUM 可能改变没有整数主键的表的 rowid,
+    执行 VACUUM 之后需要调用本函数
+
+    Args:
+        engine: 数据库引擎
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO history_fts(history_fts) VALUES ('delete-all')"))
+        conn.execute(text(_SQLITE_BACKFILL))
+
+
+def parse_terms(query: str) -> List[str]:
+    """
+    把搜索字符串拆分为搜索词
+
+    Args:
+        query: 搜索字符串, 例如 "sqrt 16"
+
+    Returns:
+        List[str]: 搜索词
+
+    Raises:
+        ValueError: 没有有效的搜索词或搜索词过多/过长
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        raise ValueError("搜索词不能为空")
+    if len(terms) > SEARCH_MAX_TERMS:
+        raise ValueError(f"搜索词不能超过 {SEARCH_MAX_TERMS} 个")
+    if any(len(term) > SEARCH_MAX_TERM_LENGTH for term in terms):
+        raise ValueError(f"单个搜索词不能超过 {SEARCH_MAX_TERM_LENGTH} 个字符")
+    return terms
+
+
+def _fts_phrase(term: str) -> str:
+    """
+    转换为 FTS5 短语 (小数点等分隔符在短语内按相邻词匹配)
+
+    2-6 个字符的前缀有前缀索引; 单个字符的前缀几乎匹配全部记录, 按完整词匹配
+    """
+    phrase = '"' + term.replace('"', '""') + '"'
+    return phrase + "*" if len(term) > 1 else phrase
+
+
+def period_tokens(start: datetime, end: datetime) -> Optional[List[str]]:
+    """
+    把时间范围 [start, end) 覆盖的日期拆分为最少的年/月/日分桶词
+
+    Args:
+        start: 起始时间 (包含)
+        end: 结束时间 (不包含)
+
+    Returns:
+        Optional[List[str]]: 分桶词, 词数超过上限时为 None
+    """
+    try:
+        day = start.date()
+        last = (end - timedelta(microseconds=1)).date()
+        tokens = []
+        while day <= last:
+            next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            if day.month == 1 and day.day == 1 and date(day.year, 12, 31) <= last:
+                tokens.append(f"y{day:%Y}")
+                day = date(day.year + 1, 1, 1)
+            elif day.day == 1 and next_month - timedelta(days=1) <= last:
+                tokens.append(f"m{day:%Y%m}")
+                day = next_month
+            else:
+                tokens.append(f"d{day:%Y%m%d}")
+                day += timedelta(days=1)
+            if len(tokens) > SEARCH_MAX_PERIOD_TOKENS:
+                return None
+    except (OverflowError, ValueError):
+        # 范围延伸到 date.max 附近
+        return None
+    return tokens
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转换为 UTC (数据库中保存的是不带时区的 UTC 时间)"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class HistorySearchService:
+    """历史记录搜索服务类"""
+
+    @staticmethod
+    def search(
+        db: Session,
+        user_id: UUID,
+        query: str,
+        calculation_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 20,
+    ) -> Tuple[List[tuple], bool]:
+        """
+        搜索用户的历史记录 (每个搜索词按前缀匹配, 多个词同时满足)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            query: 搜索字符串
+            calculation_type: 计算类型过滤
+            start: 起始时间 (包含)
+            end: 结束时间 (不包含)
+            limit: 最多返回的记录数
+
+        Returns:
+            Tuple[List[HistoryRow], bool]: (匹配的记录, 是否还有更多匹配)
+
+        Raises:
+            ValueError: 搜索词无效
+            RuntimeError: 当前数据库不支持索引搜索
+        """
+        terms = parse_terms(query)
+        dialect = db.get_bind().dialect.name
+        start, end = _naive_utc(start), _naive_utc(end)
+        if start is not None and end is not None and start >= end:
+            return [], False
+
+        if dialect == "sqlite":
+            # 在索引内完成用户、类型和词的交集, 按写入顺序倒序读取, 取够即停
+            match = [f"owner:u{UUID(str(user_id)).hex}"]
+            if calculation_type:
+                match.append('ctype:"t' + calculation_type.replace('"', '""') + '"')
+            match.extend(f"expression:{_fts_phrase(term)}" for term in terms)
+            if start is not None or end is not None:
+                # 时间范围在索引内按分桶词求交集, 精确边界仍由下面的 created_at 条件判断
+                period = HistorySearchService._period_match(db, user_id, start, end)
+                if period == "":
+                    return [], False
+                if period is not None:
+                    match.append(period)
+
+            fts = table("history_fts", column("rowid"))
+            statement = (
+                select(*HISTORY_ROW_COLUMNS)
+                .join_from(fts, History, literal_column("history.rowid") == fts.c.rowid)
+                .where(text("history_fts MATCH :match").bindparams(match=" AND ".join(match)))
+                .where(History.user_id == user_id)
+                .order_by(fts.c.rowid.desc())
+            )
+        elif dialect == "postgresql":
+            # 三元组索引支持任意位置的子串匹配; 转义 LIKE 通配符
+            statement = select(*HISTORY_ROW_COLUMNS).where(History.user_id == user_id)
+            for term in terms:
+                escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                pattern = f"%{escaped}%"
+                # 短表达式在 history 表中, 长表达式在 history_texts 中 (各自有三元组索引)
+                texts = select(HistoryText.id).where(HistoryText.content.ilike(pattern))
+                statement = statement.where(
+                    or_(
+                        History.expression_inline.ilike(pattern),
+                        History.expression_id.in_(texts),
+                    )
+                )
+            if calculation_type:
+                statement = statement.where(History.calculation_type == calculation_type)
+            statement = statement.order_by(History.created_at.desc(), History.id.desc())
+        else:
+            raise RuntimeError("当前数据库不支持历史记录搜索")
+
+        # 已清空但尚未被后台任务删除的记录
+        cleared_seq, _ = cleared_watermark(db, user_id)
+        statement = statement.where(*visible_history(cleared_seq))
+        if start is not None:
+            statement = statement.where(History.created_at >= start)
+        if end is not None:
+            statement = statement.where(History.created_at < end)
+
+        rows = db.execute(statement.limit(limit + 1)).all()
+        return [to_row(row) for row in rows[:limit]], len(rows) > limit
+
+    @staticmethod
+    def _period_match(
+        db: Session, user_id: UUID, start: Optional[datetime], end: Optional[datetime]
+    ) -> Optional[str]:
+        """
+        生成时间范围的 FTS5 过滤条件
+
+        未指定的一端取该用户最早/最晚的记录时间 (按 (user_id, created_at) 索引读取)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            start: 起始时间 (包含)
+            end: 结束时间 (不包含)
+
+        Returns:
+            Optional[str]: 过滤条件; 范围内没有记录时为空字符串, 分桶词过多时为 None
+        """
+        # min/max 分开查询, SQLite 才能各自只读取索引的一端
+        bound = History.user_id == user_id
+        if start is None:
+            start = db.execute(select(func.min(History.created_at)).where(bound)).scalar()
+        if end is None:
+            last = db.execute(select(func.max(History.created_at)).where(bound)).scalar()
+            end = last + timedelta(microseconds=1) if last is not None else None
+        if start is None or end is None or start >= end:
+            return ""
+
+        tokens = period_tokens(start, end)
+        if tokens is None:
+            return None
+        return "period:(" + " OR ".join(tokens) + ")"
@@ -0,0 +1,251 @@
+"""
+历史记录存储格式
+- 可由浮点数精确还原的数值结果 (repr(float(result)) == result) 保存在 result_value 中
+- 不超过 HISTORY_TEXT_INLINE_MAX 字节的表达式和文本结果直接保存在 history 表中
+- 更长的文本按内容去重保存在 history_texts 中, 历史记录只保存整数ID引用
+
+短文本的引用 (整数ID) 与文本本身大小相当, 去重节省不了空间, 读写时还要多一次查找,
+因此只对长文本去重。写入前用 to_storage 把包含 expression/result 文本的插入字段转换为存储字段,
+按列读取时查询 HISTORY_ROW_COLUMNS, 再用 to_row 还原为原来的字段; 删除记录后用 release_texts
+清理不再被引用的文本
+"""
+import hashlib
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import History, HistoryText
+
+# 直接保存在 history 表中的文本的最大长度 (UTF-8 字节), 更长的文本去重保存
+HISTORY_TEXT_INLINE_MAX = int(os.getenv("HISTORY_TEXT_INLINE_MAX", "64"))
+
+# 每条查询/插入语句中的最大文本数 (不超过 SQLite 的参数数量上限)
+HISTORY_TEXT_CHUNK = 500
+
+# 支持 INSERT ... ON CONFLICT DO NOTHING 的方言
+_UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+class HistoryRow(NamedTuple):
+    """按列读取的历史记录 (结果已还原, 可直接用于响应模型和游标)"""
+
+    id: UUID
+    expression: str
+    result: Optional[str]
+    calculation_type: str
+    created_at: datetime
+
+
+# 按列读取历史记录时查询的列 (配合 to_row 使用)
+HISTORY_ROW_COLUMNS = (
+    History.id,
+    History.expression.label("expression"),
+    History.result_text.label("result_text"),
+    History.result_value,
+    History.calculation_type,
+    History.created_at,
+)
+
+
+def split_result(result: Optional[str]) -> Tuple[Optional[str], Optional[float]]:
+    """
+    把结果文本拆分为存储形式
+
+    Args:
+        result: 计算结果文本
+
+    Returns:
+        Tuple[Optional[str], Optional[float]]: (需要保存的文本, 数值); 两者最多一个不为空
+    """
+    if result is None:
+        return None, None
+    try:
+        value = float(result)
+    except ValueError:
+        return result, None
+    # 只有能原样还原的文本才按数值保存 (整数 "4" 与 "4.0" 不同, 按文本保存)
+    if math.isfinite(value) and repr(value) == result:
+        return None, value
+    return result, None
+
+
+def format_result(text: Optional[str], value: Optional[float]) -> Optional[str]:
+    """
+    从存储形式还原结果文本
+
+    Args:
+        text: 文本结果
+        value: 数值结果
+
+    Returns:
+        Optional[str]: 结果文本
+    """
+    if text is not None:
+        return text
+    return repr(value) if value is not None else None
+
+
+def to_row(row) -> HistoryRow:
+    """
+    把按 HISTORY_ROW_COLUMNS 查询的行转换为 HistoryRow
+
+    Args:
+        row: 查询结果行
+
+    Returns:
+        HistoryRow: 历史记录
+    """
+    # 按位置解包并内联 format_result (导出和搜索对每一行调用)
+    record_id, expression, text, value, calculation_type, created_at = row
+    return HistoryRow(
+        record_id,
+        expression,
+        text if text is not None else (repr(value) if value is not None else None),
+        calculation_type,
+        created_at,
+    )
+
+
+def _inline(text: str) -> bool:
+    """文本是否直接保存在 history 表中"""
+    return len(text) * 4 <= HISTORY_TEXT_INLINE_MAX or (
+        len(text.encode("utf-8")) <= HISTORY_TEXT_INLINE_MAX
+    )
+
+
+def _digest(text: str) -> bytes:
+    """文本摘要 (SHA-256 的前 16 字节)"""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:16]
+
+
+def intern_texts(db: Session, texts: Iterable[str]) -> Dict[str, int]:
+    """
+    查找或插入文本, 返回文本到ID的映射 (在调用方的事务中执行)
+
+    已存在的文本按摘要的唯一索引查找; 新文本用 INSERT ... ON CONFLICT DO NOTHING 插入,
+    并发插入相同文本时以先提交的为准。查找到的文本行加共享锁 (PostgreSQL 的 FOR KEY SHARE;
+    SQLite 中调用方已先分配变更序号, 持有写锁), 提交前不会被 release_texts 删除
+
+    Args:
+        db: 数据库会话
+        texts: 文本 (可重复)
+
+    Returns:
+        Dict[str, int]: 文本到 history_texts.id 的映射
+    """
+    by_digest = {_digest(text): text for text in set(texts)}
+    digests = list(by_digest)
+    if not digests:
+        return {}
+
+    def lookup(keys: List[bytes]) -> Dict[bytes, int]:
+        found = {}
+        for start in range(0, len(keys), HISTORY_TEXT_CHUNK):
+            chunk = keys[start:start + HISTORY_TEXT_CHUNK]
+            found.update(
+                db.execute(
+                    select(HistoryText.digest, HistoryText.id)
+                    .where(HistoryText.digest.in_(chunk))
+                    .with_for_update(read=True, key_share=True)
+                ).all()
+            )
+        return found
+
+    ids = lookup(digests)
+    missing = [digest for digest in digests if digest not in ids]
+    if missing:
+        insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        for start in range(0, len(missing), HISTORY_TEXT_CHUNK):
+            values = [
+                {"digest": digest, "content": by_digest[digest]}
+                for digest in missing[start:start + HISTORY_TEXT_CHUNK]
+            ]
+            if insert is not None:
+                statement = insert(HistoryText).on_conflict_do_nothing(
+                    index_elements=["digest"]
+                )
+            else:
+                statement = HistoryText.__table__.insert()
+            db.execute(statement, values)
+        ids.update(lookup(missing))
+
+    return {by_digest[digest]: text_id for digest, text_id in ids.items()}
+
+
+def release_texts(db: Session, text_ids: Iterable[Optional[int]]) -> int:
+    """
+    删除不再被任何历史记录引用的文本 (在调用方的事务中执行, 删除历史记录之后调用)
+
+    同一文本可能被其他记录 (包括其他用户的记录) 引用, 按 expression_id/result_id 的索引
+    逐个检查。并发写入的新记录引用了其中的文本时 (外键冲突) 保留这一批, 由之后的删除再清理
+
+    Args:
+        db: 数据库会话
+        text_ids: 被删除的记录引用的文本ID (可包含 None 和重复值)
+
+    Returns:
+        int: 删除的文本数
+    """
+    ids = sorted({text_id for text_id in text_ids if text_id is not None})
+    deleted = 0
+    for start in range(0, len(ids), HISTORY_TEXT_CHUNK):
+        statement = delete(HistoryText).where(
+            HistoryText.id.in_(ids[start:start + HISTORY_TEXT_CHUNK]),
+            ~exists().where(History.expression_id == HistoryText.id),
+            ~exists().where(History.result_id == HistoryText.id),
+        )
+        try:
+            # 保存点之前先写入会话中待删除的记录
+            with db.begin_nested():
+                deleted += db.execute(
+                    statement.execution_options(synchronize_session=False)
+                ).rowcount
+        except IntegrityError:
+            continue
+    return deleted
+
+
+def to_storage(db: Session, mappings: List[dict]) -> List[dict]:
+    """
+    把包含 expression/result 文本的插入字段转换为存储字段 (在调用方的事务中执行)
+
+    全部为短文本时不查询数据库; 返回新的字段字典, 不修改 mappings (写入失败重试时可以再次转换)
+
+    Args:
+        db: 数据库会话
+        mappings: 历史记录插入字段
+
+    Returns:
+        List[dict]: 包含 expression/expression_id、result/result_id/result_value 的插入字段
+    """
+    splits = [split_result(mapping.get("result")) for mapping in mappings]
+    ids = intern_texts(
+        db,
+        [mapping["expression"] for mapping in mappings if not _inline(mapping["expression"])]
+        + [text for text, _ in splits if text is not None and not _inline(text)],
+    )
+
+    stored = []
+    for mapping, (text, value) in zip(mappings, splits):
+        values = {
+            key: item for key, item in mapping.items() if key not in ("expression", "result")
+        }
+        expression = mapping["expression"]
+        inline = _inline(expression)
+        # 每条记录的字段集合相同 (配合 render_nulls, 批量插入合并为一条 executemany)
+        values["expression_inline"] = expression if inline else None
+        values["expression_id"] = None if inline else ids[expression]
+        inline = text is None or _inline(text)
+        values["result_inline"] = text if inline else None
+        values["result_id"] = None if inline else ids[text]
+        values["result_value"] = value
+        stored.append(values)
+    return stored
@@ -0,0 +1,287 @@
+"""
+历史记录增量同步
+每个用户维护单调递增的变更序号 (users.history_seq): 新增的历史记录和删除标记都分配序号,
+客户端记住已同步到的序号, 只拉取之后的变更; 离线创建的记录按客户端ID去重上传
+"""
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import History, HistoryArchiveSegment, HistoryTombstone, User
+from .history_storage import to_storage
+from .user_stats import bump_history_counts
+
+# 单次拉取返回的最大变更数
+SYNC_MAX_CHANGES = 1000
+
+
+def allocate_change_seq(db: Session, user_id: UUID, count: int = 1, counter=None) -> int:
+    """
+    为用户分配连续的变更序号 (在调用方的事务中执行)
+
+    递增 users.history_seq 会对用户行加锁直到事务提交, 同一用户的事务按序号顺序提交,
+    客户端不会在拉取到较大序号之后才看到较小序号的变更
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        count: 需要的序号数量
+        counter: 递增的序号列 (默认 User.history_seq; AI 使用记录为 User.ai_usage_seq)
+
+    Returns:
+        int: 分配的第一个序号
+    """
+    counter = counter if counter is not None else User.history_seq
+    last = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        # 变更序号不是用户资料修改, 保持 updated_at 不变
+        .values({counter: counter + count, User.updated_at: User.updated_at})
+        .returning(counter)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    return last - count + 1
+
+
+def assign_change_seq(db: Session, mappings: List[dict], counter=None) -> None:
+    """
+    为待插入的记录字段按用户分配变更序号
+
+    Args:
+        db: 数据库会话
+        mappings: 插入字段列表 (原地写入 change_seq)
+        counter: 递增的序号列 (默认 User.history_seq)
+    """
+    by_user: dict = {}
+    for values in mappings:
+        by_user.setdefault(values["user_id"], []).append(values)
+    for user_id, records in by_user.items():
+        first = allocate_change_seq(db, user_id, len(records), counter)
+        for offset, values in enumerate(records):
+            values["change_seq"] = first + offset
+
+
+def cleared_watermark(db: Session, user_id: UUID) -> Tuple[int, Optional[datetime]]:
+    """
+    读取用户的清空水位 (按主键读取用户行)
+
+    清空后物理删除在后台分批进行, 读取时按水位隐藏尚未删除的数据
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+
+    Returns:
+        Tuple[int, Optional[datetime]]: (清空序号, 清空时间), 从未清空时为 (0, None)
+    """
+    row = db.execute(
+        select(User.history_cleared_seq, User.history_cleared_at).where(User.id == user_id)
+    ).first()
+    return (row[0] or 0, row[1]) if row is not None else (0, None)
+
+
+def visible_history(cleared_seq: int) -> list:
+    """未被清空的历史记录的过滤条件 (从未清空时为空)"""
+    return [History.change_seq > cleared_seq] if cleared_seq else []
+
+
+def visible_segments(cleared_at: Optional[datetime]) -> list:
+    """未被清空的归档段的过滤条件 (从未清空时为空)"""
+    return [HistoryArchiveSegment.created_at > cleared_at] if cleared_at is not None else []
+
+
+def record_tombstones(db: Session, user_id: UUID, history_ids: Iterable[Optional[UUID]]) -> None:
+    """
+    记录删除标记 (在调用方的事务中执行)
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        history_ids: 被删除的历史记录ID, None 表示清空全部
+    """
+    history_ids = list(history_ids)
+    if not history_ids:
+        return
+
+    if None in history_ids:
+        # 清空会覆盖之前的所有删除标记
+        db.query(HistoryTombstone).filter(HistoryTombstone.user_id == user_id).delete(
+            synchronize_session=False
+        )
+
+    first = allocate_change_seq(db, user_id, len(history_ids))
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(
+        HistoryTombstone,
+        [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "history_id": history_id,
+                "change_seq": first + offset,
+                "deleted_at": now,
+            }
+            for offset, history_id in enumerate(history_ids)
+        ],
+    )
+
+
+class HistorySyncService:
+    """历史记录同步服务类"""
+
+    @staticmethod
+    def current_seq(db: Session, user_id: UUID) -> int:
+        """
+        获取用户当前的变更序号 (按主键读取用户行, 不扫描历史记录)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            int: 当前变更序号
+        """
+        return db.query(User.history_seq).filter(User.id == user_id).scalar() or 0
+
+    @staticmethod
+    def get_changes(
+        db: Session, user_id: UUID, since: int, limit: int = SYNC_MAX_CHANGES
+    ) -> Tuple[List[dict], int, bool]:
+        """
+        获取序号大于 since 的变更 (按序号升序)
+
+        已归档的记录保留原来的序号, 与热表中的记录一起返回 (首次同步也能拿到全部记录)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            since: 客户端已同步到的序号
+            limit: 最多返回的变更数
+
+        Returns:
+            Tuple[List[dict], int, bool]: (变更列表, 下次拉取使用的 since, 是否还有更多变更)
+        """
+        current = HistorySyncService.current_seq(db, user_id)
+        if since >= current:
+            return [], current, False
+
+        # history_archive 导入了本模块, 在函数内导入避免循环导入
+        from .history_archive import archived_changes
+
+        cleared_seq, cleared_at = cleared_watermark(db, user_id)
+        after_seq = max(since, cleared_seq)
+        records = (
+            db.query(History)
+            .filter(History.user_id == user_id, History.change_seq > after_seq)
+            .order_by(History.change_seq)
+            .limit(limit + 1)
+            .all()
+        )
+        # 先查热表再查归档: 两次查询之间被归档的记录只会重复, 不会遗漏
+        seen = {record.id for record in records}
+        records += [
+            record
+            for record in archived_changes(db, user_id, after_seq, limit + 1, cleared_at)
+            if record.id not in seen
+        ]
+        tombstones = (
+            db.query(HistoryTombstone)
+            .filter(HistoryTombstone.user_id == user_id, HistoryTombstone.change_seq > since)
+            .order_by(HistoryTombstone.change_seq)
+            .limit(limit + 1)
+            .all()
+        )
+
+        changes = [
+            {
+                "op": "upsert",
+                "seq": record.change_seq,
+                "id": record.id,
+                "client_id": record.client_id,
+                "expression": record.expression,
+                "result": record.result,
+                "calculation_type": record.calculation_type,
+                "created_at": record.created_at,
+            }
+            for record in records
+        ] + [
+            {
+                "op": "delete" if tombstone.history_id is not None else "clear",
+                "seq": tombstone.change_seq,
+                "id": tombstone.history_id,
+            }
+            for tombstone in tombstones
+        ]
+        changes.sort(key=lambda change: change["seq"])
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        # 读取 current 之后提交的变更也可能已经返回, 取两者的较大值
+        next_since = changes[-1]["seq"] if has_more else max(current, changes[-1]["seq"])
+        return changes, next_since, has_more
+
+    @staticmethod
+    def upload(db: Session, user_id: UUID, items: List[dict]) -> List[Tuple[UUID, bool]]:
+        """
+        上传离线创建的历史记录 (按客户端ID去重, 一次批量插入)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            items: 记录字段 (client_id、expression、result、calculation_type、created_at)
+
+        Returns:
+            List[Tuple[UUID, bool]]: 与 items 顺序一致的 (服务端记录ID, 是否新建)
+        """
+        for attempt in range(2):
+            client_ids = {item["client_id"] for item in items}
+            existing = dict(
+                db.query(History.client_id, History.id).filter(
+                    History.user_id == user_id, History.client_id.in_(client_ids)
+                )
+            )
+
+            mappings = {}
+            for item in items:
+                if item["client_id"] in existing or item["client_id"] in mappings:
+                    continue
+                mappings[item["client_id"]] = {
+                    "id": uuid.uuid4(),
+                    "user_id": user_id,
+                    "client_id": item["client_id"],
+                    "expression": item["expression"],
+                    "result": item["result"],
+                    "calculation_type": item["calculation_type"],
+                    "created_at": item.get("created_at") or datetime.utcnow(),
+                }
+
+            try:
+                if mappings:
+                    assign_change_seq(db, list(mappings.values()))
+                    bump_history_counts(db, mappings.values())
+                    db.bulk_insert_mappings(
+                        History, to_storage(db, list(mappings.values())), render_nulls=True
+                    )
+                db.commit()
+                break
+            except IntegrityError:
+                # 并发上传了相同的客户端ID, 重新去重一次
+                db.rollback()
+                if attempt:
+                    raise
+
+        created = set()
+        results = []
+        for item in items:
+            client_id = item["client_id"]
+            if client_id in existing:
+                results.append((existing[client_id], False))
+            else:
+                results.append((mappings[client_id]["id"], client_id not in created))
+                created.add(client_id)
+        return results
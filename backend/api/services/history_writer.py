@@ -0,0 +1,363 @@
+"""
+历史记录写后缓冲 (write-behind)
+可选地把历史记录和 AI 使用记录放入内存队列, 由后台线程按数量或时间批量插入,
+请求无需等待数据库提交; 队列有界, 写满时阻塞等待, 超时后退回同步写入
+
+记录入队后即向用户返回成功: 一批记录重试 HISTORY_FLUSH_RETRIES 次后仍写入失败
+(例如数据库长时间不可用) 时该批记录被丢弃, 计入统计中的 failed / failed_batches;
+进程被强制终止时队列中尚未提交的记录也会丢失
+"""
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from ..models import AIUsage, History, User
+from .history_storage import to_storage
+from .history_sync import assign_change_seq
+from .user_stats import bump_ai_usage_counts, bump_history_counts
+
+# 写入模式: sync (请求内同步提交) / buffered (写后缓冲, 后台批量提交)
+HISTORY_WRITE_MODE = os.getenv("HISTORY_WRITE_MODE", "sync")
+
+# 缓冲队列容量 (条)
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "10000"))
+
+# 单次批量插入的最大条数 (达到后立即提交)
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "500"))
+
+# 最长提交间隔 (秒): 队列中最早的记录等待超过该时间后提交
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+
+# 队列写满时的最长等待时间 (秒), 超时后由请求线程同步写入
+HISTORY_ENQUEUE_TIMEOUT = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT", "1.0"))
+
+# 批量插入失败时的重试次数
+HISTORY_FLUSH_RETRIES = 3
+
+# 关闭时等待队列清空的最长时间 (秒)
+HISTORY_SHUTDOWN_TIMEOUT = 30.0
+
+
+class HistoryWriter:
+    """
+    写后缓冲写入器
+
+    队列中的每一项为 (模型类, 插入字段, 入队时间), 字段中包含客户端生成的 UUID 主键,
+    因此调用方在入队后即可返回记录ID
+    """
+
+    def __init__(
+        self,
+        capacity: int = HISTORY_BUFFER_SIZE,
+        batch_size: int = HISTORY_FLUSH_BATCH,
+        interval: float = HISTORY_FLUSH_INTERVAL,
+        enqueue_timeout: float = HISTORY_ENQUEUE_TIMEOUT,
+    ):
+        self.capacity = max(capacity, 1)
+        self.batch_size = max(batch_size, 1)
+        self.interval = max(interval, 0.0)
+        self.enqueue_timeout = max(enqueue_timeout, 0.0)
+        self._queue: "queue.Queue[Tuple[Any, Dict[str, Any], float]]" = queue.Queue(self.capacity)
+        # 已入队但尚未提交的记录 (按主键), 用于读取刚写入的记录
+        self._pending: Dict[UUID, Tuple[Any, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self.failed_batches = 0
+        self.last_error: Optional[str] = None
+        self.last_failure_at: Optional[float] = None
+        self.retries = 0
+        self.backpressure = 0
+        self.sync_fallbacks = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_size = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        """启动后台提交线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = HISTORY_SHUTDOWN_TIMEOUT) -> None:
+        """
+        停止后台线程 (先提交队列中剩余的全部记录)
+
+        Args:
+            timeout: 等待队列清空的最长时间 (秒)
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, model, values: Dict[str, Any]) -> bool:
+        """
+        记录入队
+
+        Args:
+            model: 模型类 (History / AIUsage)
+            values: 插入字段 (必须包含主键 id)
+
+        Returns:
+            bool: 是否入队成功; 写入器未运行或队列写满等待超时时返回 False,
+                调用方应同步写入
+        """
+        if self._thread is None or self._stopping.is_set():
+            return False
+
+        # 先登记为待提交, 避免后台线程在登记之前就完成提交
+        with self._lock:
+            self._pending[values["id"]] = (model, values)
+
+        item = (model, values, time.monotonic())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # 背压: 阻塞请求线程, 直到后台线程腾出空间
+            with self._lock:
+                self.backpressure += 1
+            try:
+                self._queue.put(item, timeout=self.enqueue_timeout)
+            except queue.Full:
+                with self._lock:
+                    self._pending.pop(values["id"], None)
+                    self.sync_fallbacks += 1
+                return False
+
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def pending(self, model, record_id: UUID) -> Optional[Dict[str, Any]]:
+        """
+        读取已入队但尚未提交的记录
+
+        Args:
+            model: 模型类
+            record_id: 记录ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 插入字段, 不存在或已提交时返回None
+        """
+        with self._lock:
+            entry = self._pending.get(record_id)
+        if entry is None or entry[0] is not model:
+            return None
+        return entry[1]
+
+    def flush(self, timeout: float = HISTORY_SHUTDOWN_TIMEOUT) -> bool:
+        """
+        等待当前已入队的记录全部提交 (删除或清空历史记录之前调用)
+
+        Args:
+            timeout: 最长等待时间 (秒)
+
+        Returns:
+            bool: 是否在超时前全部提交
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def _run(self) -> None:
+        """后台线程主循环: 按数量或时间收集一批记录并批量插入"""
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+            elif self._stopping.is_set():
+                break
+
+    def _collect(self) -> List[Tuple[Any, Dict[str, Any], float]]:
+        """
+        收集一批记录
+
+        等待第一条记录后继续收集, 直到达到批量大小或第一条记录等待满提交间隔;
+        关闭过程中不再等待, 直接取出队列中的记录
+
+        Returns:
+            List: 本批记录
+        """
+        try:
+            first = self._queue.get(timeout=self.interval or 0.05)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first[2] + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stopping.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Tuple[Any, Dict[str, Any], float]]) -> None:
+        """
+        批量插入一批记录 (一个事务, 失败时重试)
+
+        Args:
+            batch: 本批记录
+        """
+        from ..utils.database import SessionLocal
+
+        by_model: Dict[Any, List[Dict[str, Any]]] = {}
+        for model, values, _ in batch:
+            by_model.setdefault(model, []).append(values)
+
+        succeeded = False
+        error = None
+        for attempt in range(HISTORY_FLUSH_RETRIES + 1):
+            db = SessionLocal()
+            try:
+                for model, mappings in by_model.items():
+                    if model is History:
+                        assign_change_seq(db, mappings)
+                        bump_history_counts(db, mappings)
+                        # 转换为新的字段字典, 重试时仍从原始字段转换
+                        mappings = to_storage(db, mappings)
+                    elif model is AIUsage:
+                        assign_change_seq(db, mappings, User.ai_usage_seq)
+                        bump_ai_usage_counts(db, mappings)
+                    # render_nulls: 空值也写入语句, 所有记录合并为一条 executemany
+                    db.bulk_insert_mappings(model, mappings, render_nulls=True)
+                db.commit()
+                succeeded = True
+                break
+            except Exception as e:
+                db.rollback()
+                if attempt == HISTORY_FLUSH_RETRIES:
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"⚠️  历史记录批量写入失败, 丢弃 {len(batch)} 条: {error}")
+                    break
+                with self._lock:
+                    self.retries += 1
+                time.sleep(min(0.1 * 2**attempt, 2.0))
+            finally:
+                db.close()
+
+        now = time.monotonic()
+        lag = now - min(enqueued_at for _, _, enqueued_at in batch)
+        with self._lock:
+            for _, values, _ in batch:
+                self._pending.pop(values["id"], None)
+            if succeeded:
+                self.written += len(batch)
+            else:
+                # 丢弃的记录不会再写入, 通过统计暴露给监控
+                self.failed += len(batch)
+                self.failed_batches += 1
+                self.last_error = error
+                self.last_failure_at = time.time()
+            self.flushes += 1
+            self.last_flush_at = time.time()
+            self.last_flush_size = len(batch)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._flushed.notify_all()
+
+    def stats(self) -> dict:
+        """
+        获取写入器统计
+
+        Returns:
+            dict: 队列长度、提交次数、写入/失败 (丢弃) /回退条数、最近一次失败和提交延迟
+        """
+        with self._lock:
+            return {
+                "mode": "buffered",
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queued": self._queue.qsize(),
+                "pending": len(self._pending),
+                "capacity": self.capacity,
+                "batch_size": self.batch_size,
+                "interval_seconds": self.interval,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "failed_batches": self.failed_batches,
+                "last_error": self.last_error,
+                "last_failure_at": self.last_failure_at,
+                "retries": self.retries,
+                "flushes": self.flushes,
+                "avg_batch_size": (
+                    (self.written + self.failed) / self.flushes if self.flushes else 0.0
+                ),
+                "backpressure": self.backpressure,
+                "sync_fallbacks": self.sync_fallbacks,
+                "last_flush_at": self.last_flush_at,
+                "last_flush_size": self.last_flush_size,
+                "last_flush_lag_ms": self.last_lag * 1000,
+                "max_flush_lag_ms": self.max_lag * 1000,
+            }
+
+
+# 全局写入器 (HISTORY_WRITE_MODE=buffered 时启用)
+_writer: Optional[HistoryWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_history_writer() -> Optional[HistoryWriter]:
+    """
+    获取全局写后缓冲写入器
+
+    Returns:
+        Optional[HistoryWriter]: 未启用写后缓冲时返回None
+    """
+    global _writer
+    if HISTORY_WRITE_MODE != "buffered":
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = HistoryWriter()
+    return _writer
+
+
+def start_history_writer() -> None:
+    """启动写后缓冲线程 (应用启动时调用)"""
+    writer = get_history_writer()
+    if writer is not None:
+        writer.start()
+
+
+def shutdown_history_writer() -> None:
+    """提交剩余记录并停止写后缓冲线程 (应用关闭时调用)"""
+    if _writer is not None:
+        _writer.shutdown()
+
+
+def history_writer_stats() -> dict:
+    """
+    获取写入器统计
+
+    Returns:
+        dict: 写入器统计信息
+    """
+    writer = get_history_writer()
+    if writer is None:
+        return {"mode": "sync"}
+    return writer.stats()
@@ -0,0 +1,419 @@
+"""
+矩阵计算
+表达式支持矩阵字面量 ([[1, 2], [3, 4]])、矩阵乘法 (@) 和线性代数函数,
+计算使用 NumPy, 结果以紧凑的数组编码 (形状 + 类型 + base64 数据) 返回
+"""
+import ast
+import base64
+import os
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .expression import (
+    CostAnalyzer,
+    CostEstimate,
+    ExpressionCostError,
+    ExpressionEngine,
+    _Bound,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 矩阵表达式允许的最大 AST 节点数 (字面量中每个元素占一个节点)
+MATRIX_MAX_NODES = int(os.getenv("CALC_MATRIX_MAX_NODES", "20000"))
+
+# 矩阵结果 (及中间结果) 允许的最大元素数
+MATRIX_MAX_ELEMENTS = int(os.getenv("CALC_MATRIX_MAX_ELEMENTS", "1000000"))
+
+# 矩阵表达式的运算预算 (按浮点运算次数估算)
+MATRIX_MAX_OPERATIONS = int(os.getenv("CALC_MATRIX_MAX_OPERATIONS", "200000000"))
+
+# 元素数不超过该值的实数结果同时以嵌套列表返回
+MATRIX_INLINE_ELEMENTS = int(os.getenv("CALC_MATRIX_INLINE_ELEMENTS", "256"))
+
+# 数组编码支持的元素类型 (均为小端)
+ARRAY_DTYPES = {"float64": "<f8", "complex128": "<c16"}
+
+# 二进制编码头: 魔数、类型编号、维数
+_BINARY_MAGIC = b"MX"
+_BINARY_HEADER = struct.Struct("<2sBB")
+_BINARY_DTYPE_CODES = {"float64": 1, "complex128": 2}
+
+
+class _ArrayBound(_Bound):
+    """矩阵/向量节点的静态上界 (记录形状)"""
+
+    __slots__ = ("shape",)
+
+    def __init__(self, shape: Tuple[int, ...]):
+        super().__init__(False, 1024.0)
+        self.shape = shape
+
+
+def _elements(shape: Tuple[int, ...]) -> int:
+    """形状对应的元素数"""
+    count = 1
+    for size in shape:
+        count *= size
+    return count
+
+
+def _shape_of(bound: _Bound) -> Tuple[int, ...]:
+    """上界对应的形状 (标量为空元组)"""
+    return bound.shape if isinstance(bound, _ArrayBound) else ()
+
+
+def _broadcast(left: Tuple[int, ...], right: Tuple[int, ...]) -> Tuple[int, ...]:
+    """按 NumPy 广播规则合并两个形状"""
+    ndim = max(len(left), len(right))
+    left = (1,) * (ndim - len(left)) + left
+    right = (1,) * (ndim - len(right)) + right
+    shape = []
+    for a, b in zip(left, right):
+        if a != b and 1 not in (a, b):
+            raise ValueError("矩阵维度不匹配, 无法逐元素运算")
+        shape.append(max(a, b))
+    return tuple(shape)
+
+
+def _square(shape: Tuple[int, ...], name: str) -> int:
+    """校验方阵并返回阶数"""
+    if len(shape) != 2 or shape[0] != shape[1]:
+        raise ValueError(f"{name} 需要方阵参数")
+    return shape[0]
+
+
+class MatrixCostAnalyzer(CostAnalyzer):
+    """
+    矩阵表达式的静态分析
+
+    在标量分析的基础上跟踪矩阵形状, 编译阶段即可发现维度不匹配,
+    并按形状估算矩阵运算的浮点运算次数和结果元素数
+    """
+
+    def __init__(self, max_elements: int = MATRIX_MAX_ELEMENTS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_elements = max_elements
+
+    def _array(self, estimate: CostEstimate, shape: Tuple[int, ...]) -> _Bound:
+        """构造矩阵上界并检查元素数"""
+        if not shape:
+            return _Bound(False, 1024.0)
+        if len(shape) > 2:
+            raise ValueError("只支持向量和二维矩阵")
+        if _elements(shape) > self.max_elements:
+            raise ExpressionCostError(f"矩阵过大 (最多{self.max_elements}个元素)")
+        return _ArrayBound(shape)
+
+    def _visit(self, node: ast.AST, estimate: CostEstimate) -> _Bound:
+        if isinstance(node, ast.List):
+            if not node.elts:
+                raise ValueError("矩阵不能为空")
+            shapes = {_shape_of(self._visit(element, estimate)) for element in node.elts}
+            if len(shapes) != 1:
+                raise ValueError("矩阵的每一行长度必须相同")
+            shape = (len(node.elts),) + shapes.pop()
+            self._charge(estimate, _elements(shape))
+            return self._array(estimate, shape)
+        return super()._visit(node, estimate)
+
+    def _unary(self, estimate: CostEstimate, op: ast.unaryop, operand: _Bound) -> _Bound:
+        if isinstance(operand, _ArrayBound):
+            self._charge(estimate, _elements(operand.shape))
+            return operand
+        return super()._unary(estimate, op, operand)
+
+    def _binary(
+        self, estimate: CostEstimate, op: ast.operator, left: _Bound, right: _Bound
+    ) -> _Bound:
+        if isinstance(op, ast.MatMult):
+            return self._matmul(estimate, _shape_of(left), _shape_of(right))
+        if isinstance(left, _ArrayBound) or isinstance(right, _ArrayBound):
+            shape = _broadcast(_shape_of(left), _shape_of(right))
+            self._charge(estimate, _elements(shape))
+            return self._array(estimate, shape)
+        return super()._binary(estimate, op, left, right)
+
+    def _matmul(
+        self, estimate: CostEstimate, left: Tuple[int, ...], right: Tuple[int, ...]
+    ) -> _Bound:
+        """矩阵乘法的形状和代价 (与 numpy.matmul 的一维/二维规则一致)"""
+        if not left or not right:
+            raise ValueError("矩阵乘法 @ 的操作数必须是向量或矩阵")
+        rows = left[:-1]
+        columns = right[1:] if len(right) == 2 else ()
+        inner = right[0]
+        if left[-1] != inner:
+            raise ValueError(
+                f"矩阵维度不匹配: {'x'.join(map(str, left))} @ {'x'.join(map(str, right))}"
+            )
+        shape = rows + columns
+        self._charge(estimate, 2 * _elements(shape) * inner)
+        return self._array(estimate, shape)
+
+    def _call(self, estimate: CostEstimate, name: str, args: List[_Bound]) -> _Bound:
+        shapes = [_shape_of(arg) for arg in args]
+
+        if name in LINALG_FUNCTIONS:
+            expected = 2 if name == "solve" else 1
+            if len(args) != expected:
+                raise ValueError(f"{name} 需要{expected}个参数")
+            if name == "transpose":
+                self._charge(estimate, _elements(shapes[0]))
+                return self._array(estimate, shapes[0][::-1])
+            n = _square(shapes[0], name)
+            # 分解类运算约为 n^3 次浮点运算 (特征值求解的常数更大)
+            self._charge(estimate, (10 if name == "eig" else 1) * n**3)
+            if name == "det":
+                return self._array(estimate, ())
+            if name == "eig":
+                return self._array(estimate, (n,))
+            if name == "solve":
+                if not shapes[1] or len(shapes[1]) > 2 or shapes[1][0] != n:
+                    raise ValueError("solve(A, b) 中 b 的行数必须与 A 的阶数相同")
+                self._charge(estimate, 2 * n * _elements(shapes[1]))
+                return self._array(estimate, shapes[1])
+            return self._array(estimate, shapes[0])
+
+        if name == "pow" and len(args) != 2:
+            raise ValueError("矩阵表达式中 pow() 只支持两个参数 (不支持模幂)")
+
+        if any(shapes):
+            # 标量函数对矩阵逐元素计算
+            shape = ()
+            for arg_shape in shapes:
+                shape = _broadcast(shape, arg_shape)
+            self._charge(estimate, _elements(shape))
+            return self._array(estimate, shape)
+
+        return super()._call(estimate, name, args)
+
+
+def _matrix(rows: list) -> "np.ndarray":
+    """矩阵字面量转换为 float64 数组"""
+    return np.array(rows, dtype=np.float64)
+
+
+def _eigenvalues(matrix: "np.ndarray") -> "np.ndarray":
+    """特征值 (虚部可忽略时返回实数)"""
+    return np.real_if_close(np.linalg.eigvals(matrix))
+
+
+# 线性代数函数
+LINALG_FUNCTIONS = (
+    {
+        "det": np.linalg.det,
+        "inv": np.linalg.inv,
+        "solve": np.linalg.solve,
+        "transpose": np.transpose,
+        "eig": _eigenvalues,
+    }
+    if np is not None
+    else {}
+)
+
+
+class _MatrixRewriter(ast.NodeTransformer):
+    """将最外层的矩阵字面量改写为 _matrix([...]) 调用"""
+
+    def visit_List(self, node: ast.List) -> ast.AST:
+        node.elts = [self._visit_element(element) for element in node.elts]
+        return ast.Call(func=ast.Name(id="_matrix", ctx=ast.Load()), args=[node], keywords=[])
+
+    def _visit_element(self, node: ast.AST) -> ast.AST:
+        """嵌套的行保持为列表, 其他元素继续改写"""
+        if isinstance(node, ast.List):
+            node.elts = [self._visit_element(element) for element in node.elts]
+            return node
+        return self.visit(node)
+
+
+class MatrixExpressionEngine(ExpressionEngine):
+    """
+    矩阵表达式引擎
+
+    在标量白名单的基础上允许矩阵字面量和 @ 运算符, 标量函数替换为 NumPy ufunc
+    (对矩阵逐元素计算), 并增加 det/inv/solve/transpose/eig
+    """
+
+    def __init__(self, constants: Dict[str, float], functions: Dict[str, Callable]):
+        super().__init__(
+            constants,
+            {**functions, **LINALG_FUNCTIONS},
+            analyzer=MatrixCostAnalyzer(
+                max_nodes=MATRIX_MAX_NODES, max_operations=MATRIX_MAX_OPERATIONS
+            ),
+        )
+
+    def _transform(
+        self,
+        node: ast.AST,
+        used_functions: Dict[str, Callable],
+        variables: Tuple[str, ...] = (),
+    ) -> ast.AST:
+        if isinstance(node, ast.List):
+            return ast.List(
+                elts=[self._transform(element, used_functions, variables) for element in node.elts],
+                ctx=ast.Load(),
+            )
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.MatMult):
+            return ast.BinOp(
+                left=self._transform(node.left, used_functions, variables),
+                op=node.op,
+                right=self._transform(node.right, used_functions, variables),
+            )
+        return super()._transform(node, used_functions, variables)
+
+    def _finalize(self, tree: ast.Expression, used_functions: Dict[str, Callable]) -> ast.AST:
+        used_functions["_matrix"] = _matrix
+        return _MatrixRewriter().visit(tree)
+
+
+def evaluate_matrix(engine: MatrixExpressionEngine, expression: str) -> "np.ndarray":
+    """
+    计算矩阵表达式
+
+    Args:
+        engine: 矩阵表达式引擎
+        expression: 数学表达式字符串
+
+    Returns:
+        np.ndarray: float64 或 complex128 数组 (标量结果为零维数组)
+
+    Raises:
+        ValueError: 表达式无效、维度不匹配、矩阵奇异、超出大小限制或浮点数范围
+        ZeroDivisionError: 标量除零
+    """
+    compiled = engine.compile(expression)
+
+    try:
+        with np.errstate(all="ignore"):
+            result = compiled.evaluate()
+    except np.linalg.LinAlgError as e:
+        if "singular" in str(e).lower():
+            raise ValueError("计算错误: 矩阵是奇异的 (不可逆)")
+        raise ValueError(f"计算错误: {str(e)}")
+    except ZeroDivisionError:
+        raise ZeroDivisionError("除数不能为零")
+    except OverflowError:
+        raise ValueError("计算错误: 结果超出浮点数范围")
+    except Exception as e:
+        raise ValueError(f"计算错误: {str(e)}")
+
+    numeric = (int, float, complex, np.ndarray, np.number)
+    if isinstance(result, bool) or not isinstance(result, numeric):
+        raise ValueError("计算错误: 表达式必须返回数值或矩阵结果")
+
+    # 超出 float 范围的整数 (例如 2 ** 10000) 在转换时抛出 OverflowError
+    try:
+        result = np.asarray(result)
+        dtype = np.complex128 if np.iscomplexobj(result) else np.float64
+        return result.astype(dtype, copy=False)
+    except OverflowError:
+        raise ValueError("计算错误: 结果超出浮点数范围")
+
+
+def array_dtype(array: "np.ndarray") -> str:
+    """数组编码使用的元素类型名称"""
+    return "complex128" if np.iscomplexobj(array) else "float64"
+
+
+def encode_array(array: "np.ndarray") -> Dict[str, Any]:
+    """
+    紧凑数组编码
+
+    Args:
+        array: 计算结果
+
+    Returns:
+        Dict[str, Any]: shape (形状), dtype (元素类型), data (小端字节的 base64)
+    """
+    dtype = array_dtype(array)
+    data = np.ascontiguousarray(array, dtype=ARRAY_DTYPES[dtype]).tobytes()
+    return {
+        "shape": list(array.shape),
+        "dtype": dtype,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def inline_values(array: "np.ndarray") -> Optional[Any]:
+    """
+    小型实数结果的嵌套列表表示 (非有限值为None)
+
+    Args:
+        array: 计算结果
+
+    Returns:
+        Optional[Any]: 嵌套列表或标量, 结果过大或为复数时返回None
+    """
+    if array.size > MATRIX_INLINE_ELEMENTS or np.iscomplexobj(array):
+        return None
+    values = np.where(np.isfinite(array), array, np.nan).tolist()
+    return _replace_nan(values)
+
+
+def _replace_nan(values: Any) -> Any:
+    """将嵌套列表中的 NaN 替换为None"""
+    if isinstance(values, list):
+        return [_replace_nan(value) for value in values]
+    return None if values != values else values
+
+
+def to_binary(array: "np.ndarray") -> bytes:
+    """
+    数组的二进制编码 (用于历史记录存储)
+
+    格式: 魔数 "MX" + 类型编号 (u8) + 维数 (u8) + 各维大小 (u32) + 小端数据
+
+    Args:
+        array: 计算结果
+
+    Returns:
+        bytes: 二进制编码
+    """
+    dtype = array_dtype(array)
+    header = _BINARY_HEADER.pack(_BINARY_MAGIC, _BINARY_DTYPE_CODES[dtype], array.ndim)
+    dims = struct.pack(f"<{array.ndim}I", *array.shape)
+    return header + dims + np.ascontiguousarray(array, dtype=ARRAY_DTYPES[dtype]).tobytes()
+
+
+def from_binary(blob: bytes) -> "np.ndarray":
+    """
+    解析 to_binary 生成的二进制编码
+
+    Args:
+        blob: 二进制编码
+
+    Returns:
+        np.ndarray: 数组
+
+    Raises:
+        ValueError: 编码格式无效
+    """
+    magic, code, ndim = _BINARY_HEADER.unpack_from(blob)
+    dtypes = {value: name for name, value in _BINARY_DTYPE_CODES.items()}
+    if magic != _BINARY_MAGIC or code not in dtypes:
+        raise ValueError("矩阵数据格式无效")
+    offset = _BINARY_HEADER.size
+    shape = struct.unpack_from(f"<{ndim}I", blob, offset)
+    offset += 4 * ndim
+    array = np.frombuffer(blob, dtype=ARRAY_DTYPES[dtypes[code]], offset=offset)
+    return array.reshape(shape)
+
+
+def matrix_reference(array: "np.ndarray") -> str:
+    """
+    大矩阵结果在历史记录 result 字段中的引用 (完整数据保存在 result_data)
+
+    Args:
+        array: 计算结果
+
+    Returns:
+        str: 例如 matrix:100x100:float64
+    """
+    shape = "x".join(str(size) for size in array.shape) or "scalar"
+    return f"matrix:{shape}:{array_dtype(array)}"
@@ -0,0 +1,273 @@
+"""
+函数绘图采样
+自适应细分 (曲率大、定义域边界和间断处加密) + LTTB 降采样到目标点数,
+结果按 (表达式, 区间, 分辨率) 缓存
+"""
+import math
+import os
+from typing import List, Optional, Tuple
+
+from .calculator import CalculatorService, np
+from .result_cache import ResultCache, create_backend
+
+# 单次绘图返回的最大点数
+PLOT_MAX_POINTS = int(os.getenv("CALC_PLOT_MAX_POINTS", "10000"))
+
+# 单次绘图允许的最大函数求值次数
+PLOT_MAX_EVALUATIONS = int(os.getenv("CALC_PLOT_MAX_EVALUATIONS", "200000"))
+
+# 自适应细分的最大轮数 (每轮把需要细分的区间二分一次)
+PLOT_REFINE_ROUNDS = 16
+
+# 中点偏离线性插值超过 y 范围的该比例时细分
+PLOT_TOLERANCE = 1e-3
+
+# 相邻两点的跳变超过 y 范围的该比例, 且细分到最小宽度仍然存在时视为间断
+PLOT_JUMP_RATIO = 0.5
+
+
+def _y_scale(y: "np.ndarray") -> float:
+    """y 的稳健范围 (1% ~ 99% 分位数), 避免渐近线附近的极大值主导容差"""
+    finite = y[np.isfinite(y)]
+    if finite.size < 2:
+        return 1.0
+    low, high = np.percentile(finite, [1, 99])
+    return float(high - low) or float(np.max(np.abs(finite))) or 1.0
+
+
+def adaptive_sample(
+    function, start: float, stop: float, initial: int, max_evaluations: int
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]:
+    """
+    自适应采样
+
+    从均匀网格开始, 每轮对所有候选区间一次性向量化求中点; 中点偏离线性插值过大、
+    端点与中点有无定义不一致 (定义域边界)、或相邻点跳变过大的区间继续二分
+
+    Args:
+        function: 向量化函数
+        start: 区间起点
+        stop: 区间终点
+        initial: 初始均匀采样点数
+        max_evaluations: 函数求值次数上限
+
+    Returns:
+        Tuple: (x, y, 间断标记, 求值次数), 间断标记[i] 表示 x[i] 与 x[i+1] 之间不应连线
+    """
+    x = np.linspace(start, stop, initial)
+    y = function(x)
+    evaluations = initial
+    min_width = abs(stop - start) * 2.0**-PLOT_REFINE_ROUNDS / max(initial, 1)
+
+    # 候选区间 (按左端点下标)
+    candidates = np.arange(x.size - 1)
+    scale = _y_scale(y)
+
+    for _ in range(PLOT_REFINE_ROUNDS):
+        if not candidates.size or evaluations + candidates.size > max_evaluations:
+            break
+
+        left, right = x[candidates], x[candidates + 1]
+        middle = (left + right) / 2
+        y_left, y_right = y[candidates], y[candidates + 1]
+        y_middle = function(middle)
+        evaluations += middle.size
+
+        finite = np.isfinite([y_left, y_middle, y_right])
+        with np.errstate(invalid="ignore"):
+            deviation = np.abs(y_middle - (y_left + y_right) / 2)
+            jump = np.abs(y_right - y_left)
+        boundary = ~(finite.all(axis=0) | ~finite.any(axis=0))
+        curved = np.nan_to_num(deviation, nan=0.0) > PLOT_TOLERANCE * scale
+        jumping = np.nan_to_num(jump, nan=0.0) > PLOT_JUMP_RATIO * scale
+        refine = (boundary | curved | jumping) & (right - left > 2 * min_width)
+
+        # 所有中点都插入 (已经求值), 只有需要细分的区间的两半进入下一轮
+        order = np.argsort(np.concatenate([x, middle]), kind="stable")
+        inserted = np.concatenate([np.zeros(x.size, bool), np.ones(middle.size, bool)])[order]
+        x = np.concatenate([x, middle])[order]
+        y = np.concatenate([y, y_middle])[order]
+
+        # 新数组中中点的位置; 细分区间的两半的左端点分别是原左端点和中点
+        middle_positions = np.flatnonzero(inserted)
+        refined_middles = middle_positions[refine]
+        candidates = np.concatenate([refined_middles - 1, refined_middles])
+        candidates.sort()
+
+    # 细分到最小宽度后仍然变号跳变、且两侧都远超 y 范围的相邻点视为渐近线处的间断
+    # (无定义的点由调用方按 NaN/inf 单独断开)
+    scale = _y_scale(y)
+    with np.errstate(invalid="ignore"):
+        magnitude = np.minimum(np.abs(y[:-1]), np.abs(y[1:]))
+        gaps = (
+            (np.sign(y[:-1]) * np.sign(y[1:]) < 0)
+            & (np.nan_to_num(magnitude, nan=0.0) > scale)
+            & (np.diff(x) <= 4 * min_width)
+        )
+    return x, y, gaps, evaluations
+
+
+def lttb(x: "np.ndarray", y: "np.ndarray", target: int) -> "np.ndarray":
+    """
+    Largest-Triangle-Three-Buckets 降采样 (保留首尾点和形状特征)
+
+    Args:
+        x: 横坐标 (升序)
+        y: 纵坐标 (全部为有限值)
+        target: 目标点数
+
+    Returns:
+        np.ndarray: 选中点的下标
+    """
+    n = x.size
+    if target >= n or target < 3:
+        return np.arange(n) if target >= n else np.array([0, n - 1])[:target]
+
+    # 中间 n-2 个点分为 target-2 个桶, 每个桶的平均点与选择无关, 预先向量化计算
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    counts = np.diff(np.r_[edges, n])
+    average_x = np.add.reduceat(x, edges) / counts
+    average_y = np.add.reduceat(y, edges) / counts
+    # 最后一个桶的 "下一个桶" 是终点
+    average_x[-1], average_y[-1] = x[-1], y[-1]
+
+    selected = np.empty(target, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+
+    for bucket in range(target - 2):
+        begin, end = edges[bucket], edges[bucket + 1]
+        px, py = x[previous], y[previous]
+        ax, ay = average_x[bucket + 1], average_y[bucket + 1]
+        area = np.abs((px - ax) * (y[begin:end] - py) - (px - x[begin:end]) * (ay - py))
+        previous = begin + int(np.argmax(area))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsample(
+    x: "np.ndarray", y: "np.ndarray", gaps: "np.ndarray", target: int
+) -> Tuple[List[float], List[Optional[float]]]:
+    """
+    按连续段分别做 LTTB 降采样, 段之间以 y 为None的点分隔
+
+    Args:
+        x: 横坐标
+        y: 纵坐标 (可包含 NaN/inf)
+        gaps: 相邻点间断标记
+        target: 目标点数 (包括分隔点; 每个连续段至少保留首尾两点, 段很多时可能略多)
+
+    Returns:
+        Tuple[List[float], List[Optional[float]]]: (x, y), 间断处的 y 为None
+    """
+    finite = np.isfinite(y)
+    # 连续段的边界: 有无定义发生变化或间断
+    breaks = np.flatnonzero((finite[1:] != finite[:-1]) | gaps) + 1
+    segments = [
+        (begin, end)
+        for begin, end in zip(np.r_[0, breaks], np.r_[breaks, y.size])
+        if finite[begin]
+    ]
+
+    total = sum(end - begin for begin, end in segments)
+    budget = max(target - max(len(segments) - 1, 0), 2 * len(segments))
+
+    xs: List[float] = []
+    ys: List[Optional[float]] = []
+    for index, (begin, end) in enumerate(segments):
+        if index:
+            # 分隔点取两段之间的中点
+            gap_x = (xs[-1] + float(x[begin])) / 2
+            xs.append(gap_x)
+            ys.append(None)
+        share = max(2, budget * (end - begin) // total)
+        chosen = lttb(x[begin:end], y[begin:end], share) + begin
+        xs.extend(x[chosen].tolist())
+        ys.extend(y[chosen].tolist())
+
+    return xs, ys
+
+
+class PlotService:
+    """函数绘图服务类"""
+
+    # 绘图结果缓存 (plot:{hash}, 与计算结果缓存共用后端配置)
+    cache = ResultCache(backend=create_backend(), prefix="plot:")
+
+    @classmethod
+    def plot(
+        cls, expression: str, variable: str, start: float, stop: float, points: int = 1000
+    ) -> dict:
+        """
+        生成函数曲线的绘图数据
+
+        Args:
+            expression: 含自由变量的表达式
+            variable: 自由变量名
+            start: 区间起点
+            stop: 区间终点
+            points: 目标点数
+
+        Returns:
+            dict: x、y (间断处为None)、点数、函数求值次数、间断数和是否命中缓存
+
+        Raises:
+            RuntimeError: 未安装 NumPy
+            ValueError: 表达式无效、区间无效或点数超出限制
+        """
+        if not 2 <= points <= PLOT_MAX_POINTS:
+            raise ValueError(f"绘图点数必须在 2 到 {PLOT_MAX_POINTS} 之间")
+        if not (math.isfinite(start) and math.isfinite(stop)):
+            raise ValueError("绘图区间必须是有限数值")
+        if start >= stop:
+            raise ValueError("绘图区间的起点必须小于终点")
+
+        function = CalculatorService.vectorize(expression, variable)
+        compiled = CalculatorService.engine.compile(expression, variables=(variable,))
+
+        # 缓存键: 规范化表达式 + 变量 + 区间 + 分辨率
+        key = f"{compiled.canonical}|{variable}|{start!r}|{stop!r}|{points}"
+        hit, cached = cls.cache.get(key)
+        if hit:
+            return {**cached, "cached": True}
+
+        x, y, gaps, evaluations = adaptive_sample(
+            function,
+            start,
+            stop,
+            initial=max(points // 2, 64),
+            max_evaluations=PLOT_MAX_EVALUATIONS,
+        )
+        xs, ys = downsample(x, y, gaps, points)
+
+        result = {
+            "x": xs,
+            "y": ys,
+            "points": len(xs),
+            "evaluations": evaluations,
+            "gaps": sum(1 for value in ys if value is None),
+        }
+        cls.cache.set(key, result)
+        return {**result, "cached": False}
+
+    @classmethod
+    def clear_cache(cls) -> dict:
+        """
+        清空绘图缓存
+
+        Returns:
+            dict: 各级缓存删除的条目数
+        """
+        return cls.cache.clear()
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """
+        获取绘图缓存统计
+
+        Returns:
+            dict: 命中/未命中次数、大小和后端信息
+        """
+        return cls.cache.stats()
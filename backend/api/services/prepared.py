@@ -0,0 +1,412 @@
+"""
+预编译表达式
+类似数据库的预处理语句: 表达式注册时完成解析、白名单校验和计算量分析, 返回句柄,
+之后按句柄绑定变量取值计算 (单次或批量向量化), 不再重复解析
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .calculator import CalculatorService, np
+
+# 每个用户最多保存的预编译表达式数量 (超出时淘汰最久未使用的)
+PREPARED_MAX_PER_USER = int(os.getenv("CALC_PREPARED_MAX_PER_USER", "256"))
+
+# 最多保存预编译表达式的用户数量 (超出时淘汰最久未活动用户的全部表达式)
+PREPARED_MAX_USERS = int(os.getenv("CALC_PREPARED_MAX_USERS", "10000"))
+
+# 单次批量计算允许的最大绑定组数
+PREPARED_BATCH_MAX_SIZE = int(os.getenv("CALC_PREPARED_BATCH_MAX_SIZE", "100000"))
+
+# 单个表达式允许的最大变量数
+PREPARED_MAX_VARIABLES = 32
+
+
+class PreparedExpression:
+    """预编译表达式"""
+
+    __slots__ = ("handle", "compiled", "created_at", "last_used_at", "evaluations")
+
+    def __init__(self, handle: str, compiled):
+        self.handle = handle
+        self.compiled = compiled
+        self.created_at = time.time()
+        self.last_used_at = self.created_at
+        self.evaluations = 0
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        """变量名 (按注册顺序)"""
+        return self.compiled.variables
+
+    def to_dict(self) -> dict:
+        """
+        转换为响应字典
+
+        Returns:
+            dict: 句柄、表达式、规范形式、变量、计算次数和时间戳
+        """
+        return {
+            "handle": self.handle,
+            "expression": self.compiled.source,
+            "canonical": self.compiled.canonical,
+            "variables": list(self.variables),
+            "evaluations": self.evaluations,
+            "created_at": self.created_at,
+            "last_used_at": self.last_used_at,
+        }
+
+
+def prepared_handle(canonical: str, variables: Sequence[str]) -> str:
+    """
+    生成预编译表达式的句柄
+
+    句柄由规范化表达式和变量列表决定, 重复注册同一表达式得到相同的句柄
+
+    Args:
+        canonical: 规范化表达式
+        variables: 变量名
+
+    Returns:
+        str: 句柄 (16 位十六进制)
+    """
+    key = f"{canonical}|{','.join(variables)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class PreparedExpressionStore:
+    """
+    按用户隔离的预编译表达式存储
+
+    两级 LRU: 每个用户的表达式数量有上限, 保存表达式的用户数量也有上限
+    """
+
+    def __init__(
+        self, max_per_user: int = PREPARED_MAX_PER_USER, max_users: int = PREPARED_MAX_USERS
+    ):
+        self.max_per_user = max(max_per_user, 1)
+        self.max_users = max(max_users, 1)
+        self._users: "OrderedDict[str, OrderedDict[str, PreparedExpression]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, user_id: str, prepared: PreparedExpression) -> PreparedExpression:
+        """
+        保存预编译表达式 (句柄已存在时返回已有的表达式)
+
+        Args:
+            user_id: 用户ID
+            prepared: 预编译表达式
+
+        Returns:
+            PreparedExpression: 保存后的表达式
+        """
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                entries = self._users[user_id] = OrderedDict()
+            self._users.move_to_end(user_id)
+
+            existing = entries.get(prepared.handle)
+            if existing is not None:
+                entries.move_to_end(prepared.handle)
+                return existing
+
+            entries[prepared.handle] = prepared
+            while len(entries) > self.max_per_user:
+                entries.popitem(last=False)
+                self.evictions += 1
+            while len(self._users) > self.max_users:
+                _, evicted = self._users.popitem(last=False)
+                self.evictions += len(evicted)
+            return prepared
+
+    def get(self, user_id: str, handle: str) -> Optional[PreparedExpression]:
+        """
+        读取预编译表达式
+
+        Args:
+            user_id: 用户ID
+            handle: 句柄
+
+        Returns:
+            Optional[PreparedExpression]: 预编译表达式, 不存在或已被淘汰时返回None
+        """
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                return None
+            prepared = entries.get(handle)
+            if prepared is not None:
+                entries.move_to_end(handle)
+                self._users.move_to_end(user_id)
+            return prepared
+
+    def list(self, user_id: str) -> List[PreparedExpression]:
+        """
+        列出用户的预编译表达式 (最近使用的在前)
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            List[PreparedExpression]: 预编译表达式列表
+        """
+        with self._lock:
+            return list(reversed(self._users.get(user_id, {}).values()))
+
+    def delete(self, user_id: str, handle: str) -> bool:
+        """
+        删除预编译表达式
+
+        Args:
+            user_id: 用户ID
+            handle: 句柄
+
+        Returns:
+            bool: 是否删除成功
+        """
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None or entries.pop(handle, None) is None:
+                return False
+            if not entries:
+                del self._users[user_id]
+            return True
+
+    def clear(self) -> None:
+        """清空所有用户的预编译表达式"""
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> dict:
+        """
+        获取存储统计
+
+        Returns:
+            dict: 用户数、表达式数量、容量和淘汰次数
+        """
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "size": sum(len(entries) for entries in self._users.values()),
+                "max_users": self.max_users,
+                "max_per_user": self.max_per_user,
+                "evictions": self.evictions,
+            }
+
+
+class PreparedExpressionService:
+    """预编译表达式服务类"""
+
+    store = PreparedExpressionStore()
+
+    @classmethod
+    def prepare(cls, user_id, expression: str, variables: Sequence[str]) -> PreparedExpression:
+        """
+        注册预编译表达式
+
+        Args:
+            user_id: 用户ID
+            expression: 含自由变量的表达式
+            variables: 变量名列表
+
+        Returns:
+            PreparedExpression: 预编译表达式
+
+        Raises:
+            ValueError: 表达式或变量名无效、计算量超出预算
+        """
+        variables = tuple(variables)
+        if len(variables) > PREPARED_MAX_VARIABLES:
+            raise ValueError(f"变量数量不能超过 {PREPARED_MAX_VARIABLES} 个")
+        if len(set(variables)) != len(variables):
+            raise ValueError("变量名不能重复")
+
+        compiled = CalculatorService.engine.compile(expression, variables=variables)
+        handle = prepared_handle(compiled.canonical, variables)
+        return cls.store.put(str(user_id), PreparedExpression(handle, compiled))
+
+    @classmethod
+    def get(cls, user_id, handle: str) -> Optional[PreparedExpression]:
+        """
+        按句柄读取预编译表达式
+
+        Args:
+            user_id: 用户ID
+            handle: 句柄
+
+        Returns:
+            Optional[PreparedExpression]: 预编译表达式, 不存在时返回None
+        """
+        return cls.store.get(str(user_id), handle)
+
+    @classmethod
+    def list(cls, user_id) -> List[PreparedExpression]:
+        """
+        列出用户的预编译表达式
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            List[PreparedExpression]: 预编译表达式列表
+        """
+        return cls.store.list(str(user_id))
+
+    @classmethod
+    def delete(cls, user_id, handle: str) -> bool:
+        """
+        删除预编译表达式
+
+        Args:
+            user_id: 用户ID
+            handle: 句柄
+
+        Returns:
+            bool: 是否删除成功
+        """
+        return cls.store.delete(str(user_id), handle)
+
+    @staticmethod
+    def _check_bindings(prepared: PreparedExpression, bindings: Dict[str, float]) -> None:
+        """
+        校验绑定的变量与注册时的变量一致
+
+        Args:
+            prepared: 预编译表达式
+            bindings: 变量取值
+
+        Raises:
+            ValueError: 缺少变量或包含未注册的变量
+        """
+        missing = [name for name in prepared.variables if name not in bindings]
+        if missing:
+            raise ValueError(f"缺少变量的取值: {', '.join(missing)}")
+        unknown = [name for name in bindings if name not in prepared.variables]
+        if unknown:
+            raise ValueError(f"未注册的变量: {', '.join(unknown)}")
+
+    @classmethod
+    def evaluate(
+        cls, prepared: PreparedExpression, bindings: Dict[str, float]
+    ) -> Union[float, int]:
+        """
+        绑定变量计算预编译表达式
+
+        Args:
+            prepared: 预编译表达式
+            bindings: 变量取值
+
+        Returns:
+            Union[float, int]: 计算结果
+
+        Raises:
+            ValueError: 变量绑定无效或计算错误
+            ZeroDivisionError: 除零错误
+        """
+        cls._check_bindings(prepared, bindings)
+        prepared.evaluations += 1
+        prepared.last_used_at = time.time()
+        return CalculatorService._run(prepared.compiled, bindings)
+
+    @classmethod
+    def evaluate_batch(
+        cls, prepared: PreparedExpression, bindings: List[Dict[str, float]]
+    ) -> List[Tuple[Optional[Union[float, int]], Optional[str]]]:
+        """
+        批量绑定变量计算预编译表达式
+
+        安装了 NumPy 时按变量组成列数组一次性向量化计算; 结果不是有限值的行
+        (定义域之外、除零、溢出) 再逐行计算以得到与单次计算一致的错误信息
+
+        Args:
+            prepared: 预编译表达式
+            bindings: 每组变量的取值
+
+        Returns:
+            List[Tuple[Optional[Union[float, int]], Optional[str]]]: 按输入顺序排列的 (计算结果, 错误信息)
+
+        Raises:
+            ValueError: 绑定组数超出限制
+        """
+        if len(bindings) > PREPARED_BATCH_MAX_SIZE:
+            raise ValueError(f"批量计算的绑定组数不能超过 {PREPARED_BATCH_MAX_SIZE}")
+
+        results: List[Tuple[Optional[Union[float, int]], Optional[str]]] = [None] * len(bindings)
+        expected = set(prepared.variables)
+        pending = []
+        for index, row in enumerate(bindings):
+            # 快速路径: 变量集合完全一致
+            if row.keys() == expected:
+                pending.append(index)
+                continue
+            try:
+                cls._check_bindings(prepared, row)
+                pending.append(index)
+            except ValueError as e:
+                results[index] = (None, str(e))
+
+        values = cls._evaluate_vectorized(prepared, [bindings[index] for index in pending])
+        if values is not None:
+            finite = np.isfinite(values)
+            for index, value, ok in zip(pending, values.tolist(), finite.tolist()):
+                if ok:
+                    results[index] = (value, None)
+            pending = [index for index, ok in zip(pending, finite.tolist()) if not ok]
+
+        # 未安装 NumPy、向量化失败或结果不是有限值的行逐行计算
+        for index in pending:
+            try:
+                results[index] = (CalculatorService._run(prepared.compiled, bindings[index]), None)
+            except (ValueError, ZeroDivisionError) as e:
+                results[index] = (None, str(e))
+
+        prepared.evaluations += len(bindings)
+        prepared.last_used_at = time.time()
+        return results
+
+    @classmethod
+    def _evaluate_vectorized(
+        cls, prepared: PreparedExpression, rows: List[Dict[str, float]]
+    ) -> Optional["np.ndarray"]:
+        """
+        按列向量化计算
+
+        Args:
+            prepared: 预编译表达式
+            rows: 已校验的变量取值
+
+        Returns:
+            Optional[np.ndarray]: float64 结果数组, 未安装 NumPy 或向量化计算失败时返回None
+        """
+        if np is None or not rows:
+            return None
+
+        columns = {
+            name: np.fromiter((row[name] for row in rows), dtype=np.float64, count=len(rows))
+            for name in prepared.variables
+        }
+        try:
+            with np.errstate(all="ignore"):
+                values = prepared.compiled.evaluate(
+                    variables=columns, functions=CalculatorService.NUMPY_FUNCTIONS
+                )
+                values = np.asarray(values, dtype=np.float64)
+        except Exception:
+            # 例如超出 float64 范围的整数常量, 交给逐行计算给出错误信息
+            return None
+        return np.broadcast_to(values, (len(rows),))
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        获取预编译表达式存储统计
+
+        Returns:
+            dict: 用户数、表达式数量、容量和淘汰次数
+        """
+        return cls.store.stats()
@@ -0,0 +1,289 @@
+"""
+计算结果缓存
+两级缓存: 进程内 LRU (带 TTL) + 可选的外部键值存储 (Redis 或内存替身)
+键格式为 calc:{expression_hash}, 哈希基于规范化后的表达式
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 结果缓存配置
+RESULT_CACHE_SIZE = int(os.getenv("CALC_RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = int(os.getenv("CALC_RESULT_CACHE_TTL", "3600"))  # 1小时
+RESULT_CACHE_BACKEND = os.getenv("CALC_RESULT_CACHE_BACKEND", "none")  # none/memory/redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class CacheBackend(ABC):
+    """外部缓存后端接口"""
+
+    name = "none"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存值
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[str]: 缓存值, 不存在时返回None
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: int) -> None:
+        """
+        写入缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间 (秒)
+        """
+
+    @abstractmethod
+    def clear(self, prefix: str) -> int:
+        """
+        删除指定前缀的所有键
+
+        Args:
+            prefix: 键前缀
+
+        Returns:
+            int: 删除的键数量
+        """
+
+
+class MemoryCacheBackend(CacheBackend):
+    """内存缓存后端 (用于测试和单进程部署)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def clear(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis 缓存后端"""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL):
+        if redis is None:
+            raise RuntimeError("Redis 缓存后端需要安装 redis")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self._client.set(key, value, ex=ttl)
+
+    def clear(self, prefix: str) -> int:
+        count = 0
+        for key in self._client.scan_iter(match=f"{prefix}*", count=1000):
+            count += self._client.delete(key)
+        return count
+
+
+def create_backend(name: str = RESULT_CACHE_BACKEND) -> Optional[CacheBackend]:
+    """
+    根据配置创建外部缓存后端
+
+    Args:
+        name: 后端名称 (none/memory/redis)
+
+    Returns:
+        Optional[CacheBackend]: 缓存后端, none 时返回None
+    """
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "redis":
+        try:
+            return RedisCacheBackend()
+        except RuntimeError as e:
+            print(f"⚠️  {e}, 结果缓存仅使用进程内缓存")
+    return None
+
+
+class ResultCache:
+    """
+    两级结果缓存
+
+    第一级为进程内 LRU, 第二级为可选的外部后端;
+    外部后端故障不会影响计算, 只记录错误次数
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        size: int = RESULT_CACHE_SIZE,
+        ttl: int = RESULT_CACHE_TTL,
+        prefix: str = "calc:",
+    ):
+        self.backend = backend
+        self.size = max(size, 0)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+
+    def make_key(self, canonical: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            canonical: 规范化后的表达式 (或其他确定性的请求描述)
+
+        Returns:
+            str: 缓存键, 例如 calc:{expression_hash}
+        """
+        return self.prefix + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, canonical: str) -> Tuple[bool, Any]:
+        """
+        读取缓存结果
+
+        Args:
+            canonical: 规范化后的表达式
+
+        Returns:
+            Tuple[bool, Any]: (是否命中, 缓存值)
+        """
+        key = self.make_key(canonical)
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._local.move_to_end(key)
+                    self.local_hits += 1
+                    return True, value
+                del self._local[key]
+
+        if self.backend is not None:
+            try:
+                raw = self.backend.get(key)
+            except Exception:
+                raw = None
+                with self._lock:
+                    self.backend_errors += 1
+            if raw is not None:
+                value = json.loads(raw)
+                self._set_local(key, value)
+                with self._lock:
+                    self.backend_hits += 1
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, canonical: str, value: Any) -> None:
+        """
+        写入缓存结果
+
+        Args:
+            canonical: 规范化后的表达式
+            value: 可 JSON 序列化的结果
+        """
+        key = self.make_key(canonical)
+        self._set_local(key, value)
+
+        if self.backend is not None:
+            try:
+                self.backend.set(key, json.dumps(value), self.ttl)
+            except Exception:
+                with self._lock:
+                    self.backend_errors += 1
+
+    def _set_local(self, key: str, value: Any) -> None:
+        """写入进程内缓存"""
+        if not self.size:
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def clear(self) -> dict:
+        """
+        清空缓存 (进程内和外部后端)
+
+        Returns:
+            dict: 各级缓存删除的条目数
+        """
+        with self._lock:
+            local_count = len(self._local)
+            self._local.clear()
+
+        backend_count = 0
+        if self.backend is not None:
+            try:
+                backend_count = self.backend.clear(self.prefix)
+            except Exception:
+                with self._lock:
+                    self.backend_errors += 1
+
+        return {"local": local_count, "backend": backend_count}
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中/未命中次数、大小和后端信息
+        """
+        with self._lock:
+            lookups = self.local_hits + self.backend_hits + self.misses
+            return {
+                "backend": self.backend.name if self.backend is not None else "none",
+                "size": len(self._local),
+                "capacity": self.size,
+                "ttl": self.ttl,
+                "local_hits": self.local_hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "hit_rate": (self.local_hits + self.backend_hits) / lookups if lookups else 0.0,
+                "backend_errors": self.backend_errors,
+            }
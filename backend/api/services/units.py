@@ -0,0 +1,659 @@
+"""
+单位换算
+带量纲的数值类型 (Quantity) 和预先构建的单位表:
+每个单位对应到 SI 基本单位的换算系数和七维量纲向量, 换算和量纲检查都是字典查找
+"""
+import ast
+import io
+import math
+import re
+import tokenize
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .expression import ExpressionEngine
+
+# 量纲向量的各分量: 长度、质量、时间、电流、温度、物质的量、发光强度
+BASE_DIMENSIONS = ("m", "kg", "s", "A", "K", "mol", "cd")
+
+# 量纲向量
+Dimension = Tuple[int, int, int, int, int, int, int]
+
+DIMENSIONLESS: Dimension = (0, 0, 0, 0, 0, 0, 0)
+
+# 量纲指数的绝对值上限 (例如 m^12), 防止 `2 m ** 1000000` 之类的结果
+MAX_DIMENSION_EXPONENT = 12
+
+
+def _dimension(**exponents: int) -> Dimension:
+    """按基本单位的指数构造量纲向量, 例如 _dimension(m=1, s=-1)"""
+    return tuple(exponents.get(name, 0) for name in BASE_DIMENSIONS)
+
+
+# 常用量纲
+LENGTH = _dimension(m=1)
+AREA = _dimension(m=2)
+VOLUME = _dimension(m=3)
+MASS = _dimension(kg=1)
+TIME = _dimension(s=1)
+CURRENT = _dimension(A=1)
+TEMPERATURE = _dimension(K=1)
+AMOUNT = _dimension(mol=1)
+LUMINOSITY = _dimension(cd=1)
+SPEED = _dimension(m=1, s=-1)
+ACCELERATION = _dimension(m=1, s=-2)
+FORCE = _dimension(kg=1, m=1, s=-2)
+PRESSURE = _dimension(kg=1, m=-1, s=-2)
+ENERGY = _dimension(kg=1, m=2, s=-2)
+POWER = _dimension(kg=1, m=2, s=-3)
+FREQUENCY = _dimension(s=-1)
+CHARGE = _dimension(A=1, s=1)
+VOLTAGE = _dimension(kg=1, m=2, s=-3, A=-1)
+RESISTANCE = _dimension(kg=1, m=2, s=-3, A=-2)
+
+# 量纲名称 (用于错误信息和单位列表)
+DIMENSION_NAMES = {
+    DIMENSIONLESS: "无量纲",
+    LENGTH: "长度",
+    AREA: "面积",
+    VOLUME: "体积",
+    MASS: "质量",
+    TIME: "时间",
+    CURRENT: "电流",
+    TEMPERATURE: "温度",
+    AMOUNT: "物质的量",
+    LUMINOSITY: "发光强度",
+    SPEED: "速度",
+    ACCELERATION: "加速度",
+    FORCE: "力",
+    PRESSURE: "压强",
+    ENERGY: "能量",
+    POWER: "功率",
+    FREQUENCY: "频率",
+    CHARGE: "电荷",
+    VOLTAGE: "电压",
+    RESISTANCE: "电阻",
+}
+
+# SI 词头
+SI_PREFIXES = {
+    "T": 1e12,
+    "G": 1e9,
+    "M": 1e6,
+    "k": 1e3,
+    "h": 1e2,
+    "d": 1e-1,
+    "c": 1e-2,
+    "m": 1e-3,
+    "u": 1e-6,
+    "µ": 1e-6,
+    "μ": 1e-6,
+    "n": 1e-9,
+}
+
+# 单位定义: 名称 -> (换算系数, 偏移量, 量纲, 别名, 是否可加 SI 词头)
+# 基本单位值 = 数值 * 换算系数 + 偏移量
+_UNIT_DEFINITIONS = [
+    # 长度
+    ("m", 1.0, 0.0, LENGTH, ("meter", "meters", "metre", "metres"), True),
+    ("inch", 0.0254, 0.0, LENGTH, ("inches",), False),
+    ("ft", 0.3048, 0.0, LENGTH, ("foot", "feet"), False),
+    ("yd", 0.9144, 0.0, LENGTH, ("yard", "yards"), False),
+    ("mi", 1609.344, 0.0, LENGTH, ("mile", "miles"), False),
+    ("nmi", 1852.0, 0.0, LENGTH, ("nautical_mile",), False),
+    ("au", 149597870700.0, 0.0, LENGTH, (), False),
+    ("ly", 9460730472580800.0, 0.0, LENGTH, ("lightyear",), False),
+    # 面积和体积
+    ("ha", 1e4, 0.0, AREA, ("hectare", "hectares"), False),
+    ("acre", 4046.8564224, 0.0, AREA, ("acres",), False),
+    ("L", 1e-3, 0.0, VOLUME, ("l", "liter", "liters", "litre", "litres"), True),
+    ("gal", 3.785411784e-3, 0.0, VOLUME, ("gallon", "gallons"), False),
+    # 质量
+    ("g", 1e-3, 0.0, MASS, ("gram", "grams"), True),
+    ("t", 1e3, 0.0, MASS, ("tonne", "tonnes"), False),
+    ("lb", 0.45359237, 0.0, MASS, ("lbs", "pound", "pounds"), False),
+    ("oz", 0.028349523125, 0.0, MASS, ("ounce", "ounces"), False),
+    # 时间
+    ("s", 1.0, 0.0, TIME, ("sec", "second", "seconds"), True),
+    ("min", 60.0, 0.0, TIME, ("minute", "minutes"), False),
+    ("h", 3600.0, 0.0, TIME, ("hr", "hour", "hours"), False),
+    ("day", 86400.0, 0.0, TIME, ("days",), False),
+    ("week", 604800.0, 0.0, TIME, ("weeks",), False),
+    ("year", 31557600.0, 0.0, TIME, ("years", "yr"), False),
+    # 电流、物质的量、发光强度
+    ("A", 1.0, 0.0, CURRENT, ("ampere", "amperes"), True),
+    ("mol", 1.0, 0.0, AMOUNT, ("mole", "moles"), True),
+    ("cd", 1.0, 0.0, LUMINOSITY, ("candela",), False),
+    # 温度 (摄氏度和华氏度带偏移量)
+    ("K", 1.0, 0.0, TEMPERATURE, ("kelvin",), False),
+    ("degC", 1.0, 273.15, TEMPERATURE, ("celsius",), False),
+    ("degF", 5.0 / 9.0, 273.15 - 32.0 * 5.0 / 9.0, TEMPERATURE, ("fahrenheit",), False),
+    # 导出单位
+    ("kph", 1000.0 / 3600.0, 0.0, SPEED, ("kmh",), False),
+    ("mph", 1609.344 / 3600.0, 0.0, SPEED, (), False),
+    ("knot", 1852.0 / 3600.0, 0.0, SPEED, ("knots", "kn"), False),
+    ("N", 1.0, 0.0, FORCE, ("newton", "newtons"), True),
+    ("lbf", 4.4482216152605, 0.0, FORCE, (), False),
+    ("Pa", 1.0, 0.0, PRESSURE, ("pascal",), True),
+    ("bar", 1e5, 0.0, PRESSURE, (), False),
+    ("atm", 101325.0, 0.0, PRESSURE, (), False),
+    ("psi", 6894.757293168361, 0.0, PRESSURE, (), False),
+    ("J", 1.0, 0.0, ENERGY, ("joule", "joules"), True),
+    ("cal", 4.184, 0.0, ENERGY, ("calorie", "calories"), False),
+    ("kcal", 4184.0, 0.0, ENERGY, ("kilocalorie", "kilocalories"), False),
+    ("Wh", 3600.0, 0.0, ENERGY, (), True),
+    ("eV", 1.602176634e-19, 0.0, ENERGY, (), False),
+    ("W", 1.0, 0.0, POWER, ("watt", "watts"), True),
+    ("hp", 745.69987158227022, 0.0, POWER, ("horsepower",), False),
+    ("Hz", 1.0, 0.0, FREQUENCY, ("hertz",), True),
+    ("C", 1.0, 0.0, CHARGE, ("coulomb", "coulombs"), False),
+    ("V", 1.0, 0.0, VOLTAGE, ("volt", "volts"), True),
+    ("ohm", 1.0, 0.0, RESISTANCE, ("ohms",), True),
+]
+
+
+class Unit:
+    """单位表中的一项"""
+
+    __slots__ = ("name", "factor", "offset", "dimension")
+
+    def __init__(self, name: str, factor: float, offset: float, dimension: Dimension):
+        self.name = name
+        self.factor = factor
+        self.offset = offset
+        self.dimension = dimension
+
+
+def _build_unit_table() -> Dict[str, Unit]:
+    """展开别名和 SI 词头, 构建 名称 -> 单位 的查找表"""
+    table: Dict[str, Unit] = {}
+    for name, factor, offset, dimension, aliases, prefixable in _UNIT_DEFINITIONS:
+        unit = Unit(name, factor, offset, dimension)
+        for alias in (name,) + aliases:
+            table[alias] = unit
+        if prefixable:
+            for prefix, scale in SI_PREFIXES.items():
+                prefixed = prefix + name
+                # 显式定义的单位和别名优先 (例如 kcal)
+                table.setdefault(prefixed, Unit(prefixed, factor * scale, 0.0, dimension))
+    return table
+
+
+# 单位查找表
+UNITS: Dict[str, Unit] = _build_unit_table()
+
+# 量纲索引: 量纲 -> 该量纲下的单位名称 (不含别名)
+UNITS_BY_DIMENSION: Dict[Dimension, List[str]] = {}
+for _name, _unit in UNITS.items():
+    if _unit.name == _name:
+        UNITS_BY_DIMENSION.setdefault(_unit.dimension, []).append(_name)
+
+# 各量纲结果的默认显示单位
+PREFERRED_UNITS = {
+    DIMENSIONLESS: "",
+    LENGTH: "m",
+    AREA: "m^2",
+    VOLUME: "m^3",
+    MASS: "kg",
+    TIME: "s",
+    CURRENT: "A",
+    TEMPERATURE: "K",
+    AMOUNT: "mol",
+    LUMINOSITY: "cd",
+    SPEED: "m/s",
+    ACCELERATION: "m/s^2",
+    FORCE: "N",
+    PRESSURE: "Pa",
+    ENERGY: "J",
+    POWER: "W",
+    FREQUENCY: "Hz",
+    CHARGE: "C",
+    VOLTAGE: "V",
+    RESISTANCE: "ohm",
+}
+
+
+def format_dimension(dimension: Dimension) -> str:
+    """
+    以 SI 基本单位表示量纲, 例如 kg*m/s^2
+
+    Args:
+        dimension: 量纲向量
+
+    Returns:
+        str: 单位表达式 (无量纲为空字符串)
+    """
+    numerator, denominator = [], []
+    for name, exponent in zip(BASE_DIMENSIONS, dimension):
+        if exponent:
+            power = abs(exponent)
+            term = name if power == 1 else f"{name}^{power}"
+            (numerator if exponent > 0 else denominator).append(term)
+    text = "*".join(numerator) or ("1" if denominator else "")
+    if denominator:
+        text += "/" + "/".join(denominator)
+    return text
+
+
+def dimension_name(dimension: Dimension) -> str:
+    """量纲名称, 没有名称时返回基本单位表示"""
+    return DIMENSION_NAMES.get(dimension) or format_dimension(dimension)
+
+
+class Quantity:
+    """
+    带量纲的数值
+
+    value 以 SI 基本单位表示; 带偏移量的温度单位 (摄氏度、华氏度) 只在与数字相乘时
+    应用偏移 (20 degC -> 293.15 K), 参与其他运算时按绝对温度处理:
+    - absolute: 应用过偏移量的温度, 两个这样的温度不能相加 (0 degC + 10 degC 没有确定的含义)
+    - interval: 两个温度之差 (30 degC - 10 degC), 换算到 degC/degF 时不减去偏移量
+    """
+
+    __slots__ = ("value", "dimension", "offset", "absolute", "interval")
+
+    def __init__(
+        self,
+        value: float,
+        dimension: Dimension,
+        offset: float = 0.0,
+        absolute: bool = False,
+        interval: bool = False,
+    ):
+        self.value = value
+        self.dimension = dimension
+        self.offset = offset
+        self.absolute = absolute
+        self.interval = interval
+
+    def _absolute(self) -> "Quantity":
+        """应用偏移量"""
+        if not self.offset:
+            return self
+        return Quantity(self.value + self.offset, self.dimension, absolute=True)
+
+    @staticmethod
+    def _check_dimension(dimension: Dimension) -> Dimension:
+        """量纲指数不能超过 MAX_DIMENSION_EXPONENT"""
+        if any(abs(d) > MAX_DIMENSION_EXPONENT for d in dimension):
+            raise ValueError(f"单位的幂次过大 (最多 {MAX_DIMENSION_EXPONENT} 次)")
+        return dimension
+
+    @staticmethod
+    def _coerce(other: Any) -> "Quantity":
+        """数字视为无量纲量"""
+        if isinstance(other, Quantity):
+            return other._absolute()
+        return Quantity(other, DIMENSIONLESS)
+
+    def _require_same(self, other: "Quantity", operation: str) -> None:
+        """加减运算要求量纲相同"""
+        if self.dimension != other.dimension:
+            raise ValueError(
+                f"量纲不匹配: 不能对 {dimension_name(self.dimension)} 和 "
+                f"{dimension_name(other.dimension)} {operation}"
+            )
+
+    def __add__(self, other: Any) -> "Quantity":
+        left, right = self._absolute(), self._coerce(other)
+        left._require_same(right, "相加")
+        if left.absolute and right.absolute:
+            raise ValueError("不能将两个带零点偏移的温度相加 (例如 0 degC + 10 degC), 温差请使用 K")
+        return Quantity(
+            left.value + right.value,
+            left.dimension,
+            absolute=left.absolute or right.absolute,
+            interval=left.interval and right.interval,
+        )
+
+    def __radd__(self, other: Any) -> "Quantity":
+        return self._coerce(other) + self
+
+    def __sub__(self, other: Any) -> "Quantity":
+        left, right = self._absolute(), self._coerce(other)
+        left._require_same(right, "相减")
+        # 两个温度之差是温差; 温度减去温差仍是温度
+        return Quantity(
+            left.value - right.value,
+            left.dimension,
+            absolute=left.absolute and not right.absolute,
+            interval=(left.absolute and right.absolute) or (left.interval and right.interval),
+        )
+
+    def __rsub__(self, other: Any) -> "Quantity":
+        return self._coerce(other) - self
+
+    def __mul__(self, other: Any) -> "Quantity":
+        if not isinstance(other, Quantity):
+            # 数字乘以单位: 应用偏移量 (20 * degC)
+            return Quantity(
+                self.value * other + self.offset,
+                self.dimension,
+                absolute=bool(self.offset),
+                interval=self.interval,
+            )
+        left, right = self._absolute(), other._absolute()
+        dimension = tuple(a + b for a, b in zip(left.dimension, right.dimension))
+        return Quantity(left.value * right.value, self._check_dimension(dimension))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Any) -> "Quantity":
+        left, right = self._absolute(), self._coerce(other)
+        dimension = tuple(a - b for a, b in zip(left.dimension, right.dimension))
+        return Quantity(left.value / right.value, self._check_dimension(dimension))
+
+    def __rtruediv__(self, other: Any) -> "Quantity":
+        return self._coerce(other) / self
+
+    def __pow__(self, exponent: Any) -> "Quantity":
+        if isinstance(exponent, Quantity):
+            if exponent.dimension != DIMENSIONLESS:
+                raise ValueError("指数必须是无量纲的数值")
+            exponent = exponent.value
+        base = self._absolute()
+        dimension = self._check_dimension(tuple(d * exponent for d in base.dimension))
+        if any(d != int(d) for d in dimension):
+            raise ValueError("单位的幂运算结果必须是整数次量纲")
+        return Quantity(base.value**exponent, tuple(int(d) for d in dimension))
+
+    def __rpow__(self, base: Any) -> "Quantity":
+        return self._coerce(base) ** self
+
+    def __neg__(self) -> "Quantity":
+        absolute = self._absolute()
+        if absolute.absolute:
+            raise ValueError("不能对带零点偏移的温度取负, 负温度请写成 -40 degC")
+        return Quantity(-absolute.value, absolute.dimension, interval=absolute.interval)
+
+    def __pos__(self) -> "Quantity":
+        return self._absolute()
+
+    def __abs__(self) -> "Quantity":
+        absolute = self._absolute()
+        return Quantity(abs(absolute.value), absolute.dimension)
+
+    def __mod__(self, other: Any) -> "Quantity":
+        left, right = self._absolute(), self._coerce(other)
+        left._require_same(right, "取模")
+        return Quantity(left.value % right.value, left.dimension)
+
+    def __floordiv__(self, other: Any) -> "Quantity":
+        left, right = self._absolute(), self._coerce(other)
+        left._require_same(right, "整除")
+        return Quantity(float(left.value // right.value), DIMENSIONLESS)
+
+
+def _dimensionless(function: Callable) -> Callable:
+    """数学函数的参数必须无量纲 (例如 sin(3 m) 没有意义)"""
+
+    def wrapper(*args):
+        values = []
+        for arg in args:
+            if isinstance(arg, Quantity):
+                arg = arg._absolute()
+                if arg.dimension != DIMENSIONLESS:
+                    raise ValueError(
+                        f"函数参数必须是无量纲的数值, 得到 {dimension_name(arg.dimension)}"
+                    )
+                arg = arg.value
+            values.append(arg)
+        return function(*values)
+
+    return wrapper
+
+
+def _unit_sqrt(x: Any) -> Any:
+    """平方根 (量纲指数必须为偶数)"""
+    if isinstance(x, Quantity):
+        return x**0.5
+    return math.sqrt(x)
+
+
+def _unit_pow(base: Any, exponent: Any) -> Any:
+    """pow(a, b)"""
+    return base**exponent
+
+
+# 换算表达式中的 "in" / "to" 目标单位分隔符
+_TARGET_PATTERN = re.compile(r"^(?P<source>.+?)\s+(?:in|to|->)\s+(?P<target>[^\s].*)$")
+
+
+def insert_implicit_multiplication(expression: str) -> str:
+    """
+    插入隐式乘法: `3 mi` -> `(3*mi)`, `5 m^2` -> `(5*m**2)`, `2(3 m)` -> `2*((3*m))`,
+    `-40 degC` -> `(-40*degC)`
+
+    数字与紧随的单位 (及其幂次) 整体加括号, 使 `1 mi / 1 km` 按 `(1 mi) / (1 km)` 计算
+
+    Args:
+        expression: 表达式字符串
+
+    Returns:
+        str: 可由 Python 语法解析的表达式
+
+    Raises:
+        ValueError: 表达式无法分词
+    """
+    try:
+        tokens = [
+            token
+            for token in tokenize.generate_tokens(io.StringIO(expression).readline)
+            if token.type not in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER)
+        ]
+    except (tokenize.TokenError, SyntaxError, IndentationError):
+        raise ValueError("表达式语法错误")
+
+    # ^ 按幂运算处理 (m^2)
+    texts = ["**" if token.string == "^" else token.string for token in tokens]
+
+    parts = []
+    sign = ""
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        is_call = index + 2 < len(tokens) and tokens[index + 2].string == "("
+
+        if (
+            token.string in ("-", "+")
+            and following is not None
+            and following.type == tokenize.NUMBER
+            and (index == 0 or tokens[index - 1].type == tokenize.OP)
+            and (index == 0 or tokens[index - 1].string not in (")", "]"))
+        ):
+            # 一元正负号属于数字: `-40 degC` -> `(-40*degC)`, 先取负再应用单位的零点偏移
+            sign = texts[index]
+            index += 1
+            continue
+
+        if token.type == tokenize.NUMBER and following is not None:
+            if following.type == tokenize.NAME and not is_call:
+                # 数字 + 单位 [+ 幂次]
+                end = index + 2
+                if end < len(tokens) and texts[end] == "**":
+                    end += 1
+                    if end < len(tokens) and texts[end] in ("-", "+"):
+                        end += 1
+                    end += 1
+                number = sign + texts[index]
+                parts.append("(" + number + "*" + " ".join(texts[index + 1 : end]) + ")")
+                sign = ""
+                index = end
+                continue
+            if following.type == tokenize.NAME or following.string == "(":
+                parts.extend([sign, texts[index], "*"] if sign else [texts[index], "*"])
+                sign = ""
+                index += 1
+                continue
+
+        if sign:
+            parts.append(sign)
+            sign = ""
+        parts.append(texts[index])
+        if token.string == ")" and following is not None:
+            if following.type in (tokenize.NAME, tokenize.NUMBER) or following.string == "(":
+                parts.append("*")
+        index += 1
+
+    return " ".join(parts)
+
+
+def split_target(expression: str) -> Tuple[str, Optional[str]]:
+    """
+    拆分 `X in Y` / `X to Y` 形式的换算表达式
+
+    Args:
+        expression: 换算表达式
+
+    Returns:
+        Tuple[str, Optional[str]]: (源表达式, 目标单位), 没有目标单位时为None
+    """
+    match = _TARGET_PATTERN.match(expression.strip())
+    if match is None:
+        return expression, None
+    return match.group("source"), match.group("target").strip()
+
+
+class UnitExpressionEngine(ExpressionEngine):
+    """
+    带单位的表达式引擎
+
+    单位名称 (区分大小写) 在编译时从单位表解析为 Quantity, 数学常量和函数与普通引擎相同,
+    三角函数等要求无量纲参数
+    """
+
+    def __init__(self, constants: Dict[str, float], functions: Dict[str, Callable]):
+        unit_functions = {name: _dimensionless(function) for name, function in functions.items()}
+        unit_functions.update({"sqrt": _unit_sqrt, "abs": abs, "pow": _unit_pow})
+        super().__init__(constants, unit_functions)
+
+    def compile(self, expression: str, variables: Tuple[str, ...] = ()):
+        return super().compile(insert_implicit_multiplication(expression), variables)
+
+    def _transform(
+        self,
+        node: ast.AST,
+        used_functions: Dict[str, Callable],
+        variables: Tuple[str, ...] = (),
+    ) -> ast.AST:
+        if isinstance(node, ast.Name) and node.id not in variables:
+            unit = UNITS.get(node.id)
+            if unit is not None and node.id.lower() not in self.constants:
+                name = f"_unit_{unit.name}"
+                used_functions[name] = Quantity(unit.factor, unit.dimension, unit.offset)
+                return ast.Name(id=name, ctx=ast.Load())
+        return super()._transform(node, used_functions, variables)
+
+
+class ConversionResult:
+    """换算结果"""
+
+    __slots__ = ("value", "unit", "dimension")
+
+    def __init__(self, value: float, unit: str, dimension: Dimension):
+        self.value = value
+        self.unit = unit
+        self.dimension = dimension
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            # 保留 15 位有效数字, 去掉换算系数引入的末位误差 (67.99999999999999 -> 68)
+            "value": float(f"{self.value:.15g}"),
+            "unit": self.unit,
+            "dimension": dimension_name(self.dimension),
+            "base_unit": format_dimension(self.dimension),
+        }
+
+    def __str__(self) -> str:
+        return f"{self.value:.12g} {self.unit}".rstrip()
+
+
+def _evaluate(engine: UnitExpressionEngine, expression: str) -> Quantity:
+    """
+    计算表达式, 结果统一为 Quantity (数字视为无量纲量)
+
+    返回值保留单位自身的偏移量 (例如 degC), 由调用方决定是否应用
+    """
+    compiled = engine.compile(expression)
+    try:
+        result = compiled.evaluate()
+    except ZeroDivisionError:
+        raise ZeroDivisionError("除数不能为零")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"计算错误: {str(e)}")
+
+    if isinstance(result, Quantity):
+        return result
+    if isinstance(result, bool) or not isinstance(result, (int, float)):
+        raise ValueError("计算错误: 表达式必须返回数值结果")
+    return Quantity(float(result), DIMENSIONLESS)
+
+
+def _first_unit(expression: str, dimension: Dimension) -> Optional[Unit]:
+    """表达式中第一个量纲与结果相同的单位 (用作默认显示单位)"""
+    for name in re.findall(r"[A-Za-zµ_]\w*", expression):
+        unit = UNITS.get(name)
+        if unit is not None and unit.dimension == dimension:
+            return unit
+    return None
+
+
+def convert(
+    engine: UnitExpressionEngine, expression: str, target: Optional[str] = None
+) -> ConversionResult:
+    """
+    计算带单位的表达式并换算到目标单位
+
+    目标单位可以通过参数指定, 也可以写在表达式中 (`3 mi in km`);
+    未指定时使用表达式中第一个量纲相同的单位, 再退回到 SI 单位
+
+    Args:
+        engine: 带单位的表达式引擎
+        expression: 表达式, 例如 `3 mi + 200 m` 或 `100 km/h to mph`
+        target: 目标单位表达式, 例如 `km` 或 `m/s`
+
+    Returns:
+        ConversionResult: 换算后的数值、单位和量纲
+
+    Raises:
+        ValueError: 表达式无效、单位未知、量纲不匹配或结果超出浮点数范围
+        ZeroDivisionError: 除零错误
+    """
+    if target is None:
+        expression, target = split_target(expression)
+
+    quantity = _evaluate(engine, expression)._absolute()
+
+    if target is not None:
+        # 目标单位不应用偏移量: degC 表示 "1 个摄氏度刻度, 零点偏移 273.15"
+        unit = _evaluate(engine, target)
+        if unit.dimension != quantity.dimension:
+            raise ValueError(
+                f"无法将 {dimension_name(quantity.dimension)} 换算为 "
+                f"{dimension_name(unit.dimension)}"
+            )
+        if not unit.value:
+            raise ZeroDivisionError("除数不能为零")
+        offset = 0.0 if quantity.interval else unit.offset
+        value = (quantity.value - offset) / unit.value
+        result = ConversionResult(value, target, quantity.dimension)
+    else:
+        unit = _first_unit(expression, quantity.dimension)
+        if unit is not None:
+            offset = 0.0 if quantity.interval else unit.offset
+            result = ConversionResult(
+                (quantity.value - offset) / unit.factor, unit.name, quantity.dimension
+            )
+        else:
+            preferred = PREFERRED_UNITS.get(
+                quantity.dimension, format_dimension(quantity.dimension)
+            )
+            result = ConversionResult(quantity.value, preferred, quantity.dimension)
+
+    # 浮点运算溢出得到 inf/nan (响应中会变成 null), 在保存历史记录之前拒绝
+    if not math.isfinite(result.value):
+        raise ValueError("结果超出浮点数范围")
+    return result
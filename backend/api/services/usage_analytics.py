@@ -0,0 +1,453 @@
+"""
+使用统计汇总
+后台任务按用户的变更序号 (users.history_seq / users.ai_usage_seq) 增量汇总新增的历史记录和
+AI 使用记录, 写入按小时/按天的汇总表; user_stats 记录每个用户已汇总到的序号 (高水位),
+每次只读取水位之后的记录。统计接口只读取汇总表, 耗时与原始记录数量无关
+
+常用表达式按累计使用次数排行 (清空历史记录时删除, 之后重新累计)。
+汇总的是使用量: 记录汇总之后再被删除或归档不回减计数。
+变更序号为空的旧记录 (增量同步上线之前创建) 不计入
+"""
+import hashlib
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import (
+    AIUsage,
+    AIUsageRollup,
+    ExpressionRollup,
+    History,
+    UsageRollup,
+    User,
+    UserStats,
+)
+from .user_stats import UserStatsService
+
+# 后台汇总间隔 (秒), 0 表示不启用
+USAGE_ROLLUP_INTERVAL = float(os.getenv("USAGE_ROLLUP_INTERVAL", "60"))
+
+# 每个用户每个事务汇总的最大记录数 (历史记录和 AI 使用记录分别计算)
+USAGE_ROLLUP_BATCH = int(os.getenv("USAGE_ROLLUP_BATCH", "5000"))
+
+# 按小时汇总的保留天数 (更早的只保留按天汇总)
+USAGE_HOURLY_RETENTION_DAYS = int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", "14"))
+
+# 查找待汇总用户时每批的用户数
+USAGE_ROLLUP_USER_BATCH = 100
+
+# 常用表达式排行的条数
+USAGE_TOP_EXPRESSIONS = 10
+
+# 汇总粒度
+PERIODS = ("hour", "day")
+
+# 支持 INSERT ... ON CONFLICT 的方言
+_UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def bucket_start(moment: datetime, period: str) -> datetime:
+    """
+    时间所在分桶的起始时间
+
+    Args:
+        moment: 时间 (UTC)
+        period: hour 或 day
+
+    Returns:
+        datetime: 分桶起始时间
+    """
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _expression_digest(expression: str) -> bytes:
+    """表达式摘要 (SHA-256 的前 16 字节)"""
+    return hashlib.sha256(expression.encode("utf-8")).digest()[:16]
+
+
+def _add_counts(db: Session, model, keys: List[str], rows: List[dict], counts: List[str]) -> None:
+    """
+    把增量累加到汇总表 (在调用方的事务中执行)
+
+    Args:
+        db: 数据库会话
+        model: 汇总表模型
+        keys: 主键列名
+        rows: 每行的主键和增量 (以及其他需要写入的列)
+        counts: 累加的列名
+    """
+    if not rows:
+        return
+    table = model.__table__
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
+    if insert is not None:
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in counts},
+        )
+        db.execute(statement, rows)
+        return
+
+    # 其他数据库: 先更新, 没有汇总行时插入
+    for row in rows:
+        result = db.execute(
+            update(table)
+            .where(*[table.c[name] == row[name] for name in keys])
+            .values({name: table.c[name] + row[name] for name in counts})
+        )
+        if result.rowcount == 0:
+            db.execute(table.insert().values(**row))
+
+
+class UsageAnalyticsService:
+    """使用统计服务类"""
+
+    @staticmethod
+    def rollup_user(db: Session, user_id: UUID) -> Tuple[int, int, bool]:
+        """
+        汇总单个用户水位之后的一批记录并推进水位 (在调用方的事务中执行, 不提交)
+
+        锁定用户的统计行, 同时执行的汇总任务不会重复累加同一批记录
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            Tuple[int, int, bool]: (汇总的历史记录数, 汇总的 AI 使用记录数, 是否还有未汇总的记录)
+        """
+        stats = db.execute(
+            select(UserStats).where(UserStats.user_id == user_id).with_for_update()
+        ).scalar_one_or_none()
+        if stats is None:
+            UserStatsService.reconcile_user(db, user_id)
+            stats = db.execute(
+                select(UserStats).where(UserStats.user_id == user_id).with_for_update()
+            ).scalar_one()
+
+        # 读取已提交的序号: 不大于该序号的记录都已提交 (序号按提交顺序分配)
+        history_seq, ai_usage_seq, cleared_seq = db.execute(
+            select(User.history_seq, User.ai_usage_seq, User.history_cleared_seq).where(
+                User.id == user_id
+            )
+        ).one()
+
+        records = db.execute(
+            select(
+                History.change_seq,
+                History.created_at,
+                History.calculation_type,
+                History.expression.label("expression"),
+            )
+            .where(
+                History.user_id == user_id,
+                # 清空水位之前的记录已被逻辑删除
+                History.change_seq > max(stats.rollup_history_seq, cleared_seq),
+                History.change_seq <= history_seq,
+            )
+            .order_by(History.change_seq)
+            .limit(USAGE_ROLLUP_BATCH)
+        ).all()
+        usages = db.execute(
+            select(AIUsage.change_seq, AIUsage.created_at, AIUsage.tokens_used)
+            .where(
+                AIUsage.user_id == user_id,
+                AIUsage.change_seq > stats.rollup_ai_usage_seq,
+                AIUsage.change_seq <= ai_usage_seq,
+            )
+            .order_by(AIUsage.change_seq)
+            .limit(USAGE_ROLLUP_BATCH)
+        ).all()
+
+        calculations: Counter = Counter()
+        expressions: Counter = Counter()
+        texts: Dict[bytes, str] = {}
+        for _, created_at, calculation_type, expression in records:
+            for period in PERIODS:
+                calculations[(period, bucket_start(created_at, period), calculation_type)] += 1
+            digest = _expression_digest(expression)
+            texts[digest] = expression
+            expressions[digest] += 1
+
+        ai_usage: Dict[tuple, List[int]] = {}
+        for _, created_at, tokens_used in usages:
+            for period in PERIODS:
+                entry = ai_usage.setdefault((period, bucket_start(created_at, period)), [0, 0])
+                entry[0] += 1
+                entry[1] += tokens_used
+
+        _add_counts(
+            db,
+            UsageRollup,
+            ["user_id", "period", "bucket_start", "calculation_type"],
+            [
+                {
+                    "user_id": user_id,
+                    "period": period,
+                    "bucket_start": start,
+                    "calculation_type": calculation_type,
+                    "calculations": count,
+                }
+                for (period, start, calculation_type), count in calculations.items()
+            ],
+            ["calculations"],
+        )
+        _add_counts(
+            db,
+            AIUsageRollup,
+            ["user_id", "period", "bucket_start"],
+            [
+                {
+                    "user_id": user_id,
+                    "period": period,
+                    "bucket_start": start,
+                    "queries": queries,
+                    "tokens": tokens,
+                }
+                for (period, start), (queries, tokens) in ai_usage.items()
+            ],
+            ["queries", "tokens"],
+        )
+        _add_counts(
+            db,
+            ExpressionRollup,
+            ["user_id", "digest"],
+            [
+                {
+                    "user_id": user_id,
+                    "digest": digest,
+                    "expression": texts[digest],
+                    "uses": count,
+                }
+                for digest, count in expressions.items()
+            ],
+            ["uses"],
+        )
+
+        # 不足一批时推进到当前序号 (跳过已删除或已清空的记录)
+        history_more = len(records) == USAGE_ROLLUP_BATCH
+        ai_more = len(usages) == USAGE_ROLLUP_BATCH
+        stats.rollup_history_seq = records[-1].change_seq if history_more else history_seq
+        stats.rollup_ai_usage_seq = usages[-1].change_seq if ai_more else ai_usage_seq
+        stats.rolled_up_at = datetime.utcnow()
+        db.flush()
+        return len(records), len(usages), history_more or ai_more
+
+    @staticmethod
+    def run_rollups(db: Session) -> dict:
+        """
+        汇总所有有新记录的用户 (每个用户每批一个事务), 并清理过期的按小时汇总
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            dict: 汇总的用户数、历史记录数和 AI 使用记录数
+        """
+        users = history = ai_usage = 0
+        last_id = None
+        while True:
+            # 序号大于汇总水位的用户 (按用户ID分批)
+            query = (
+                select(User.id)
+                .outerjoin(UserStats, UserStats.user_id == User.id)
+                .where(
+                    or_(
+                        User.history_seq > func.coalesce(UserStats.rollup_history_seq, 0),
+                        User.ai_usage_seq > func.coalesce(UserStats.rollup_ai_usage_seq, 0),
+                    )
+                )
+                .order_by(User.id)
+                .limit(USAGE_ROLLUP_USER_BATCH)
+            )
+            if last_id is not None:
+                query = query.where(User.id > last_id)
+            user_ids = db.execute(query).scalars().all()
+            if not user_ids:
+                break
+
+            for user_id in user_ids:
+                more = True
+                while more:
+                    records, usages, more = UsageAnalyticsService.rollup_user(db, user_id)
+                    db.commit()
+                    history += records
+                    ai_usage += usages
+                users += 1
+            last_id = user_ids[-1]
+
+        if USAGE_HOURLY_RETENTION_DAYS > 0:
+            cutoff = bucket_start(
+                datetime.utcnow() - timedelta(days=USAGE_HOURLY_RETENTION_DAYS), "day"
+            )
+            for model in (UsageRollup, AIUsageRollup):
+                db.execute(
+                    delete(model).where(model.period == "hour", model.bucket_start < cutoff)
+                )
+            db.commit()
+
+        return {"users": users, "history": history, "ai_usage": ai_usage}
+
+    @staticmethod
+    def get_summary(
+        db: Session, user_id: UUID, days: int = 30, granularity: str = "day"
+    ) -> dict:
+        """
+        读取用户最近一段时间的使用统计 (只读取汇总表)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+            days: 统计最近的天数 (包括今天)
+            granularity: 时间线的粒度 (hour/day)
+
+        Returns:
+            dict: 总计、按计算类型统计、时间线、常用表达式 (累计) 和汇总时间
+
+        Raises:
+            ValueError: 按小时统计的范围超过了按小时汇总的保留天数
+        """
+        if granularity == "hour" and 0 < USAGE_HOURLY_RETENTION_DAYS < days:
+            raise ValueError(f"按小时统计最多 {USAGE_HOURLY_RETENTION_DAYS} 天")
+
+        now = datetime.utcnow()
+        step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+        count = days * 24 if granularity == "hour" else days
+        end = bucket_start(now, granularity) + step
+        start = end - step * count
+
+        timeline = {
+            start + step * offset: {
+                "bucket_start": start + step * offset,
+                "calculations": 0,
+                "ai_queries": 0,
+                "ai_tokens": 0,
+            }
+            for offset in range(count)
+        }
+        by_type: Counter = Counter()
+
+        rows = db.execute(
+            select(
+                UsageRollup.bucket_start, UsageRollup.calculation_type, UsageRollup.calculations
+            ).where(
+                UsageRollup.user_id == user_id,
+                UsageRollup.period == granularity,
+                UsageRollup.bucket_start >= start,
+            )
+        ).all()
+        for bucket, calculation_type, calculations in rows:
+            if bucket in timeline:
+                timeline[bucket]["calculations"] += calculations
+                by_type[calculation_type] += calculations
+
+        rows = db.execute(
+            select(AIUsageRollup.bucket_start, AIUsageRollup.queries, AIUsageRollup.tokens).where(
+                AIUsageRollup.user_id == user_id,
+                AIUsageRollup.period == granularity,
+                AIUsageRollup.bucket_start >= start,
+            )
+        ).all()
+        for bucket, queries, tokens in rows:
+            if bucket in timeline:
+                timeline[bucket]["ai_queries"] += queries
+                timeline[bucket]["ai_tokens"] += tokens
+
+        # 常用表达式按累计次数排行 (不限于统计范围), 走 (user_id, uses) 索引
+        top = db.execute(
+            select(ExpressionRollup.expression, ExpressionRollup.uses)
+            .where(ExpressionRollup.user_id == user_id)
+            .order_by(ExpressionRollup.uses.desc())
+            .limit(USAGE_TOP_EXPRESSIONS)
+        ).all()
+
+        buckets = list(timeline.values())
+        stats = db.get(UserStats, user_id)
+        return {
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "calculations": sum(bucket["calculations"] for bucket in buckets),
+            "ai_queries": sum(bucket["ai_queries"] for bucket in buckets),
+            "ai_tokens": sum(bucket["ai_tokens"] for bucket in buckets),
+            "by_type": dict(by_type),
+            "timeline": buckets,
+            "top_expressions": [
+                {"expression": expression, "count": count} for expression, count in top
+            ],
+            "rolled_up_at": stats.rolled_up_at if stats is not None else None,
+        }
+
+
+def clear_expression_rollups(db: Session, user_id: UUID) -> None:
+    """
+    删除用户的常用表达式汇总 (清空历史记录时调用, 在调用方的事务中执行)
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+    """
+    db.execute(delete(ExpressionRollup).where(ExpressionRollup.user_id == user_id))
+
+
+def delete_user_rollups(db: Session, user_id: UUID) -> None:
+    """
+    删除用户的全部汇总 (删除账户时调用, 在调用方的事务中执行)
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+    """
+    for model in (UsageRollup, AIUsageRollup, ExpressionRollup):
+        db.execute(delete(model).where(model.user_id == user_id))
+
+
+# 后台汇总线程 (USAGE_ROLLUP_INTERVAL > 0 时启用)
+_rollup_worker: Optional[threading.Thread] = None
+_rollup_stop = threading.Event()
+
+
+def _rollup_loop() -> None:
+    """后台汇总主循环"""
+    from ..utils.database import SessionLocal
+
+    while not _rollup_stop.wait(USAGE_ROLLUP_INTERVAL):
+        db = SessionLocal()
+        try:
+            UsageAnalyticsService.run_rollups(db)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  使用统计汇总失败: {e}")
+        finally:
+            db.close()
+
+
+def start_usage_rollups() -> None:
+    """启动后台汇总线程 (应用启动时调用)"""
+    global _rollup_worker
+    if USAGE_ROLLUP_INTERVAL <= 0 or _rollup_worker is not None:
+        return
+    _rollup_stop.clear()
+    _rollup_worker = threading.Thread(target=_rollup_loop, name="usage-rollup", daemon=True)
+    _rollup_worker.start()
+
+
+def shutdown_usage_rollups() -> None:
+    """停止后台汇总线程 (应用关闭时调用)"""
+    global _rollup_worker
+    if _rollup_worker is not None:
+        _rollup_stop.set()
+        _rollup_worker.join(timeout=5)
+        _rollup_worker = None
@@ -0,0 +1,313 @@
+"""
+用户统计汇总
+历史记录数 (热数据/已归档)、AI 查询次数、token 总数和最近活动时间保存在 user_stats 表中,
+随插入/删除在同一事务中增量更新, 读取为按主键的 O(1) 查询; 对账任务按用户重新统计并修正偏差
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import AIUsage, History, HistoryArchiveSegment, User, UserStats
+from ..utils.database import use_primary
+
+# 后台对账间隔 (秒), 0 表示不启用
+USER_STATS_RECONCILE_INTERVAL = float(os.getenv("USER_STATS_RECONCILE_INTERVAL", "0"))
+
+# 对账时每个事务处理的用户数
+USER_STATS_RECONCILE_BATCH = 100
+
+# 支持 INSERT ... ON CONFLICT 的方言
+_UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def bump_stats(
+    db: Session,
+    user_id: UUID,
+    history: int = 0,
+    ai_queries: int = 0,
+    ai_tokens: int = 0,
+    activity_at: Optional[datetime] = None,
+    archived: int = 0,
+) -> None:
+    """
+    增量更新用户统计 (在调用方的事务中执行, 不提交)
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        history: 历史记录数变化量
+        ai_queries: AI 查询次数变化量
+        ai_tokens: token 数变化量
+        activity_at: 活动时间 (新增记录时传入)
+        archived: 归档记录数变化量
+    """
+    table = UserStats.__table__
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+
+    if insert is not None:
+        statement = insert(table).values(
+            user_id=user_id,
+            history_count=max(history, 0),
+            ai_queries=max(ai_queries, 0),
+            ai_tokens=max(ai_tokens, 0),
+            archived_count=max(archived, 0),
+            last_activity_at=activity_at,
+        )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={
+                    "history_count": table.c.history_count + history,
+                    "ai_queries": table.c.ai_queries + ai_queries,
+                    "ai_tokens": table.c.ai_tokens + ai_tokens,
+                    "archived_count": table.c.archived_count + archived,
+                    "last_activity_at": func.coalesce(
+                        statement.excluded.last_activity_at, table.c.last_activity_at
+                    ),
+                },
+            )
+        )
+        return
+
+    # 其他数据库: 先更新, 没有统计行时插入
+    values = {
+        "history_count": table.c.history_count + history,
+        "ai_queries": table.c.ai_queries + ai_queries,
+        "ai_tokens": table.c.ai_tokens + ai_tokens,
+        "archived_count": table.c.archived_count + archived,
+    }
+    if activity_at is not None:
+        values["last_activity_at"] = activity_at
+    result = db.execute(update(table).where(table.c.user_id == user_id).values(**values))
+    if result.rowcount == 0:
+        db.execute(
+            table.insert().values(
+                user_id=user_id,
+                history_count=max(history, 0),
+                ai_queries=max(ai_queries, 0),
+                ai_tokens=max(ai_tokens, 0),
+                archived_count=max(archived, 0),
+                last_activity_at=activity_at,
+            )
+        )
+
+
+def bump_history_counts(db: Session, mappings: Iterable[dict]) -> None:
+    """
+    按用户汇总一批新增的历史记录并更新统计
+
+    Args:
+        db: 数据库会话
+        mappings: 历史记录插入字段
+    """
+    counts: Dict[UUID, list] = {}
+    for values in mappings:
+        entry = counts.setdefault(values["user_id"], [0, values["created_at"]])
+        entry[0] += 1
+        entry[1] = max(entry[1], values["created_at"])
+    for user_id, (count, activity_at) in counts.items():
+        bump_stats(db, user_id, history=count, activity_at=activity_at)
+
+
+def bump_ai_usage_counts(db: Session, mappings: Iterable[dict]) -> None:
+    """
+    按用户汇总一批新增的 AI 使用记录并更新统计
+
+    Args:
+        db: 数据库会话
+        mappings: AI 使用记录插入字段
+    """
+    counts: Dict[UUID, list] = {}
+    for values in mappings:
+        entry = counts.setdefault(values["user_id"], [0, 0, values["created_at"]])
+        entry[0] += 1
+        entry[1] += values["tokens_used"]
+        entry[2] = max(entry[2], values["created_at"])
+    for user_id, (queries, tokens, activity_at) in counts.items():
+        bump_stats(db, user_id, ai_queries=queries, ai_tokens=tokens, activity_at=activity_at)
+
+
+class UserStatsService:
+    """用户统计服务类"""
+
+    @staticmethod
+    def get_stats(db: Session, user_id: UUID) -> UserStats:
+        """
+        读取用户统计 (按主键读取; 尚无统计行时先对账生成)
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            UserStats: 用户统计
+        """
+        stats = db.get(UserStats, user_id)
+        if stats is None:
+            # 只读副本上不能写入, 切换到主库后生成统计行
+            use_primary(db)
+            UserStatsService.reconcile_user(db, user_id)
+            db.commit()
+            stats = db.get(UserStats, user_id)
+        return stats
+
+    @staticmethod
+    def reconcile_user(db: Session, user_id: UUID) -> bool:
+        """
+        重新统计单个用户并修正统计行 (在调用方的事务中执行, 不提交)
+
+        先锁定统计行再统计, 并发的插入/删除要么在统计之前提交并被计入,
+        要么等待本事务提交后再在修正后的值上增量更新
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            bool: 统计行是否有偏差 (或原本不存在)
+        """
+        stats = db.execute(
+            select(UserStats).where(UserStats.user_id == user_id).with_for_update()
+        ).scalar_one_or_none()
+
+        # 清空水位之前的数据由后台任务删除, 不计入统计
+        watermark = db.execute(
+            select(User.history_cleared_seq, User.history_cleared_at).where(User.id == user_id)
+        ).first()
+        cleared_seq, cleared_at = watermark if watermark is not None else (0, None)
+        hot_filter = [History.user_id == user_id]
+        segment_filter = [HistoryArchiveSegment.user_id == user_id]
+        if cleared_seq:
+            hot_filter.append(History.change_seq > cleared_seq)
+        if cleared_at is not None:
+            segment_filter.append(HistoryArchiveSegment.created_at > cleared_at)
+
+        history_count, history_last = db.execute(
+            select(func.count(History.id), func.max(History.created_at)).where(*hot_filter)
+        ).one()
+        ai_queries, ai_tokens, ai_last = db.execute(
+            select(
+                func.count(AIUsage.id),
+                func.coalesce(func.sum(AIUsage.tokens_used), 0),
+                func.max(AIUsage.created_at),
+            ).where(AIUsage.user_id == user_id)
+        ).one()
+        archived_count, archived_last = db.execute(
+            select(
+                func.coalesce(func.sum(HistoryArchiveSegment.record_count), 0),
+                func.max(HistoryArchiveSegment.end_at),
+            ).where(*segment_filter)
+        ).one()
+        last_activity_at = max(
+            filter(None, [history_last, ai_last, archived_last]), default=None
+        )
+
+        now = datetime.utcnow()
+        if stats is None:
+            db.add(
+                UserStats(
+                    user_id=user_id,
+                    history_count=history_count,
+                    ai_queries=ai_queries,
+                    ai_tokens=ai_tokens,
+                    archived_count=archived_count,
+                    last_activity_at=last_activity_at,
+                    reconciled_at=now,
+                )
+            )
+            db.flush()
+            return True
+
+        drifted = (
+            stats.history_count,
+            stats.ai_queries,
+            stats.ai_tokens,
+            stats.archived_count,
+        ) != (history_count, ai_queries, ai_tokens, archived_count)
+        stats.history_count = history_count
+        stats.archived_count = archived_count
+        stats.ai_queries = ai_queries
+        stats.ai_tokens = ai_tokens
+        stats.last_activity_at = last_activity_at or stats.last_activity_at
+        stats.reconciled_at = now
+        db.flush()
+        return drifted
+
+    @staticmethod
+    def reconcile_all(db: Session) -> dict:
+        """
+        对所有用户对账 (每批用户一个事务, 避免长时间持有锁)
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            dict: 检查的用户数和修正的用户数
+        """
+        checked = repaired = 0
+        last_id = None
+        while True:
+            query = select(User.id).order_by(User.id).limit(USER_STATS_RECONCILE_BATCH)
+            if last_id is not None:
+                query = query.where(User.id > last_id)
+            user_ids = db.execute(query).scalars().all()
+            if not user_ids:
+                break
+
+            for user_id in user_ids:
+                if UserStatsService.reconcile_user(db, user_id):
+                    repaired += 1
+            db.commit()
+
+            checked += len(user_ids)
+            last_id = user_ids[-1]
+
+        return {"checked": checked, "repaired": repaired}
+
+
+# 后台对账线程 (USER_STATS_RECONCILE_INTERVAL > 0 时启用)
+_reconciler: Optional[threading.Thread] = None
+_reconciler_stop = threading.Event()
+
+
+def _reconcile_loop() -> None:
+    """后台对账主循环"""
+    from ..utils.database import SessionLocal
+
+    while not _reconciler_stop.wait(USER_STATS_RECONCILE_INTERVAL):
+        db = SessionLocal()
+        try:
+            result = UserStatsService.reconcile_all(db)
+            if result["repaired"]:
+                print(f"⚠️  用户统计对账修正了 {result['repaired']} 个用户")
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  用户统计对账失败: {e}")
+        finally:
+            db.close()
+
+
+def start_stats_reconciler() -> None:
+    """启动后台对账线程 (应用启动时调用)"""
+    global _reconciler
+    if USER_STATS_RECONCILE_INTERVAL <= 0 or _reconciler is not None:
+        return
+    _reconciler_stop.clear()
+    _reconciler = threading.Thread(target=_reconcile_loop, name="stats-reconciler", daemon=True)
+    _reconciler.start()
+
+
+def shutdown_stats_reconciler() -> None:
+    """停止后台对账线程 (应用关闭时调用)"""
+    global _reconciler
+    if _reconciler is not None:
+        _reconciler_stop.set()
+        _reconciler.join(timeout=5)
+        _reconciler = None
@@ -0,0 +1,95 @@
+"""
+异步数据库工具模块
+
+DB_ASYNC=true 时使用: 与 utils/database.py 连接同一个数据库, 使用异步驱动
+(SQLite: aiosqlite, PostgreSQL: asyncpg), 连接池参数和 SQLite 连接参数与同步引擎相同。
+异步路由等待数据库时不占用线程池, 并发数只受连接池大小限制
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .database import (
+    DATABASE_URL,
+    MeteredQueuePool,
+    _engine_options,
+    _set_sqlite_pragmas,
+    pool_stats,
+)
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:
+    raise RuntimeError("DB_ASYNC=true 需要安装 greenlet 和异步数据库驱动 (aiosqlite / asyncpg)")
+
+# 各数据库使用的异步驱动
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """
+    把同步数据库URL转换为使用异步驱动的URL
+
+    Args:
+        url: 数据库URL (例如 sqlite:///./calculator.db)
+
+    Returns:
+        str: 异步驱动的数据库URL (例如 sqlite+aiosqlite:///./calculator.db)
+
+    Raises:
+        ValueError: 不支持的数据库类型
+    """
+    database = make_url(url)
+    backend = database.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支持异步访问的数据库类型: {backend}, 请设置 ASYNC_DATABASE_URL")
+    database = database.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return database.render_as_string(hide_password=False)
+
+
+# 异步引擎的数据库URL, 默认由 DATABASE_URL 转换得到
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+
+class MeteredAsyncQueuePool(MeteredQueuePool, AsyncAdaptedQueuePool):
+    """记录取出连接的耗时和超时次数的异步连接池"""
+
+
+# 创建异步数据库引擎
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, MeteredAsyncQueuePool)
+)
+
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+# 创建异步会话工厂 (提交后不过期对象, 避免在协程中访问属性时隐式查询数据库)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+async def get_async_db():
+    """
+    获取异步数据库会话的依赖注入函数
+    用于FastAPI的Depends
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def async_pool_stats() -> dict:
+    """
+    获取异步引擎的连接池状态和累计指标
+
+    Returns:
+        dict: 与 pool_stats 相同的字段
+    """
+    return pool_stats(async_engine.sync_engine)
+
+
+async def shutdown_async_db() -> None:
+    """关闭异步引擎的所有连接 (应用关闭时调用)"""
+    await async_engine.dispose()
@@ -2,31 +2,229 @@
 数据库工具模块
 """
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 # 从环境变量获取数据库URL,默认使用SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./calculator.db")
 
+# 连接池: 常驻连接数、高峰时额外创建的连接数 (默认共 20 个)、等待空闲连接的超时 (秒)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "15"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# 连接使用超过该时间 (秒) 后重建, 避免被数据库或中间代理断开的空闲连接; -1 表示不重建
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# 取出连接时先检查是否可用 (断开的连接自动重连)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite 连接参数 (每个新连接执行): WAL 模式下读写互不阻塞, synchronous=NORMAL 在 WAL 下
+# 只在检查点时同步磁盘 (断电可能丢失最近提交的事务, 但不会损坏数据库),
+# busy_timeout 为写锁被占用时的等待时间 (毫秒), mmap_size 为内存映射读取的大小 (字节)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# 异步数据库访问: 启用后认证、计算、AI 计算和历史记录的主要路由使用异步引擎
+# (utils/async_database.py, 需要安装 greenlet 和 aiosqlite / asyncpg), 等待数据库时不占用线程池
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+
+class MeteredQueuePool(QueuePool):
+    """记录取出连接的耗时 (等待空闲连接或新建连接) 和超时次数的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        # 正在等待连接的线程数
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        with self.metrics_lock:
+            self.waiting += 1
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self.metrics_lock:
+                self.waiting -= 1
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # dispose() 之后引擎使用新的连接池, 保留累计指标
+        pool = super().recreate()
+        with self.metrics_lock:
+            pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+            pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        return pool
+
+
+def _engine_options(url: str, poolclass=MeteredQueuePool) -> dict:
+    """
+    根据数据库类型生成 create_engine 参数
+
+    Args:
+        url: 数据库URL
+        poolclass: 连接池类 (异步引擎使用 MeteredAsyncQueuePool)
+
+    Returns:
+        dict: create_engine 的关键字参数
+    """
+    database = make_url(url)
+    if database.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if database.database in (None, "", ":memory:"):
+            # 内存数据库只能有一个连接, 使用默认的连接池
+            return options
+        # 本地文件数据库的连接不会被断开, 不需要检查和重建
+        return {
+            **options,
+            "poolclass": poolclass,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 # 创建数据库引擎
-# SQLite需要特殊配置
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+# SQLite 实际生效的日志模式 (内存数据库等不支持 WAL 时与配置不同)
+_sqlite_journal_mode = None
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """新建 SQLite 连接时设置日志模式、同步级别、锁等待时间和内存映射"""
+    global _sqlite_journal_mode
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        _sqlite_journal_mode = cursor.fetchone()[0]
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+
+def pool_stats(bind=None) -> dict:
+    """
+    获取连接池状态和累计指标
+
+    Args:
+        bind: 数据库引擎 (默认同步引擎; 异步引擎传入其 sync_engine)
+
+    Returns:
+        dict: 连接池配置、当前占用和等待的连接数、累计取出次数、取出耗时和超时次数
+    """
+    bind = engine if bind is None else bind
+    pool = bind.pool
+    stats = {"database": bind.dialect.name, "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            {
+                "size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            }
+        )
+    if isinstance(pool, MeteredQueuePool):
+        with pool.metrics_lock:
+            waiting, checkouts, timeouts = pool.waiting, pool.checkouts, pool.timeouts
+            wait_total, wait_max = pool.wait_total, pool.wait_max
+        stats.update(
+            {
+                "waiting": waiting,
+                "checkouts": checkouts,
+                "timeouts": timeouts,
+                "avg_wait_ms": round(wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "max_wait_ms": round(wait_max * 1000, 3),
+            }
+        )
+    if _sqlite_journal_mode is not None:
+        stats["journal_mode"] = _sqlite_journal_mode
+    return stats
+
+# 只读请求的 HTTP 方法 (会话可改用只读副本, 见 utils/replicas.py)
+READ_METHODS = {"GET", "HEAD"}
+
+
+class RoutingSession(Session):
+    """
+    可绑定到只读副本的会话
+
+    info["bind"] 为空时使用主库; 只读请求认证后由 utils/replicas.route_session 设置为副本引擎
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        bind = self.info.get("bind")
+        if bind is not None:
+            return bind
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def use_primary(db: Session) -> None:
+    """
+    把绑定到只读副本的会话切换回主库 (只读请求中需要写入时调用)
+
+    结束副本上的只读事务, 之后的查询和写入使用主库 (已加载的对象失效, 访问时从主库重新加载)
+
+    Args:
+        db: 数据库会话
+    """
+    if db.info.get("bind") is not None:
+        db.rollback()
+        db.info.pop("bind")
+
 
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # 创建基类
 Base = declarative_base()
 
 
-def get_db():
+def get_db(request: Request):
     """
     获取数据库会话的依赖注入函数
     用于FastAPI的Depends
+
+    会话默认使用主库; 只读请求 (GET/HEAD) 标记为 read_only, 认证后可改用只读副本
     """
     db = SessionLocal()
+    db.info["read_only"] = request.method in READ_METHODS
     try:
         yield db
     finally:
@@ -36,13 +234,35 @@ def get_db():
 def init_db():
     """
     初始化数据库
-    创建所有表
+    创建所有表, 并把已有的表迁移到当前模型
     """
     # 导入所有模型以确保它们被注册
-    from ..models import User, History, AIUsage
+    from ..models import (
+        User,
+        UserStats,
+        History,
+        HistoryText,
+        HistoryTombstone,
+        HistoryArchiveSegment,
+        HistoryPurgeJob,
+        AIUsage,
+        UsageRollup,
+        AIUsageRollup,
+        ExpressionRollup,
+    )
 
     # 创建所有表
     Base.metadata.create_all(bind=engine)
+
+    # 升级旧版本创建的表 (create_all 不会修改已有的表)
+    from .migrations import migrate_db
+
+    migrate_db(engine)
+
+    # 历史记录搜索索引 (SQLite FTS5 / PostgreSQL pg_trgm)
+    from ..services.history_search import setup_search_index
+
+    setup_search_index(engine)
     print("✅ 数据库表已创建")
 
 
@@ -0,0 +1,254 @@
+"""
+数据库迁移
+
+Base.metadata.create_all 只创建缺少的表, 不会修改已有的表。migrate_db 把旧版本创建的数据库
+升级到当前模型 (init_db 建表之后调用, 也可以单独执行 `python init_db.py migrate`):
+- 为已有的表添加模型中新增的列
+- 去掉模型中已改为可空的列的非空约束 (SQLite 不支持修改列, 按新定义重建表)
+- 创建已有的表上新增的索引
+- 回填新增列的数据 (历史记录和 AI 使用记录的变更序号)
+
+每一步都先检查数据库的当前状态, 可以重复执行。多进程部署升级时先单独执行一次迁移, 再启动服务
+"""
+from typing import List
+
+from sqlalchemy import MetaData, Table, bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from .database import Base
+
+# 回填变更序号时每条 UPDATE 语句更新的记录数
+MIGRATION_BATCH_SIZE = 1000
+
+# 已有的表上新增的索引: (索引名, 表名, 列, 是否唯一, 部分索引条件)
+MIGRATION_INDEXES = [
+    # 游标分页 (替代只按 user_id 过滤后再排序的查询)
+    (
+        "idx_history_user_created_id",
+        "history",
+        ("user_id", "created_at", "id"),
+        False,
+        None,
+    ),
+    # 增量同步
+    ("idx_history_user_change_seq", "history", ("user_id", "change_seq"), False, None),
+    ("uq_history_user_client_id", "history", ("user_id", "client_id"), True, None),
+    # 使用统计增量汇总 (AI 使用记录)
+    ("idx_ai_usage_user_change_seq", "ai_usage", ("user_id", "change_seq"), False, None),
+    # 删除记录后检查长文本是否仍被引用
+    (
+        "idx_history_expression_id",
+        "history",
+        ("expression_id",),
+        False,
+        "expression_id IS NOT NULL",
+    ),
+    ("idx_history_result_id", "history", ("result_id",), False, "result_id IS NOT NULL"),
+]
+
+
+def _add_missing_columns(conn: Connection) -> List[str]:
+    """
+    为已有的表添加模型中新增的列
+
+    Returns:
+        List[str]: 添加的列 (表名.列名)
+
+    Raises:
+        RuntimeError: 新增的列不允许为空且没有服务端默认值
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(
+                    f"无法为已有的表添加没有默认值的非空列: {table.name}.{column.name}"
+                )
+            definition = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _rebuild_sqlite_table(conn: Connection, table: Table) -> None:
+    """
+    按模型的定义重建 SQLite 表 (复制数据后替换原表, 再创建模型中的索引)
+
+    表上的触发器随原表删除; rowid 会重新分配, 按 rowid 关联的 history_fts 一并删除,
+    之后由 setup_search_index 重新创建触发器并重建索引
+
+    Args:
+        conn: 数据库连接
+        table: 模型中的表
+    """
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+    # 外键引用的表也复制到临时的 MetaData 中, 才能生成建表语句
+    metadata = MetaData()
+    for other in Base.metadata.sorted_tables:
+        other.to_metadata(metadata)
+    rebuilt = table.to_metadata(metadata, name=f"{table.name}_migrate")
+    # 上次迁移中断时留下的临时表
+    conn.execute(text(f"DROP TABLE IF EXISTS {rebuilt.name}"))
+    conn.execute(CreateTable(rebuilt))
+    conn.execute(
+        text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}")
+    )
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+    if table.name == "history":
+        conn.execute(text("DROP TABLE IF EXISTS history_fts"))
+
+
+def _drop_not_null(conn: Connection) -> List[str]:
+    """
+    去掉模型中已改为可空的列的非空约束 (例如长表达式保存在 history_texts 中时 expression 为空)
+
+    Returns:
+        List[str]: 修改的列 (表名.列名)
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    changed = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"]: column for column in inspector.get_columns(table.name)}
+        columns = [
+            column
+            for column in table.columns
+            if column.nullable
+            and column.name in existing
+            and not existing[column.name]["nullable"]
+        ]
+        if not columns:
+            continue
+        if conn.dialect.name == "sqlite":
+            _rebuild_sqlite_table(conn, table)
+        else:
+            for column in columns:
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL")
+                )
+        changed.extend(f"{table.name}.{column.name}" for column in columns)
+    return changed
+
+
+def _create_indexes(conn: Connection) -> List[str]:
+    """
+    创建已有的表上缺少的索引
+
+    Returns:
+        List[str]: 创建的索引名
+    """
+    inspector = inspect(conn)
+    created = []
+    for name, table, columns, unique, where in MIGRATION_INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        existing.update(
+            constraint["name"] for constraint in inspector.get_unique_constraints(table)
+        )
+        if name in existing:
+            continue
+        conn.execute(
+            text(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+                f"ON {table} ({', '.join(columns)})"
+                + (f" WHERE {where}" if where else "")
+            )
+        )
+        created.append(name)
+    return created
+
+
+def _backfill_change_seq(conn: Connection, table_name: str, counter: str) -> int:
+    """
+    为没有变更序号的记录分配序号, 并推进用户的序号计数器
+
+    每个用户的记录按 (created_at, id) 顺序接在 users.{counter} 之后编号,
+    之后增量同步和使用统计汇总都能读到这些记录
+
+    Args:
+        conn: 数据库连接
+        table_name: 表名 (history 或 ai_usage)
+        counter: users 表中的序号列 (history_seq 或 ai_usage_seq)
+
+    Returns:
+        int: 回填的记录数
+    """
+    table = Base.metadata.tables[table_name]
+    users = Base.metadata.tables["users"]
+    user_ids = conn.execute(
+        select(table.c.user_id).where(table.c.change_seq.is_(None)).distinct()
+    ).scalars().all()
+
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("record_id"))
+        .values(change_seq=bindparam("seq"))
+    )
+    total = 0
+    for user_id in user_ids:
+        seq = conn.execute(select(users.c[counter]).where(users.c.id == user_id)).scalar() or 0
+        record_ids = conn.execute(
+            select(table.c.id)
+            .where(table.c.user_id == user_id, table.c.change_seq.is_(None))
+            .order_by(table.c.created_at, table.c.id)
+        ).scalars().all()
+        for start in range(0, len(record_ids), MIGRATION_BATCH_SIZE):
+            batch = record_ids[start:start + MIGRATION_BATCH_SIZE]
+            conn.execute(
+                statement,
+                [
+                    {"record_id": record_id, "seq": seq + offset}
+                    for offset, record_id in enumerate(batch, start=1)
+                ],
+            )
+            seq += len(batch)
+        conn.execute(update(users).where(users.c.id == user_id).values({counter: seq}))
+        total += len(record_ids)
+    return total
+
+
+def migrate_db(engine) -> List[str]:
+    """
+    把旧版本创建的数据库升级到当前模型 (幂等, 在 create_all 之后调用)
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        List[str]: 执行的迁移步骤说明 (没有需要迁移的内容时为空)
+    """
+    steps = []
+    with engine.begin() as conn:
+        added = _add_missing_columns(conn)
+        if added:
+            steps.append(f"添加列: {', '.join(added)}")
+
+        changed = _drop_not_null(conn)
+        if changed:
+            steps.append(f"允许为空: {', '.join(changed)}")
+
+        created = _create_indexes(conn)
+        if created:
+            steps.append(f"创建索引: {', '.join(created)}")
+
+        for table_name, counter in (("history", "history_seq"), ("ai_usage", "ai_usage_seq")):
+            count = _backfill_change_seq(conn, table_name, counter)
+            if count:
+                steps.append(f"回填 {table_name}.change_seq: {count} 条记录")
+
+    for step in steps:
+        print(f"✅ 数据库迁移: {step}")
+    return steps
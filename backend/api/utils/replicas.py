@@ -0,0 +1,327 @@
+"""
+只读副本路由
+
+DATABASE_REPLICA_URLS 配置只读副本 (主从复制的从库) 后, 只读请求 (GET/HEAD) 的会话在认证后
+轮流绑定到健康的副本, 写请求和其余会话使用主库:
+- 健康检查: 后台线程定期查询每个副本 (PostgreSQL 同时检查复制延迟), 失败的副本暂停使用,
+  恢复后自动重新加入; 没有健康的副本或取出副本连接失败时回退到主库
+- 读己之写: 用户发出写请求 (或提交写入) 之后 REPLICA_STICKY_SECONDS 秒内,
+  该用户的只读请求仍使用主库, 避免读不到自己刚写入的数据 (记录在进程内,
+  多进程部署时需要负载均衡器按用户保持会话, 或把该时间设为大于复制延迟)
+"""
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .database import (
+    RoutingSession,
+    SessionLocal,
+    _engine_options,
+    _set_sqlite_pragmas,
+    pool_stats,
+)
+
+# 只读副本的数据库URL (逗号分隔); 为空时全部使用主库
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+
+# 副本健康检查间隔 (秒)
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+
+# PostgreSQL 副本允许的最大复制延迟 (秒), 超过时视为不健康; 0 表示不检查
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "0"))
+
+# 读己之写: 用户写入之后该时间 (秒) 内的只读请求使用主库
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# 健康检查查询 (同时确认副本上有数据表)
+HEALTH_CHECK_SQL = text("SELECT 1 FROM users LIMIT 1")
+
+# PostgreSQL 副本的复制延迟 (秒, 主库上没有新事务时也会增长)
+REPLICATION_LAG_SQL = text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+)
+
+
+class Replica:
+    """只读副本 (引擎和健康状态)"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url, **_engine_options(url))
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+        # 首次健康检查之前视为健康, 失败时在取出连接或健康检查时暂停使用
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[datetime] = None
+        self.lag: Optional[float] = None
+        self.reads = 0
+
+    def check(self) -> bool:
+        """
+        检查副本是否可用 (可以连接并查询数据表, 复制延迟不超过 REPLICA_MAX_LAG)
+
+        Returns:
+            bool: 是否健康
+        """
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(HEALTH_CHECK_SQL)
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(connection.execute(REPLICATION_LAG_SQL).scalar())
+            if REPLICA_MAX_LAG > 0 and self.lag is not None and self.lag > REPLICA_MAX_LAG:
+                self.mark_failed(f"复制延迟 {self.lag:.1f} 秒超过 {REPLICA_MAX_LAG:g} 秒")
+            else:
+                if not self.healthy:
+                    print(f"✅ 只读副本已恢复: {self.display_url}")
+                self.healthy, self.last_error = True, None
+        except Exception as e:
+            self.mark_failed(str(e))
+        self.last_checked = datetime.utcnow()
+        return self.healthy
+
+    def mark_failed(self, error: str) -> None:
+        """
+        暂停使用副本 (下次健康检查成功后恢复)
+
+        Args:
+            error: 失败原因
+        """
+        if self.healthy:
+            print(f"⚠️  只读副本不可用, 改用主库: {self.display_url}: {error}")
+        self.healthy, self.last_error = False, error
+
+    @property
+    def display_url(self) -> str:
+        """隐藏密码的数据库URL"""
+        return make_url(self.url).render_as_string(hide_password=True)
+
+
+class ReplicaRouter:
+    """只读副本集合、轮询选择和读己之写记录"""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # 用户ID -> 最近一次写入的时间 (time.monotonic)
+        self._recent_writes: Dict[UUID, float] = {}
+        # 因读己之写和没有可用副本而使用主库的只读请求数
+        self.sticky_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了只读副本"""
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        """
+        轮流选择一个健康的副本
+
+        Returns:
+            Optional[Replica]: 副本, 没有健康的副本时返回 None
+        """
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def count(self, field: str, replica: Optional[Replica] = None) -> None:
+        """
+        增加路由计数
+
+        Args:
+            field: 计数字段 (reads / sticky_reads / fallbacks)
+            replica: 计数的副本 (field 为 reads 时)
+        """
+        target = replica if replica is not None else self
+        with self._lock:
+            setattr(target, field, getattr(target, field) + 1)
+
+    def record_write(self, user_id: UUID) -> None:
+        """
+        记录用户的写入 (之后 REPLICA_STICKY_SECONDS 秒内该用户的只读请求使用主库)
+
+        Args:
+            user_id: 用户ID
+        """
+        with self._lock:
+            self._recent_writes[user_id] = time.monotonic()
+
+    def wrote_recently(self, user_id: UUID) -> bool:
+        """
+        用户最近是否写入过 (读己之写)
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            bool: 是否在 REPLICA_STICKY_SECONDS 秒内写入过
+        """
+        with self._lock:
+            written_at = self._recent_writes.get(user_id)
+            if written_at is None:
+                return False
+            if time.monotonic() - written_at < REPLICA_STICKY_SECONDS:
+                return True
+            del self._recent_writes[user_id]
+            return False
+
+    def prune(self) -> None:
+        """删除已超过 REPLICA_STICKY_SECONDS 的写入记录"""
+        expired_before = time.monotonic() - REPLICA_STICKY_SECONDS
+        with self._lock:
+            for user_id in [
+                user_id
+                for user_id, written_at in self._recent_writes.items()
+                if written_at < expired_before
+            ]:
+                del self._recent_writes[user_id]
+
+    def check_all(self) -> int:
+        """
+        检查所有副本并清理过期的写入记录
+
+        Returns:
+            int: 健康的副本数
+        """
+        self.prune()
+        return sum(replica.check() for replica in self.replicas)
+
+    def stats(self) -> dict:
+        """
+        获取副本状态和路由统计
+
+        Returns:
+            dict: 每个副本的健康状态、复制延迟、读取次数和连接池状态, 以及只读请求使用主库的次数
+        """
+        with self._lock:
+            sticky_users = len(self._recent_writes)
+        return {
+            "replicas": [
+                {
+                    "url": replica.display_url,
+                    "healthy": replica.healthy,
+                    "last_error": replica.last_error,
+                    "last_checked": replica.last_checked,
+                    "lag_seconds": replica.lag,
+                    "reads": replica.reads,
+                    "pool": pool_stats(replica.engine),
+                }
+                for replica in self.replicas
+            ],
+            "sticky_reads": self.sticky_reads,
+            "fallbacks": self.fallbacks,
+            "sticky_users": sticky_users,
+        }
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_commit(session: Session) -> None:
+    """请求会话在主库上提交后记录该用户的写入"""
+    user_id = session.info.get("user_id")
+    if user_id is not None and session.info.get("bind") is None and replica_router.enabled:
+        replica_router.record_write(user_id)
+
+
+def route_session(db: Session, user_id: UUID) -> None:
+    """
+    认证后确定请求会话使用的数据库 (在会话的第一次查询之前调用)
+
+    只读请求使用健康的副本 (用户最近写入过时使用主库); 写请求使用主库并记录写入
+
+    Args:
+        db: 数据库会话 (由 get_db 创建)
+        user_id: 当前用户ID
+    """
+    db.info["user_id"] = user_id
+    if not replica_router.enabled:
+        return
+    if not db.info.get("read_only"):
+        replica_router.record_write(user_id)
+        return
+    if replica_router.wrote_recently(user_id):
+        replica_router.count("sticky_reads")
+        return
+
+    # 依次尝试健康的副本, 取出连接失败时暂停使用该副本
+    while True:
+        replica = replica_router.choose()
+        if replica is None:
+            replica_router.count("fallbacks")
+            return
+        db.info["bind"] = replica.engine
+        try:
+            db.connection()
+        except DBAPIError as e:
+            db.rollback()
+            db.info.pop("bind")
+            replica.mark_failed(str(e))
+            continue
+        replica_router.count("reads", replica)
+        return
+
+
+def read_session(user_id: UUID) -> Session:
+    """
+    创建只读会话 (不经过 get_db 的只读操作使用, 例如流式导出)
+
+    Args:
+        user_id: 当前用户ID
+
+    Returns:
+        Session: 按 route_session 规则绑定到副本或主库的会话
+    """
+    db = SessionLocal()
+    db.info["read_only"] = True
+    route_session(db, user_id)
+    return db
+
+
+# 后台健康检查线程 (配置了只读副本且 REPLICA_HEALTH_INTERVAL > 0 时启用)
+_health_worker: Optional[threading.Thread] = None
+_health_stop = threading.Event()
+
+
+def _health_loop() -> None:
+    """后台健康检查主循环"""
+    while not _health_stop.wait(REPLICA_HEALTH_INTERVAL):
+        replica_router.check_all()
+
+
+def start_replica_health_checks() -> None:
+    """检查一次所有副本并启动后台健康检查线程 (应用启动时调用)"""
+    global _health_worker
+    if not replica_router.enabled or _health_worker is not None:
+        return
+    healthy = replica_router.check_all()
+    print(f"✅ 只读副本: {healthy}/{len(replica_router.replicas)} 个可用")
+    if REPLICA_HEALTH_INTERVAL <= 0:
+        return
+    _health_stop.clear()
+    _health_worker = threading.Thread(target=_health_loop, name="replica-health", daemon=True)
+    _health_worker.start()
+
+
+def shutdown_replica_health_checks() -> None:
+    """停止后台健康检查线程 (应用关闭时调用)"""
+    global _health_worker
+    if _health_worker is not None:
+        _health_stop.set()
+        _health_worker.join(timeout=5)
+        _health_worker = None
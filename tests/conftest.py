@@ -0,0 +1,92 @@
+"""
+测试公共配置
+
+配置在导入 api 模块时从环境变量读取, 因此先指向临时 SQLite 数据库并关闭只读副本、
+写后缓冲等可选功能, 再导入 api。测试共用一个数据库, 每个测试使用新建的用户隔离数据
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+TEST_DIR = tempfile.mkdtemp(prefix="calculator-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["DB_ASYNC"] = "false"
+os.environ["HISTORY_WRITE_MODE"] = "sync"
+os.environ["CALC_EXECUTOR"] = "inline"
+os.environ["CALC_RESULT_CACHE_BACKEND"] = "none"
+os.environ["HISTORY_PURGE_PAUSE"] = "0"
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../backend"))
+
+import pytest  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api.routers as routers  # noqa: E402
+from api.models import User  # noqa: E402
+from api.utils.database import SessionLocal, init_db  # noqa: E402
+from api.utils.security import create_access_token  # noqa: E402
+
+
+def build_app(**overrides) -> FastAPI:
+    """
+    创建包含全部路由的应用 (与 app.py 的路由前缀一致)
+
+    Args:
+        overrides: 替换的路由 (例如 history_router=异步版本)
+
+    Returns:
+        FastAPI: 应用
+    """
+    app = FastAPI()
+    for name in routers.__all__:
+        app.include_router(overrides.get(name, getattr(routers, name)), prefix="/api/v1")
+    return app
+
+
+def auth_headers_for(user: User) -> dict:
+    """用户的认证请求头 (直接签发令牌, 不经过注册和登录)"""
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """初始化测试数据库"""
+    init_db()
+    yield
+
+
+@pytest.fixture(scope="session")
+def client():
+    """测试客户端"""
+    with TestClient(build_app()) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    """数据库会话"""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    """新建的测试用户"""
+    name = f"u{uuid.uuid4().hex[:12]}"
+    record = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.add(record)
+    db.commit()
+    return record
+
+
+@pytest.fixture
+def auth_headers(user):
+    """测试用户的认证请求头"""
+    return auth_headers_for(user)
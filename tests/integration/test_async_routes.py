@@ -0,0 +1,90 @@
+"""
+DB_ASYNC 模式: 异步路由替换同名的同步路由后, 接口行为与同步模式一致
+"""
+import asyncio
+import inspect
+
+import pytest
+from fastapi import APIRouter
+from fastapi.testclient import TestClient
+
+from api import routers
+from api.routers import use_async_routes
+from api.routers.ai_async import router as ai_async_router
+from api.routers.auth_async import router as auth_async_router
+from api.routers.calculate_async import router as calculate_async_router
+from api.routers.history_async import router as history_async_router
+from api.utils.async_database import shutdown_async_db
+
+from conftest import build_app
+
+ASYNC_ROUTERS = {
+    "auth_router": auth_async_router,
+    "calculate_router": calculate_async_router,
+    "history_router": history_async_router,
+    "ai_router": ai_async_router,
+}
+
+
+def swapped_routers() -> dict:
+    """同步路由的副本 (不修改全局路由), 替换为异步路由"""
+    swapped = {}
+    for name, async_router in ASYNC_ROUTERS.items():
+        router = APIRouter()
+        router.routes.extend(getattr(routers, name).routes)
+        use_async_routes(router, async_router)
+        swapped[name] = router
+    return swapped
+
+
+@pytest.fixture(scope="module")
+def async_client():
+    with TestClient(build_app(**swapped_routers())) as client:
+        yield client
+    asyncio.run(shutdown_async_db())
+
+
+def test_every_async_route_replaces_a_sync_route():
+    swapped = swapped_routers()
+    for name, async_router in ASYNC_ROUTERS.items():
+        endpoints = {route.endpoint for route in swapped[name].routes}
+        assert {route.endpoint for route in async_router.routes} <= endpoints
+        # 替换后路由数和顺序不变
+        sync_paths = [route.path for route in getattr(routers, name).routes]
+        assert [route.path for route in swapped[name].routes] == sync_paths
+
+    calculate = next(
+        route
+        for route in swapped["calculate_router"].routes
+        if route.path == "/calculate" and "POST" in route.methods
+    )
+    assert inspect.iscoroutinefunction(calculate.endpoint)
+
+
+def test_calculate_and_history(async_client, auth_headers):
+    response = async_client.post(
+        "/api/v1/calculate", json={"expression": "6 * 7"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["result"] == 42.0
+    calculation_id = response.json()["calculation_id"]
+
+    history = async_client.get("/api/v1/history", headers=auth_headers).json()
+    assert [item["id"] for item in history["items"]] == [calculation_id]
+    assert history["total"] == 1
+
+    # 超出浮点数范围的结果不保存
+    response = async_client.post(
+        "/api/v1/calculate", json={"expression": "2 ** 1024 - 1"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+    deleted = async_client.delete(f"/api/v1/history/{calculation_id}", headers=auth_headers)
+    assert deleted.status_code == 204
+    assert async_client.get("/api/v1/history", headers=auth_headers).json()["total"] == 0
+
+
+def test_current_user(async_client, user, auth_headers):
+    response = async_client.get("/api/v1/auth/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == user.username
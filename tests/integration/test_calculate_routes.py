@@ -0,0 +1,122 @@
+"""
+计算接口
+"""
+import hashlib
+from uuid import UUID
+
+import pytest
+from sqlalchemy import event, select
+
+from api import dependencies
+from api.models import History
+from api.services.calculator import CalculatorService
+from api.services.exact import EXACT_STREAM_THRESHOLD, iter_digits
+from api.services.plot import PlotService
+from api.services.result_cache import MemoryCacheBackend, ResultCache
+from api.utils.database import engine
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """计算结果缓存和绘图缓存共用一个内存后端"""
+    backend = MemoryCacheBackend()
+    monkeypatch.setattr(CalculatorService, "result_cache", ResultCache(backend=backend))
+    monkeypatch.setattr(PlotService, "cache", ResultCache(backend=backend, prefix="plot:"))
+    return backend
+
+
+def test_batch_order_errors_and_single_insert(client, db, user, auth_headers):
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO history "):
+            inserts.append(statement)
+
+    expressions = ["2 + 3", "1 / 0", "sqrt(16)", "foo(1)", "2 ** 1024", "10 - 4"]
+    event.listen(engine, "before_cursor_execute", count_inserts)
+    try:
+        response = client.post(
+            "/api/v1/calculate/batch", json={"expressions": expressions}, headers=auth_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_inserts)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["expression"] for item in body["items"]] == expressions
+    assert [item["result"] for item in body["items"]] == [5, None, 4.0, None, None, 6]
+    errors = [item["error"] for item in body["items"]]
+    assert [error is None for error in errors] == [True, False, True, False, False, True]
+    assert "除数不能为零" in errors[1] and "浮点数范围" in errors[4]
+    assert (body["succeeded"], body["failed"]) == (3, 3)
+    # 成功的计算以一次批量插入写入历史记录
+    assert len(inserts) == 1
+
+    records = {
+        record.id: record
+        for record in db.execute(select(History).where(History.user_id == user.id)).scalars()
+    }
+    for item in body["items"]:
+        if item["error"] is None:
+            record = records[UUID(item["calculation_id"])]
+            assert record.expression == item["expression"]
+            assert float(record.result) == item["result"]
+    assert len(records) == 3
+
+
+def test_matrix_beyond_float_range(client, auth_headers):
+    response = client.post(
+        "/api/v1/calculate/matrix", json={"expression": "2 ** 10000"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+    assert "浮点数范围" in response.json()["detail"]
+
+
+def test_admin_cache_flush(client, user, auth_headers, caches, monkeypatch):
+    plot = {"expression": "sin(x)", "start": 0, "stop": 1, "points": 10}
+
+    def plot_cached() -> bool:
+        return client.post("/api/v1/calculate/plot", json=plot, headers=auth_headers).json()[
+            "cached"
+        ]
+
+    calculate = {"expression": "2 + 2"}
+    assert client.post("/api/v1/calculate", json=calculate, headers=auth_headers).status_code == 200
+    assert plot_cached() is False
+    assert plot_cached() is True
+
+    # 只有管理员可以清空缓存
+    assert client.delete("/api/v1/calculate/cache", headers=auth_headers).status_code == 403
+    monkeypatch.setattr(dependencies, "ADMIN_USERNAMES", {user.username})
+    response = client.delete("/api/v1/calculate/cache", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["deleted"] == {"local": 1, "backend": 1}
+    assert body["plot_deleted"] == {"local": 1, "backend": 1}
+
+    assert plot_cached() is False
+    assert client.get("/api/v1/calculate/cache/stats", headers=auth_headers).json()["size"] == 0
+
+
+def test_exact_result_streamed(client, db, auth_headers):
+    expression = "2 ** 40000"
+    digits = "".join(iter_digits(2**40000))
+    assert len(digits) > EXACT_STREAM_THRESHOLD
+    digest = hashlib.sha256(digits.encode("ascii")).hexdigest()
+
+    response = client.post(
+        "/api/v1/calculate/exact", json={"expression": expression}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text == digits
+    assert response.headers["X-Result-Digits"] == str(len(digits))
+    assert response.headers["X-Result-Digest"] == digest
+
+    # 历史记录只保存位数和摘要, 完整结果重新计算后校验
+    calculation_id = response.headers["X-Calculation-Id"]
+    record = db.get(History, UUID(calculation_id))
+    assert record.result == f"exact:{len(digits)}:sha256:{digest}"
+    again = client.get(f"/api/v1/calculate/exact/{calculation_id}", headers=auth_headers)
+    assert again.status_code == 200
+    assert again.text == digits
@@ -0,0 +1,24 @@
+"""
+数值微积分接口
+"""
+import pytest
+
+
+def test_integrate_integer_pow(client, auth_headers):
+    response = client.post(
+        "/api/v1/calculate/integrate",
+        json={"expression": "pow(10, 20) * x", "lower": 0, "upper": 1},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["value"] == pytest.approx(5e19, rel=1e-12)
+
+
+def test_integrate_rejects_modular_pow(client, auth_headers):
+    response = client.post(
+        "/api/v1/calculate/integrate",
+        json={"expression": "pow(x, 2, 5)", "lower": 0, "upper": 1},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+    assert "模幂" in response.json()["detail"]
@@ -0,0 +1,28 @@
+"""
+单位换算接口
+"""
+import pytest
+from sqlalchemy import select
+
+from api.models import History
+
+
+@pytest.mark.parametrize(
+    "expression, to, value",
+    [("-40 degC", "degF", -40.0), ("-10 degF", "degC", -23.333333333333)],
+)
+def test_negative_temperatures(client, db, user, auth_headers, expression, to, value):
+    response = client.post(
+        "/api/v1/convert", json={"expression": expression, "to": to}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["value"] == pytest.approx(value)
+    record = db.execute(select(History).where(History.user_id == user.id)).scalar_one()
+    assert record.result == f"{value:.12g} {to}"
+
+
+def test_non_finite_result_not_saved(client, db, user, auth_headers):
+    response = client.post("/api/v1/convert", json={"expression": "1e400 m"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "浮点数范围" in response.json()["detail"]
+    assert db.execute(select(History).where(History.user_id == user.id)).first() is None
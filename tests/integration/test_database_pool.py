@@ -0,0 +1,104 @@
+"""
+数据库连接池指标 (MeteredQueuePool / pool_stats, 即 /health/db 的内容) 和 SQLite 连接参数
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from api.utils.database import (
+    SQLITE_BUSY_TIMEOUT,
+    MeteredQueuePool,
+    engine,
+    pool_stats,
+)
+
+
+@pytest.fixture
+def small_engine(tmp_path):
+    """只有一个连接的连接池 (参数为等待连接的超时秒数)"""
+    engines = []
+
+    def create(timeout: float = 0.2):
+        test_engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            poolclass=MeteredQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=timeout,
+            connect_args={"check_same_thread": False},
+        )
+        engines.append(test_engine)
+        return test_engine
+
+    yield create
+    for test_engine in engines:
+        test_engine.dispose()
+
+
+def test_sqlite_pragmas():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # NORMAL
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT
+    assert pool_stats()["journal_mode"] == "wal"
+
+
+def test_pool_stats_fields():
+    stats = pool_stats()
+    assert (stats["database"], stats["pool"]) == ("sqlite", "MeteredQueuePool")
+    with engine.connect():
+        held = pool_stats()
+        assert held["checked_out"] == stats["checked_out"] + 1
+        assert held["checkouts"] == stats["checkouts"] + 1
+    assert pool_stats()["checked_out"] == stats["checked_out"]
+    assert {"size", "idle", "overflow", "waiting", "timeouts", "avg_wait_ms"} <= set(stats)
+
+
+def test_timeouts(small_engine):
+    test_engine = small_engine()
+    with test_engine.connect():
+        assert pool_stats(test_engine)["checkouts"] == 1
+        with pytest.raises(PoolTimeoutError):
+            test_engine.connect()
+    stats = pool_stats(test_engine)
+    assert (stats["timeouts"], stats["checkouts"], stats["waiting"]) == (1, 2, 0)
+    assert stats["max_wait_ms"] >= 200
+
+
+def test_waiting(small_engine):
+    test_engine = small_engine(timeout=5)
+    conn = test_engine.connect()
+    acquired = threading.Event()
+
+    def wait_for_connection():
+        with test_engine.connect():
+            acquired.set()
+
+    worker = threading.Thread(target=wait_for_connection)
+    worker.start()
+    # 等待中的线程计入 waiting, 连接归还后取到连接
+    deadline = time.monotonic() + 2
+    while pool_stats(test_engine)["waiting"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool_stats(test_engine)["waiting"] == 1
+    conn.close()
+    worker.join(timeout=5)
+    assert acquired.is_set()
+
+    stats = pool_stats(test_engine)
+    assert (stats["waiting"], stats["checked_out"], stats["checkouts"]) == (0, 0, 2)
+    assert stats["timeouts"] == 0 and stats["avg_wait_ms"] > 0
+
+
+def test_metrics_survive_dispose(small_engine):
+    test_engine = small_engine()
+    for _ in range(2):
+        with test_engine.connect():
+            pass
+    test_engine.dispose()
+    stats = pool_stats(test_engine)
+    assert stats["checkouts"] == 2 and stats["checked_out"] == 0
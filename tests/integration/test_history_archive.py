@@ -0,0 +1,164 @@
+"""
+历史记录归档: 热数据与归档数据的合并顺序、读取和删除归档记录 (重写归档段) 以及管理接口
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select, update
+
+from api import dependencies
+from api.models import History, HistoryArchiveSegment, User
+from api.services import history_archive
+from api.services.history import HistoryService
+from api.services.history_archive import HistoryArchiveService
+from api.services.matrix import to_binary
+
+PAST = datetime.utcnow() - timedelta(days=30)
+
+
+def create_at(db, user, expression, created_at, **kwargs):
+    """创建指定创建时间的历史记录"""
+    record = HistoryService.create_history(db, user.id, expression, "1", **kwargs)
+    db.execute(update(History).where(History.id == record.id).values(created_at=created_at))
+    db.commit()
+    return record.id
+
+
+def segments(db, user):
+    db.expire_all()
+    return (
+        db.execute(
+            select(HistoryArchiveSegment)
+            .where(HistoryArchiveSegment.user_id == user.id)
+            .order_by(HistoryArchiveSegment.start_at)
+        )
+        .scalars()
+        .all()
+    )
+
+
+@pytest.fixture
+def archived(db, user, monkeypatch):
+    """5 条旧记录归档为 3 个段 (每段 2 条), 另有 3 条近期记录; 返回按创建时间倒序的 ID"""
+    monkeypatch.setattr(history_archive, "HISTORY_ARCHIVE_CHUNK", 2)
+    old = [create_at(db, user, f"old {i}", PAST + timedelta(minutes=i)) for i in range(5)]
+    assert HistoryArchiveService.archive_user(db, user.id, PAST + timedelta(days=1)) == (5, 3)
+    recent = [HistoryService.create_history(db, user.id, f"new {i}", "1").id for i in range(3)]
+    return [str(i) for i in reversed(old + recent)]
+
+
+def page_ids(client, headers, **params):
+    response = client.get("/api/v1/history", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_page_number_merge_order(client, auth_headers, archived):
+    seen = []
+    for page in (1, 2, 3):
+        body = page_ids(client, auth_headers, page=page, page_size=3, include_archived=True)
+        assert body["total"] == 8 and body["total_pages"] == 3
+        seen += [item["id"] for item in body["items"]]
+    assert seen == archived
+
+    body = page_ids(client, auth_headers, page_size=10)
+    assert [item["id"] for item in body["items"]] == archived[:3]
+    assert body["total"] == 3
+
+
+def test_cursor_merge_order(client, auth_headers, archived):
+    seen, cursor = [], None
+    while True:
+        params = {"page_size": 3, "include_archived": True}
+        if cursor:
+            params["cursor"] = cursor
+        body = page_ids(client, auth_headers, **params)
+        seen += [item["id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == archived
+
+
+def test_hot_record_older_than_archive_interleaves(client, db, user, auth_headers, archived):
+    # 离线上传的记录创建时间早于部分归档记录, 仍在热表中
+    middle = create_at(db, user, "uploaded", PAST + timedelta(minutes=2, seconds=30))
+    body = page_ids(client, auth_headers, page_size=20, include_archived=True)
+    ids = [item["id"] for item in body["items"]]
+    assert ids == archived[:5] + [str(middle)] + archived[5:]
+    created = [item["created_at"] for item in body["items"]]
+    assert created == sorted(created, reverse=True)
+
+
+def test_get_archived_record(client, db, user, auth_headers, monkeypatch):
+    monkeypatch.setattr(history_archive, "HISTORY_ARCHIVE_CHUNK", 2)
+    values = np.array([[1.5, 2.0], [3.0, 4.0]])
+    record_id = create_at(
+        db,
+        user,
+        "[[1.5, 2], [3, 4]]",
+        PAST,
+        calculation_type="matrix",
+        result_data=to_binary(values),
+    )
+    create_at(db, user, "old", PAST + timedelta(minutes=1))
+    HistoryArchiveService.archive_user(db, user.id, PAST + timedelta(days=1))
+
+    record = HistoryService.get_history(db, user.id, record_id)
+    assert (record.expression, record.calculation_type) == ("[[1.5, 2], [3, 4]]", "matrix")
+    # 二进制结果随归档段保存
+    response = client.get(f"/api/v1/calculate/matrix/{record_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["values"] == values.tolist()
+
+
+def test_delete_archived_record_rewrites_segment(client, db, user, auth_headers, archived):
+    first, second = archived[-1], archived[-2]
+    before = segments(db, user)
+    assert [segment.record_count for segment in before] == [2, 2, 1]
+
+    assert client.delete(f"/api/v1/history/{first}", headers=auth_headers).status_code == 204
+    after = segments(db, user)
+    assert [segment.record_count for segment in after] == [1, 2, 1]
+    assert after[0].id == before[0].id
+    assert after[0].start_at == after[0].end_at == PAST + timedelta(minutes=1)
+    assert HistoryService.get_history(db, user.id, uuid.UUID(first)) is None
+    assert HistoryService.get_history(db, user.id, uuid.UUID(second)).expression == "old 1"
+
+    # 删除段内的最后一条记录时删除整个段
+    assert client.delete(f"/api/v1/history/{second}", headers=auth_headers).status_code == 204
+    assert [segment.record_count for segment in segments(db, user)] == [2, 1]
+    assert client.delete(f"/api/v1/history/{second}", headers=auth_headers).status_code == 404
+
+    body = page_ids(client, auth_headers, page_size=20, include_archived=True)
+    assert [item["id"] for item in body["items"]] == archived[:-2]
+    assert body["total"] == 6
+
+
+def test_other_user_cannot_read_archived_record(db, archived):
+    name = f"u{uuid.uuid4().hex[:12]}"
+    other = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.add(other)
+    db.commit()
+    # 其他用户没有归档段, 即使知道记录ID也读不到
+    record_id = uuid.UUID(archived[-1])
+    assert HistoryService.get_history(db, other.id, record_id) is None
+    assert not HistoryService.delete_history(db, other.id, record_id)
+
+
+def test_archive_route(client, db, user, auth_headers, monkeypatch):
+    monkeypatch.setattr(dependencies, "ADMIN_USERNAMES", {user.username})
+    create_at(db, user, "old", PAST)
+    HistoryService.create_history(db, user.id, "new", "1")
+
+    response = client.post("/api/v1/history/archive/run", headers=auth_headers)
+    assert response.status_code == 400
+
+    url = "/api/v1/history/archive/run?older_than_days=1"
+    assert client.post(url, headers=auth_headers).json()["archived"] >= 1
+    assert [segment.record_count for segment in segments(db, user)] == [1]
+    # 再次执行不会重复归档
+    client.post(url, headers=auth_headers)
+    assert [segment.record_count for segment in segments(db, user)] == [1]
@@ -0,0 +1,107 @@
+"""
+历史记录导出: 流式输出全部记录 (包括已归档的记录)、NDJSON/CSV 格式和游标续传
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from api.models import History
+from api.services import history_export
+from api.services.history import HistoryService
+from api.services.history_archive import HistoryArchiveService
+
+
+@pytest.fixture
+def records(db, user, monkeypatch):
+    """3 条已归档的旧记录和 4 条近期记录, 按创建时间升序返回 ID"""
+    # 每批 2 条, 覆盖多批输出以及热数据与归档数据的归并
+    monkeypatch.setattr(history_export, "HISTORY_EXPORT_BATCH_SIZE", 2)
+    old = HistoryService.create_history_bulk(db, user.id, [(f"{i} - 1", "1") for i in range(3)])
+    past = datetime.utcnow() - timedelta(days=30)
+    for offset, history_id in enumerate(old):
+        db.execute(
+            update(History)
+            .where(History.id == history_id)
+            .values(created_at=past + timedelta(seconds=offset))
+        )
+    db.commit()
+    archived, _ = HistoryArchiveService.archive_user(db, user.id, past + timedelta(days=1))
+    assert archived == 3
+
+    recent = [
+        HistoryService.create_history(db, user.id, f"{i} + 1", str(i + 1)).id for i in range(4)
+    ]
+    return [str(i) for i in old + recent]
+
+
+def export(client, headers, **params):
+    response = client.get("/api/v1/history/export", params=params, headers=headers)
+    assert response.status_code == 200
+    return response
+
+
+def ndjson_rows(content: bytes):
+    return [json.loads(line) for line in content.decode("utf-8").splitlines()]
+
+
+def test_ndjson_includes_archived_records(client, auth_headers, records):
+    response = export(client, auth_headers, include_archived=True)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "history.ndjson" in response.headers["content-disposition"]
+
+    rows = ndjson_rows(response.content)
+    assert [row["id"] for row in rows] == records
+    assert set(rows[0]) == set(history_export.EXPORT_FIELDS)
+    assert (rows[0]["expression"], rows[0]["result"]) == ("0 - 1", "1")
+    assert rows[-1]["calculation_type"] == "basic"
+    assert [row["created_at"] for row in rows] == sorted(row["created_at"] for row in rows)
+
+
+def test_archived_records_excluded_by_default(client, auth_headers, records):
+    rows = ndjson_rows(export(client, auth_headers).content)
+    assert [row["id"] for row in rows] == records[3:]
+
+
+def test_csv_format(client, auth_headers, records):
+    response = export(client, auth_headers, format="csv", include_archived=True)
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert tuple(rows[0]) == history_export.EXPORT_FIELDS
+    assert [row[0] for row in rows[1:]] == records
+    assert rows[-1][1:3] == ["3 + 1", "4"]
+
+
+def test_gzip_export(client, auth_headers, records):
+    response = export(client, auth_headers, gzip=True, include_archived=True)
+    assert response.headers["content-type"] == "application/gzip"
+    assert "history.ndjson.gz" in response.headers["content-disposition"]
+    rows = ndjson_rows(gzip.decompress(response.content))
+    assert [row["id"] for row in rows] == records
+
+
+def test_resume_from_cursor(client, auth_headers, records):
+    rows = ndjson_rows(export(client, auth_headers, include_archived=True).content)
+    # 从最后一条归档记录之后继续, 以及从近期记录中间继续
+    for index in (2, 4):
+        resumed = export(client, auth_headers, include_archived=True, since=rows[index]["cursor"])
+        assert [row["id"] for row in ndjson_rows(resumed.content)] == records[index + 1:]
+
+
+def test_empty_export(client, auth_headers):
+    assert export(client, auth_headers).content == b""
+    assert export(client, auth_headers, format="csv").text == ",".join(
+        history_export.EXPORT_FIELDS
+    ) + "\n"
+
+
+def test_invalid_cursor(client, auth_headers):
+    response = client.get(
+        "/api/v1/history/export", params={"since": "not-a-cursor"}, headers=auth_headers
+    )
+    assert response.status_code == 400
@@ -0,0 +1,79 @@
+"""
+历史记录游标分页
+"""
+import base64
+
+import pytest
+
+from api.services.history import HistoryService, decode_cursor, encode_cursor
+
+
+def pages(client, headers, page_size, **params):
+    """按 next_cursor 依次读取所有页"""
+    result = []
+    cursor = None
+    while True:
+        query = {"page_size": page_size, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/v1/history", params=query, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        result.append(body)
+        cursor = body["next_cursor"]
+        assert body["has_more"] == (cursor is not None)
+        if cursor is None:
+            return result
+
+
+def test_cursor_paging_with_equal_timestamps(client, db, user, auth_headers):
+    # 批量创建的记录 created_at 相同, 按 id 区分先后
+    ids = HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(7)])
+    newest = HistoryService.create_history(db, user.id, "2 * 2", "4").id
+
+    result = pages(client, auth_headers, 3)
+    assert [len(body["items"]) for body in result] == [3, 3, 2]
+    # 第一页按页码分页统计总数, 之后的游标分页不统计
+    assert (result[0]["page"], result[0]["total"]) == (1, 8)
+    assert all(body["page"] is None and body["total"] is None for body in result[1:])
+
+    items = [item for body in result for item in body["items"]]
+    assert items[0]["id"] == str(newest)
+    assert sorted(item["id"] for item in items[1:]) == sorted(str(i) for i in ids)
+    assert [item["id"] for item in items[1:]] == sorted((str(i) for i in ids), reverse=True)
+
+
+def test_cursor_ignores_records_created_while_paging(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(4)])
+    first = client.get("/api/v1/history", params={"page_size": 2}, headers=auth_headers).json()
+    HistoryService.create_history(db, user.id, "new", "0")
+
+    second = client.get(
+        "/api/v1/history",
+        params={"page_size": 2, "cursor": first["next_cursor"]},
+        headers=auth_headers,
+    ).json()
+    seen = [item["id"] for item in first["items"] + second["items"]]
+    assert len(set(seen)) == 4
+    assert second["has_more"] is False and second["next_cursor"] is None
+
+
+def test_last_page_exactly_full(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(4)])
+    result = pages(client, auth_headers, 2)
+    assert [len(body["items"]) for body in result] == [2, 2]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not-a-cursor", base64.urlsafe_b64encode(b"2026-01-01T00:00:00|x").decode(), "%%%"],
+)
+def test_invalid_cursor(client, auth_headers, cursor):
+    response = client.get("/api/v1/history", params={"cursor": cursor}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "分页游标无效"
+
+
+def test_cursor_round_trip(db, user):
+    record = HistoryService.create_history(db, user.id, "1 + 1", "2")
+    assert decode_cursor(encode_cursor(record)) == (record.created_at, record.id)
@@ -0,0 +1,114 @@
+"""
+清空历史记录和删除账户: 清空水位立即隐藏数据, 后台任务分批删除 (包括不再被引用的长文本)
+"""
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from api.models import History, HistoryText, User
+from api.services import history_purge
+from api.services.history import HistoryService
+from api.services.history_purge import HistoryPurgeService
+
+LONG_EXPRESSION = "sqrt(" + " + ".join(["7"] * 40) + ")"
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """超过 3 条记录时创建后台任务, 每批删除 3 条"""
+    monkeypatch.setattr(history_purge, "HISTORY_PURGE_BATCH", 3)
+
+
+@pytest.fixture
+def queued_jobs(monkeypatch):
+    """拦截提交到后台线程的任务, 由测试手动执行"""
+    jobs = []
+    monkeypatch.setattr(history_purge, "submit_purge_job", jobs.append)
+    return jobs
+
+
+def create_records(db, user, count, prefix=LONG_EXPRESSION):
+    """创建带长表达式 (去重保存在 history_texts 中) 的历史记录"""
+    return HistoryService.create_history_bulk(
+        db, user.id, [(f"{prefix} + {i}", "1.0") for i in range(count)]
+    )
+
+
+def text_count(db, prefix=LONG_EXPRESSION):
+    return db.execute(
+        select(func.count()).select_from(HistoryText).where(HistoryText.content.like(f"{prefix}%"))
+    ).scalar()
+
+
+def test_small_clear_deletes_inline(client, db, user, auth_headers, small_batches, queued_jobs):
+    create_records(db, user, 3)
+    response = client.delete("/api/v1/history", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 3
+    assert queued_jobs == []
+    assert db.execute(select(func.count()).where(History.user_id == user.id)).scalar() == 0
+    assert text_count(db) == 0
+
+
+def test_watermark_hides_rows_until_job_runs(
+    client, db, user, auth_headers, small_batches, queued_jobs
+):
+    prefix = LONG_EXPRESSION + " * 2"
+    create_records(db, user, 5, prefix)
+    response = client.delete("/api/v1/history", headers=auth_headers)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert [str(job) for job in queued_jobs] == [job_id]
+
+    # 物理删除之前读取已看不到被清空的记录
+    history = client.get("/api/v1/history", headers=auth_headers).json()
+    assert history["items"] == [] and history["total"] == 0
+    search = client.get("/api/v1/history/search", params={"q": "sqrt"}, headers=auth_headers)
+    assert search.json()["items"] == []
+    job = client.get(f"/api/v1/history/jobs/{job_id}", headers=auth_headers).json()
+    assert (job["status"], job["total"], job["deleted"]) == ("pending", 5, 0)
+
+    # 清空之后新增的记录可见, 也不会被任务删除
+    kept = HistoryService.create_history(db, user.id, prefix + " + kept", "2.0").id
+    history = client.get("/api/v1/history", headers=auth_headers).json()
+    assert [item["id"] for item in history["items"]] == [str(kept)]
+
+    assert HistoryPurgeService.run_job(db, queued_jobs[0]) is True
+    job = client.get(f"/api/v1/history/jobs/{job_id}", headers=auth_headers).json()
+    assert (job["status"], job["deleted"]) == ("done", 5)
+    rows = db.execute(select(History.id).where(History.user_id == user.id)).scalars().all()
+    assert rows == [kept]
+    # 只保留仍被引用的长文本
+    assert text_count(db, prefix) == 1
+
+
+def test_background_job_completes(client, db, user, auth_headers, small_batches):
+    create_records(db, user, 7, LONG_EXPRESSION + " * 3")
+    response = client.delete("/api/v1/history", headers=auth_headers)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/api/v1/history/jobs/{job_id}", headers=auth_headers).json()
+        if job["status"] in ("done", "failed") or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert (job["status"], job["deleted"], job["error"]) == ("done", 7, None)
+    assert db.execute(select(func.count()).where(History.user_id == user.id)).scalar() == 0
+
+
+def test_account_removal(db, user, queued_jobs):
+    prefix, user_id = LONG_EXPRESSION + " * 4", user.id
+    create_records(db, user, 4, prefix)
+    HistoryService.create_ai_usage(db, user_id, "1 + 1", 10)
+
+    job_id = HistoryPurgeService.remove_account(db, user).id
+    assert db.get(User, user_id).is_active is False
+    assert HistoryPurgeService.run_job(db, queued_jobs[0]) is True
+
+    db.expire_all()
+    assert db.get(User, user_id) is None
+    assert HistoryPurgeService.get_job(db, job_id).deleted == 5
+    assert text_count(db, prefix) == 0
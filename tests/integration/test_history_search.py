@@ -0,0 +1,132 @@
+"""
+历史记录搜索 (SQLite FTS5): 前缀匹配、查询语法转义、用户隔离和过滤条件
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from api.models import History, User
+from api.services.history import HistoryService
+
+from conftest import auth_headers_for
+
+SEARCH = "/api/v1/history/search"
+
+LONG_EXPRESSION = "cbrt(" + " + ".join(["9"] * 40) + ")"
+
+
+@pytest.fixture
+def other_user(db):
+    name = f"u{uuid.uuid4().hex[:12]}"
+    record = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.add(record)
+    db.commit()
+    return record
+
+
+def search(client, headers, q, **params):
+    response = client.get(SEARCH, params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def expressions(body):
+    return [item["expression"] for item in body["items"]]
+
+
+def test_prefix_and_term_matching(client, db, user, auth_headers):
+    for expression in ("sqrt(16)", "sqrt(2) + 1.5", "sin(pi)", LONG_EXPRESSION):
+        HistoryService.create_history(db, user.id, expression, "1")
+
+    # 按创建时间倒序
+    assert expressions(search(client, auth_headers, "sqr")) == ["sqrt(2) + 1.5", "sqrt(16)"]
+    assert expressions(search(client, auth_headers, "sqrt 16")) == ["sqrt(16)"]
+    assert expressions(search(client, auth_headers, "sqrt(16")) == ["sqrt(16)"]
+    # 单个字符按完整词匹配
+    assert expressions(search(client, auth_headers, "1")) == ["sqrt(2) + 1.5"]
+    assert expressions(search(client, auth_headers, "1.5")) == ["sqrt(2) + 1.5"]
+    # 长表达式保存在 history_texts 中
+    assert expressions(search(client, auth_headers, "cbrt")) == [LONG_EXPRESSION]
+    assert expressions(search(client, auth_headers, "cos")) == []
+
+
+@pytest.mark.parametrize(
+    "q, expected",
+    [
+        # 未转义时会匹配两条记录
+        ('sqrt" OR "sin', []),
+        ("sqrt OR sin", []),
+        ("NEAR(sqrt sin)", []),
+        ("expression:sin", []),
+        ("{owner ctype}:sin", []),
+        ("sin NOT 16", []),
+        ("sqrt*", ["sqrt(16)"]),
+        ("^sqrt", ["sqrt(16)"]),
+    ],
+)
+def test_query_syntax_is_escaped(client, db, user, auth_headers, q, expected):
+    HistoryService.create_history(db, user.id, "sqrt(16)", "4")
+    HistoryService.create_history(db, user.id, "sin(0)", "0")
+    # FTS5 语法字符按分隔符处理, 关键字按普通词匹配, 所有词都需要匹配
+    assert expressions(search(client, auth_headers, q)) == expected
+
+
+def test_query_without_terms(client, auth_headers):
+    for q in ('"', "*", "()"):
+        response = client.get(SEARCH, params={"q": q}, headers=auth_headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "搜索词不能为空"
+
+
+def test_too_many_terms(client, auth_headers):
+    response = client.get(SEARCH, params={"q": " ".join("abcdefghi")}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_user_isolation(client, db, user, auth_headers, other_user):
+    HistoryService.create_history(db, user.id, "log(100)", "2")
+    HistoryService.create_history(db, other_user.id, "log(1000)", "3")
+
+    assert expressions(search(client, auth_headers, "log")) == ["log(100)"]
+    other_headers = auth_headers_for(other_user)
+    assert expressions(search(client, other_headers, "log")) == ["log(1000)"]
+    # 在搜索词中写另一个用户的 owner 词不能越过用户过滤
+    assert expressions(search(client, auth_headers, f"owner:u{other_user.id.hex}")) == []
+    assert expressions(search(client, auth_headers, f"u{other_user.id.hex}")) == []
+
+
+def test_deleted_and_cleared_records_hidden(client, db, user, auth_headers):
+    first = HistoryService.create_history(db, user.id, "exp(1)", "2.718")
+    HistoryService.create_history(db, user.id, "exp(2)", "7.389")
+    assert HistoryService.delete_history(db, user.id, first.id)
+    assert expressions(search(client, auth_headers, "exp")) == ["exp(2)"]
+
+    client.delete("/api/v1/history", headers=auth_headers)
+    assert expressions(search(client, auth_headers, "exp")) == []
+
+
+def test_calculation_type_filter(client, db, user, auth_headers):
+    HistoryService.create_history(db, user.id, "tan(1)", "1.557", "basic")
+    HistoryService.create_history(db, user.id, "tan(2)", "-2.185", "scientific")
+
+    body = search(client, auth_headers, "tan", calculation_type="scientific")
+    assert expressions(body) == ["tan(2)"]
+    assert expressions(search(client, auth_headers, "tan", calculation_type='x" OR "t')) == []
+
+
+def test_time_range_and_limit(client, db, user, auth_headers):
+    ids = [HistoryService.create_history(db, user.id, f"abs({i})", str(i)).id for i in range(3)]
+    past = datetime.utcnow() - timedelta(days=40)
+    db.execute(update(History).where(History.id == ids[0]).values(created_at=past))
+    db.commit()
+
+    start = (past + timedelta(days=1)).isoformat()
+    assert expressions(search(client, auth_headers, "abs", start=start)) == ["abs(2)", "abs(1)"]
+    end = (past + timedelta(seconds=1)).isoformat()
+    assert expressions(search(client, auth_headers, "abs", end=end)) == ["abs(0)"]
+
+    body = search(client, auth_headers, "abs", limit=2)
+    assert len(body["items"]) == 2 and body["has_more"] is True
+    assert search(client, auth_headers, "abs", limit=3)["has_more"] is False
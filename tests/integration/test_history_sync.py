@@ -0,0 +1,174 @@
+"""
+历史记录增量同步: /history/changes 分页、删除标记、归档记录、ETag/304 和离线上传去重
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from api.models import History, HistoryArchiveSegment
+from api.services.history import HistoryService
+from api.services.history_archive import HistoryArchiveService, archived_changes
+
+CHANGES = "/api/v1/history/changes"
+UPLOAD = "/api/v1/history/sync/upload"
+
+
+def pull_all(client, headers, since=0, limit=2):
+    """按 has_more 连续拉取, 返回全部变更和最终的 since"""
+    changes = []
+    while True:
+        response = client.get(CHANGES, params={"since": since, "limit": limit}, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["changes"]) <= limit
+        changes += body["changes"]
+        since = body["since"]
+        if not body["has_more"]:
+            return changes, since
+
+
+def test_changes_paging(client, db, user, auth_headers):
+    records = [(f"{i} + {i}", str(2.0 * i)) for i in range(5)]
+    HistoryService.create_history_bulk(db, user.id, records)
+
+    changes, since = pull_all(client, auth_headers)
+    assert [change["seq"] for change in changes] == [1, 2, 3, 4, 5]
+    assert {change["op"] for change in changes} == {"upsert"}
+    assert changes[2]["expression"] == "2 + 2" and changes[2]["result"] == "4.0"
+    assert since == 5
+
+    # 没有新变更
+    response = client.get(CHANGES, params={"since": since}, headers=auth_headers)
+    assert response.json() == {"changes": [], "since": 5, "has_more": False}
+
+
+def test_tombstones(client, db, user, auth_headers):
+    ids = HistoryService.create_history_bulk(db, user.id, [("1 + 1", "2.0"), ("2 + 2", "4.0")])
+    _, since = pull_all(client, auth_headers)
+
+    assert client.delete(f"/api/v1/history/{ids[0]}", headers=auth_headers).status_code == 204
+    changes, since = pull_all(client, auth_headers, since)
+    assert [(change["op"], change["id"]) for change in changes] == [("delete", str(ids[0]))]
+
+    assert client.delete("/api/v1/history", headers=auth_headers).json()["deleted_count"] == 1
+    changes, _ = pull_all(client, auth_headers, since)
+    assert [(change["op"], change["id"]) for change in changes] == [("clear", None)]
+
+    # 首次同步的客户端不会收到已删除的记录
+    changes, _ = pull_all(client, auth_headers)
+    assert all(change["op"] != "upsert" for change in changes)
+
+
+def test_not_modified(client, db, user, auth_headers):
+    HistoryService.create_history(db, user.id, "1 + 1", "2.0")
+    response = client.get(CHANGES, headers=auth_headers)
+    etag, since = response.headers["ETag"], response.json()["since"]
+    assert etag == f'"{since}"'
+
+    headers = {**auth_headers, "If-None-Match": etag}
+    response = client.get(CHANGES, params={"since": since}, headers=headers)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # 有新变更后返回 200 和新的 ETag
+    HistoryService.create_history(db, user.id, "2 + 2", "4.0")
+    response = client.get(CHANGES, params={"since": since}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [change["expression"] for change in response.json()["changes"]] == ["2 + 2"]
+
+
+def test_upload_deduplicates_by_client_id(client, auth_headers):
+    items = [
+        {"client_id": "offline-1", "expression": "1 + 1", "result": "2.0"},
+        {"client_id": "offline-2", "expression": "2 + 2", "result": "4.0"},
+    ]
+    first = client.post(UPLOAD, json={"items": items}, headers=auth_headers).json()
+    assert first["created"] == 2
+
+    # 网络重试: 重复上传 offline-2, 同时上传新的 offline-3
+    retry = client.post(
+        UPLOAD,
+        json={"items": items[1:] + [{"client_id": "offline-3", "expression": "3 + 3"}]},
+        headers=auth_headers,
+    ).json()
+    assert retry["created"] == 1
+    assert [item["created"] for item in retry["items"]] == [False, True]
+    assert retry["items"][0]["id"] == first["items"][1]["id"]
+
+    changes, since = pull_all(client, auth_headers)
+    assert [change["client_id"] for change in changes] == ["offline-1", "offline-2", "offline-3"]
+    assert since == retry["since"]
+
+    history = client.get("/api/v1/history", headers=auth_headers).json()
+    assert history["total"] == 3
+
+
+def archive_oldest(db, user, count):
+    """把用户序号最小的 count 条记录移到过去并归档"""
+    ids = (
+        db.execute(
+            select(History.id)
+            .where(History.user_id == user.id)
+            .order_by(History.change_seq)
+            .limit(count)
+        )
+        .scalars()
+        .all()
+    )
+    past = datetime.utcnow() - timedelta(days=30)
+    db.execute(update(History).where(History.id.in_(ids)).values(created_at=past))
+    db.commit()
+    archived, _ = HistoryArchiveService.archive_user(db, user.id, past + timedelta(days=1))
+    assert archived == count
+    return ids
+
+
+def test_full_sync_includes_archived_records(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(5)])
+    archived = archive_oldest(db, user, 3)
+
+    changes, since = pull_all(client, auth_headers)
+    assert [change["seq"] for change in changes] == [1, 2, 3, 4, 5]
+    assert [change["id"] for change in changes[:3]] == [str(i) for i in archived]
+    assert changes[0]["expression"] == "0 + 1" and changes[0]["result"] == "1"
+    assert since == 5
+
+    # 从中间继续拉取: 只返回序号更大的归档记录
+    changes, _ = pull_all(client, auth_headers, since=2)
+    assert [change["seq"] for change in changes] == [3, 4, 5]
+
+
+def test_deleted_archived_record_not_synced(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(3)])
+    archived = archive_oldest(db, user, 2)
+    response = client.delete(f"/api/v1/history/{archived[0]}", headers=auth_headers)
+    assert response.status_code == 204
+
+    changes, since = pull_all(client, auth_headers)
+    assert [(change["op"], change["seq"]) for change in changes] == [
+        ("upsert", 2),
+        ("upsert", 3),
+        ("delete", 4),
+    ]
+    assert since == 4
+
+
+def test_cleared_archive_not_synced(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(3)])
+    archive_oldest(db, user, 2)
+    assert client.delete("/api/v1/history", headers=auth_headers).status_code == 200
+
+    changes, _ = pull_all(client, auth_headers)
+    assert [change["op"] for change in changes] == ["clear"]
+
+
+def test_sync_skips_segments_without_new_changes(db, user):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(4)])
+    archive_oldest(db, user, 4)
+    segment = db.execute(
+        select(HistoryArchiveSegment).where(HistoryArchiveSegment.user_id == user.id)
+    ).scalar_one()
+    assert segment.max_seq == 4
+    assert archived_changes(db, user.id, 4, 10) == []
+    assert [record.change_seq for record in archived_changes(db, user.id, 1, 2)] == [2, 3]
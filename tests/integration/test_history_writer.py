@@ -0,0 +1,116 @@
+"""
+历史记录写后缓冲 (HistoryWriter): 关闭时提交、背压退回同步写入、未提交记录的读取和写入失败
+"""
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from api.models import History
+from api.services import history_writer
+from api.services.history import HistoryService
+from api.services.history_writer import HistoryWriter
+
+
+@pytest.fixture
+def use_writer(monkeypatch):
+    """启用写后缓冲, 返回创建并启动写入器的函数"""
+    writers = []
+
+    def start(**options) -> HistoryWriter:
+        writer = HistoryWriter(**options)
+        writer.start()
+        writers.append(writer)
+        monkeypatch.setattr(history_writer, "HISTORY_WRITE_MODE", "buffered")
+        monkeypatch.setattr(history_writer, "_writer", writer)
+        return writer
+
+    yield start
+    for writer in writers:
+        writer.shutdown()
+
+
+def stored_count(db, user) -> int:
+    db.expire_all()
+    return db.execute(select(func.count()).where(History.user_id == user.id)).scalar()
+
+
+def test_pending_records_visible_and_drained_on_shutdown(db, user, use_writer):
+    writer = use_writer(batch_size=1000, interval=1.0)
+    ids = [HistoryService.create_history(db, user.id, f"{i} + 1", str(i + 1)).id for i in range(5)]
+
+    # 提交之前: 数据库中还没有, 但按ID可以读取到 (只对记录所属的用户可见)
+    assert stored_count(db, user) == 0
+    record = HistoryService.get_history(db, user.id, ids[0])
+    assert (record.expression, record.result) == ("0 + 1", "1")
+    assert HistoryService.get_history(db, uuid.uuid4(), ids[0]) is None
+
+    writer.shutdown()
+    assert stored_count(db, user) == 5
+    stats = writer.stats()
+    assert (stats["written"], stats["flushes"], stats["pending"]) == (5, 1, 0)
+    assert HistoryService.get_history(db, user.id, ids[0]).change_seq is not None
+
+    # 已停止的写入器不再接收记录, 退回同步写入
+    HistoryService.create_history(db, user.id, "6 + 1", "7")
+    assert stored_count(db, user) == 6
+
+
+def test_delete_waits_for_pending_records(client, db, user, auth_headers, use_writer):
+    use_writer(batch_size=1000, interval=0.2)
+    record_id = HistoryService.create_history(db, user.id, "1 + 1", "2").id
+    response = client.delete(f"/api/v1/history/{record_id}", headers=auth_headers)
+    assert response.status_code == 204
+    assert stored_count(db, user) == 0
+
+
+def test_backpressure_falls_back_to_sync(db, user, use_writer, monkeypatch):
+    writer = use_writer(capacity=1, batch_size=1, interval=0.0, enqueue_timeout=0.05)
+    # 后台线程取出第一条记录后阻塞, 队列 (容量 1) 被第二条记录占满
+    release = threading.Event()
+    write = writer._write
+
+    def blocked_write(batch):
+        release.wait(10)
+        write(batch)
+
+    monkeypatch.setattr(writer, "_write", blocked_write)
+
+    HistoryService.create_history(db, user.id, "1", "1")
+    deadline = time.monotonic() + 5
+    while not writer._queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    HistoryService.create_history(db, user.id, "2", "2")
+    fallback = HistoryService.create_history(db, user.id, "3", "3")
+
+    # 第三条记录等待超时后在请求线程中同步提交
+    assert stored_count(db, user) == 1
+    assert db.get(History, fallback.id) is not None
+    stats = writer.stats()
+    assert (stats["backpressure"], stats["sync_fallbacks"], stats["enqueued"]) == (1, 1, 2)
+
+    release.set()
+    writer.shutdown()
+    assert stored_count(db, user) == 3
+
+
+def test_failed_batches_reported(client, db, user, auth_headers, use_writer, monkeypatch):
+    monkeypatch.setattr(history_writer, "HISTORY_FLUSH_RETRIES", 1)
+
+    def unavailable(db, mappings):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(history_writer, "bump_history_counts", unavailable)
+    writer = use_writer(batch_size=1000, interval=0.1)
+    record_id = HistoryService.create_history(db, user.id, "1 + 1", "2").id
+    assert writer.flush(10) is True
+
+    # 重试后仍失败的记录被丢弃, 通过统计暴露
+    assert stored_count(db, user) == 0
+    assert HistoryService.get_history(db, user.id, record_id) is None
+    stats = client.get("/api/v1/history/writer/stats", headers=auth_headers).json()
+    assert (stats["failed"], stats["failed_batches"], stats["retries"]) == (1, 1, 1)
+    assert stats["last_error"] == "RuntimeError: database unavailable"
+    assert stats["last_failure_at"] is not None
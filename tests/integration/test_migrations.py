@@ -0,0 +1,153 @@
+"""
+数据库迁移: 旧版本 (初始版本) 创建的数据库升级到当前模型
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from api.services.history import HistoryService
+from api.services.history_search import HistorySearchService, setup_search_index
+from api.utils.database import Base
+from api.utils.migrations import migrate_db
+
+# 初始版本的表结构
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE users (
+        id UUID NOT NULL, username VARCHAR(20) NOT NULL, email VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL, created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL, is_active BOOLEAN NOT NULL, is_premium BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE history (
+        id UUID NOT NULL, user_id UUID NOT NULL, expression TEXT NOT NULL,
+        result VARCHAR(255), calculation_type VARCHAR(20) NOT NULL, created_at DATETIME NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX ix_history_user_id ON history (user_id)",
+    """
+    CREATE TABLE ai_usage (
+        id UUID NOT NULL, user_id UUID NOT NULL, "query" TEXT NOT NULL,
+        tokens_used INTEGER NOT NULL, model_version VARCHAR(50) NOT NULL,
+        created_at DATETIME NOT NULL, PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE
+    )
+    """,
+]
+
+LONG_EXPRESSION = "sqrt(" + " + ".join(["5"] * 40) + ")"
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    """初始版本的数据库: 一个用户, 三条历史记录 (按创建时间倒序插入), 一条 AI 使用记录"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    user_id = uuid.uuid4()
+    now = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text(
+                "INSERT INTO users VALUES (:id, 'old', 'old@example.com', 'x', :now, :now, 1, 0)"
+            ),
+            {"id": user_id.hex, "now": now},
+        )
+        for minutes in (3, 2, 1):
+            conn.execute(
+                text(
+                    "INSERT INTO history "
+                    "VALUES (:id, :user_id, :expression, :result, 'basic', :at)"
+                ),
+                {
+                    "id": uuid.uuid4().hex,
+                    "user_id": user_id.hex,
+                    "expression": f"{minutes} + {minutes}",
+                    "result": str(2.0 * minutes),
+                    "at": now + timedelta(minutes=minutes),
+                },
+            )
+        conn.execute(
+            text("INSERT INTO ai_usage VALUES (:id, :user_id, 'q', 10, 'glm-4.6', :at)"),
+            {"id": uuid.uuid4().hex, "user_id": user_id.hex, "at": now},
+        )
+    engine.user_id = user_id
+    yield engine
+    engine.dispose()
+
+
+def upgrade(engine):
+    """与 init_db 相同的升级步骤"""
+    Base.metadata.create_all(bind=engine)
+    steps = migrate_db(engine)
+    setup_search_index(engine)
+    return steps
+
+
+def test_upgrade_baseline_database(old_engine):
+    steps = upgrade(old_engine)
+    assert any("history.change_seq" in step for step in steps)
+    assert upgrade(old_engine) == []
+
+    inspector = inspect(old_engine)
+    columns = {column["name"]: column for column in inspector.get_columns("history")}
+    assert {"expression_id", "result_id", "result_value", "change_seq", "client_id"} <= set(columns)
+    assert columns["expression"]["nullable"] is True
+    indexes = {index["name"] for index in inspector.get_indexes("history")}
+    assert {
+        "idx_history_user_created_id",
+        "idx_history_user_change_seq",
+        "idx_history_expression_id",
+    } <= indexes
+
+    with old_engine.connect() as conn:
+        # 变更序号按创建时间回填, 用户的计数器接在最后一个序号之后
+        rows = conn.execute(
+            text("SELECT expression, change_seq FROM history ORDER BY created_at")
+        ).all()
+        assert rows == [("1 + 1", 1), ("2 + 2", 2), ("3 + 3", 3)]
+        assert conn.execute(text("SELECT history_seq, ai_usage_seq FROM users")).one() == (3, 1)
+
+
+def test_long_expressions_after_upgrade(old_engine):
+    upgrade(old_engine)
+    user_id = old_engine.user_id
+    with Session(old_engine) as db:
+        record = HistoryService.create_history(db, user_id, LONG_EXPRESSION, "8.94427190999916")
+        assert record.change_seq == 4
+        items, _ = HistorySearchService.search(db, user_id, "sqrt")
+        assert [item.expression for item in items] == [LONG_EXPRESSION]
+        # 迁移前的记录重建索引后仍能搜索到
+        items, _ = HistorySearchService.search(db, user_id, "2")
+        assert [item.expression for item in items] == ["2 + 2"]
+
+
+def test_stale_search_triggers_replaced(old_engine):
+    upgrade(old_engine)
+    user_id = old_engine.user_id
+    with old_engine.begin() as conn:
+        # 搜索功能最初版本的触发器: 只索引 history.expression 列
+        conn.execute(text("DROP TRIGGER history_fts_insert"))
+        conn.execute(
+            text(
+                "CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN "
+                "INSERT INTO history_fts(rowid, expression, owner, ctype, period) "
+                "VALUES (new.rowid, new.expression, 'u' || new.user_id, "
+                "'t' || new.calculation_type, ''); END"
+            )
+        )
+
+    with Session(old_engine) as db:
+        HistoryService.create_history(db, user_id, LONG_EXPRESSION, "8.94427190999916")
+        assert HistorySearchService.search(db, user_id, "sqrt")[0] == []
+
+    setup_search_index(old_engine)
+    with Session(old_engine) as db:
+        items, _ = HistorySearchService.search(db, user_id, "sqrt")
+        assert [item.expression for item in items] == [LONG_EXPRESSION]
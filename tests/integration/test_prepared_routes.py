@@ -0,0 +1,93 @@
+"""
+预编译表达式接口
+"""
+import uuid
+
+import pytest
+
+from api.models import User
+from api.services.prepared import PreparedExpressionService, PreparedExpressionStore
+from conftest import auth_headers_for
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    monkeypatch.setattr(PreparedExpressionService, "store", PreparedExpressionStore())
+
+
+@pytest.fixture
+def other_headers(db):
+    """另一个用户的认证请求头"""
+    name = f"u{uuid.uuid4().hex[:12]}"
+    other = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.add(other)
+    db.commit()
+    return auth_headers_for(other)
+
+
+def prepare(client, headers, expression="x * y", variables=("x", "y")) -> str:
+    response = client.post(
+        "/api/v1/prepared",
+        json={"expression": expression, "variables": list(variables)},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json()["handle"]
+
+
+def test_handles_are_per_user(client, auth_headers, other_headers):
+    handle = prepare(client, auth_headers)
+    evaluate = f"/api/v1/prepared/{handle}/evaluate"
+    bindings = {"bindings": {"x": 3, "y": 4}}
+
+    assert client.post(evaluate, json=bindings, headers=auth_headers).json()["result"] == 12
+    # 其他用户不能使用或删除该句柄
+    assert client.post(evaluate, json=bindings, headers=other_headers).status_code == 404
+    assert client.get(f"/api/v1/prepared/{handle}", headers=other_headers).status_code == 404
+    assert client.delete(f"/api/v1/prepared/{handle}", headers=other_headers).status_code == 404
+    assert client.get("/api/v1/prepared", headers=other_headers).json() == []
+
+    info = client.get(f"/api/v1/prepared/{handle}", headers=auth_headers).json()
+    assert (info["variables"], info["evaluations"]) == (["x", "y"], 1)
+    assert client.delete(f"/api/v1/prepared/{handle}", headers=auth_headers).status_code == 200
+    assert client.post(evaluate, json=bindings, headers=auth_headers).status_code == 404
+
+
+@pytest.mark.parametrize(
+    "bindings, message",
+    [
+        ({"x": 1}, "缺少变量的取值"),
+        ({"x": 1, "y": 2, "z": 3}, "未注册的变量"),
+        ({"x": 1e308, "y": 10}, "浮点数范围"),
+    ],
+)
+def test_invalid_bindings(client, auth_headers, bindings, message):
+    handle = prepare(client, auth_headers)
+    response = client.post(
+        f"/api/v1/prepared/{handle}/evaluate", json={"bindings": bindings}, headers=auth_headers
+    )
+    assert response.status_code == 400
+    assert message in response.json()["detail"]
+
+
+def test_batch(client, auth_headers):
+    handle = prepare(client, auth_headers, "x / y")
+    response = client.post(
+        f"/api/v1/prepared/{handle}/evaluate/batch",
+        json={"bindings": [{"x": 1, "y": 2}, {"x": 1, "y": 0}, {"x": 1}, {"x": 9, "y": 3}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["result"] for item in body["items"]] == [0.5, None, None, 3.0]
+    assert [item["error"] is None for item in body["items"]] == [True, False, False, True]
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+
+
+def test_invalid_expression(client, auth_headers):
+    response = client.post(
+        "/api/v1/prepared",
+        json={"expression": "__import__('os')", "variables": []},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+"""
+只读副本路由: 只读请求使用副本, 读己之写期间和副本不可用时回退到主库
+
+副本是主库的 SQLite 快照 (之后不再同步), 读到的数据能区分请求使用了哪个数据库
+"""
+import sqlite3
+import uuid
+
+import pytest
+
+from api.models import User
+from api.services.history import HistoryService
+from api.utils import replicas
+from api.utils.database import engine
+from api.utils.replicas import ReplicaRouter
+
+from conftest import auth_headers_for
+
+
+def history_count(client, headers):
+    response = client.get("/api/v1/history", headers=headers)
+    assert response.status_code == 200
+    return len(response.json()["items"])
+
+
+def use_router(monkeypatch, urls):
+    """替换全局的副本路由"""
+    router = ReplicaRouter(urls)
+    monkeypatch.setattr(replicas, "replica_router", router)
+    return router
+
+
+@pytest.fixture
+def replica_url(tmp_path, db, user):
+    """用户有一条历史记录时的主库快照"""
+    HistoryService.create_history(db, user.id, "1 + 1", "2.0")
+    path = tmp_path / "replica.db"
+    source, target = sqlite3.connect(engine.url.database), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture
+def router(monkeypatch, replica_url):
+    router = use_router(monkeypatch, [replica_url])
+    monkeypatch.setattr(replicas, "REPLICA_STICKY_SECONDS", 60.0)
+    yield router
+    router.replicas[0].engine.dispose()
+
+
+def test_reads_use_replica(client, db, user, auth_headers, router):
+    # 绕过请求直接写入主库: 副本上仍只有快照中的一条记录
+    HistoryService.create_history(db, user.id, "2 + 2", "4.0")
+    assert history_count(client, auth_headers) == 1
+    assert router.replicas[0].reads == 1
+
+
+def test_read_your_writes(client, auth_headers, router, monkeypatch):
+    response = client.post("/api/v1/calculate", json={"expression": "3 + 3"}, headers=auth_headers)
+    assert response.status_code == 200
+
+    # 写入之后的只读请求使用主库, 能读到刚写入的记录
+    assert history_count(client, auth_headers) == 2
+    assert router.sticky_reads == 1
+    assert router.replicas[0].reads == 0
+
+    # 超过 REPLICA_STICKY_SECONDS 后重新使用副本
+    monkeypatch.setattr(replicas, "REPLICA_STICKY_SECONDS", 0.0)
+    assert history_count(client, auth_headers) == 1
+    assert router.replicas[0].reads == 1
+
+
+def test_unhealthy_replica_falls_back(client, db, user, auth_headers, router):
+    HistoryService.create_history(db, user.id, "2 + 2", "4.0")
+    router.replicas[0].mark_failed("测试")
+    assert history_count(client, auth_headers) == 2
+    assert router.fallbacks == 1
+
+    # 健康检查成功后恢复使用
+    assert router.check_all() == 1
+    assert history_count(client, auth_headers) == 1
+
+
+def test_unreachable_replica_marked_failed(client, auth_headers, monkeypatch, tmp_path):
+    router = use_router(monkeypatch, [f"sqlite:///{tmp_path}/missing/replica.db"])
+    assert history_count(client, auth_headers) == 0
+    assert router.replicas[0].healthy is False
+    assert router.fallbacks == 1
+
+
+def test_user_missing_on_replica(client, db, router):
+    # 快照之后注册的用户: 认证时在主库上再查一次
+    name = f"n{uuid.uuid4().hex[:12]}"
+    late = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.add(late)
+    db.commit()
+    assert history_count(client, auth_headers_for(late)) == 0
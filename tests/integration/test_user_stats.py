@@ -0,0 +1,139 @@
+"""
+用户统计汇总 (user_stats): 新增、删除、归档和清空时的增量计数, 以及对账修正偏差
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from api import dependencies
+from api.models import History, UserStats
+from api.services import history_purge
+from api.services.history import HistoryService
+from api.services.history_archive import HistoryArchiveService
+from api.services.history_purge import HistoryPurgeService
+from api.services.user_stats import UserStatsService
+
+
+def counts(db, user):
+    """(热数据记录数, 已归档记录数, AI 查询次数, token 数)"""
+    db.expire_all()
+    stats = UserStatsService.get_stats(db, user.id)
+    return stats.history_count, stats.archived_count, stats.ai_queries, stats.ai_tokens
+
+
+def archive_all_records(db, user):
+    """把用户的全部记录移到过去并归档"""
+    past = datetime.utcnow() - timedelta(days=30)
+    db.execute(update(History).where(History.user_id == user.id).values(created_at=past))
+    db.commit()
+    archived, _ = HistoryArchiveService.archive_user(db, user.id, past + timedelta(days=1))
+    return archived
+
+
+def test_counts_follow_inserts_and_deletes(db, user):
+    record = HistoryService.create_history(db, user.id, "1 + 1", "2")
+    HistoryService.create_history_bulk(db, user.id, [("2 + 2", "4"), ("3 + 3", "6")])
+    HistoryService.create_ai_usage(db, user.id, "q", 10)
+    HistoryService.create_ai_usage(db, user.id, "q", 5)
+    assert counts(db, user) == (3, 0, 2, 15)
+
+    assert HistoryService.delete_history(db, user.id, record.id)
+    assert counts(db, user) == (2, 0, 2, 15)
+    # 删除不存在的记录不改变计数
+    assert not HistoryService.delete_history(db, user.id, record.id)
+    assert counts(db, user) == (2, 0, 2, 15)
+    assert UserStatsService.get_stats(db, user.id).last_activity_at is not None
+
+
+def test_archive_moves_counts(client, db, user, auth_headers):
+    ids = HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(3)])
+    assert archive_all_records(db, user) == 3
+    HistoryService.create_history(db, user.id, "new", "0")
+    assert counts(db, user) == (1, 3, 0, 0)
+
+    # 删除已归档的记录减少归档计数
+    assert client.delete(f"/api/v1/history/{ids[0]}", headers=auth_headers).status_code == 204
+    assert counts(db, user) == (1, 2, 0, 0)
+
+    body = client.get(
+        "/api/v1/history", params={"include_archived": True}, headers=auth_headers
+    ).json()
+    assert body["total"] == 3
+    assert client.get("/api/v1/history", headers=auth_headers).json()["total"] == 1
+    assert not UserStatsService.reconcile_user(db, user.id)
+
+
+def test_clear_resets_counts(client, db, user, auth_headers):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(2)])
+    archive_all_records(db, user)
+    HistoryService.create_history(db, user.id, "new", "0")
+    HistoryService.create_ai_usage(db, user.id, "q", 7)
+
+    response = client.delete("/api/v1/history", headers=auth_headers)
+    assert response.json()["deleted_count"] == 3
+    # AI 使用记录不随历史记录清空
+    assert counts(db, user) == (0, 0, 1, 7)
+    assert not UserStatsService.reconcile_user(db, user.id)
+
+
+def test_background_clear_resets_counts(client, db, user, auth_headers, monkeypatch):
+    monkeypatch.setattr(history_purge, "HISTORY_PURGE_BATCH", 2)
+    jobs = []
+    monkeypatch.setattr(history_purge, "submit_purge_job", jobs.append)
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(5)])
+
+    assert client.delete("/api/v1/history", headers=auth_headers).status_code == 202
+    # 清空水位之后、后台任务删除之前, 计数和对账都不包含被清空的记录
+    assert counts(db, user) == (0, 0, 0, 0)
+    assert not UserStatsService.reconcile_user(db, user.id)
+
+    HistoryService.create_history(db, user.id, "after", "1")
+    HistoryPurgeService.run_job(db, jobs[0])
+    assert counts(db, user) == (1, 0, 0, 0)
+
+
+def test_reconcile_repairs_drift(db, user):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(3)])
+    HistoryService.create_ai_usage(db, user.id, "q", 4)
+    assert not UserStatsService.reconcile_user(db, user.id)
+
+    db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user.id)
+        .values(history_count=99, archived_count=5, ai_queries=0, ai_tokens=1)
+    )
+    db.commit()
+    assert UserStatsService.reconcile_user(db, user.id)
+    db.commit()
+    assert counts(db, user) == (3, 0, 1, 4)
+    assert UserStatsService.get_stats(db, user.id).reconciled_at is not None
+
+
+def test_missing_stats_row_rebuilt(db, user):
+    HistoryService.create_history_bulk(db, user.id, [("1 + 1", "2"), ("2 + 2", "4")])
+    db.query(UserStats).filter(UserStats.user_id == user.id).delete()
+    db.commit()
+    # 读取时没有统计行, 先对账生成
+    assert counts(db, user) == (2, 0, 0, 0)
+
+
+@pytest.fixture
+def admin_headers(user, auth_headers, monkeypatch):
+    monkeypatch.setattr(dependencies, "ADMIN_USERNAMES", {user.username})
+    return auth_headers
+
+
+def test_reconcile_route(client, db, user, admin_headers):
+    HistoryService.create_history(db, user.id, "1 + 1", "2")
+    db.execute(update(UserStats).where(UserStats.user_id == user.id).values(history_count=7))
+    db.commit()
+
+    body = client.post("/api/v1/history/stats/reconcile", headers=admin_headers).json()
+    assert body["repaired"] >= 1 and body["checked"] >= 1
+    assert counts(db, user) == (1, 0, 0, 0)
+
+
+def test_reconcile_route_requires_admin(client, auth_headers):
+    response = client.post("/api/v1/history/stats/reconcile", headers=auth_headers)
+    assert response.status_code == 403
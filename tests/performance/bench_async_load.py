@@ -0,0 +1,187 @@
+"""
+同步 / 异步数据库访问的并发负载测试
+
+同一组路由分别以同步模式 (def 路由 + 阻塞的 SessionLocal, 在 Starlette 线程池中执行,
+默认最多 40 个线程) 和异步模式 (DB_ASYNC=true, async 路由 + 异步引擎) 运行,
+CONCURRENCY 个客户端同时循环请求 GET /history (认证 + 读取第一页), 统计吞吐量和延迟。
+
+本地 SQLite 没有网络往返, 查询耗时很短, 线程池上限几乎不起作用; 测试在每条 SQL 语句
+执行时等待 BENCH_DB_LATENCY_MS 毫秒, 模拟网络数据库的往返延迟。等待发生在执行语句的线程中
+(同步模式为线程池线程, 异步模式为 aiosqlite 的连接线程), 与真实数据库驱动等待响应的方式相同。
+两种模式的连接池都设为 POOL_SIZE, 使并发只受线程池 (同步) 或连接池 (异步) 限制。
+吞吐量同时受单进程 CPU 限制 (aiosqlite 每条语句在线程间往返多次, 异步模式每个请求的 CPU
+开销比同步模式高), 只有等待数据库的时间远大于请求的 CPU 时间时线程池上限才是瓶颈。
+每种模式在独立的子进程和临时数据库中运行 (DB_ASYNC 在导入路由模块时读取)
+
+运行:
+    python tests/performance/bench_async_load.py
+    BENCH_DB_LATENCY_MS=0 python tests/performance/bench_async_load.py
+    BENCH_DB_LATENCY_MS=200 BENCH_ASYNC_CONCURRENCY=20,40,80,160,320 \
+        python tests/performance/bench_async_load.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+LATENCY_MS = float(os.getenv("BENCH_DB_LATENCY_MS", "100"))
+CONCURRENCY = [int(n) for n in os.getenv("BENCH_ASYNC_CONCURRENCY", "20,40,80,160").split(",")]
+DURATION = float(os.getenv("BENCH_ASYNC_SECONDS", "5"))
+# 两种模式的连接池大小 (大于最高并发数)
+POOL_SIZE = max(CONCURRENCY) + 10
+# 预先写入的历史记录数
+PRELOAD = 200
+
+MODES = [("同步 (线程池)", "false"), ("异步 (DB_ASYNC)", "true")]
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """返回样本的百分位数 (毫秒)"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def add_latency(dbapi_connection) -> None:
+    """让 SQLite 连接在执行每条语句时等待 LATENCY_MS 毫秒 (在执行语句的线程中)"""
+    # aiosqlite 适配连接 -> aiosqlite.Connection -> sqlite3.Connection
+    driver = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+    connection = getattr(driver, "_conn", driver)
+    connection.set_trace_callback(lambda statement: time.sleep(LATENCY_MS / 1000))
+
+
+def worker() -> None:
+    """在当前进程中运行一种模式 (由主进程以子进程方式调用), 输出 JSON 结果"""
+    import asyncio
+
+    from fastapi import FastAPI
+    from sqlalchemy import event
+
+    # 添加 backend 目录到Python路径
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+    import api.routers as routers
+    from api.models import User
+    from api.services.history import HistoryService
+    from api.utils.database import DB_ASYNC, SessionLocal, engine, init_db
+    from api.utils.security import create_access_token
+
+    init_db()
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    HistoryService.create_history_bulk(db, user.id, [("1 + 1", "2")] * PRELOAD)
+    authorization = f"Bearer {create_access_token({'sub': str(user.id)})}".encode()
+    db.close()
+
+    bind = engine
+    if DB_ASYNC:
+        from api.utils.async_database import async_engine
+
+        bind = async_engine.sync_engine
+    # 预先写入数据之后再增加延迟 (新建的连接生效)
+    bind.dispose()
+    event.listen(bind, "connect", lambda connection, record: add_latency(connection))
+
+    app = FastAPI()
+    for name in routers.__all__:
+        app.include_router(getattr(routers, name), prefix="/api/v1")
+
+    async def request() -> int:
+        """直接调用 ASGI 应用 (不经过 HTTP 客户端, 减少客户端本身占用的 CPU), 返回状态码"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/v1/history",
+            "raw_path": b"/api/v1/history",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"authorization", authorization)],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        response = {}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+
+        await app(scope, receive, send)
+        return response["status"]
+
+    async def run_level(concurrency: int) -> dict:
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + DURATION
+
+        async def run_client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                if await request() == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(run_client() for _ in range(concurrency)))
+        return {
+            "concurrency": concurrency,
+            "throughput": len(latencies) / DURATION,
+            "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99),
+            "errors": errors,
+        }
+
+    async def run() -> list:
+        # 预热: 建立连接
+        await asyncio.gather(*(request() for _ in range(POOL_SIZE)))
+        return [await run_level(concurrency) for concurrency in CONCURRENCY]
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main():
+    """主函数"""
+    print(
+        f"GET /history, 每条 SQL 语句延迟 {LATENCY_MS:g} ms, 每级并发运行 {DURATION:g} 秒"
+        f" (线程池上限 40, 连接池 {POOL_SIZE})\n"
+    )
+    print(f"{'模式':<16} | {'并发':>5} | {'请求/s':>8} | {'p50':>9} | {'p99':>9} | {'错误':>4}")
+    print("-" * 68)
+    for name, db_async in MODES:
+        db_dir = tempfile.mkdtemp(prefix="calc-bench-")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+            "DB_ASYNC": db_async,
+            "DB_POOL_SIZE": str(POOL_SIZE),
+            "DB_MAX_OVERFLOW": "0",
+        }
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "worker"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for result in json.loads(output.strip().splitlines()[-1]):
+            print(
+                f"{name:<16} | {result['concurrency']:>5} | {result['throughput']:>8.0f}"
+                f" | {result['p50']:>6.1f}ms | {result['p99']:>6.1f}ms | {result['errors']:>4}"
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["worker"]:
+        worker()
+    else:
+        main()
@@ -0,0 +1,96 @@
+"""
+批量计算性能测试
+
+对比逐条计算 (每条表达式单独计算并提交一次历史记录) 与批量计算
+(一次计算全部表达式, 一次批量插入历史记录) 在 1 / 100 / 10000 条表达式下的吞吐量
+
+运行:
+    python tests/performance/bench_calculate_batch.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+# 使用临时 SQLite 数据库, 必须在导入数据库模块之前设置
+_DB_DIR = tempfile.mkdtemp(prefix="calc-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+from api.models import User  # noqa: E402
+from api.services.calculator import CalculatorService  # noqa: E402
+from api.services.history import HistoryService  # noqa: E402
+from api.utils.database import SessionLocal, init_db  # noqa: E402
+
+SIZES = [1, 100, 10000]
+
+EXPRESSIONS = [
+    "2 + 3 * 4",
+    "sqrt(16) + log(e)",
+    "sin(pi / 2) * cos(0)",
+    "pow(2, 10) - 24",
+    "(1 + 2) * (3 + 4) / 5",
+]
+
+
+def make_expressions(count: int) -> list:
+    """生成测试表达式 (包含少量重复表达式, 模拟真实负载)"""
+    return [f"{EXPRESSIONS[i % len(EXPRESSIONS)]} + {i % 97}" for i in range(count)]
+
+
+def run_single(db, user_id, expressions: list) -> None:
+    """逐条计算并逐条保存历史记录 (等价于循环调用 /calculate)"""
+    for expression in expressions:
+        result = CalculatorService.evaluate(expression)
+        HistoryService.create_history(
+            db=db, user_id=user_id, expression=expression, result=str(result)
+        )
+
+
+def run_batch(db, user_id, expressions: list) -> None:
+    """批量计算并一次性保存历史记录 (等价于 /calculate/batch)"""
+    outcomes = CalculatorService.evaluate_batch(expressions)
+    HistoryService.create_history_bulk(
+        db=db,
+        user_id=user_id,
+        records=[
+            (expression, str(result))
+            for expression, (result, error) in zip(expressions, outcomes)
+            if error is None
+        ],
+    )
+
+
+def measure(func, db, user_id, expressions: list) -> float:
+    """返回每秒处理的表达式数量"""
+    start = time.perf_counter()
+    func(db, user_id, expressions)
+    elapsed = time.perf_counter() - start
+    return len(expressions) / elapsed
+
+
+def main():
+    """主函数"""
+    init_db()
+    db = SessionLocal()
+
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+
+    print(f"{'表达式数量':>10} | {'逐条 (expr/s)':>16} | {'批量 (expr/s)':>16} | {'加速比':>8}")
+    print("-" * 60)
+
+    for size in SIZES:
+        expressions = make_expressions(size)
+        single = measure(run_single, db, user.id, expressions)
+        batch = measure(run_batch, db, user.id, expressions)
+        print(f"{size:>10} | {single:>16,.0f} | {batch:>16,.0f} | {batch / single:>7.1f}x")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
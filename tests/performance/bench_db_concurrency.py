@@ -0,0 +1,169 @@
+"""
+SQLite 并发读写性能测试
+
+比较两种 SQLite 连接参数下多线程同时写入和读取历史记录的吞吐量和延迟:
+- 回滚日志: journal_mode=DELETE, synchronous=FULL (SQLite 默认, 原来的配置)
+- WAL: journal_mode=WAL, synchronous=NORMAL, mmap (utils/database.py 的默认配置)
+
+写线程逐条创建历史记录 (每条一个事务), 读线程读取历史记录第一页;
+每种配置在独立的子进程和临时数据库中运行 (连接参数在导入数据库模块时读取)
+
+运行:
+    python tests/performance/bench_db_concurrency.py
+    BENCH_DB_WRITERS=8 BENCH_DB_READERS=8 python tests/performance/bench_db_concurrency.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+WRITERS = int(os.getenv("BENCH_DB_WRITERS", "4"))
+READERS = int(os.getenv("BENCH_DB_READERS", "4"))
+DURATION = float(os.getenv("BENCH_DB_SECONDS", "5"))
+# 预先写入的历史记录数 (每个用户)
+PRELOAD = 2000
+
+PROFILES = [
+    (
+        "回滚日志 (原配置)",
+        {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0"},
+    ),
+    ("WAL + NORMAL", {}),
+]
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """返回样本的百分位数 (毫秒)"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def worker() -> None:
+    """在当前进程中运行一种配置 (由主进程以子进程方式调用), 输出 JSON 结果"""
+    # 添加 backend 目录到Python路径
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+    from api.models import User
+    from api.services.history import HistoryService
+    from api.utils.database import SessionLocal, init_db, pool_stats
+
+    init_db()
+    db = SessionLocal()
+    users = [
+        User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash="x")
+        for i in range(max(WRITERS, READERS))
+    ]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+    for user_id in user_ids:
+        HistoryService.create_history_bulk(db, user_id, [("1 + 1", "2")] * PRELOAD)
+    db.close()
+
+    results = {"write": [], "read": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + DURATION
+
+    def run(operation, kind):
+        latencies, errors = [], 0
+        session = SessionLocal()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation(session)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                session.rollback()
+                errors += 1
+        session.close()
+        with lock:
+            results[kind].extend(latencies)
+            results["errors"] += errors
+
+    threads = [
+        threading.Thread(
+            target=run,
+            args=(
+                lambda session, user_id=user_ids[i]: HistoryService.create_history(
+                    session, user_id, "2 * 3", "6"
+                ),
+                "write",
+            ),
+        )
+        for i in range(WRITERS)
+    ] + [
+        threading.Thread(
+            target=run,
+            args=(
+                lambda session, user_id=user_ids[i]: HistoryService.get_user_history(
+                    session, user_id, page_size=20
+                ),
+                "read",
+            ),
+        )
+        for i in range(READERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = pool_stats()
+    print(
+        json.dumps(
+            {
+                "writes": len(results["write"]) / DURATION,
+                "reads": len(results["read"]) / DURATION,
+                "write_p50": percentile(results["write"], 0.5),
+                "write_p99": percentile(results["write"], 0.99),
+                "read_p50": percentile(results["read"], 0.5),
+                "read_p99": percentile(results["read"], 0.99),
+                "errors": results["errors"],
+                "journal_mode": stats.get("journal_mode"),
+                "max_wait_ms": stats.get("max_wait_ms"),
+            }
+        )
+    )
+
+
+def main():
+    """主函数"""
+    print(f"{WRITERS} 个写线程 + {READERS} 个读线程, 每种配置运行 {DURATION:.0f} 秒\n")
+    print(
+        f"{'配置':<18} | {'写入/s':>8} | {'写 p50':>8} | {'写 p99':>9} | {'读取/s':>8}"
+        f" | {'读 p50':>8} | {'读 p99':>9} | {'错误':>4}"
+    )
+    print("-" * 96)
+    for name, overrides in PROFILES:
+        db_dir = tempfile.mkdtemp(prefix="calc-bench-")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+            **overrides,
+        }
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "worker"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{name:<18} | {result['writes']:>8.0f} | {result['write_p50']:>6.2f}ms"
+            f" | {result['write_p99']:>7.2f}ms | {result['reads']:>8.0f}"
+            f" | {result['read_p50']:>6.2f}ms | {result['read_p99']:>7.2f}ms"
+            f" | {result['errors']:>4}"
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["worker"]:
+        worker()
+    else:
+        main()
@@ -0,0 +1,132 @@
+"""
+历史记录分页性能测试
+
+对比页码分页 (OFFSET + COUNT) 与游标分页 ((created_at, id) 键集) 在深分页时的延迟:
+同一用户写入 ROWS 条历史记录 (另有其他用户的干扰数据), 分别读取第 1 页和第 PAGE 页
+
+运行:
+    python tests/performance/bench_history_pagination.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 使用临时 SQLite 数据库, 必须在导入数据库模块之前设置
+_DB_DIR = tempfile.mkdtemp(prefix="calc-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+import uuid  # noqa: E402
+
+from api.models import History, User  # noqa: E402
+from api.services.history import HistoryService, encode_cursor  # noqa: E402
+from api.services.history_storage import to_storage  # noqa: E402
+from api.utils.database import SessionLocal, init_db  # noqa: E402
+
+PAGE_SIZE = 20
+PAGE = 5000
+ROWS = PAGE * PAGE_SIZE + 10000
+OTHER_ROWS = 50000
+REPEAT = 20
+INSERT_CHUNK = 10000
+
+
+def populate(db, user_id, count: int) -> None:
+    """批量写入历史记录 (每 100 条共享同一时间戳, 覆盖 created_at 相同时按 id 排序的情况)"""
+    start = datetime.utcnow() - timedelta(days=365)
+    for offset in range(0, count, INSERT_CHUNK):
+        mappings = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "expression": f"{i} + 1",
+                "result": str(i + 1),
+                "calculation_type": "basic",
+                "created_at": start + timedelta(seconds=i // 100),
+            }
+            for i in range(offset, min(offset + INSERT_CHUNK, count))
+        ]
+        db.bulk_insert_mappings(History, to_storage(db, mappings), render_nulls=True)
+        db.commit()
+
+
+def measure(func) -> float:
+    """返回多次调用的延迟中位数 (毫秒)"""
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    """主函数"""
+    init_db()
+    db = SessionLocal()
+
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    other = User(username="other", email="other@example.com", password_hash="x")
+    db.add_all([user, other])
+    db.commit()
+
+    print(f"写入 {ROWS:,} + {OTHER_ROWS:,} 条历史记录...")
+    populate(db, user.id, ROWS)
+    populate(db, other.id, OTHER_ROWS)
+
+    # 第 PAGE 页之前最后一条记录的游标 (等价于从第 1 页逐页翻到第 PAGE-1 页)
+    previous = (
+        db.query(History)
+        .filter(History.user_id == user.id)
+        .order_by(History.created_at.desc(), History.id.desc())
+        .offset((PAGE - 1) * PAGE_SIZE - 1)
+        .first()
+    )
+    cursor = encode_cursor(previous)
+
+    # 两种方式读到的第 PAGE 页必须一致
+    by_page = HistoryService.get_user_history(db, user.id, PAGE, PAGE_SIZE)
+    by_cursor = HistoryService.get_user_history(db, user.id, page_size=PAGE_SIZE, cursor=cursor)
+    assert [item.id for item in by_page.items] == [item.id for item in by_cursor.items]
+
+    cases = [
+        ("页码分页 第1页 (含总数)", lambda: HistoryService.get_user_history(db, user.id, 1, PAGE_SIZE)),
+        (
+            f"页码分页 第{PAGE}页 (含总数)",
+            lambda: HistoryService.get_user_history(db, user.id, PAGE, PAGE_SIZE),
+        ),
+        (
+            f"页码分页 第{PAGE}页 (不含总数)",
+            lambda: HistoryService.get_user_history(
+                db, user.id, PAGE, PAGE_SIZE, include_total=False
+            ),
+        ),
+        (
+            f"游标分页 第{PAGE}页",
+            lambda: HistoryService.get_user_history(
+                db, user.id, page_size=PAGE_SIZE, cursor=cursor
+            ),
+        ),
+    ]
+
+    print(f"{'分页方式':<24} | {'延迟中位数 (ms)':>16}")
+    print("-" * 46)
+    results = {}
+    for name, func in cases:
+        results[name] = measure(func)
+        print(f"{name:<24} | {results[name]:>16.2f}")
+
+    deep_page = results[f"页码分页 第{PAGE}页 (含总数)"]
+    deep_cursor = results[f"游标分页 第{PAGE}页"]
+    print(f"\n第 {PAGE} 页: 游标分页比页码分页快 {deep_page / deep_cursor:.1f}x")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
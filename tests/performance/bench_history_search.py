@@ -0,0 +1,150 @@
+"""
+历史记录搜索性能测试
+
+同一用户写入 ROWS 条历史记录 (另有其他用户的干扰数据), 经全文索引执行常见搜索,
+统计每类查询的 p50/p95 延迟; 同时给出 LIKE 全表扫描作为对照
+
+运行:
+    python tests/performance/bench_history_search.py
+    BENCH_HISTORY_ROWS=100000 python tests/performance/bench_history_search.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 使用临时 SQLite 数据库, 必须在导入数据库模块之前设置
+_DB_DIR = tempfile.mkdtemp(prefix="calc-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+import uuid  # noqa: E402
+
+from api.models import History, User  # noqa: E402
+from api.services.history_search import HistorySearchService  # noqa: E402
+from api.services.history_storage import to_storage  # noqa: E402
+from api.utils.database import SessionLocal, init_db  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_HISTORY_ROWS", "1000000"))
+OTHER_ROWS = ROWS // 10
+REPEAT = 50
+INSERT_CHUNK = 20000
+LIMIT = 20
+
+# 表达式模板 (函数出现频率不同, 覆盖常见词和罕见词)
+TEMPLATES = [
+    (40, "{a} + {b}"),
+    (20, "sqrt({a})"),
+    (15, "sin({x}) + cos({y})"),
+    (10, "log({a}) * {b}"),
+    (10, "{a} / {b} - {c}"),
+    (4, "exp({x}) - {c}"),
+    (1, "factorial({c})"),
+]
+
+
+def expression(rng: random.Random) -> str:
+    """按权重生成一条随机表达式"""
+    _, template = rng.choices(TEMPLATES, weights=[w for w, _ in TEMPLATES])[0]
+    return template.format(
+        a=rng.randint(1, 100000),
+        b=rng.randint(1, 1000),
+        c=rng.randint(1, 20),
+        x=round(rng.uniform(0, 10), 2),
+        y=round(rng.uniform(0, 10), 2),
+    )
+
+
+def populate(db, user_id, count: int, seed: int) -> datetime:
+    """批量写入历史记录 (每分钟约一条, 返回第一条的创建时间)"""
+    rng = random.Random(seed)
+    start = datetime.utcnow() - timedelta(minutes=count)
+    for offset in range(0, count, INSERT_CHUNK):
+        mappings = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "expression": expression(rng),
+                "result": "0",
+                "calculation_type": "basic" if i % 3 else "scientific",
+                "created_at": start + timedelta(minutes=i),
+            }
+            for i in range(offset, min(offset + INSERT_CHUNK, count))
+        ]
+        db.bulk_insert_mappings(History, to_storage(db, mappings), render_nulls=True)
+        db.commit()
+    return start
+
+
+def measure(func) -> tuple:
+    """返回多次调用的延迟 p50 和 p95 (毫秒)"""
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    """主函数"""
+    init_db()
+    db = SessionLocal()
+
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    other = User(username="other", email="other@example.com", password_hash="x")
+    db.add_all([user, other])
+    db.commit()
+
+    print(f"写入 {ROWS:,} + {OTHER_ROWS:,} 条历史记录 (同时建立索引)...")
+    started = time.perf_counter()
+    first = populate(db, user.id, ROWS, seed=1)
+    populate(db, other.id, OTHER_ROWS, seed=2)
+    print(f"写入耗时 {time.perf_counter() - started:.1f}s\n")
+
+    def search(query, **kwargs):
+        return lambda: HistorySearchService.search(db, user.id, query, limit=LIMIT, **kwargs)
+
+    middle = first + timedelta(minutes=ROWS // 2)
+    cases = [
+        ("常见词 sqrt", search("sqrt")),
+        ("前缀 sq", search("sq")),
+        ("罕见词 factorial", search("factorial")),
+        ("多个词 sin cos", search("sin cos")),
+        ("数字前缀 314", search("314")),
+        ("小数 3.14", search("3.14")),
+        ("单字符 7", search("7")),
+        ("类型过滤 exp", search("exp", calculation_type="scientific")),
+        ("近期一天 log", search("log", start=first + timedelta(minutes=ROWS - 1440))),
+        ("早期一天 sqrt", search("sqrt", start=first, end=first + timedelta(days=1))),
+        ("中间一周 exp", search("exp", start=middle, end=middle + timedelta(days=7))),
+        ("无匹配 tan", search("tan")),
+    ]
+
+    print(f"{'查询':<20} | {'p50 (ms)':>10} | {'p95 (ms)':>10}")
+    print("-" * 46)
+    worst = 0.0
+    for name, func in cases:
+        p50, p95 = measure(func)
+        worst = max(worst, p95)
+        print(f"{name:<20} | {p50:>10.2f} | {p95:>10.2f}")
+
+    # 对照: LIKE 需要扫描该用户的全部记录 (无匹配时最明显)
+    started = time.perf_counter()
+    db.query(History.id).filter(
+        History.user_id == user.id, History.expression.like("%tan%")
+    ).order_by(History.created_at.desc()).limit(LIMIT).all()
+    like_ms = (time.perf_counter() - started) * 1000
+    print(f"\nLIKE 扫描 tan: {like_ms:.2f} ms; 索引搜索最差 p95: {worst:.2f} ms")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+历史记录存储格式性能测试
+
+同一数据分别写入去重存储 (history + history_texts) 和原来的内联文本格式
+(history_inline, 与原 history 表的列和索引一致), 比较:
+- 存储空间: 表和索引占用的页面大小 (SQLite dbstat)
+- 写入延迟: 批量插入 (每批一个事务) 和单条插入 (每条一个事务), 两者都用 bulk_insert_mappings
+- 读取延迟: 按 (user_id, created_at, id) 索引读取一页, 以及顺序读取全部记录
+
+数据分布: 大部分记录来自少量常见表达式 (按 Zipf 分布, 其中一部分是较长的公式),
+其余为只出现一次的表达式。
+为只比较存储格式, 测试前删除了搜索索引的触发器 (两种格式都不维护 FTS 索引)
+
+运行:
+    python tests/performance/bench_history_storage.py
+    BENCH_HISTORY_ROWS=1000000 python tests/performance/bench_history_storage.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 使用临时 SQLite 数据库, 必须在导入数据库模块之前设置
+_DB_DIR = tempfile.mkdtemp(prefix="calc-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+import uuid  # noqa: E402
+
+from sqlalchemy import (  # noqa: E402
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import UUID  # noqa: E402
+from sqlalchemy.orm import declarative_base  # noqa: E402
+
+from api.models import History, User  # noqa: E402
+from api.services.history_storage import (  # noqa: E402
+    HISTORY_ROW_COLUMNS,
+    to_row,
+    to_storage,
+)
+from api.utils.database import SessionLocal, engine, init_db  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_HISTORY_ROWS", "200000"))
+# 常见表达式的数量和占全部记录的比例
+COMMON_EXPRESSIONS = 500
+COMMON_RATIO = 0.8
+INSERT_CHUNK = 1000
+SINGLE_INSERTS = 500
+PAGE_SIZE = 20
+REPEAT = 200
+
+_Legacy = declarative_base()
+
+
+class HistoryInline(_Legacy):
+    """原来的内联文本格式 (与 history 表原来的列和索引一致)"""
+
+    __tablename__ = "history_inline"
+    __table_args__ = (
+        Index("idx_history_inline_user_created_id", "user_id", "created_at", "id"),
+        Index("idx_history_inline_user_change_seq", "user_id", "change_seq"),
+        UniqueConstraint("user_id", "client_id"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    expression = Column(Text, nullable=False)
+    result = Column(String(255), nullable=True)
+    result_data = Column(LargeBinary, nullable=True)
+    calculation_type = Column(String(20), nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+    change_seq = Column(BigInteger, nullable=True)
+    client_id = Column(String(64), nullable=True)
+
+
+def common_pool(rng: random.Random) -> list:
+    """常见表达式及其结果 (整数结果、浮点数结果和较长的公式各占一部分)"""
+    pool = []
+    for i in range(COMMON_EXPRESSIONS):
+        a, b = rng.randint(1, 99), rng.randint(1, 99)
+        if i % 4 == 0:
+            pool.append((f"{a}+{b}", str(a + b)))
+        elif i % 4 == 1:
+            pool.append((f"sqrt({a})", repr(a ** 0.5)))
+        elif i % 4 == 2:
+            pool.append((f"pi*{a}**2", repr(3.141592653589793 * a ** 2)))
+        else:
+            # 例如贷款月供、复利等公式
+            rate = a / 1000
+            pool.append(
+                (
+                    f"{b * 1000} * ({rate} / 12) * (1 + {rate} / 12) ** {a * 12}"
+                    f" / ((1 + {rate} / 12) ** {a * 12} - 1)",
+                    repr(b * 1000 * (rate / 12) / (1 - (1 + rate / 12) ** (-a * 12))),
+                )
+            )
+    return pool
+
+
+def generate(count: int, seed: int = 1) -> list:
+    """生成 (表达式, 结果) 列表"""
+    rng = random.Random(seed)
+    pool = common_pool(rng)
+    weights = [1 / (rank + 1) for rank in range(len(pool))]
+    records = []
+    for _ in range(count):
+        if rng.random() < COMMON_RATIO:
+            records.append(rng.choices(pool, weights=weights)[0])
+        else:
+            x = rng.uniform(0, 1000)
+            records.append((f"sin({x:.6f}) * log({rng.randint(2, 10 ** 6)})", repr(x / 7)))
+    return records
+
+
+def new_id() -> uuid.UUID:
+    """
+    生成记录ID
+
+    SQLite 中 UUID 列为 NUMERIC 亲和性, 十六进制形式恰好是合法数字 (约百万分之一的概率,
+    例如全为数字) 时会被存为数字并无法读回; 测试写入数十万条, 跳过这类 ID 以免偶发失败
+    """
+    while True:
+        value = uuid.uuid4()
+        try:
+            float(value.hex)
+        except ValueError:
+            return value
+
+
+def mappings_for(user_id, records: list, start: datetime) -> list:
+    """生成插入字段"""
+    return [
+        {
+            "id": new_id(),
+            "user_id": user_id,
+            "expression": expression,
+            "result": result,
+            "calculation_type": "basic",
+            "created_at": start + timedelta(seconds=i),
+            "change_seq": i + 1,
+        }
+        for i, (expression, result) in enumerate(records)
+    ]
+
+
+def table_sizes() -> dict:
+    """每个表 (包括其索引) 占用的字节数"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT m.tbl_name, SUM(d.pgsize) FROM dbstat d "
+                "JOIN sqlite_master m ON m.name = d.name GROUP BY m.tbl_name"
+            )
+        ).all()
+    return dict(rows)
+
+
+def measure(func, repeat: int = REPEAT) -> tuple:
+    """返回多次调用的延迟 p50 和 p95 (毫秒)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    """主函数"""
+    init_db()
+    _Legacy.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for trigger in ("history_fts_insert", "history_fts_delete", "history_fts_update"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+    db = SessionLocal()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+
+    records = generate(ROWS)
+    start = datetime.utcnow() - timedelta(seconds=ROWS)
+    mappings = mappings_for(user.id, records, start)
+    print(f"写入 {ROWS:,} 条历史记录, 不同表达式 {len({e for e, _ in records}):,} 个\n")
+
+    # 批量插入
+    started = time.perf_counter()
+    for offset in range(0, ROWS, INSERT_CHUNK):
+        db.bulk_insert_mappings(HistoryInline, mappings[offset:offset + INSERT_CHUNK])
+        db.commit()
+    inline_bulk = (time.perf_counter() - started) * 1000 / (ROWS / INSERT_CHUNK)
+
+    started = time.perf_counter()
+    for offset in range(0, ROWS, INSERT_CHUNK):
+        db.bulk_insert_mappings(
+            History, to_storage(db, mappings[offset:offset + INSERT_CHUNK]), render_nulls=True
+        )
+        db.commit()
+    interned_bulk = (time.perf_counter() - started) * 1000 / (ROWS / INSERT_CHUNK)
+
+    # 单条插入 (每条一个事务, 与同步写入模式相同)
+    singles = mappings_for(user.id, generate(SINGLE_INSERTS, seed=2), datetime.utcnow())
+    items = iter(singles)
+
+    def insert_inline():
+        db.bulk_insert_mappings(HistoryInline, [next(items)])
+        db.commit()
+
+    inline_single = measure(insert_inline, SINGLE_INSERTS)
+    items = iter(singles)
+
+    def insert_interned():
+        db.bulk_insert_mappings(History, to_storage(db, [next(items)]), render_nulls=True)
+        db.commit()
+
+    interned_single = measure(insert_interned, SINGLE_INSERTS)
+
+    sizes = table_sizes()
+    inline_size = sizes["history_inline"]
+    interned_size = sizes["history"] + sizes["history_texts"]
+
+    # 读取一页 (深度随机) 和全部记录
+    rng = random.Random(3)
+    positions = [start + timedelta(seconds=rng.randint(PAGE_SIZE, ROWS)) for _ in range(REPEAT)]
+
+    def page(statement, table_user, table_created, convert):
+        position = iter(positions)
+
+        def run():
+            rows = db.execute(
+                statement.where(table_user == user.id, table_created < next(position))
+                .order_by(table_created.desc())
+                .limit(PAGE_SIZE)
+            ).all()
+            return [convert(row) for row in rows]
+
+        return run
+
+    select_inline = select(
+        HistoryInline.id,
+        HistoryInline.expression,
+        HistoryInline.result,
+        HistoryInline.calculation_type,
+        HistoryInline.created_at,
+    )
+    select_history = select(*HISTORY_ROW_COLUMNS)
+    inline_page = measure(
+        page(select_inline, HistoryInline.user_id, HistoryInline.created_at, tuple)
+    )
+    interned_page = measure(page(select_history, History.user_id, History.created_at, to_row))
+
+    def scan(statement, convert):
+        started = time.perf_counter()
+        result = db.execute(statement, execution_options={"yield_per": 1000})
+        for rows in result.partitions():
+            [convert(row) for row in rows]
+        return time.perf_counter() - started
+
+    inline_scan = scan(select_inline.where(HistoryInline.user_id == user.id), tuple)
+    interned_scan = scan(select_history.where(History.user_id == user.id), to_row)
+
+    print(f"{'':<24} | {'内联文本':>12} | {'去重存储':>12}")
+    print("-" * 56)
+    print(f"{'存储 (MB)':<24} | {inline_size / 2**20:>12.1f} | {interned_size / 2**20:>12.1f}")
+    print(
+        f"{'每条记录 (字节)':<24} | {inline_size / ROWS:>12.1f} | {interned_size / ROWS:>12.1f}"
+    )
+    print(f"{'批量插入 每批 (ms)':<24} | {inline_bulk:>12.2f} | {interned_bulk:>12.2f}")
+    print(
+        f"{'单条插入 p50 (ms)':<24} | {inline_single[0]:>12.3f} | {interned_single[0]:>12.3f}"
+    )
+    print(
+        f"{'单条插入 p95 (ms)':<24} | {inline_single[1]:>12.3f} | {interned_single[1]:>12.3f}"
+    )
+    print(f"{'读取一页 p50 (ms)':<24} | {inline_page[0]:>12.3f} | {interned_page[0]:>12.3f}")
+    print(f"{'读取一页 p95 (ms)':<24} | {inline_page[1]:>12.3f} | {interned_page[1]:>12.3f}")
+    print(f"{'顺序读取全部 (s)':<24} | {inline_scan:>12.2f} | {interned_scan:>12.2f}")
+    print(
+        f"\n去重存储为内联文本的 {interned_size / inline_size:.0%} "
+        f"(history {sizes['history'] / 2**20:.1f} MB + "
+        f"history_texts {sizes['history_texts'] / 2**20:.1f} MB)"
+    )
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
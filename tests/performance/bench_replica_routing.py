@@ -0,0 +1,214 @@
+"""
+只读副本路由性能测试
+
+主库 + 一个只读副本均为本地 SQLite 文件 (副本是写入前用 SQLite 备份接口复制的快照,
+测试期间不再同步)。WRITERS 个客户端循环请求 POST /calculate (每条写入一个事务),
+同时 READERS 个客户端 (其他用户, 不写入) 循环请求 GET /history, 比较:
+- 只有主库: 读写都在主库上
+- 主库 + 副本: 只读请求路由到副本 (DATABASE_REPLICA_URLS)
+
+每种配置在独立的子进程和临时数据库中运行 (副本配置在导入数据库模块时读取)。
+之后检查读己之写: 写入的用户在 REPLICA_STICKY_SECONDS 内读取主库 (能读到刚写入的记录),
+过期后读取副本 (快照中没有该记录)
+
+运行:
+    python tests/performance/bench_replica_routing.py
+    SQLITE_JOURNAL_MODE=DELETE python tests/performance/bench_replica_routing.py
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+WRITERS = int(os.getenv("BENCH_REPLICA_WRITERS", "4"))
+READERS = int(os.getenv("BENCH_REPLICA_READERS", "16"))
+DURATION = float(os.getenv("BENCH_REPLICA_SECONDS", "5"))
+STICKY_SECONDS = 1.0
+# 每个读取用户预先写入的历史记录数
+PRELOAD = 2000
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """返回样本的百分位数 (毫秒)"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def worker(primary: str, replica: str) -> None:
+    """在当前进程中运行一种配置 (由主进程以子进程方式调用), 输出 JSON 结果"""
+    import asyncio
+
+    from fastapi import FastAPI
+
+    # 添加 backend 目录到Python路径
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+    import api.routers as routers
+    from api.models import User
+    from api.services.history import HistoryService
+    from api.utils.database import SessionLocal, init_db
+    from api.utils.replicas import replica_router, start_replica_health_checks
+    from api.utils.security import create_access_token
+
+    init_db()
+    db = SessionLocal()
+    users = [
+        User(username=f"bench{i}", email=f"bench{i}@example.com", password_hash="x")
+        for i in range(WRITERS + READERS)
+    ]
+    db.add_all(users)
+    db.commit()
+    for user in users[WRITERS:]:
+        HistoryService.create_history_bulk(db, user.id, [("1 + 1", "2")] * PRELOAD)
+    tokens = [
+        f"Bearer {create_access_token({'sub': str(user.id)})}".encode() for user in users
+    ]
+    db.close()
+
+    # 复制主库快照作为副本
+    source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+    source.backup(target)
+    source.close()
+    target.close()
+    start_replica_health_checks()
+
+    app = FastAPI()
+    for name in routers.__all__:
+        app.include_router(getattr(routers, name), prefix="/api/v1")
+
+    async def request(method: str, path: str, token: bytes, body: bytes = b"") -> tuple:
+        """直接调用 ASGI 应用, 返回 (状态码, 响应内容)"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"bench"),
+                (b"authorization", token),
+                (b"content-type", b"application/json"),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        response = {"body": b""}
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+
+        await app(scope, receive, send)
+        return response["status"], response["body"]
+
+    async def run() -> dict:
+        results = {"write": [], "read": [], "errors": 0}
+        deadline = time.perf_counter() + DURATION
+
+        async def run_client(kind: str, token: bytes):
+            if kind == "write":
+                method, path = "POST", "/api/v1/calculate"
+            else:
+                method, path = "GET", "/api/v1/history"
+            counter = 0
+            while time.perf_counter() < deadline:
+                counter += 1
+                body = json.dumps({"expression": f"{counter} * 3"}).encode()
+                started = time.perf_counter()
+                status_code, _ = await request(method, path, token, body)
+                if status_code == 200:
+                    results[kind].append(time.perf_counter() - started)
+                else:
+                    results["errors"] += 1
+
+        await asyncio.gather(
+            *(run_client("write", token) for token in tokens[:WRITERS]),
+            *(run_client("read", token) for token in tokens[WRITERS:]),
+        )
+
+        # 读己之写: 写入的用户立即读取能读到刚写入的记录, 过期后读取副本快照
+        expression = '"expression":"7 * 6"'
+        await request("POST", "/api/v1/calculate", tokens[0], b'{"expression": "7 * 6"}')
+        _, own = await request("GET", "/api/v1/history", tokens[0])
+        await asyncio.sleep(STICKY_SECONDS + 0.1)
+        _, later = await request("GET", "/api/v1/history", tokens[0])
+
+        stats = replica_router.stats()
+        return {
+            "writes": len(results["write"]) / DURATION,
+            "reads": len(results["read"]) / DURATION,
+            "write_p50": percentile(results["write"], 0.5),
+            "read_p50": percentile(results["read"], 0.5),
+            "read_p99": percentile(results["read"], 0.99),
+            "errors": results["errors"],
+            "replica_reads": sum(item["reads"] for item in stats["replicas"]),
+            "own_write_visible": expression in own.decode(),
+            "visible_after_window": expression in later.decode(),
+        }
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main():
+    """主函数"""
+    print(f"{WRITERS} 个写入客户端 + {READERS} 个读取客户端, 每种配置运行 {DURATION:.0f} 秒\n")
+    print(
+        f"{'配置':<12} | {'写入/s':>7} | {'写 p50':>8} | {'读取/s':>7} | {'读 p50':>8}"
+        f" | {'读 p99':>8} | {'副本读取':>8} | {'错误':>4}"
+    )
+    print("-" * 88)
+    checks = []
+    for name, use_replica in [("只有主库", False), ("主库 + 副本", True)]:
+        db_dir = tempfile.mkdtemp(prefix="calc-bench-")
+        primary = os.path.join(db_dir, "primary.db")
+        replica = os.path.join(db_dir, "replica.db")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{primary}",
+            "DATABASE_REPLICA_URLS": f"sqlite:///{replica}" if use_replica else "",
+            "REPLICA_STICKY_SECONDS": str(STICKY_SECONDS),
+        }
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "worker", primary, replica],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{name:<12} | {result['writes']:>8.0f} | {result['write_p50']:>6.2f}ms"
+            f" | {result['reads']:>8.0f} | {result['read_p50']:>6.2f}ms"
+            f" | {result['read_p99']:>6.2f}ms | {result['replica_reads']:>11}"
+            f" | {result['errors']:>4}"
+        )
+        if use_replica:
+            checks.append(result)
+
+    for result in checks:
+        print(
+            f"\n读己之写: 写入后立即读取 {'能' if result['own_write_visible'] else '不能'}读到新记录,"
+            f" {STICKY_SECONDS:g} 秒后读取副本快照"
+            f" {'能' if result['visible_after_window'] else '不能'}读到 (副本未同步)"
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["worker"]:
+        worker(*sys.argv[2:4])
+    else:
+        main()
@@ -0,0 +1,191 @@
+"""
+使用统计汇总性能测试
+
+同一用户的历史记录和 AI 使用记录分几次增加到 ROWS 条 (分布在最近一年内), 每次增加后:
+- 增量汇总新增的记录 (只读取汇总水位之后的记录), 统计汇总速度
+- 比较统计接口 (只读取汇总表) 与直接在原始表上 GROUP BY 统计同样内容的延迟
+
+运行:
+    python tests/performance/bench_usage_summary.py
+    BENCH_USAGE_ROWS=1000000 python tests/performance/bench_usage_summary.py
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 使用临时 SQLite 数据库, 必须在导入数据库模块之前设置
+_DB_DIR = tempfile.mkdtemp(prefix="calc-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}")
+
+# 添加 backend 目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../backend"))
+
+import uuid  # noqa: E402
+
+from sqlalchemy import func, select  # noqa: E402
+
+from api.models import AIUsage, History, User  # noqa: E402
+from api.services.history_storage import to_storage  # noqa: E402
+from api.services.history_sync import assign_change_seq  # noqa: E402
+from api.services.usage_analytics import UsageAnalyticsService, bucket_start  # noqa: E402
+from api.utils.database import SessionLocal, init_db  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_USAGE_ROWS", "200000"))
+STAGES = 4
+# 每条 AI 使用记录对应的历史记录数
+AI_RATIO = 10
+COMMON_EXPRESSIONS = 200
+INSERT_CHUNK = 10000
+REPEAT = 20
+CALCULATION_TYPES = ["basic", "basic", "basic", "scientific", "ai"]
+
+
+def new_id() -> uuid.UUID:
+    """生成记录ID (跳过十六进制形式是合法数字的 ID, 见 bench_history_storage.new_id)"""
+    while True:
+        value = uuid.uuid4()
+        try:
+            float(value.hex)
+        except ValueError:
+            return value
+
+
+def populate(db, user_id, count: int, rng: random.Random) -> None:
+    """写入 count 条历史记录和 count / AI_RATIO 条 AI 使用记录 (创建时间在最近一年内随机)"""
+    now = datetime.utcnow()
+    weights = [1 / (rank + 1) for rank in range(COMMON_EXPRESSIONS)]
+    for offset in range(0, count, INSERT_CHUNK):
+        size = min(INSERT_CHUNK, count - offset)
+        mappings = []
+        for _ in range(size):
+            if rng.random() < 0.95:
+                rank = rng.choices(range(COMMON_EXPRESSIONS), weights=weights)[0]
+                expression = f"sqrt({rank}) * {rank % 7}"
+            else:
+                expression = f"{rng.random():.8f} * 42"
+            mappings.append(
+                {
+                    "id": new_id(),
+                    "user_id": user_id,
+                    "expression": expression,
+                    "result": "1",
+                    "calculation_type": rng.choice(CALCULATION_TYPES),
+                    "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+                }
+            )
+        assign_change_seq(db, mappings)
+        db.bulk_insert_mappings(History, to_storage(db, mappings), render_nulls=True)
+
+        usages = [
+            {
+                "id": new_id(),
+                "user_id": user_id,
+                "query": "q",
+                "tokens_used": rng.randint(50, 500),
+                "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+            }
+            for _ in range(size // AI_RATIO)
+        ]
+        assign_change_seq(db, usages, User.ai_usage_seq)
+        db.bulk_insert_mappings(AIUsage, usages, render_nulls=True)
+        db.commit()
+
+
+def raw_summary(db, user_id, days: int) -> dict:
+    """直接在原始表上统计 (与 get_summary 的内容相同)"""
+    start = bucket_start(datetime.utcnow(), "day") - timedelta(days=days - 1)
+    day = func.date(History.created_at)
+    timeline = db.execute(
+        select(day, History.calculation_type, func.count())
+        .where(History.user_id == user_id, History.created_at >= start)
+        .group_by(day, History.calculation_type)
+    ).all()
+    ai_day = func.date(AIUsage.created_at)
+    ai = db.execute(
+        select(ai_day, func.count(), func.sum(AIUsage.tokens_used))
+        .where(AIUsage.user_id == user_id, AIUsage.created_at >= start)
+        .group_by(ai_day)
+    ).all()
+    # 常用表达式为累计次数 (不限于统计范围)
+    expression = History.expression.label("expression")
+    uses = func.count()
+    top = db.execute(
+        select(expression, uses)
+        .where(History.user_id == user_id)
+        .group_by(expression)
+        .order_by(uses.desc())
+        .limit(10)
+    ).all()
+    return {
+        "calculations": sum(row[2] for row in timeline),
+        "ai_tokens": sum(row[2] for row in ai),
+        "top": [(row[0], row[1]) for row in top],
+    }
+
+
+def measure(func) -> float:
+    """返回多次调用的延迟中位数 (毫秒)"""
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    """主函数"""
+    init_db()
+    db = SessionLocal()
+    rng = random.Random(1)
+
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+
+    print(
+        f"{'原始记录数':<12} | {'汇总 (条/s)':>12} | {'30天 汇总表':>12} | {'30天 原始表':>12}"
+        f" | {'365天 汇总表':>12} | {'365天 原始表':>12}"
+    )
+    print("-" * 92)
+    total = 0
+    for stage in range(STAGES):
+        count = ROWS // STAGES
+        populate(db, user.id, count, rng)
+        total += count
+
+        started = time.perf_counter()
+        result = UsageAnalyticsService.run_rollups(db)
+        elapsed = time.perf_counter() - started
+        assert result["history"] == count, result
+
+        # 汇总结果与原始表一致 (按天统计, 今天之前的范围两者相同)
+        summary = UsageAnalyticsService.get_summary(db, user.id, 365)
+        raw = raw_summary(db, user.id, 365)
+        assert summary["calculations"] == raw["calculations"], (summary["calculations"], raw)
+        assert summary["ai_tokens"] == raw["ai_tokens"]
+        assert [item["count"] for item in summary["top_expressions"]] == [
+            uses for _, uses in raw["top"]
+        ]
+
+        latencies = [
+            measure(lambda: UsageAnalyticsService.get_summary(db, user.id, 30)),
+            measure(lambda: raw_summary(db, user.id, 30)),
+            measure(lambda: UsageAnalyticsService.get_summary(db, user.id, 365)),
+            measure(lambda: raw_summary(db, user.id, 365)),
+        ]
+        rate = (result["history"] + result["ai_usage"]) / elapsed
+        print(
+            f"{total:<15,} | {rate:>14,.0f} | "
+            + " | ".join(f"{value:>10.2f} ms" for value in latencies)
+        )
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
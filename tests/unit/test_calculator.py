@@ -0,0 +1,19 @@
+"""
+计算服务 (CalculatorService): 浮点结果范围和批量计算
+"""
+import pytest
+
+from api.services.calculator import CalculatorService
+
+
+def test_float_result_range():
+    assert CalculatorService.float_result(2**1023) == float(2**1023)
+    # 2**1024 - 1 只有 1024 位, 但超出 float 的最大值
+    with pytest.raises(ValueError, match="/calculate/exact"):
+        CalculatorService.float_result(2**1024 - 1)
+
+
+def test_batch_reports_out_of_range_items():
+    results = CalculatorService.evaluate_batch(["2 ** 1024", "1 + 1"])
+    assert results[0][0] is None and "浮点数范围" in results[0][1]
+    assert results[1] == (2, None)
@@ -0,0 +1,35 @@
+"""
+数值微积分 (向量化求值)
+"""
+import math
+
+import pytest
+
+from api.services.calculus import CalculusService
+
+
+def test_integrate_gaussian():
+    result = CalculusService.integrate("exp(-x**2)", "x", -5, 5)
+    assert result["converged"]
+    assert result["value"] == pytest.approx(math.sqrt(math.pi), rel=1e-10)
+
+
+@pytest.mark.parametrize(
+    "expression, value",
+    [
+        # 整数幂在向量化计算中按 float64 计算, 不会按 int64 溢出
+        ("pow(10, 20) * x", 5e19),
+        ("10 ** 20 * x", 5e19),
+        ("pow(2, 70) * x ** 2", 2.0**70 / 3),
+    ],
+)
+def test_integrate_large_integer_powers(expression, value):
+    result = CalculusService.integrate(expression, "x", 0, 1)
+    assert result["value"] == pytest.approx(value, rel=1e-12)
+
+
+def test_derivative_and_roots_with_integer_pow():
+    _, values = CalculusService.derivative("pow(10, 20) * x ** 2", "x", points=[1.0])
+    assert values[0] == pytest.approx(2e20, rel=1e-6)
+    roots = CalculusService.roots("pow(x, 2) - 2", "x", 0, 2)
+    assert roots["roots"] == pytest.approx([math.sqrt(2)])
@@ -0,0 +1,61 @@
+"""
+表达式静态计算量分析 (CostAnalyzer) 的预算限制
+"""
+import pytest
+
+from api.services.calculator import CalculatorService
+from api.services.expression import CostAnalyzer, ExpressionCostError, ExpressionEngine
+
+
+def make_engine(**limits) -> ExpressionEngine:
+    """使用指定预算的表达式引擎 (不使用编译缓存)"""
+    return ExpressionEngine(
+        CalculatorService.CONSTANTS,
+        CalculatorService.FUNCTIONS,
+        cache_size=0,
+        analyzer=CostAnalyzer(**limits),
+    )
+
+
+def test_node_limit():
+    engine = make_engine(max_nodes=10)
+    # 节点数包括运算符节点
+    assert engine.compile("1 + 2").cost.nodes == 4
+    with pytest.raises(ExpressionCostError, match="过于复杂"):
+        engine.compile(" + ".join(["1"] * 10))
+
+
+def test_result_bits_limit():
+    engine = make_engine(max_result_bits=1024)
+    assert engine.compile("2 ** 1000").cost.result_bits == 1001
+    with pytest.raises(ExpressionCostError, match="结果过大"):
+        engine.compile("2 ** 2000")
+
+
+def test_nested_power_rejected_before_evaluation():
+    # 9 ** 9 ** 9 的结果有约 3.7 亿位十进制数字, 必须在执行前拒绝
+    with pytest.raises(ExpressionCostError):
+        CalculatorService.evaluate("9 ** 9 ** 9")
+    with pytest.raises(ExpressionCostError):
+        CalculatorService.evaluate("pow(10, pow(10, 10))")
+
+
+def test_operation_budget():
+    engine = make_engine(max_operations=1000)
+    assert engine.compile("2 ** 100").cost.operations < 1000
+    with pytest.raises(ExpressionCostError, match="计算量超出限制"):
+        engine.compile("3 ** 5000")
+
+
+def test_modular_power_is_cheap():
+    # 模幂的结果不超过模数, 指数很大也允许
+    cost = CalculatorService.analyze("pow(3, 10 ** 18, 1000007)")
+    assert cost["result_bits"] <= 20
+    assert CalculatorService.evaluate("pow(3, 10 ** 18, 1000007)") == pow(3, 10**18, 1000007)
+
+
+def test_float_power_is_constant_cost():
+    assert CalculatorService.analyze("2.0 ** 100000")["operations"] == 1
+    # 浮点溢出在执行时立即报错
+    with pytest.raises(ValueError):
+        CalculatorService.evaluate_local("2.0 ** 100000")
@@ -0,0 +1,76 @@
+"""
+精确计算 (exact): 分块输出十进制数字和结果摘要
+"""
+import hashlib
+import sys
+from decimal import Decimal
+
+import pytest
+
+from api.services.calculator import CalculatorService
+from api.services.exact import (
+    EXACT_MAX_DIGITS,
+    digit_count,
+    exact_reference,
+    iter_digits,
+    parse_exact_reference,
+    result_digest,
+)
+
+
+
+def reference_str(value: int) -> str:
+    """参考值: str() 生成的完整十进制字符串 (临时取消整数转字符串的位数限制)"""
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    try:
+        return str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [0, 7, -12345, 10**4000, 10**4000 - 1, 2**16000, -(3**20000), 10**12345 + 1],
+    ids=["0", "7", "negative", "10^4000", "10^4000-1", "2^16000", "-3^20000", "10^12345+1"],
+)
+@pytest.mark.parametrize("chunk_size", [1, 7, 4000])
+def test_iter_digits_matches_str(value, chunk_size):
+    # 分块输出不受 sys.get_int_max_str_digits() 的限制
+    chunks = list(iter_digits(value, chunk_size))
+    assert "".join(chunks) == reference_str(value)
+    assert digit_count(value) == len(reference_str(abs(value)))
+
+
+def test_large_integers_streamed_in_chunks():
+    chunks = list(iter_digits(2**16000, 1000))
+    # 首块不补零, 其余每块正好 chunk_size 位
+    assert len(chunks) == 5
+    assert all(len(chunk) == 1000 for chunk in chunks[1:])
+    assert chunks[0][0] != "0"
+
+
+def test_digest_matches_reference():
+    expected = hashlib.sha256(reference_str(2**16000).encode("ascii")).hexdigest()
+    assert result_digest(2**16000) == expected
+    assert result_digest(CalculatorService.evaluate_exact("2 ** 16000")) == expected
+    assert digit_count(2**16000) == 4817
+
+
+def test_decimal_results():
+    result = CalculatorService.evaluate_exact("1 / 3")
+    assert isinstance(result, Decimal)
+    assert "".join(iter_digits(result, 7)) == "0." + "3" * 50
+    assert result_digest(result) == hashlib.sha256(str(result).encode("ascii")).hexdigest()
+
+
+def test_max_digits():
+    with pytest.raises(ValueError, match="结果过大"):
+        CalculatorService.evaluate_exact(f"10 ** {EXACT_MAX_DIGITS}")
+
+
+def test_reference_round_trip():
+    digest = result_digest(2**16000)
+    assert parse_exact_reference(exact_reference(4817, digest)) == (4817, digest)
+    assert parse_exact_reference("12345") is None
+    assert parse_exact_reference(None) is None
@@ -0,0 +1,78 @@
+"""
+进程池计算执行器 (ProcessPoolEvaluator): 超时、工作进程替换和启动失败
+"""
+import time
+
+import pytest
+
+from api.services import executor
+from api.services.executor import EvaluationTimeout, ProcessPoolEvaluator
+
+# 在工作进程中耗时约 1 秒以上的表达式 (需要放宽工作进程的计算量预算)
+SLOW_EXPRESSION = "3 ** 5000000 % 7"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """一个工作进程, 超时 0.2 秒 (工作进程通过环境变量继承放宽的预算)"""
+    monkeypatch.setenv("CALC_MAX_RESULT_BITS", "100000000")
+    monkeypatch.setenv("CALC_MAX_OPERATIONS", "1000000000000000")
+    evaluator = ProcessPoolEvaluator(size=1, timeout=0.2)
+    evaluator.start()
+    yield evaluator
+    evaluator.shutdown()
+
+
+def wait_idle(evaluator, deadline=30.0):
+    """等待替换进程启动完成并加入空闲队列"""
+    end = time.monotonic() + deadline
+    while evaluator.stats()["idle"] < evaluator.size and time.monotonic() < end:
+        time.sleep(0.05)
+
+
+def test_evaluate_and_errors(pool):
+    assert pool.evaluate("2 ** 10") == 1024
+    with pytest.raises(ZeroDivisionError):
+        pool.evaluate("1 / 0")
+    with pytest.raises(ValueError):
+        pool.evaluate("foo(1)")
+    stats = pool.stats()
+    assert (stats["completed"], stats["timeouts"], stats["restarts"]) == (3, 0, 0)
+
+
+def test_timeout_replaces_worker(pool):
+    old = next(iter(pool._workers))
+    with pytest.raises(EvaluationTimeout, match="计算超时"):
+        pool.evaluate(SLOW_EXPRESSION)
+    assert not old.process.is_alive()
+
+    # 替换进程启动后可以继续计算
+    wait_idle(pool)
+    assert pool.evaluate("1 + 1") == 2
+    stats = pool.stats()
+    assert (stats["timeouts"], stats["restarts"], stats["spawn_failures"]) == (1, 1, 0)
+    assert len(pool._workers) == 1 and old not in pool._workers
+
+
+def test_failed_replacement_not_retried(pool, monkeypatch):
+    spawn = executor._Worker
+    attempts = []
+
+    def failing_worker(context):
+        attempts.append(context)
+        raise OSError("Too many open files")
+
+    monkeypatch.setattr(executor, "_Worker", failing_worker)
+    with pytest.raises(EvaluationTimeout):
+        pool.evaluate(SLOW_EXPRESSION)
+    # 替换失败只尝试一次, 仍然报告超时
+    assert len(attempts) == 1
+    stats = pool.stats()
+    assert (stats["timeouts"], stats["restarts"], stats["spawn_failures"]) == (1, 1, 1)
+    assert pool._workers == set()
+
+    # 下一次计算重新补足进程池 (放宽超时, 等待替换进程启动完成)
+    monkeypatch.setattr(executor, "_Worker", spawn)
+    pool.timeout = 30
+    assert pool.evaluate("2 + 2") == 4
+    assert len(pool._workers) == 1
@@ -0,0 +1,63 @@
+"""
+表达式引擎 (ExpressionEngine) 的编译缓存
+"""
+import pytest
+
+from api.services.calculator import CalculatorService
+from api.services.expression import ExpressionEngine
+
+
+def make_engine(cache_size: int) -> ExpressionEngine:
+    """新建的表达式引擎 (不与 CalculatorService 共享缓存)"""
+    return ExpressionEngine(
+        CalculatorService.CONSTANTS, CalculatorService.FUNCTIONS, cache_size=cache_size
+    )
+
+
+def test_hits_and_misses():
+    engine = make_engine(8)
+    first = engine.compile("1 + 2")
+    # 空白不同的同一表达式命中缓存
+    assert engine.compile("  1  +   2 ") is first
+    assert first.evaluate() == 3
+    assert engine.stats() == {"size": 1, "capacity": 8, "hits": 1, "misses": 1}
+
+    # 自由变量不同的表达式分别缓存
+    assert engine.compile("x + 1", ("x",)) is not engine.compile("x + 1", ("x", "y"))
+    assert engine.stats()["size"] == 3
+
+
+def test_lru_eviction_is_bounded():
+    engine = make_engine(2)
+    a = engine.compile("1 + 1")
+    engine.compile("2 + 2")
+    # 访问 a 之后, 最久未使用的是 2 + 2
+    assert engine.compile("1 + 1") is a
+    engine.compile("3 + 3")
+    assert engine.stats()["size"] == 2
+
+    misses = engine.stats()["misses"]
+    assert engine.compile("1 + 1") is a
+    engine.compile("2 + 2")
+    assert engine.stats()["misses"] == misses + 1
+    assert engine.stats()["size"] == 2
+
+
+def test_invalid_expressions_not_cached():
+    engine = make_engine(8)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            engine.compile("__import__('os')")
+    assert engine.stats()["size"] == 0
+    assert engine.stats()["misses"] == 2
+
+
+def test_cache_disabled_and_clear():
+    engine = make_engine(0)
+    assert engine.compile("1 + 1") is not engine.compile("1 + 1")
+    assert engine.stats()["size"] == 0
+
+    engine = make_engine(8)
+    engine.compile("1 + 1")
+    engine.clear()
+    assert engine.stats()["size"] == 0
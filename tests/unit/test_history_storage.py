@@ -0,0 +1,125 @@
+"""
+历史记录存储格式: 写入前的转换 (to_storage) 与读取时的还原 (to_row / History.result)
+"""
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from api.models import History, HistoryText
+from api.services.history_storage import (
+    HISTORY_ROW_COLUMNS,
+    HISTORY_TEXT_INLINE_MAX,
+    format_result,
+    intern_texts,
+    release_texts,
+    split_result,
+    to_row,
+    to_storage,
+)
+
+LONG_EXPRESSION = "sqrt(" + " + ".join(["2"] * 40) + ")"
+LONG_RESULT = "[[" + ", ".join(["1.5"] * 40) + "]]"
+
+
+@pytest.mark.parametrize(
+    "result",
+    ["4.0", "0.1", "-2.5e-300", "1e+300", "4", "1.50", "inf", "nan", "错误", "", None],
+)
+def test_split_result_round_trip(result):
+    text, value = split_result(result)
+    assert text is None or value is None
+    assert format_result(text, value) == result
+
+
+def test_numeric_results_stored_as_float():
+    assert split_result("0.30000000000000004") == (None, 0.30000000000000004)
+    # 整数文本和非规范写法按文本保存, 读取时原样返回
+    assert split_result("4") == ("4", None)
+    assert split_result("1.50") == ("1.50", None)
+
+
+def test_to_storage_does_not_modify_mappings(db, user):
+    mappings = [{"user_id": user.id, "expression": LONG_EXPRESSION, "result": "4.0"}]
+    stored = to_storage(db, mappings)
+    db.rollback()
+    assert mappings == [{"user_id": user.id, "expression": LONG_EXPRESSION, "result": "4.0"}]
+    assert "expression" not in stored[0] and "result" not in stored[0]
+
+
+@pytest.mark.parametrize(
+    "expression, result",
+    [
+        ("1 + 1", "2.0"),
+        ("1 + 1", "2"),
+        (LONG_EXPRESSION, "9.055385138137417"),
+        ("matrix", LONG_RESULT),
+        (LONG_EXPRESSION, LONG_RESULT),
+        ("x", None),
+    ],
+)
+def test_round_trip(db, user, expression, result):
+    stored = to_storage(
+        db,
+        [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user.id,
+                "expression": expression,
+                "result": result,
+                "calculation_type": "basic",
+                "created_at": datetime.utcnow(),
+            }
+        ],
+    )[0]
+    assert (stored["expression_inline"] is None) == (len(expression) > HISTORY_TEXT_INLINE_MAX)
+    db.add(History(**stored))
+    db.commit()
+
+    record = db.get(History, stored["id"])
+    assert (record.expression, record.result) == (expression, result)
+    row = to_row(db.execute(select(*HISTORY_ROW_COLUMNS).where(History.id == stored["id"])).one())
+    assert (row.expression, row.result) == (expression, result)
+
+
+def test_long_texts_deduplicated(db):
+    first = intern_texts(db, [LONG_EXPRESSION, LONG_EXPRESSION, LONG_RESULT])
+    second = intern_texts(db, [LONG_EXPRESSION])
+    db.commit()
+    assert len(first) == 2
+    assert second[LONG_EXPRESSION] == first[LONG_EXPRESSION]
+
+
+def test_release_texts_keeps_referenced_texts(db, user):
+    text = LONG_EXPRESSION + " + 1"
+    stored = to_storage(
+        db,
+        [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user.id,
+                "expression": text,
+                "result": "1.0",
+                "calculation_type": "basic",
+                "created_at": datetime.utcnow(),
+                "change_seq": seq,
+            }
+            for seq in (1, 2)
+        ],
+    )
+    db.add_all(History(**values) for values in stored)
+    db.commit()
+    text_id = stored[0]["expression_id"]
+    count = select(func.count()).select_from(HistoryText).where(HistoryText.id == text_id)
+
+    # 另一条记录仍引用该文本
+    db.delete(db.get(History, stored[0]["id"]))
+    assert release_texts(db, [text_id, None]) == 0
+    db.commit()
+    assert db.execute(count).scalar() == 1
+
+    db.delete(db.get(History, stored[1]["id"]))
+    assert release_texts(db, [text_id]) == 1
+    db.commit()
+    assert db.execute(count).scalar() == 0
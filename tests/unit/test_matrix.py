@@ -0,0 +1,19 @@
+"""
+矩阵计算 (evaluate_matrix)
+"""
+import numpy as np
+import pytest
+
+from api.services.calculator import CalculatorService
+
+
+def test_evaluate_matrix():
+    result = CalculatorService.evaluate_matrix("[[1, 2], [3, 4]] @ [[5], [6]]")
+    assert result.dtype == np.float64
+    np.testing.assert_allclose(result, [[17.0], [39.0]])
+
+
+@pytest.mark.parametrize("expression", ["2 ** 10000", "[[1, 2]] * 2 ** 10000"])
+def test_result_beyond_float_range_rejected(expression):
+    with pytest.raises(ValueError, match="浮点数范围"):
+        CalculatorService.evaluate_matrix(expression)
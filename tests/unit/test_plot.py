@@ -0,0 +1,97 @@
+"""
+函数绘图采样 (plot): 自适应细分、间断处断开和 LTTB 降采样
+"""
+import math
+
+import numpy as np
+import pytest
+
+from api.services.plot import PlotService, adaptive_sample, downsample, lttb
+from api.services.result_cache import ResultCache
+
+
+@pytest.fixture(autouse=True)
+def plot_cache(monkeypatch):
+    """每个测试使用新的绘图缓存"""
+    monkeypatch.setattr(PlotService, "cache", ResultCache(prefix="plot:"))
+
+
+def gap_positions(result: dict) -> list:
+    """y 为None的分隔点的横坐标"""
+    return [x for x, y in zip(result["x"], result["y"]) if y is None]
+
+
+@pytest.mark.parametrize("target", [3, 10, 257, 1000])
+def test_lttb_output_size(target):
+    rng = np.random.default_rng(0)
+    x = np.sort(rng.uniform(0, 100, 5000))
+    y = rng.normal(size=x.size)
+    selected = lttb(x, y, target)
+    assert selected.size == target
+    assert selected[0] == 0 and selected[-1] == x.size - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_all_points_below_target():
+    x = np.arange(5.0)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_lttb_keeps_peaks():
+    x = np.linspace(0, 1, 1001)
+    y = np.zeros_like(x)
+    y[500] = 10.0
+    assert 500 in lttb(x, y, 20)
+
+
+def test_downsample_single_segment_hits_target():
+    x = np.linspace(0, 10, 5000)
+    xs, ys = downsample(x, np.sin(x), np.zeros(x.size - 1, bool), 300)
+    assert len(xs) == len(ys) == 300
+    assert None not in ys
+
+
+def test_asymptotes_emitted_as_gaps():
+    result = PlotService.plot("tan(x)", "x", -5, 5, 500)
+    # [-5, 5] 中 tan(x) 有 4 条渐近线: ±π/2, ±3π/2
+    expected = [-3 * math.pi / 2, -math.pi / 2, math.pi / 2, 3 * math.pi / 2]
+    assert gap_positions(result) == pytest.approx(expected, abs=1e-3)
+    assert result["gaps"] == 4
+    assert result["points"] == len(result["x"]) <= 500
+    assert result["x"] == sorted(result["x"])
+
+
+def test_pole_and_domain_boundary():
+    result = PlotService.plot("1/x", "x", -1, 1, 200)
+    assert gap_positions(result) == pytest.approx([0.0], abs=1e-3)
+
+    # 定义域边界附近加密采样, 定义域之外没有点
+    result = PlotService.plot("sqrt(x)", "x", -2, 2, 300)
+    assert result["gaps"] == 0
+    assert 0 <= min(result["x"]) < 1e-3
+
+
+def test_smooth_function_has_no_gaps():
+    result = PlotService.plot("sin(x)", "x", 0, 10, 100)
+    assert result["gaps"] == 0
+    assert result["points"] == 100
+    assert result["y"] == pytest.approx(np.sin(result["x"]).tolist())
+
+
+def test_evaluation_budget():
+    x, y, gaps, evaluations = adaptive_sample(np.tan, -5, 5, initial=64, max_evaluations=500)
+    assert evaluations <= 500
+    assert x.size == evaluations and gaps.size == x.size - 1
+
+
+def test_cached_results():
+    first = PlotService.plot("sin(x)", "x", 0, 1, 50)
+    second = PlotService.plot(" sin( x ) ", "x", 0, 1, 50)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert first["y"] == second["y"]
+
+
+@pytest.mark.parametrize("start, stop, points", [(1, 0, 100), (0, math.inf, 100), (0, 1, 1)])
+def test_invalid_ranges(start, stop, points):
+    with pytest.raises(ValueError):
+        PlotService.plot("x", "x", start, stop, points)
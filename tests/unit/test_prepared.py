@@ -0,0 +1,129 @@
+"""
+预编译表达式: 按用户隔离的两级 LRU 存储和变量绑定校验
+"""
+import pytest
+
+from api.services.calculator import CalculatorService
+from api.services.prepared import (
+    PreparedExpression,
+    PreparedExpressionService,
+    PreparedExpressionStore,
+)
+
+
+def make_prepared(expression: str, variables=("x",)) -> PreparedExpression:
+    """不经过服务类的预编译表达式 (句柄即表达式)"""
+    return PreparedExpression(expression, CalculatorService.engine.compile(expression, variables))
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    """每个测试使用新的存储"""
+    store = PreparedExpressionStore(max_per_user=3, max_users=2)
+    monkeypatch.setattr(PreparedExpressionService, "store", store)
+    return store
+
+
+def handles(store, user_id) -> list:
+    return [prepared.handle for prepared in store.list(user_id)]
+
+
+def test_user_isolation():
+    a = PreparedExpressionService.prepare("alice", "x * 2", ["x"])
+    b = PreparedExpressionService.prepare("bob", "x * 2", ["x"])
+    # 句柄由表达式决定, 但各用户的表达式分别保存
+    assert a.handle == b.handle and a is not b
+    assert PreparedExpressionService.get("carol", a.handle) is None
+
+    assert PreparedExpressionService.delete("alice", a.handle) is True
+    assert PreparedExpressionService.get("alice", a.handle) is None
+    assert PreparedExpressionService.get("bob", b.handle) is b
+    assert PreparedExpressionService.delete("alice", a.handle) is False
+
+
+def test_same_expression_same_handle():
+    first = PreparedExpressionService.prepare("alice", "x + y", ["x", "y"])
+    assert PreparedExpressionService.prepare("alice", " x+y ", ["x", "y"]) is first
+    assert PreparedExpressionService.prepare("alice", "x + y", ["y", "x"]).handle != first.handle
+
+
+def test_per_user_lru_eviction(store):
+    for expression in ("x + 1", "x + 2", "x + 3"):
+        store.put("alice", make_prepared(expression))
+    # 读取使 x + 1 成为最近使用的, 淘汰的是 x + 2
+    assert store.get("alice", "x + 1") is not None
+    store.put("alice", make_prepared("x + 4"))
+    assert handles(store, "alice") == ["x + 4", "x + 1", "x + 3"]
+    assert store.stats()["evictions"] == 1
+
+
+def test_user_lru_eviction(store):
+    store.put("alice", make_prepared("x + 1"))
+    store.put("alice", make_prepared("x + 2"))
+    store.put("bob", make_prepared("x + 1"))
+    store.get("alice", "x + 1")
+    store.put("carol", make_prepared("x + 1"))
+    # 最久未使用的用户 (bob) 的全部表达式被淘汰
+    assert handles(store, "bob") == []
+    assert len(handles(store, "alice")) == 2
+    assert store.stats() == {
+        "users": 2,
+        "size": 3,
+        "max_users": 2,
+        "max_per_user": 3,
+        "evictions": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "variables, message",
+    [
+        (["x", "x"], "不能重复"),
+        ([f"v{i}" for i in range(33)], "不能超过"),
+        (["sin"], "重名"),
+        (["1x"], "不合法"),
+    ],
+)
+def test_invalid_variables(variables, message):
+    with pytest.raises(ValueError, match=message):
+        PreparedExpressionService.prepare("alice", "x", variables)
+
+
+@pytest.mark.parametrize(
+    "bindings, message",
+    [({"x": 1}, "缺少变量的取值: y"), ({"x": 1, "y": 2, "z": 3}, "未注册的变量: z")],
+)
+def test_binding_validation(bindings, message):
+    prepared = PreparedExpressionService.prepare("alice", "x + y", ["x", "y"])
+    with pytest.raises(ValueError, match=message):
+        PreparedExpressionService.evaluate(prepared, bindings)
+
+
+def test_evaluate():
+    prepared = PreparedExpressionService.prepare("alice", "p * (1 + r) ** n", ["p", "r", "n"])
+    result = PreparedExpressionService.evaluate(prepared, {"p": 1000, "r": 0.05, "n": 10})
+    assert result == pytest.approx(1628.894626777442)
+    assert prepared.evaluations == 1
+    with pytest.raises(ValueError, match="浮点数范围"):
+        PreparedExpressionService.evaluate(prepared, {"p": 1e308, "r": 1, "n": 10})
+
+
+def test_evaluate_batch_keeps_order_and_errors():
+    prepared = PreparedExpressionService.prepare("alice", "sqrt(x) / y", ["x", "y"])
+    outcomes = PreparedExpressionService.evaluate_batch(
+        prepared,
+        [
+            {"x": 16, "y": 2},
+            {"x": 1, "y": 0},
+            {"x": -1, "y": 1},
+            {"x": 9},
+            {"x": 9, "y": 3},
+        ],
+    )
+    assert [result for result, _ in outcomes] == [2.0, None, None, None, 1.0]
+    errors = [error for _, error in outcomes]
+    assert errors[0] is None and errors[4] is None
+    assert "除数不能为零" in errors[1]
+    assert errors[2] is not None
+    assert "缺少变量的取值" in errors[3]
+    assert prepared.evaluations == 5
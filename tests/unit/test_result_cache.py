@@ -0,0 +1,98 @@
+"""
+两级结果缓存 (ResultCache): 进程内 LRU + 外部后端
+"""
+from api.services import result_cache
+from api.services.result_cache import CacheBackend, MemoryCacheBackend, ResultCache
+
+
+class FailingBackend(CacheBackend):
+    """总是失败的外部后端"""
+
+    name = "failing"
+
+    def get(self, key):
+        raise ConnectionError("unavailable")
+
+    def set(self, key, value, ttl):
+        raise ConnectionError("unavailable")
+
+    def clear(self, prefix):
+        raise ConnectionError("unavailable")
+
+
+class Clock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_format():
+    cache = ResultCache()
+    key = cache.make_key("1 + 1")
+    assert key.startswith("calc:") and len(key) == len("calc:") + 64
+    assert ResultCache(prefix="plot:").make_key("1 + 1") == "plot:" + key[len("calc:"):]
+
+
+def test_two_tier_lookup():
+    backend = MemoryCacheBackend()
+    writer = ResultCache(backend=backend)
+    reader = ResultCache(backend=backend)
+
+    assert reader.get("1 + 1") == (False, None)
+    writer.set("1 + 1", 2)
+    # 另一个进程的缓存从外部后端读取, 之后从进程内缓存读取
+    assert reader.get("1 + 1") == (True, 2)
+    assert reader.get("1 + 1") == (True, 2)
+    stats = reader.stats()
+    assert (stats["local_hits"], stats["backend_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_ttl_expiry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    backend = MemoryCacheBackend()
+    cache = ResultCache(backend=backend, ttl=60)
+    cache.set("2 ** 10", 1024)
+
+    clock.now += 59
+    assert cache.get("2 ** 10") == (True, 1024)
+    clock.now += 2
+    # 两级缓存都已过期
+    assert cache.get("2 ** 10") == (False, None)
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_size_bound():
+    cache = ResultCache(size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1) and cache.get("c") == (True, 3)
+    assert cache.stats()["size"] == 2
+
+
+def test_backend_errors_do_not_fail_lookups():
+    cache = ResultCache(backend=FailingBackend())
+    cache.set("1 + 1", 2)
+    assert cache.get("1 + 1") == (True, 2)
+    assert cache.get("2 + 2") == (False, None)
+    assert cache.clear() == {"local": 1, "backend": 0}
+    assert cache.stats()["backend_errors"] == 3
+
+
+def test_clear_only_own_prefix():
+    backend = MemoryCacheBackend()
+    calc = ResultCache(backend=backend)
+    plot = ResultCache(backend=backend, prefix="plot:")
+    calc.set("1 + 1", 2)
+    plot.set("sin(x)", {"x": [0.0]})
+
+    assert calc.clear() == {"local": 1, "backend": 1}
+    assert ResultCache(backend=backend, prefix="plot:").get("sin(x)") == (True, {"x": [0.0]})
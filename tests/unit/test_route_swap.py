@@ -0,0 +1,64 @@
+"""
+DB_ASYNC 路由替换 (use_async_routes)
+"""
+import pytest
+from fastapi import APIRouter
+
+from api.routers import use_async_routes
+
+
+def make_routers():
+    """同步路由 (路径参数路由在后) 和对应的异步路由"""
+    router = APIRouter()
+
+    @router.get("/items/stats")
+    def stats():
+        """统计"""
+        return "sync"
+
+    @router.get("/items/{item_id}")
+    def get_item(item_id: int):
+        """获取单个条目"""
+        return "sync"
+
+    @router.delete("/items/{item_id}")
+    def delete_item(item_id: int):
+        """删除条目"""
+        return "sync"
+
+    async_router = APIRouter()
+
+    @async_router.get("/items/{item_id}")
+    async def get_item_async(item_id: int):
+        return "async"
+
+    return router, async_router
+
+
+def test_replaces_matching_route_in_place():
+    router, async_router = make_routers()
+    use_async_routes(router, async_router)
+
+    paths = [(route.path, sorted(route.methods)) for route in router.routes]
+    assert paths == [
+        ("/items/stats", ["GET"]),
+        ("/items/{item_id}", ["GET"]),
+        ("/items/{item_id}", ["DELETE"]),
+    ]
+    replaced = router.routes[1]
+    assert replaced.endpoint.__name__ == "get_item_async"
+    # 接口文档沿用同步路由的说明
+    assert replaced.description == "获取单个条目"
+    # 方法不同的同名路径保持同步实现
+    assert router.routes[2].endpoint.__name__ == "delete_item"
+
+
+def test_unmatched_async_route_rejected():
+    router, async_router = make_routers()
+
+    @async_router.post("/items")
+    async def create_item():
+        return "async"
+
+    with pytest.raises(RuntimeError, match="/items"):
+        use_async_routes(router, async_router)
@@ -0,0 +1,55 @@
+"""
+带单位的数量 (units): 温度偏移、负数和单位幂次
+"""
+import pytest
+
+from api.services.calculator import CalculatorService
+from api.services.units import insert_implicit_multiplication
+
+
+@pytest.mark.parametrize(
+    "expression, target, value",
+    [
+        ("30 degC - 10 degC", "degC", 20.0),
+        ("30 degC - 10 degC", "K", 20.0),
+        ("20 degC + 10 K", "degC", 30.0),
+        ("10 degC", "degF", 50.0),
+        ("0 degC", "K", 273.15),
+        ("-40 degC", "degF", -40.0),
+        ("-10 degF", "degC", -23.333333333333),
+        ("-273.15 degC", "K", 0.0),
+        ("10 degC - -5 degC", "K", 15.0),
+        ("-(30 degC - 10 degC)", "degC", -20.0),
+    ],
+)
+def test_temperature_offsets(expression, target, value):
+    result = CalculatorService.convert(expression, target)
+    assert result.to_dict()["value"] == pytest.approx(value)
+
+
+def test_negative_number_binds_before_offset():
+    assert insert_implicit_multiplication("-40 degC") == "(-40*degC)"
+    assert insert_implicit_multiplication("2 * -3 m") == "2 * (-3*m)"
+    assert insert_implicit_multiplication("5 - 3 m") == "5 - (3*m)"
+
+
+def test_negating_offset_temperature_rejected():
+    with pytest.raises(ValueError, match="-40 degC"):
+        CalculatorService.convert("-(40 degC)", "degC")
+
+
+def test_adding_two_offset_temperatures_rejected():
+    with pytest.raises(ValueError, match="温差请使用 K"):
+        CalculatorService.convert("0 degC + 10 degC", "degC")
+
+
+def test_unit_exponent_capped():
+    assert CalculatorService.convert("(2 m) ** 3", "m**3").to_dict()["value"] == 8.0
+    with pytest.raises(ValueError, match="幂次过大"):
+        CalculatorService.convert("2 m ** 1000000")
+
+
+@pytest.mark.parametrize("expression, target", [("1e400 m", None), ("1e308 m * 10", "km")])
+def test_non_finite_result_rejected(expression, target):
+    with pytest.raises(ValueError, match="浮点数范围"):
+        CalculatorService.convert(expression, target)
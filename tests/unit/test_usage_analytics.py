@@ -0,0 +1,131 @@
+"""
+使用统计汇总 (usage_analytics): 高水位增量汇总、分批、清空水位和按小时汇总的保留期
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from api.models import AIUsageRollup, UsageRollup, UserStats
+from api.services import usage_analytics
+from api.services.history import HistoryService
+from api.services.history_purge import HistoryPurgeService
+from api.services.usage_analytics import UsageAnalyticsService, bucket_start
+
+
+def rollup(db, user):
+    """汇总用户水位之后的全部记录, 返回 (历史记录数, AI 使用记录数)"""
+    history = ai_usage = 0
+    more = True
+    while more:
+        records, usages, more = UsageAnalyticsService.rollup_user(db, user.id)
+        db.commit()
+        history += records
+        ai_usage += usages
+    return history, ai_usage
+
+
+def summary(db, user, **kwargs):
+    db.expire_all()
+    return UsageAnalyticsService.get_summary(db, user.id, **kwargs)
+
+
+def test_bucket_start():
+    moment = datetime(2026, 10, 18, 13, 45, 12, 500)
+    assert bucket_start(moment, "hour") == datetime(2026, 10, 18, 13)
+    assert bucket_start(moment, "day") == datetime(2026, 10, 18)
+
+
+def test_high_water_mark_does_not_double_count(db, user):
+    HistoryService.create_history_bulk(db, user.id, [("1 + 1", "2"), ("2 + 2", "4")])
+    HistoryService.create_history(db, user.id, "1 + 1", "2", "scientific")
+    HistoryService.create_ai_usage(db, user.id, "q", 12)
+    assert rollup(db, user) == (3, 1)
+    # 没有新记录时不再累加
+    assert rollup(db, user) == (0, 0)
+
+    stats = db.get(UserStats, user.id)
+    assert (stats.rollup_history_seq, stats.rollup_ai_usage_seq) == (3, 1)
+    assert stats.rolled_up_at is not None
+
+    HistoryService.create_history(db, user.id, "3 + 3", "6")
+    assert rollup(db, user) == (1, 0)
+
+    body = summary(db, user)
+    assert (body["calculations"], body["ai_queries"], body["ai_tokens"]) == (4, 1, 12)
+    assert body["by_type"] == {"basic": 3, "scientific": 1}
+    assert body["top_expressions"][0] == {"expression": "1 + 1", "count": 2}
+    assert summary(db, user, granularity="hour", days=1)["calculations"] == 4
+
+
+def test_rollup_in_batches(db, user, monkeypatch):
+    monkeypatch.setattr(usage_analytics, "USAGE_ROLLUP_BATCH", 2)
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(5)])
+
+    assert UsageAnalyticsService.rollup_user(db, user.id) == (2, 0, True)
+    db.commit()
+    assert db.get(UserStats, user.id).rollup_history_seq == 2
+    assert rollup(db, user) == (3, 0)
+    assert summary(db, user)["calculations"] == 5
+
+
+def test_deleted_after_rollup_still_counted(db, user):
+    record = HistoryService.create_history(db, user.id, "1 + 1", "2")
+    rollup(db, user)
+    assert HistoryService.delete_history(db, user.id, record.id)
+    assert rollup(db, user) == (0, 0)
+    assert summary(db, user)["calculations"] == 1
+
+
+def test_cleared_records_skipped(db, user):
+    HistoryService.create_history_bulk(db, user.id, [(f"{i} + 1", "1") for i in range(3)])
+    HistoryPurgeService.clear_history(db, user.id)
+    HistoryService.create_history(db, user.id, "after", "1")
+
+    # 清空水位之前尚未汇总的记录不计入, 水位推进到当前序号
+    assert rollup(db, user) == (1, 0)
+    body = summary(db, user)
+    assert body["calculations"] == 1
+    assert body["top_expressions"] == [{"expression": "after", "count": 1}]
+
+
+def test_hourly_rollups_expire(db, user, monkeypatch):
+    monkeypatch.setattr(usage_analytics, "USAGE_HOURLY_RETENTION_DAYS", 3)
+    now = datetime.utcnow()
+    old, recent = bucket_start(now - timedelta(days=5), "hour"), bucket_start(now, "hour")
+    for period, start in (("hour", old), ("hour", recent), ("day", bucket_start(old, "day"))):
+        db.add(
+            UsageRollup(
+                user_id=user.id,
+                period=period,
+                bucket_start=start,
+                calculation_type="basic",
+                calculations=1,
+            )
+        )
+        db.add(AIUsageRollup(user_id=user.id, period=period, bucket_start=start, queries=1))
+    db.commit()
+
+    UsageAnalyticsService.run_rollups(db)
+    for model in (UsageRollup, AIUsageRollup):
+        rows = db.execute(
+            select(model.period, model.bucket_start).where(model.user_id == user.id)
+        ).all()
+        assert sorted(rows) == sorted([("hour", recent), ("day", bucket_start(old, "day"))])
+
+    # 按天汇总保留更早的数据; 按小时统计不能超过保留期
+    assert summary(db, user, days=7)["calculations"] == 1
+    assert summary(db, user, days=3, granularity="hour")["calculations"] == 1
+    with pytest.raises(ValueError, match="3 天"):
+        UsageAnalyticsService.get_summary(db, user.id, days=4, granularity="hour")
+
+
+def test_summary_timeline(db, user):
+    created_at = HistoryService.create_history(db, user.id, "1 + 1", "2").created_at
+    rollup(db, user)
+
+    body = summary(db, user, days=2, granularity="hour")
+    assert len(body["timeline"]) == 48
+    assert body["end"] - body["start"] == timedelta(days=2)
+    counted = [bucket for bucket in body["timeline"] if bucket["calculations"]]
+    assert [bucket["bucket_start"] for bucket in counted] == [bucket_start(created_at, "hour")]
@@ -0,0 +1,17 @@
+"""
+向量化计算 (CalculatorService.vectorize): 参数扫描和微积分使用的 NumPy 函数
+"""
+import numpy as np
+import pytest
+
+from api.services.calculator import CalculatorService
+
+
+def test_sweep_rejects_modular_pow():
+    with pytest.raises(ValueError, match="模幂"):
+        CalculatorService.vectorize("pow(x, 2, 5)", "x")
+
+
+def test_vectorized_pow_does_not_overflow_int64():
+    function = CalculatorService.vectorize("pow(10, 20) * x", "x")
+    np.testing.assert_allclose(function(np.array([1.0, 2.0])), [1e20, 2e20])